@@ -4,16 +4,21 @@ KernelTuneAgent - 一个内核参数调优智能代理框架
 
 from .kerneltune_agent import KernelTuneAgent
 from .llm import SimpleLLM
-from .tools import ToolCollection, PythonExecutor, FileEditor, BashExecutor
+from .router import LLMRouter
+from .tools import ToolCollection, PythonExecutor, FileEditor, BashExecutor, SysctlApplyTool, TrialTool, BatchTrialTool
 from .schema import Message, Memory, AgentState
 
 __all__ = [
     "KernelTuneAgent",
     "SimpleLLM", 
+    "LLMRouter",
     "ToolCollection",
     "PythonExecutor",
     "FileEditor", 
     "BashExecutor",
+    "SysctlApplyTool",
+    "TrialTool",
+    "BatchTrialTool",
     "Message",
     "Memory",
     "AgentState"
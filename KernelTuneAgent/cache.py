@@ -0,0 +1,195 @@
+"""
+评估结果持久化缓存
+
+以 (规范化配置, 训练命令, 主机指纹) 的哈希为键，保存每次训练的耗时，
+相同配置再次出现时直接返回缓存结果，避免重复训练。
+"""
+import hashlib
+import json
+import os
+import platform
+import time
+from typing import Dict, Iterable, List, Optional
+from pydantic import BaseModel
+from KernelTuneAgent.config import SYSCTL_PARAM_META
+from KernelTuneAgent.sysctl import parse_selected_value
+
+
+class CacheEntry(BaseModel):
+    """一条缓存的评估结果"""
+    key: str
+    config: Dict[str, str]
+    training_time: float          # 多次测量时为均值
+    samples: List[float] = []
+    fidelity: float = 1.0
+    train_cmd: str
+    host: str
+    is_baseline: bool = False
+    created_at: float = 0.0
+
+
+def normalize_value(name: str, value) -> str:
+    """把单个参数值规范化为字符串，保证同一取值的不同写法得到相同结果"""
+    text = str(value).strip()
+    meta = SYSCTL_PARAM_META.get(name, {})
+    if str(meta.get("range", "")).startswith("["):
+        return parse_selected_value(text).lower()
+    try:
+        number = float(text)
+    except ValueError:
+        return text.lower()
+    if number.is_integer():
+        return str(int(number))
+    return repr(number)
+
+
+def normalize_config(
+    config: Dict[str, object],
+    param_names: Iterable[str],
+    defaults: Optional[Dict[str, str]] = None
+) -> Dict[str, str]:
+    """在启用的参数集合上规范化配置，缺失的参数用默认值（defaults，未给出时取参数目录中的默认值）补齐"""
+    normalized = {}
+    for name in sorted(param_names):
+        if name in config and config[name] is not None:
+            normalized[name] = normalize_value(name, config[name])
+        elif defaults is not None and name in defaults:
+            normalized[name] = normalize_value(name, defaults[name])
+        else:
+            normalized[name] = normalize_value(name, SYSCTL_PARAM_META[name]["default"])
+    return normalized
+
+
+def _read_mem_total(meminfo_path: str = "/proc/meminfo") -> str:
+    try:
+        with open(meminfo_path, "r") as f:
+            for line in f:
+                if line.startswith("MemTotal:"):
+                    return line.split(":", 1)[1].strip()
+    except OSError:
+        pass
+    return "unknown"
+
+
+def host_fingerprint() -> str:
+    """主机指纹：主机名、内核版本、CPU 核数和内存总量"""
+    parts = [
+        platform.node(),
+        platform.release(),
+        platform.machine(),
+        str(os.cpu_count()),
+        _read_mem_total(),
+    ]
+    return hashlib.sha256("|".join(parts).encode("utf-8")).hexdigest()[:16]
+
+
+class EvalCache:
+    """基于 JSON 文件的评估结果缓存"""
+
+    def __init__(
+        self,
+        path: str,
+        train_cmd: str,
+        param_names: Iterable[str],
+        host: Optional[str] = None,
+        defaults: Optional[Dict[str, str]] = None
+    ):
+        self.path = path
+        self.train_cmd = train_cmd.strip()
+        self.param_names = sorted(param_names)
+        # 本机的默认配置（块设备参数的默认值为探测到的当前设置），未给出时取参数目录中的默认值
+        self.defaults = dict(defaults) if defaults is not None else None
+        self.host = host or host_fingerprint()
+        self.entries: Dict[str, CacheEntry] = {}
+        self._load()
+
+    def _load(self):
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+        except FileNotFoundError:
+            return
+        except (OSError, json.JSONDecodeError) as e:
+            print(f"⚠️ 评估缓存 {self.path} 读取失败，忽略: {e}")
+            return
+        for key, raw in data.items():
+            try:
+                self.entries[key] = CacheEntry(**raw)
+            except Exception:
+                continue
+
+    def _save(self):
+        """先写临时文件再替换，避免进程中断时留下半个文件"""
+        directory = os.path.dirname(os.path.abspath(self.path))
+        os.makedirs(directory, exist_ok=True)
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(
+                {key: entry.model_dump() for key, entry in self.entries.items()},
+                f, ensure_ascii=False, indent=2
+            )
+        os.replace(tmp_path, self.path)
+
+    def normalize(self, config: Dict[str, object]) -> Dict[str, str]:
+        return normalize_config(config, self.param_names, self.defaults)
+
+    def make_key(self, config: Dict[str, object], fidelity: float = 1.0) -> str:
+        """计算配置的缓存键，完整训练 (fidelity=1) 的键不包含 fidelity 字段"""
+        fields = {
+            "config": self.normalize(config),
+            "train_cmd": self.train_cmd,
+            "host": self.host,
+        }
+        if fidelity < 1.0:
+            fields["fidelity"] = round(fidelity, 6)
+        payload = json.dumps(fields, sort_keys=True)
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def get(self, config: Dict[str, object], fidelity: float = 1.0) -> Optional[CacheEntry]:
+        """查询缓存，未命中返回 None"""
+        return self.entries.get(self.make_key(config, fidelity))
+
+    def put(
+        self,
+        config: Dict[str, object],
+        training_time: float,
+        is_baseline: bool = False,
+        fidelity: float = 1.0,
+        samples: Optional[List[float]] = None
+    ) -> CacheEntry:
+        """写入一条评估结果并立即落盘"""
+        key = self.make_key(config, fidelity)
+        previous = self.entries.get(key)
+        entry = CacheEntry(
+            key=key,
+            config=self.normalize(config),
+            training_time=training_time,
+            samples=list(samples) if samples else [training_time],
+            fidelity=fidelity,
+            train_cmd=self.train_cmd,
+            host=self.host,
+            is_baseline=is_baseline or (previous is not None and previous.is_baseline),
+            created_at=time.time(),
+        )
+        self.entries[key] = entry
+        self._save()
+        return entry
+
+    def get_baseline(self) -> Optional[CacheEntry]:
+        """
+        查询可复用的 baseline 结果。
+        优先取默认配置下的结果，否则取同一主机、同一训练命令下最近一次标记为 baseline 的结果。
+        """
+        entry = self.get({})
+        if entry is not None:
+            return entry
+        candidates = [
+            e for e in self.entries.values()
+            if e.is_baseline
+            and e.host == self.host
+            and e.train_cmd == self.train_cmd
+            and sorted(e.config) == self.param_names
+        ]
+        if not candidates:
+            return None
+        return max(candidates, key=lambda e: e.created_at)
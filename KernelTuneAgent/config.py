@@ -1,138 +1,108 @@
-
 from enum import Enum
-"""固定参数,永远存在"""
-FIXED_SYSCTL_PARAMS = {
-    "fs.file-max",
-    "kernel.threads-max",
-    "vm.watermark_scale_factor",
-    "vm.dirty_background_ratio",
-    "vm.dirty_expire_centisecs",
-    "vm.dirty_ratio",
-    "vm.dirty_writeback_centisecs",
-    "vm.overcommit_memory",
-    "vm.overcommit_ratio",
-    "vm.page-cluster",
-    "vm.swappiness",
-    "transparent_hugepage",
-}
-"""动态参数,配置文件开关控制"""
-DYNAMIC_SYSCTL_PARAMS = {
-    "kernel.numa_balancing": {
-        "switch": "numa"
-    },
-}
+import os
+from typing import Dict, List, Tuple
+try:
+    import tomllib
+except ModuleNotFoundError:  # Python < 3.11
+    import tomli as tomllib
+
+
 class ImpactLevel(str, Enum):
     HIGH = "high"
     MEDIUM = "medium"
     LOW = "low"
-SYSCTL_PARAM_META = {
-    "fs.file-max": {
-        "range": "1000000-30000000",
-        "default": "1048576",
-        "step": "1000000",
-        "switch": None,
-        "impact": ImpactLevel.HIGH,
-        "coupling": "low",
-    },
-    "kernel.threads-max": {
-        "range": "655360-65536000",
-        "default": "3092111",
-        "step": "655360",
-        "switch": None,
-        "impact": ImpactLevel.HIGH,
-        "coupling": "low",
-    },
-    "vm.watermark_scale_factor": {
-        "range": "10-1000",
-        "default": "10",
-        "step": "10",
-        "switch": None,
-        "impact": ImpactLevel.HIGH,
-        "coupling": "low",
-    },
-     "vm.page-cluster": {
-        "range": "0-8",
-        "default": "3",
-        "step": "1",
-        "switch": None,
-        "impact": ImpactLevel.HIGH,
-        "coupling": "low",
-    },
-    "transparent_hugepage": {
-        "range": "[always,madvise,never]",
-        "default": "madvise",
-        "step": "1",
-        "switch": None,
-        "impact": ImpactLevel.HIGH,
-        "coupling": "low",
-    },
-    "vm.dirty_background_ratio": {
-        "range": "0-80",
-        "default": "10",
-        "step": "2",
-        "switch": None,
-        "impact": ImpactLevel.MEDIUM,
-        "coupling": "medium",
-    },
-    "vm.dirty_expire_centisecs": {
-        "range": "0-5000",
-        "default": "3000",
-        "step": "200",
-        "switch": None,
-        "impact": ImpactLevel.MEDIUM,
-        "coupling": "medium",
-    },
-    "vm.dirty_ratio": {
-        "range": "0-80",
-        "default": "30",
-        "step": "2",
-        "switch": None,
-        "impact": ImpactLevel.MEDIUM,
-        "coupling": "medium",
-    },
-    "vm.dirty_writeback_centisecs": {
-        "range": "100-1000",
-        "default": "500",
-        "step": "100",
-        "switch": None,
-        "impact": ImpactLevel.MEDIUM,
-        "coupling": "medium",
-    },
-    "vm.overcommit_memory": {
-        "range": "0/1/2",
-        "default": "0",
-        "step": "1",
-        "switch": None,
-        "impact": ImpactLevel.MEDIUM,
-        "coupling": "medium",
-    },
-    "vm.overcommit_ratio": {
-        "range": "0-100",
-        "default": "50",
-        "step": "10",
-        "switch": None,
-        "impact": ImpactLevel.MEDIUM,
-        "coupling": "medium",
-    },
-    "vm.swappiness": {
-        "range": "0-90",
-        "default": "10",
-        "step": "2",
-        "switch": None,
-        "impact": ImpactLevel.MEDIUM,
-        "coupling": "medium",
-    },
-    # —— 动态参数 —— #
-    "kernel.numa_balancing": {
-        "range": "0-1",
-        "default": "1",
-        "step": "1",
-        "switch": "numa",
-        "impact": ImpactLevel.MEDIUM,
-        "coupling": "medium",
-    },
+
+
+"""可调参数目录：每个参数的类型、范围、读写路径和启用条件都在 tunables.toml 中声明"""
+CATALOG_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "tunables.toml")
+
+CATALOG_ROOTS = ("proc", "mm", "block")
+CATALOG_FORMATS = ("plain", "selected")
+
+
+def _parse_tunable(name: str, item: Dict) -> Dict:
+    """
+    把目录中的一项转换为参数元数据：range/default/step 沿用文本格式，
+    整数区间为 'low-high'，数值型离散取值为 '0/1/2'，其它离散取值为 '[a,b,c]'
+    """
+    kind = item.get("type")
+    try:
+        if kind == "int":
+            low, high = (int(v) for v in item["range"])
+            text_range, step = f"{low}-{high}", str(int(item.get("step", 1)))
+        elif kind == "choice":
+            choices = [str(c) for c in item["choices"]]
+            numeric = all(c.lstrip("-").isdigit() for c in choices)
+            text_range = "/".join(choices) if numeric else f"[{','.join(choices)}]"
+            step = "1"
+        else:
+            raise ValueError(f"未知的参数类型 {kind!r}")
+        root = item.get("root", "proc")
+        if root not in CATALOG_ROOTS:
+            raise ValueError(f"未知的 root {root!r}")
+        if root != "proc" and not item.get("path"):
+            raise ValueError(f"root 为 {root} 的参数必须给出 path")
+        if item.get("format", "plain") not in CATALOG_FORMATS:
+            raise ValueError(f"未知的 format {item.get('format')!r}")
+        meta = {
+            "range": text_range,
+            "default": str(item["default"]),
+            "step": step,
+            "switch": item.get("switch"),
+            "impact": ImpactLevel(item.get("impact", "medium")),
+            "coupling": item.get("coupling", "medium"),
+            "root": root,
+            "path": item.get("path") or "/".join(name.split(".")),
+            "format": item.get("format", "plain"),
+            "requires": item.get("requires"),
+        }
+    except (KeyError, TypeError) as e:
+        raise ValueError(f"参数目录中 {name} 缺少或错误的字段: {e}") from e
+    except ValueError as e:
+        raise ValueError(f"参数目录中 {name}: {e}") from e
+    if item.get("scale"):
+        meta["scale"] = item["scale"]
+        meta["floor"] = str(item.get("floor", 1))
+    return meta
+
+
+def load_catalog(path: str) -> Tuple[Dict[str, Dict], List[Tuple[str, str]]]:
+    """读取参数目录，返回 (参数名 -> 元数据, 参数间约束)"""
+    with open(path, "rb") as f:
+        data = tomllib.load(f)
+    constraints = [(c["lower"], c["upper"]) for c in data.pop("constraint", [])]
+    meta = {name: _parse_tunable(name, item) for name, item in data.items()}
+    return meta, constraints
+
+
+"""参数元数据，以及参数间约束: (A, B) 表示 A 的取值必须小于 B"""
+SYSCTL_PARAM_META, PARAM_CONSTRAINTS = load_catalog(CATALOG_PATH)
+
+"""固定参数,永远存在"""
+FIXED_SYSCTL_PARAMS = {name for name, meta in SYSCTL_PARAM_META.items() if meta["switch"] is None}
+"""动态参数,配置文件开关控制"""
+DYNAMIC_SYSCTL_PARAMS = {
+    name: {"switch": meta["switch"]} for name, meta in SYSCTL_PARAM_META.items() if meta["switch"] is not None
 }
 
+
+def merge_catalog(path: str) -> List[str]:
+    """
+    合并额外的参数目录：同名参数被覆盖，约束追加。
+    就地修改上面的几个对象，已经导入它们的模块随之生效。返回目录中的参数名。
+    """
+    meta, constraints = load_catalog(path)
+    SYSCTL_PARAM_META.update(meta)
+    PARAM_CONSTRAINTS.extend(c for c in constraints if c not in PARAM_CONSTRAINTS)
+    for name, item in meta.items():
+        FIXED_SYSCTL_PARAMS.discard(name)
+        DYNAMIC_SYSCTL_PARAMS.pop(name, None)
+        if item["switch"] is None:
+            FIXED_SYSCTL_PARAMS.add(name)
+        else:
+            DYNAMIC_SYSCTL_PARAMS[name] = {"switch": item["switch"]}
+    return list(meta)
+
 """调优阶段"""
 class Phase(Enum):
     EXPLORATION = ("exploration", 0.20, 5, False, "大范围探索", ImpactLevel.HIGH)
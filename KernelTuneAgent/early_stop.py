@@ -0,0 +1,159 @@
+"""
+训练进度解析与提前终止
+
+训练过程中从标准输出和日志中解析 'epoch 3/10'、'step 200/5000' 这类进度，
+按以下规则之一判断本次试验是否明显劣于已完成的试验：
+- median: 当前进度下已用时间超过历史试验同一进度用时的中位数 (1 + margin) 倍
+- bound: 按单位进度耗时的置信下界外推，总耗时仍超过历史最快试验的 (1 + margin) 倍
+两种规则终止的试验都按同一方法（见 _projected_total）外推到完整训练的总用时，
+换算成训练耗时后不低于最快完成试验的 (1 + margin) 倍，作为删失值交给优化器和参数筛选按惩罚处理。
+"""
+import math
+import re
+from statistics import median
+from typing import Dict, List, Optional, Tuple
+from pydantic import BaseModel
+
+DEFAULT_PROGRESS_PATTERN = r"(?i)(?:epoch|step|iter(?:ation)?)\s*[\[:]?\s*(\d+)\s*/\s*(\d+)"
+
+
+class ProgressParser:
+    """按正则解析进度，第 1、2 个分组分别为当前进度和总进度"""
+
+    def __init__(self, pattern: str = DEFAULT_PROGRESS_PATTERN):
+        self.pattern = re.compile(pattern)
+
+    def parse(self, line: str) -> Optional[Tuple[int, int]]:
+        match = self.pattern.search(line)
+        if not match:
+            return None
+        try:
+            current, total = int(match.group(1)), int(match.group(2))
+        except (IndexError, ValueError):
+            return None
+        if total <= 0 or current <= 0 or current > total:
+            return None
+        return current, total
+
+
+class CompletedCurve(BaseModel):
+    """一次完整试验的进度曲线"""
+    points: List[Tuple[float, float]]    # (完成比例, 已用秒数)
+    wall_time: float
+    training_time: float
+
+
+def _elapsed_at(curve: CompletedCurve, fraction: float) -> float:
+    """在历史曲线上插值得到某一进度的已用时间"""
+    points = curve.points or [(1.0, curve.wall_time)]
+    previous = (0.0, 0.0)
+    for point in points:
+        if point[0] >= fraction:
+            span = point[0] - previous[0]
+            if span <= 0:
+                return point[1]
+            weight = (fraction - previous[0]) / span
+            return previous[1] + weight * (point[1] - previous[1])
+        previous = point
+    return curve.wall_time * fraction
+
+
+class EarlyStopper:
+    """根据历史试验的进度曲线提前终止明显劣化的试验"""
+
+    RULES = ("median", "bound")
+
+    def __init__(
+        self,
+        rule: str = "median",
+        min_fraction: float = 0.2,
+        margin: float = 0.05,
+        z: float = 1.645,
+        min_history: int = 1
+    ):
+        if rule not in self.RULES:
+            raise ValueError(f"未知的提前终止规则: {rule}，可选: {', '.join(self.RULES)}")
+        self.rule = rule
+        self.min_fraction = min_fraction
+        self.margin = margin
+        self.z = z
+        self.min_history = min_history
+        self.history: Dict[float, List[CompletedCurve]] = {}
+        self.fidelity = 1.0
+        self.points: List[Tuple[float, float]] = []
+        self.unit_times: List[float] = []
+        self.total_units = 0
+        self.projected_time: Optional[float] = None
+
+    def start(self, fidelity: float = 1.0) -> None:
+        """开始一次新的试验"""
+        self.fidelity = fidelity
+        self.points = []
+        self.unit_times = []
+        self.total_units = 0
+        self.projected_time = None
+
+    def update(self, current: int, total: int, elapsed: float) -> bool:
+        """记录一条进度，返回 True 表示应当终止本次试验"""
+        fraction = current / total
+        if self.points:
+            last_fraction, last_elapsed = self.points[-1]
+            if fraction <= last_fraction:
+                return False
+            units = (fraction - last_fraction) * total
+            self.unit_times.append((elapsed - last_elapsed) / units)
+        self.points.append((fraction, elapsed))
+        self.total_units = total
+
+        history = self.history.get(self.fidelity, [])
+        if fraction < self.min_fraction or len(history) < self.min_history:
+            return False
+        if self.rule == "median":
+            return self._median_rule(fraction, elapsed, history)
+        return self._bound_rule(fraction, elapsed, history)
+
+    def _projected_total(self, fraction: float, elapsed: float) -> float:
+        """
+        外推的完整训练总用时：已用时间 + 剩余进度 × 单位进度耗时均值的置信下界。
+        单位进度耗时不足 3 个时无法估计置信下界，按已完成比例外推（elapsed / fraction）。
+        """
+        if len(self.unit_times) < 3:
+            return elapsed / fraction
+        n = len(self.unit_times)
+        mean = sum(self.unit_times) / n
+        std = math.sqrt(sum((t - mean) ** 2 for t in self.unit_times) / (n - 1))
+        remaining = (1 - fraction) * self.total_units
+        return elapsed + remaining * max(mean - self.z * std / math.sqrt(n), 0.0)
+
+    def _median_rule(self, fraction: float, elapsed: float, history: List[CompletedCurve]) -> bool:
+        reference = median(_elapsed_at(curve, fraction) for curve in history)
+        self.projected_time = self._projected_total(fraction, elapsed)
+        return elapsed > reference * (1 + self.margin)
+
+    def _bound_rule(self, fraction: float, elapsed: float, history: List[CompletedCurve]) -> bool:
+        if len(self.unit_times) < 3:
+            return False
+        lower = self._projected_total(fraction, elapsed)
+        self.projected_time = lower
+        best_wall = min(curve.wall_time for curve in history)
+        return lower > best_wall * (1 + self.margin)
+
+    def complete(self, wall_time: float, training_time: float) -> None:
+        """记录一次完整结束的试验"""
+        curve = CompletedCurve(points=list(self.points), wall_time=wall_time, training_time=training_time)
+        self.history.setdefault(self.fidelity, []).append(curve)
+
+    def censored_value(self) -> Optional[float]:
+        """
+        被终止试验的训练耗时估计：按外推的总用时与历史最快试验总用时之比缩放其训练耗时指标。
+        试验因明显慢于已完成的试验而被终止，估计值不低于最快完成试验训练耗时的 (1 + margin) 倍
+        """
+        history = self.history.get(self.fidelity, [])
+        if self.projected_time is None or not history:
+            return None
+        reference = min(history, key=lambda curve: curve.wall_time)
+        if reference.wall_time <= 0:
+            return None
+        scaled = reference.training_time * self.projected_time / reference.wall_time
+        best = min(curve.training_time for curve in history)
+        return max(scaled, best * (1 + self.margin))
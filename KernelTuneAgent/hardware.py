@@ -0,0 +1,263 @@
+"""
+硬件拓扑探测
+
+从 procfs / sysfs 读取本机的硬件信息，生成系统提示词中的实验环境描述，并据此调整参数空间：
+- /proc/cpuinfo: CPU 型号、插槽数、物理核数和逻辑核数
+- /sys/devices/system/node: NUMA 节点及各节点的 CPU 和内存
+- /proc/meminfo: 内存总量
+- /sys/block/*/queue: 块设备类型、IO 调度器、read_ahead_kb、nr_requests
+- /proc/sys/kernel/osrelease, /etc/os-release: 内核版本和发行版
+
+所有路径都相对于 root，指向一个伪造的 procfs/sysfs 目录树即可在其它机器上复现探测结果。
+"""
+import os
+import re
+from typing import Dict, List, Optional
+from pydantic import BaseModel
+
+# 参数表的取值范围按这台机器的内存制定，标记为 scale: memory 的参数按内存比例缩放
+REFERENCE_MEM_KB = 366 * 1024 * 1024
+
+# 不计入磁盘描述的虚拟块设备
+VIRTUAL_BLOCK_PREFIXES = ("loop", "ram", "zram", "dm-", "md", "sr", "nbd")
+
+
+class NumaNode(BaseModel):
+    """一个 NUMA 节点"""
+    node: int
+    cpus: str = ""              # cpulist 格式，如 "0-23,48-71"
+    mem_kb: float = 0.0
+
+
+class BlockDevice(BaseModel):
+    """一个块设备及其请求队列设置"""
+    name: str
+    size_gb: float = 0.0
+    rotational: bool = False
+    scheduler: str = ""         # 当前生效的 IO 调度器
+    read_ahead_kb: Optional[int] = None
+    nr_requests: Optional[int] = None
+
+    def describe(self) -> str:
+        kind = "HDD" if self.rotational else ("NVMe SSD" if self.name.startswith("nvme") else "SSD")
+        parts = [f"{self.name}: {self.size_gb:.0f}GB {kind}"]
+        if self.scheduler:
+            parts.append(f"调度器 {self.scheduler}")
+        if self.read_ahead_kb is not None:
+            parts.append(f"read_ahead_kb {self.read_ahead_kb}")
+        if self.nr_requests is not None:
+            parts.append(f"nr_requests {self.nr_requests}")
+        return ", ".join(parts)
+
+
+class HardwareProfile(BaseModel):
+    """探测到的硬件信息"""
+    cpu_model: str = ""
+    sockets: int = 0
+    cores: int = 0              # 物理核数
+    threads: int = 0            # 逻辑核数
+    mem_kb: float = 0.0
+    numa_nodes: List[NumaNode] = []
+    block_devices: List[BlockDevice] = []
+    kernel: str = ""
+    os_name: str = ""
+
+    @property
+    def multi_numa(self) -> bool:
+        return len(self.numa_nodes) > 1
+
+    def primary_disk(self) -> Optional[BlockDevice]:
+        """容量最大的磁盘，默认作为块设备参数的调优对象"""
+        return max(self.block_devices, key=lambda device: device.size_gb, default=None)
+
+    def switches(self) -> Dict[str, bool]:
+        """由硬件决定的动态参数开关"""
+        return {"numa": self.multi_numa}
+
+    def describe(self) -> List[str]:
+        """实验环境描述，每项一行"""
+        lines = []
+        if self.threads:
+            cpu = f"CPU: {self.threads} 逻辑核"
+            if self.cores:
+                cpu += f" / {self.cores} 物理核"
+            if self.sockets:
+                cpu += f", {self.sockets} 路"
+            if self.cpu_model:
+                cpu += f" ({self.cpu_model})"
+            lines.append(cpu)
+        if self.mem_kb:
+            lines.append(f"内存: {self.mem_kb / (1024 * 1024):.0f}GB")
+        if self.multi_numa:
+            nodes = "; ".join(
+                f"node{node.node} CPU {node.cpus or '-'} 内存 {node.mem_kb / (1024 * 1024):.0f}GB" for node in self.numa_nodes
+            )
+            lines.append(f"NUMA: {len(self.numa_nodes)} 个节点 ({nodes})")
+        elif self.numa_nodes:
+            lines.append("NUMA: 单节点")
+        for device in self.block_devices:
+            lines.append(f"磁盘: {device.describe()}")
+        if self.os_name:
+            lines.append(f"操作系统: {self.os_name}")
+        if self.kernel:
+            lines.append(f"内核版本: {self.kernel}")
+        return lines
+
+
+def _read_text(path: str) -> Optional[str]:
+    try:
+        with open(path, "r", errors="replace") as f:
+            return f.read().strip()
+    except OSError:
+        return None
+
+
+def _read_int(path: str) -> Optional[int]:
+    text = _read_text(path)
+    try:
+        return int(text) if text is not None else None
+    except ValueError:
+        return None
+
+
+class HardwareProbe:
+    """从 root 下的 procfs/sysfs 目录树读取硬件信息"""
+
+    def __init__(self, root: str = "/"):
+        self.root = root
+
+    def _path(self, *parts: str) -> str:
+        return os.path.join(self.root, *parts)
+
+    def probe(self) -> HardwareProfile:
+        profile = HardwareProfile(
+            mem_kb=self._mem_total(),
+            numa_nodes=self._numa_nodes(),
+            block_devices=self._block_devices(),
+            kernel=_read_text(self._path("proc", "sys", "kernel", "osrelease")) or "",
+            os_name=self._os_name(),
+        )
+        self._cpu_info(profile)
+        return profile
+
+    def _cpu_info(self, profile: HardwareProfile) -> None:
+        """逻辑核数按 processor 条目计数，物理核按 (physical id, core id) 去重"""
+        text = _read_text(self._path("proc", "cpuinfo")) or ""
+        threads = 0
+        sockets = set()
+        cores = set()
+        for block in re.split(r"\n\s*\n", text):
+            fields = {}
+            for line in block.splitlines():
+                if ":" in line:
+                    key, value = line.split(":", 1)
+                    fields[key.strip()] = value.strip()
+            if "processor" not in fields:
+                continue
+            threads += 1
+            profile.cpu_model = profile.cpu_model or fields.get("model name", "")
+            if "physical id" in fields:
+                sockets.add(fields["physical id"])
+                if "core id" in fields:
+                    cores.add((fields["physical id"], fields["core id"]))
+        profile.threads = threads
+        profile.sockets = len(sockets)
+        profile.cores = len(cores)
+
+    def _mem_total(self) -> float:
+        text = _read_text(self._path("proc", "meminfo")) or ""
+        match = re.search(r"^MemTotal:\s*(\d+)", text, re.MULTILINE)
+        return float(match.group(1)) if match else 0.0
+
+    def _numa_nodes(self) -> List[NumaNode]:
+        directory = self._path("sys", "devices", "system", "node")
+        try:
+            names = os.listdir(directory)
+        except OSError:
+            return []
+        nodes = []
+        for name in names:
+            match = re.fullmatch(r"node(\d+)", name)
+            if not match:
+                continue
+            meminfo = _read_text(os.path.join(directory, name, "meminfo")) or ""
+            mem = re.search(r"MemTotal:\s*(\d+)", meminfo)
+            nodes.append(NumaNode(
+                node=int(match.group(1)),
+                cpus=_read_text(os.path.join(directory, name, "cpulist")) or "",
+                mem_kb=float(mem.group(1)) if mem else 0.0,
+            ))
+        return sorted(nodes, key=lambda node: node.node)
+
+    def _block_devices(self) -> List[BlockDevice]:
+        directory = self._path("sys", "block")
+        try:
+            names = sorted(os.listdir(directory))
+        except OSError:
+            return []
+        devices = []
+        for name in names:
+            if name.startswith(VIRTUAL_BLOCK_PREFIXES):
+                continue
+            queue = os.path.join(directory, name, "queue")
+            sectors = _read_int(os.path.join(directory, name, "size")) or 0
+            if sectors <= 0:
+                continue
+            scheduler = _read_text(os.path.join(queue, "scheduler")) or ""
+            active = re.search(r"\[([^\]]+)\]", scheduler)
+            devices.append(BlockDevice(
+                name=name,
+                size_gb=sectors * 512 / 1e9,
+                rotational=_read_int(os.path.join(queue, "rotational")) == 1,
+                scheduler=active.group(1) if active else scheduler,
+                read_ahead_kb=_read_int(os.path.join(queue, "read_ahead_kb")),
+                nr_requests=_read_int(os.path.join(queue, "nr_requests")),
+            ))
+        return devices
+
+    def _os_name(self) -> str:
+        text = _read_text(self._path("etc", "os-release")) or ""
+        match = re.search(r'^PRETTY_NAME="?([^"\n]*)"?', text, re.MULTILINE)
+        return match.group(1) if match else ""
+
+
+def apply_device_defaults(meta: Dict[str, Dict], device: BlockDevice) -> None:
+    """块设备参数的默认值改为探测到的当前设置，当前的 IO 调度器不在可选项中时补充进去"""
+    probed = {
+        "block.read_ahead_kb": device.read_ahead_kb,
+        "block.nr_requests": device.nr_requests,
+        "block.scheduler": device.scheduler or None,
+    }
+    for name, value in probed.items():
+        if name not in meta or value is None:
+            continue
+        item = meta[name]
+        text = str(item["range"])
+        if text.startswith("[") and str(value) not in text.strip("[]").split(","):
+            item["range"] = f"[{text.strip('[]')},{value}]"
+        item["default"] = str(value)
+
+
+def scale_param_meta(meta: Dict[str, Dict], profile: HardwareProfile) -> List[str]:
+    """
+    标记为 scale: memory 的参数按本机内存与参考机器的比例缩放取值范围和步长，缩放后不低于参数的 floor。
+    默认值是 baseline 写入的取值，不缩放，缩放后的范围向外扩展到包含默认值。
+    原始取值保存在 base 中，重复调用的结果不变。返回缩放过的参数名。
+    """
+    if profile.mem_kb <= 0:
+        return []
+    factor = profile.mem_kb / REFERENCE_MEM_KB
+    scaled = []
+    for name, item in meta.items():
+        if item.get("scale") != "memory":
+            continue
+        base = item.setdefault("base", {key: item[key] for key in ("range", "step")})
+        floor = int(item.get("floor", 1))
+        default = int(item["default"])
+        low, high = (int(v) for v in str(base["range"]).split("-", 1))
+        low = min(max(floor, int(low * factor)), default)
+        high = max(low, int(high * factor), default)
+        item["range"] = f"{low}-{high}"
+        item["step"] = str(max(1, int(int(base["step"]) * factor)))
+        scaled.append(name)
+    return scaled
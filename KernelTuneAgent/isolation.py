@@ -0,0 +1,197 @@
+"""
+试验隔离：每次训练前把系统恢复到可比的状态
+
+上一次试验留下的页缓存、内存碎片和脏页会影响下一次训练，放大测量噪声，
+也会混淆 vm.dirty_*、transparent_hugepage 等参数的效果。训练前按固定顺序执行配置的步骤：
+- warmup: 先跑一次（截断的）训练，耗时丢弃，吸收首次运行的编译、磁盘缓存等一次性开销
+- sync: 把脏页写回磁盘
+- drop_caches: 写 vm/drop_caches 丢弃页缓存、dentry 和 inode 缓存
+- compact_memory: 写 vm/compact_memory 整理内存碎片
+- prewarm: 顺序读一遍数据集文件，让每次训练都从同样的热缓存开始
+- quiesce: 等待系统平静：每核 1 分钟负载和 PSI some avg10 都低于阈值，超过上限时间后照常开始
+
+每一步都计时，单步失败（例如没有 root 权限）只记录，不中断训练。
+"""
+import asyncio
+import os
+import time
+from typing import Awaitable, Callable, Dict, List, Optional
+from pydantic import BaseModel
+from KernelTuneAgent.tracing import Tracer
+
+ISOLATION_STEPS = ("warmup", "sync", "drop_caches", "compact_memory", "prewarm", "quiesce")
+
+
+class IsolationStep(BaseModel):
+    """一个隔离步骤的执行结果"""
+    name: str
+    duration: float = 0.0
+    ok: bool = True
+    detail: str = ""
+
+
+class IsolationReport(BaseModel):
+    """一次训练前执行的隔离步骤"""
+    steps: List[IsolationStep] = []
+
+    @property
+    def duration(self) -> float:
+        return sum(step.duration for step in self.steps)
+
+    def describe(self) -> str:
+        parts = []
+        for step in self.steps:
+            text = f"{step.name} {step.duration:.1f}s"
+            if step.detail:
+                text += f" ({step.detail})"
+            parts.append(text if step.ok else f"{text} ⚠️")
+        return f"试验隔离 {self.duration:.1f} 秒: " + ", ".join(parts)
+
+
+def _write_proc(path: str, value: str) -> None:
+    with open(path, "w") as f:
+        f.write(f"{value}\n")
+
+
+class IsolationProtocol:
+    """按配置的步骤在每次训练前隔离系统状态"""
+
+    def __init__(
+        self,
+        steps: List[str],
+        proc_root: str = "/proc",
+        drop_caches: int = 3,
+        prewarm_paths: Optional[List[str]] = None,
+        prewarm_limit: int = 0,
+        quiesce_load: float = 0.5,
+        quiesce_pressure: float = 1.0,
+        quiesce_timeout: float = 60.0,
+        quiesce_interval: float = 1.0,
+        warmup_fidelity: float = 0.1,
+        tracer: Optional[Tracer] = None
+    ):
+        unknown = [step for step in steps if step not in ISOLATION_STEPS]
+        if unknown:
+            raise ValueError(f"未知的隔离步骤: {', '.join(unknown)}，可选: {', '.join(ISOLATION_STEPS)}")
+        # 按固定顺序执行：预热训练在最前，清理之后再预读数据集，最后等待系统平静
+        self.steps = [step for step in ISOLATION_STEPS if step in steps]
+        self.proc_root = proc_root
+        self.drop_caches = drop_caches
+        self.prewarm_paths = list(prewarm_paths or [])
+        self.prewarm_limit = prewarm_limit          # 预读字节数上限，0 表示不限
+        self.quiesce_load = quiesce_load            # 每核 1 分钟负载
+        self.quiesce_pressure = quiesce_pressure    # PSI some avg10（百分比）
+        self.quiesce_timeout = quiesce_timeout
+        self.quiesce_interval = quiesce_interval
+        self.warmup_fidelity = warmup_fidelity
+        self.tracer = tracer or Tracer()
+
+    async def prepare(self, warmup: Optional[Callable[[], Awaitable[str]]] = None) -> IsolationReport:
+        """
+        执行全部步骤，记录为一个 isolation span，每一步为其中的 isolation.<步骤> span。
+        warmup 为执行一次预热训练的回调，返回描述
+        """
+        report = IsolationReport()
+        with self.tracer.span("isolation") as parent:
+            for name in self.steps:
+                if name == "warmup" and warmup is None:
+                    continue
+                with self.tracer.span(f"isolation.{name}") as span:
+                    start = time.monotonic()
+                    step = IsolationStep(name=name)
+                    try:
+                        if name == "warmup":
+                            step.detail = await warmup()
+                        else:
+                            step.ok, step.detail = await getattr(self, f"_{name}")()
+                    except OSError as e:
+                        step.ok, step.detail = False, e.strerror or str(e)
+                    step.duration = time.monotonic() - start
+                    span.set(ok=step.ok)
+                report.steps.append(step)
+            parent.set(failed=[step.name for step in report.steps if not step.ok] or None)
+        return report
+
+    async def _sync(self):
+        await asyncio.to_thread(os.sync)
+        return True, ""
+
+    async def _drop_caches(self):
+        await asyncio.to_thread(os.sync)
+        # 页缓存很大时写 drop_caches 会阻塞数秒，放到线程中执行，不阻塞事件循环上的追踪、指标服务和健康检查
+        await asyncio.to_thread(
+            _write_proc, os.path.join(self.proc_root, "sys", "vm", "drop_caches"), str(self.drop_caches)
+        )
+        return True, ""
+
+    async def _compact_memory(self):
+        await asyncio.to_thread(_write_proc, os.path.join(self.proc_root, "sys", "vm", "compact_memory"), "1")
+        return True, ""
+
+    def _read_files(self) -> Dict[str, int]:
+        """顺序读取预热路径下的全部文件，达到字节数上限时停止"""
+        counts = {"files": 0, "bytes": 0}
+        paths = []
+        for root in self.prewarm_paths:
+            if os.path.isfile(root):
+                paths.append(root)
+                continue
+            for directory, _, names in os.walk(root):
+                paths.extend(os.path.join(directory, name) for name in sorted(names))
+        for path in paths:
+            try:
+                with open(path, "rb", buffering=0) as f:
+                    while True:
+                        chunk = f.read(1 << 20)
+                        if not chunk:
+                            break
+                        counts["bytes"] += len(chunk)
+                        if self.prewarm_limit and counts["bytes"] >= self.prewarm_limit:
+                            counts["files"] += 1
+                            return counts
+            except OSError:
+                continue
+            counts["files"] += 1
+        return counts
+
+    async def _prewarm(self):
+        if not self.prewarm_paths:
+            return False, "未配置预热路径"
+        counts = await asyncio.to_thread(self._read_files)
+        return True, f"{counts['files']} 个文件, {counts['bytes'] / (1 << 20):.0f} MB"
+
+    def _load_per_cpu(self) -> Optional[float]:
+        try:
+            with open(os.path.join(self.proc_root, "loadavg"), "r") as f:
+                return float(f.read().split()[0]) / (os.cpu_count() or 1)
+        except (OSError, ValueError, IndexError):
+            return None
+
+    def _max_pressure(self) -> Optional[float]:
+        """cpu/memory/io 的 PSI some avg10 最大值（百分比），没有 PSI 时为 None"""
+        values = []
+        for resource in ("cpu", "memory", "io"):
+            try:
+                with open(os.path.join(self.proc_root, "pressure", resource), "r") as f:
+                    for line in f:
+                        if line.startswith("some"):
+                            fields = dict(item.split("=", 1) for item in line.split()[1:] if "=" in item)
+                            values.append(float(fields.get("avg10", 0.0)))
+            except (OSError, ValueError):
+                continue
+        return max(values) if values else None
+
+    async def _quiesce(self):
+        start = time.monotonic()
+        while True:
+            load, pressure = self._load_per_cpu(), self._max_pressure()
+            state = f"负载 {load:.2f}/核" if load is not None else "负载未知"
+            if pressure is not None:
+                state += f", PSI {pressure:.1f}%"
+            quiet = (load is None or load <= self.quiesce_load) and (pressure is None or pressure <= self.quiesce_pressure)
+            waited = time.monotonic() - start
+            if quiet:
+                return True, state
+            if waited >= self.quiesce_timeout:
+                return False, f"等待 {waited:.0f} 秒仍未平静, {state}"
+            await asyncio.sleep(self.quiesce_interval)
@@ -0,0 +1,128 @@
+"""
+试验日志：崩溃后恢复调优会话
+
+只追加的 JSONL 文件，每条记录写入后立即 fsync：
+- session: 会话开始，记录训练命令、参数集合和主机指纹，用于判断日志能否用于当前环境
+- trial: 每次试验记录（TrialRecord）
+- screening: 参数筛选结果（冻结的参数和重新划分的 impact 等级）
+- checkpoint: 每一步开始前的代理状态：步数、阶段、最佳记录、baseline、折叠后的对话
+- finished: 会话正常结束
+
+恢复时只读取最后一个会话；进程在写入过程中被杀死留下的半行记录会被忽略。
+"""
+import json
+import os
+import time
+from typing import Any, Dict, List, Optional
+from pydantic import BaseModel
+from KernelTuneAgent.schema import TrialRecord
+from KernelTuneAgent.sensitivity import ScreeningReport
+
+
+class JournalState(BaseModel):
+    """从日志中读出的最后一个会话"""
+    session: Dict[str, Any] = {}
+    trials: List[TrialRecord] = []
+    screening: Optional[ScreeningReport] = None
+    checkpoint: Optional[Dict[str, Any]] = None
+    finished: bool = False
+
+    def trials_after_checkpoint(self) -> List[TrialRecord]:
+        """最后一个检查点之后才完成的试验"""
+        if self.checkpoint is None:
+            return list(self.trials)
+        return self.trials[self.checkpoint.get("trial_count", 0):]
+
+
+class TrialJournal:
+    """只追加、逐条 fsync 的试验日志"""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._file = None
+
+    def _open(self):
+        if self._file is None:
+            directory = os.path.dirname(os.path.abspath(self.path))
+            os.makedirs(directory, exist_ok=True)
+            created = not os.path.exists(self.path)
+            torn = not created and self._ends_with_partial_line()
+            self._file = open(self.path, "a", encoding="utf-8")
+            if torn:
+                # 上次进程在写入过程中被杀死，补上换行，新记录另起一行
+                self._file.write("\n")
+            if created:
+                # 新建文件时同步目录项，保证掉电后文件本身存在
+                fd = os.open(directory, os.O_RDONLY)
+                try:
+                    os.fsync(fd)
+                finally:
+                    os.close(fd)
+        return self._file
+
+    def _ends_with_partial_line(self) -> bool:
+        """文件末尾是否是没有换行结束的半行记录"""
+        with open(self.path, "rb") as f:
+            f.seek(0, os.SEEK_END)
+            if f.tell() == 0:
+                return False
+            f.seek(-1, os.SEEK_END)
+            return f.read(1) != b"\n"
+
+    def _append(self, kind: str, **payload: Any) -> None:
+        f = self._open()
+        f.write(json.dumps({"type": kind, "ts": time.time(), **payload}, ensure_ascii=False, default=str) + "\n")
+        f.flush()
+        os.fsync(f.fileno())
+
+    def start_session(self, **header: Any) -> None:
+        self._append("session", **header)
+
+    def record_trial(self, record: TrialRecord) -> None:
+        self._append("trial", trial=record.model_dump())
+
+    def record_screening(self, report: ScreeningReport) -> None:
+        self._append("screening", report=report.model_dump())
+
+    def checkpoint(self, **state: Any) -> None:
+        self._append("checkpoint", **state)
+
+    def finish(self) -> None:
+        self._append("finished")
+
+    def close(self) -> None:
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    def load(self) -> Optional[JournalState]:
+        """读取最后一个会话，没有日志时返回 None"""
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                lines = f.readlines()
+        except FileNotFoundError:
+            return None
+        state: Optional[JournalState] = None
+        for number, line in enumerate(lines, 1):
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError:
+                # 只有最后一行可能是写到一半的记录
+                if number < len(lines):
+                    print(f"⚠️ 试验日志第 {number} 行损坏，已跳过")
+                continue
+            kind = record.pop("type", None)
+            record.pop("ts", None)
+            if kind == "session":
+                state = JournalState(session=record)
+            elif state is None:
+                continue
+            elif kind == "trial":
+                state.trials.append(TrialRecord(**record["trial"]))
+            elif kind == "screening":
+                state.screening = ScreeningReport(**record["report"])
+            elif kind == "checkpoint":
+                state.checkpoint = record
+            elif kind == "finished":
+                state.finished = True
+        return state
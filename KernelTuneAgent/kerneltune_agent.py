@@ -1,43 +1,403 @@
 """
 智能代理核心实现
 """
+import asyncio
 import json
-from typing import Optional
-import re
-from KernelTuneAgent.schema import Message, AgentState, Memory, Role
-from KernelTuneAgent.llm import SimpleLLM
-from KernelTuneAgent.tools import ToolCollection
+from typing import Dict, List, Optional, Tuple, Union
+from KernelTuneAgent.schema import Message, AgentState, Memory, Role, TrialRecord, estimate_tokens
+from KernelTuneAgent.llm import LLMError, LLMResponse, SimpleLLM
+from KernelTuneAgent.router import LLMRouter, create_llm
+from KernelTuneAgent.tools import BatchTrialTool, SysctlApplyTool, ToolCollection, ToolResult, TrialTool
 from KernelTuneAgent.prompt_build import PromptBuilder
 from KernelTuneAgent.config import Phase
+from KernelTuneAgent.cache import EvalCache, host_fingerprint
+from KernelTuneAgent.journal import JournalState, TrialJournal
+from KernelTuneAgent.isolation import IsolationProtocol, IsolationReport
+from KernelTuneAgent.knowledge import CampaignRecord, HostProfile, KnowledgeBase, WorkloadSignature, select_winners
+from KernelTuneAgent.sysctl import SysctlApplier
+from KernelTuneAgent.search_space import GridIndex, SearchSpace
+from KernelTuneAgent.optimizer import create_optimizer
+from KernelTuneAgent.trial import TrialRunner, TrialResult
+from KernelTuneAgent.metrics import MetricExtractor, TrialMetrics, default_parsers, parse_training_time
+from KernelTuneAgent.scheduler import SuccessiveHalving
+from KernelTuneAgent.screening import CandidateScreener
+from KernelTuneAgent.sensitivity import ScreeningReport, screen_parameters
+from KernelTuneAgent.early_stop import EarlyStopper, ProgressParser
+from KernelTuneAgent.measurement import Measurement, MeasurementPolicy, compare
+from KernelTuneAgent.telemetry import TelemetryDigest, TelemetrySampler
+from KernelTuneAgent.tracing import Tracer
 class KernelTuneAgent:
     """内核参数调优智能代理实现"""
+
+    # 优化器的推荐被判为重复时，重新推荐的次数上限
+    SUGGEST_ATTEMPTS = 20
     
     def __init__(
         self, 
-        llm: SimpleLLM,
+        llm: Optional[Union[SimpleLLM, LLMRouter]] = None,
         name: str = "KernelTuneAgent",
         system_prompt: Optional[str] = None,
         max_steps: int = 15
     ):
         self.name = name
-        self.llm = llm
         self.tools = ToolCollection()
         self.memory = Memory()
         self.state = AgentState.IDLE
         self.max_steps = max_steps
         self.current_step = 0
         self.prompt_builder = PromptBuilder()
+        # sys.config 中的设置，由 PromptBuilder 解析为带类型的取值
+        self.settings = self.prompt_builder.settings
+        # 未传入 LLM 时按 sys.config 中的推理服务地址创建，有多个副本时使用路由
+        self.llm = llm if llm is not None else create_llm(
+            self.settings.llm_base_urls,
+            strategy=self.settings.llm_router_strategy,
+            api_key=self.settings.llm_api_key,
+            model=self.settings.llm_model,
+            timeout=self.settings.llm_timeout,
+            max_retries=self.settings.llm_max_retries,
+            stream=self.settings.llm_stream,
+            stream_usage=self.settings.llm_stream_usage,
+        )
         self.tuning_phase=Phase.EXPLORATION
+        # 工具超时与看门狗：训练命令长时间没有输出时终止
+        idle_timeout = self.settings.watchdog_idle_timeout
+        self.tools.configure_tool("bash_execute", timeout=self.settings.bash_timeout, idle_timeout=idle_timeout)
+        self.tools.configure_tool("python_execute", timeout=self.settings.python_timeout)
         # 默认系统提示词
         self.system_prompt = self.prompt_builder.build_system_prompt_messages()
 
+        # 记忆压缩：对话超过 memory_compaction_tokens 时把之前的对话折叠为试验汇总表，只保留最近一轮原始交互
+        self.memory_compaction = self.settings.memory_compaction
+        self.memory_compaction_tokens = self.settings.memory_compaction_tokens
+        self._step_start = 0
+        # 每次 LLM 请求的 token 统计
+        self.token_usage: List[Dict[str, int]] = []
+        self._prefix_token_key: Optional[tuple] = None
+        self._prefix_token_count = 0
+        # LLM 客户端重试耗尽后，本轮最多再等待重试的次数，以及每次等待的秒数
+        self.llm_failure_budget = self.settings.llm_failure_budget
+        self.llm_cooldown = self.settings.llm_cooldown
+
         # --- 新增：用于追踪最佳效果的变量 ---
         self.best_improvement_ratio = -1.0  # 记录历史最高的提升率
         self.best_step_index = 0            # 记录达到最高提升率时的步数索引（对应 memory 中的位置或轮次）
 
+        # 评估结果缓存：相同配置不重复训练
+        self.eval_cache: Optional[EvalCache] = None
+        if self.settings.eval_cache and self.prompt_builder.train_cmd:
+            self.eval_cache = EvalCache(
+                path=self.settings.cache_path,
+                train_cmd=self.prompt_builder.train_cmd,
+                param_names=self.prompt_builder.get_active_param_names(),
+                defaults={name: meta["default"] for name, meta in self.prompt_builder.param_meta.items()},
+            )
+        self._last_result_cached = False
+        self._last_cached_samples: List[float] = []
+        # 试验日志：试验记录和每一步的代理状态逐条落盘，进程中断后用 resume() 继续
+        self.journal: Optional[TrialJournal] = None
+        if self.settings.journal and self.prompt_builder.train_cmd:
+            self.journal = TrialJournal(self.settings.journal_path)
+        # 调优经验库：会话结束时记录负载特征和优胜配置，新会话从相近的历史会话热启动
+        self.knowledge: Optional[KnowledgeBase] = None
+        if self.settings.knowledge_base and self.prompt_builder.train_cmd:
+            self.knowledge = KnowledgeBase(self.settings.knowledge_base_path)
+
+        # 试验记录与参数推荐优化器
+        self.trials: List[TrialRecord] = []
+        self.search_space = SearchSpace.from_meta(self.prompt_builder.get_active_param_names(), self.prompt_builder.param_meta)
+        # 已评估网格点索引：与已评估配置过近的推荐改道到附近的未评估配置，duplicate policy 为 reject 时直接拒绝
+        self.grid_index = GridIndex(self.search_space, min_distance=self.settings.min_distance)
+        self._enter_phase(self.tuning_phase)
+        self.redirect_duplicates = self.settings.duplicate_policy != "reject"
+        # 内核参数直接读写，根目录可配置为伪造的 sysfs 目录树
+        self.sysctl_applier = SysctlApplier(self.search_space, **self.prompt_builder.sysctl_roots())
+        self.tools.register_tool(SysctlApplyTool(applier=self.sysctl_applier))
+        self.optimizer = create_optimizer(self.settings.optimizer, self.search_space)
+        # advisory: 优化器建议写入反馈提示词，由 LLM 决定；auto: 不调用 LLM，由优化器直接驱动试验
+        self.optimizer_mode = self.settings.optimizer_mode
+        # 提前终止：流式解析训练进度，明显劣于历史试验时终止训练
+        early_stopper = None
+        if self.settings.early_stopping:
+            early_stopper = EarlyStopper(
+                rule=self.settings.early_stop_rule,
+                min_fraction=self.settings.early_stop_min_fraction,
+                margin=self.settings.early_stop_margin,
+            )
+        # 噪声感知测量：自适应重复训练，与 baseline 做显著性检验
+        self.measurement_policy = MeasurementPolicy(
+            min_repeats=self.settings.min_repeats,
+            max_repeats=self.settings.max_repeats,
+            rel_precision=self.settings.target_precision,
+            confidence=self.settings.confidence,
+        )
+        self.baseline_measurement: Optional[Measurement] = None
+        # 耗时追踪：span 写入 JSONL，指标以 Prometheus 文本格式写入文件或通过本地端口提供
+        self.tracer = Tracer(jsonl_path=self.settings.trace_file or None)
+        # 会话标识，恢复的会话沿用试验日志中的标识
+        self.session_id = self.tracer.session_id
+        self.metrics_path = self.settings.metrics_file
+        self.metrics_port = self.settings.metrics_port
+        self.trial_runner = self._build_trial_runner(early_stopper)
+        self._last_metrics: Optional[TrialMetrics] = None
+        self._last_isolation: Optional[IsolationReport] = None
+        self._last_telemetry: Optional[TelemetryDigest] = None
+        self._last_censored_time: Optional[float] = None
+        self._last_censored = False
+        # 结构化试验：LLM 通过 run_trial 提交整组配置，代理直接应用、训练并记录
+        self.trial_tool: Optional[TrialTool] = None
+        self.screener: Optional[CandidateScreener] = None
+        if self.prompt_builder.structured_config and self.prompt_builder.train_cmd:
+            if self.prompt_builder.batch_candidates > 1:
+                # 批量候选：训练之前判重、检查约束并用代理模型排序
+                self.screener = CandidateScreener(self.search_space, self.optimizer, index=self.grid_index)
+                self.trial_tool = BatchTrialTool(
+                    parameters=self.prompt_builder.get_batch_schema(),
+                    config_model=self.prompt_builder.get_config_model(),
+                    space=self.search_space,
+                    runner=self.trial_runner,
+                    screener=self.screener,
+                    top_k=self.prompt_builder.batch_top_k,
+                    index=self.grid_index,
+                )
+            else:
+                self.trial_tool = TrialTool(
+                    parameters=self.prompt_builder.get_config_schema(),
+                    config_model=self.prompt_builder.get_config_model(),
+                    space=self.search_space,
+                    runner=self.trial_runner,
+                    index=self.grid_index,
+                    redirect=self.redirect_duplicates,
+                )
+            self.tools.register_tool(self.trial_tool)
+        # 流水线：训练进行期间提前推荐下一组配置，训练结束后立即开始下一次试验
+        self.pipeline = self.settings.pipeline
+        self._speculation: Optional[asyncio.Task] = None
+        # 多 fidelity 调度：先截断训练筛选候选，只把前 1/eta 晋级到完整训练
+        self.scheduler: Optional[SuccessiveHalving] = None
+        self.sh_candidates = self.settings.sh_candidates
+        if self.settings.successive_halving:
+            self.scheduler = SuccessiveHalving(
+                self.trial_runner,
+                min_fidelity=self.settings.sh_min_fidelity,
+                eta=self.settings.sh_eta,
+            )
+        # 参数筛选：baseline 之后在低 fidelity 下估计各参数的实际影响，冻结影响不显著的参数
+        self.screening = self.settings.screening and bool(self.prompt_builder.train_cmd)
+        self.screening_report: Optional[ScreeningReport] = None
+
+
+    def _build_trial_runner(self, early_stopper: Optional[EarlyStopper]) -> TrialRunner:
+        """按设置创建试验执行器：系统观测、试验隔离、指标提取和提前终止"""
+        # 系统观测：训练期间采样 vmstat / meminfo / PSI 并跟踪训练进程树，汇总写入反馈提示词
+        sampler = None
+        if self.settings.telemetry:
+            sampler = TelemetrySampler(
+                proc_root=self.settings.telemetry_root,
+                interval=self.settings.telemetry_interval,
+                numa_interval=self.settings.telemetry_numa_interval,
+            )
+            if not sampler.available():
+                print(f"⚠️ {sampler.proc_root}/vmstat 不可读，不采集系统观测")
+                sampler = None
+        # 试验隔离：每次训练前按配置的步骤清理缓存、整理内存、等待系统平静，降低试验之间的相互影响
+        isolation = None
+        if self.settings.isolation_steps:
+            isolation = IsolationProtocol(
+                self.settings.isolation_steps,
+                proc_root=self.settings.isolation_root,
+                drop_caches=self.settings.isolation_drop_caches,
+                prewarm_paths=self.settings.isolation_prewarm_paths,
+                prewarm_limit=int(self.settings.isolation_prewarm_limit * (1 << 20)),
+                quiesce_load=self.settings.isolation_quiesce_load,
+                quiesce_pressure=self.settings.isolation_quiesce_pressure,
+                quiesce_timeout=self.settings.isolation_quiesce_timeout,
+                warmup_fidelity=self.settings.isolation_warmup_fidelity,
+                tracer=self.tracer,
+            )
+            print(f"🧹 试验隔离: {', '.join(isolation.steps)}")
+        return TrialRunner(
+            train_cmd=self.prompt_builder.train_cmd,
+            log_path=self.prompt_builder.log_path,
+            param_names=self.prompt_builder.get_active_param_names(),
+            cache=self.eval_cache,
+            fidelity_arg=self.settings.fidelity_arg,
+            full_budget=self.settings.full_budget,
+            early_stopper=early_stopper,
+            timeout=self.settings.train_timeout,
+            idle_timeout=self.settings.watchdog_idle_timeout,
+            policy=self.measurement_policy,
+            progress_parser=ProgressParser(self.settings.progress_pattern),
+            applier=self.sysctl_applier,
+            sampler=sampler,
+            tracer=self.tracer,
+            isolation=isolation,
+            # 训练耗时、吞吐和每个 epoch 的耗时由代理直接从日志和标准输出中提取，不经过 LLM
+            extractor=MetricExtractor(
+                self.prompt_builder.log_path,
+                parsers=default_parsers(
+                    training_time_pattern=self.settings.training_time_pattern,
+                    json_fields=self.settings.metric_json_fields,
+                    throughput_pattern=self.settings.throughput_pattern,
+                    epoch_time_pattern=self.settings.epoch_time_pattern,
+                ),
+            ),
+        )
 
     async def run(self) -> str:
         """执行用户请求"""
+        return await self._session(self._start)
+
+    async def resume(self) -> str:
+        """从试验日志恢复最后一个未正常结束的会话并继续调优，已完成的训练不会重复"""
+        state = self.journal.load() if self.journal is not None else None
+        problem = self._check_resumable(state)
+        if problem:
+            print(f"⚠️ {problem}，开始新的调优会话")
+            return await self.run()
+        return await self._session(lambda: self._resume(state))
+
+    async def _session(self, body) -> str:
+        """整个会话记录为一个 session span，结束时导出指标、写入结束标记并附上耗时拆分"""
+        if self.metrics_port:
+            await self.tracer.serve(self.metrics_port)
+        try:
+            with self.tracer.span("session", agent=self.name, max_steps=self.max_steps) as session:
+                result = await body()
+            self._save_knowledge()
+            if self.journal is not None:
+                self.journal.finish()
+            self._export_metrics()
+            breakdown = self.tracer.breakdown(session)
+            print(breakdown)
+            return f"{result}\n{breakdown}"
+        finally:
+            await self.tracer.close()
+            # 停止路由的后台健康检查
+            close = getattr(self.llm, "close", None)
+            if close is not None:
+                await close()
+            if self.journal is not None:
+                self.journal.close()
+
+    def _session_mode(self) -> str:
+        return "optimizer" if self.optimizer is not None and self.optimizer_mode == "auto" else "llm"
+
+    async def _start(self) -> str:
+        if self.journal is not None:
+            self.journal.start_session(
+                session=self.session_id,
+                mode=self._session_mode(),
+                train_cmd=self.prompt_builder.train_cmd,
+                params=self.prompt_builder.get_active_param_names(),
+                host=host_fingerprint(),
+                max_steps=self.max_steps,
+            )
+        if self._session_mode() == "optimizer":
+            return await self.run_optimizer()
+        return await self.run_llm()
+
+    def _check_resumable(self, state: Optional[JournalState]) -> str:
+        """日志能否用于恢复，不能时返回原因"""
+        if state is None:
+            return "没有可恢复的试验日志"
+        if state.finished:
+            return "上一个会话已正常结束"
+        session = state.session
+        if (
+            session.get("train_cmd") != self.prompt_builder.train_cmd
+            or sorted(session.get("params", [])) != sorted(self.prompt_builder.get_active_param_names())
+            or session.get("host") != host_fingerprint()
+            or session.get("mode") != self._session_mode()
+        ):
+            return "试验日志与当前的训练命令、参数集合、主机或调优模式不一致"
+        if not any(t.source == "baseline" and t.training_time is not None for t in state.trials):
+            return "试验日志中没有 baseline"
+        return ""
+
+    async def _resume(self, state: JournalState) -> str:
+        """由日志重建代理状态，从最后一次完成的试验之后继续"""
+        checkpoint = state.checkpoint or {}
+        baseline_record = next(t for t in state.trials if t.source == "baseline" and t.training_time is not None)
+        baseline = baseline_record.training_time
+        self.session_id = state.session.get("session", self.session_id)
+        self.state = AgentState.RUNNING
+        self.baseline_measurement = Measurement(samples=baseline_record.samples or [baseline])
+        self._enter_phase(Phase.from_string(checkpoint.get("phase", self.tuning_phase.value)))
+        self.current_step = checkpoint.get("step", baseline_record.step)
+        self.best_improvement_ratio = checkpoint.get("best_improvement_ratio", self.best_improvement_ratio)
+        self.best_step_index = checkpoint.get("best_step_index", self.best_step_index)
+        self.trial_runner.trial_seq = checkpoint.get("trial_seq", 0)
+        self.sysctl_applier.original.update(checkpoint.get("sysctl_original", {}))
+        self.trials = list(state.trials)
+        for record in self.trials:
+            self._observe_trial(record)
+
+        # 检查点之后完成的试验：补上最佳记录和阶段更新
+        later = [t for t in state.trials_after_checkpoint() if t.source != "baseline"]
+        for record in later:
+            self.current_step = max(self.current_step, record.step)
+            if record.improvement_ratio is not None and record.improvement_ratio > self.best_improvement_ratio:
+                self.best_improvement_ratio = record.improvement_ratio
+                self.best_step_index = record.step
+        last_record = max(
+            (t for t in later if t.step == self.current_step and t.improvement_ratio is not None),
+            key=lambda t: t.improvement_ratio,
+            default=None,
+        )
+        if last_record is not None:
+            self._advance_phase(last_record.improvement_ratio)
+        print(
+            f"\n♻️ 从试验日志恢复会话: 已完成 {len(self.trials)} 次试验，第 {self.current_step} 步，"
+            f"阶段 {self.tuning_phase.value}, baseline {baseline:.4f} 秒"
+        )
+        if state.screening is not None:
+            self._apply_screening(state.screening)
+        elif self.screening:
+            # 筛选中途中断：设计由固定种子生成，已完成的训练命中评估缓存
+            await self._screen_parameters(baseline)
+
+        if self._session_mode() == "optimizer":
+            return await self._optimizer_loop(baseline)
+        if checkpoint and not later:
+            self.memory = Memory.from_snapshot(checkpoint.get("memory", {}))
+        else:
+            # 检查点之后的对话没有落盘，以试验汇总表加一条新的反馈代替
+            self.memory = Memory()
+            self.memory.compact(0, self.prompt_builder.build_trial_table(self.trials))
+            self.memory.add_message(Message.user_message(self.prompt_builder.build_feedback_prompt(
+                self.tuning_phase, baseline, last_record.training_time if last_record else None,
+                suggestion=self._suggest_config(),
+                comparison_desc=self._describe_comparison(last_record) if last_record else "",
+                telemetry_desc=self._describe_telemetry(last_record) if last_record else "",
+            )))
+        return await self._llm_loop(baseline)
+
+    def _checkpoint(self, baseline: float) -> None:
+        """每一步开始前把代理状态写入试验日志"""
+        if self.journal is None:
+            return
+        self.journal.checkpoint(
+            step=self.current_step,
+            phase=self.tuning_phase.value,
+            baseline=baseline,
+            best_improvement_ratio=self.best_improvement_ratio,
+            best_step_index=self.best_step_index,
+            trial_count=len(self.trials),
+            trial_seq=self.trial_runner.trial_seq,
+            sysctl_original=self.sysctl_applier.original,
+            memory=self.memory.snapshot(),
+        )
+
+    def _export_metrics(self) -> None:
+        if self.metrics_path:
+            try:
+                self.tracer.write_prometheus(self.metrics_path)
+            except OSError as e:
+                print(f"⚠️ 指标写入失败: {e}")
+
+    async def run_llm(self) -> str:
+        """由 LLM 推荐配置的调优循环"""
         user_input=(
             "【用户请求】"
             "在参数的默认取值下，跑一次模型，读取日志文件.\n"
@@ -53,73 +413,592 @@ class KernelTuneAgent:
         
         self.current_step += 1
         print(f"\n--- 第 {self.current_step} 步 ---")
-            
-        # Think: 思考下一步行动
-        await self.think()
-  
-        # Act: 执行行动
-        await self.act()
 
-        # 获取baseline
-        baseline=self._extract_training_time_from_last_tool_result()
+        # 优先复用之前会话测得的 baseline
+        cached_baseline = self.eval_cache.get_baseline() if self.eval_cache else None
+        baseline_config = None
+        baseline_telemetry = None
+        baseline_metrics = None
+        baseline_isolation = None
+        if cached_baseline is not None:
+            baseline = cached_baseline.training_time
+            baseline_samples = cached_baseline.samples or [baseline]
+            baseline_config = cached_baseline.config
+            print(f"♻️ 复用缓存的 baseline: {baseline:.4f} 秒，跳过默认配置训练")
+        elif self.trial_tool is not None:
+            # 默认配置无需 LLM 推荐，直接应用并训练
+            result = await self.trial_runner.measure(self.search_space.default_config(), is_baseline=True)
+            baseline, baseline_samples, baseline_config = result.training_time, result.samples, result.config
+            baseline_telemetry, baseline_metrics = result.telemetry, result.metrics
+            baseline_isolation = result.isolation
+        else:
+            # Think: 思考下一步行动
+            await self.think()
+
+            # Act: 执行行动
+            await self.act()
+
+            # 获取baseline
+            baseline=self._extract_training_time_from_last_tool_result()
+            baseline_metrics = self._last_metrics
+            baseline_isolation = self._last_isolation
+            baseline_telemetry = self._last_telemetry
+            baseline_samples = await self._complete_evaluation(baseline, is_baseline=True)
+            if baseline_samples:
+                baseline = sum(baseline_samples) / len(baseline_samples)
+        if baseline is None:
+            self.state = AgentState.FINISHED
+            return "❌ 未能获取 baseline 训练耗时"
+        self._record_trial(
+            baseline_config or self._read_effective_config(), baseline, None, source="baseline", samples=baseline_samples,
+            telemetry=baseline_telemetry, metrics=baseline_metrics, isolation=baseline_isolation
+        )
+        self._compact_memory()
+        if self.screening:
+            await self._screen_parameters(baseline)
+        record = await self._warm_start(baseline)
+        if record is not None:
+            self._compact_memory()
 
         # 添加新的用户请求
-        self.memory.add_message(Message.user_message(self.prompt_builder.build_feedback_prompt(self.tuning_phase,baseline,None)))
-        # 执行循环
+        self.memory.add_message(Message.user_message(self.prompt_builder.build_feedback_prompt(
+            self.tuning_phase, baseline, record.training_time if record else None, suggestion=self._suggest_config(),
+            comparison_desc=self._describe_comparison(record) if record else "",
+            telemetry_desc=self._describe_telemetry(record) if record else "",
+        )))
+        return await self._llm_loop(baseline)
+
+    async def _llm_loop(self, baseline: float) -> str:
+        """LLM 推荐配置、执行试验、反馈结果的主循环"""
+        speculative: Optional[LLMResponse] = None
         while self.state == AgentState.RUNNING and self.current_step < self.max_steps:
+            self._checkpoint(baseline)
             self.current_step += 1
             print(f"\n--- 第 {self.current_step} 步 ---")
             
-            # Think: 思考下一步行动
-            should_continue = await self.think()
+            # Think: 思考下一步行动（有匹配的投机推荐时直接采用，不再请求 LLM）
+            should_continue = await self.think(response=speculative)
             if not should_continue:
                 break
             
+            # 训练期间并行地为每种可能的结果提前请求下一组配置
+            self._start_speculation(baseline)
             # Act: 执行行动
             await self.act()
             
-            # 从工具执行结果里获取上一轮训练时长
-            last_traing_time=self._extract_training_time_from_last_tool_result()
-            # 更新调优阶段
-            improvement_ratio = (baseline - last_traing_time) / baseline
-
-            # --- 新增：更新最佳记录 ---
-            if improvement_ratio > self.best_improvement_ratio:
-                self.best_improvement_ratio = improvement_ratio
-                self.best_step_index = self.current_step # 记录当前步数为最佳步数
-                print(f"✨ 发现新的最佳效果！提升率: {improvement_ratio:.2%}, 步数: {self.current_step}")
+            # 获取本轮试验结果，批量候选时以其中提升率最高的一次作为本轮结果
+            record = None
+            for result in await self._collect_step_results():
+                trial_record = self._record_trial(
+                    result.config, result.training_time, baseline, samples=result.samples, cached=result.cached,
+                    censored=result.censored, censored_time=result.censored_time, telemetry=result.telemetry,
+                    metrics=result.metrics, isolation=result.isolation
+                )
+                if record is None or (
+                    trial_record.improvement_ratio is not None
+                    and (record.improvement_ratio is None or trial_record.improvement_ratio > record.improvement_ratio)
+                ):
+                    record = trial_record
+            last_traing_time = record.training_time
 
-            # TODO:改成用 prompt_builder 中的配置控制 判断是否结束
-            if improvement_ratio >= self.prompt_builder.target:
-                print("达到性能目标，搜索结束。")
-                break
+            if record.improvement_ratio is not None:
+                if self._reached_target(record):
+                    print("达到性能目标，搜索结束。")
+                    break
 
-            # 阶段更新
-            new_phase = self.update_phase(self.tuning_phase, improvement_ratio)
-            if new_phase != self.tuning_phase:
-                print(f"阶段切换：{self.tuning_phase.value} → {new_phase.value}")
-            self.tuning_phase = new_phase
+                # 阶段更新
+                self._advance_phase(record.improvement_ratio)
 
-            # 添加feedback和新的调优规则
-            self.memory.add_message(Message.user_message(self.prompt_builder.build_feedback_prompt(self.tuning_phase,baseline,last_traing_time)))
+            self._compact_memory()
+            # 添加feedback和新的调优规则；采用投机推荐时记录 LLM 实际看到的假设反馈
+            speculation = await self._take_speculation(record)
+            if speculation is not None:
+                prompt, speculative = speculation
+                print("⏩ 采用训练期间提前生成的推荐，跳过本轮 LLM 请求")
+            else:
+                speculative = None
+                prompt = self.prompt_builder.build_feedback_prompt(
+                    self.tuning_phase, baseline, last_traing_time, suggestion=self._suggest_config(),
+                    comparison_desc=self._describe_comparison(record), telemetry_desc=self._describe_telemetry(record)
+                )
+            self.memory.add_message(Message.user_message(prompt))
+            self._export_metrics()
 
+        await self._cancel_speculation()
         self.state = AgentState.FINISHED
         result = self._generate_summary()
         print(f"\n✅ 任务完成! 总共执行了 {self.current_step} 步")
         return result
     
-    async def think(self) -> bool:
+    async def run_optimizer(self) -> str:
+        """不调用 LLM，由优化器推荐配置并直接运行训练"""
+        print(f"\n🚀 {self.name} 开始执行任务: 优化器驱动调优 ({type(self.optimizer).__name__})")
+        self.state = AgentState.RUNNING
+        self.current_step = 1
+        print(f"\n--- 第 {self.current_step} 步 ---")
+
+        cached_baseline = self.eval_cache.get_baseline() if self.eval_cache else None
+        if cached_baseline is not None:
+            baseline = cached_baseline.training_time
+            baseline_config = cached_baseline.config
+            baseline_samples = cached_baseline.samples or [baseline]
+            baseline_telemetry = baseline_metrics = baseline_isolation = None
+            print(f"♻️ 复用缓存的 baseline: {baseline:.4f} 秒，跳过默认配置训练")
+        else:
+            result = await self.trial_runner.measure(self.search_space.default_config(), is_baseline=True)
+            if result.training_time is None:
+                self.state = AgentState.FINISHED
+                return f"❌ baseline 训练失败: {result.error}"
+            baseline, baseline_config, baseline_samples = result.training_time, result.config, result.samples
+            baseline_telemetry, baseline_metrics = result.telemetry, result.metrics
+            baseline_isolation = result.isolation
+        self._record_trial(
+            baseline_config, baseline, None, source="baseline", samples=baseline_samples, telemetry=baseline_telemetry,
+            metrics=baseline_metrics, isolation=baseline_isolation
+        )
+        if self.screening:
+            await self._screen_parameters(baseline)
+        await self._warm_start(baseline)
+        return await self._optimizer_loop(baseline)
+
+    async def _optimizer_loop(self, baseline: float) -> str:
+        """优化器推荐配置并直接训练的主循环"""
+        next_config: Optional[Dict[str, str]] = None
+        while self.state == AgentState.RUNNING and self.current_step < self.max_steps:
+            self._checkpoint(baseline)
+            # 被拒绝的推荐不消耗调优步数，连续被拒绝说明搜索空间已基本覆盖
+            if self.scheduler is not None:
+                configs = self._next_batch(self.sh_candidates)
+            else:
+                config = self._next_config(next_config)
+                configs = [config] if config is not None else []
+            next_config = None
+            if not configs:
+                print(f"⚠️ 连续 {self.SUGGEST_ATTEMPTS} 次推荐都与已评估配置过近，搜索空间已基本覆盖，停止搜索")
+                break
+            self.current_step += 1
+            print(f"\n--- 第 {self.current_step} 步 ---")
+            if self.scheduler is not None:
+                results = await self.scheduler.run(configs)
+                self.optimizer.clear_pending()
+            else:
+                print(f"🎯 优化器推荐配置: {config}")
+                trial = asyncio.ensure_future(self.trial_runner.measure(config))
+                outcomes: List[float] = []
+                proposals: List[Dict[str, str]] = []
+                if self.pipeline and self.current_step < self.max_steps:
+                    # 训练在子进程中进行，同时在线程中为在途配置的每种可能结果各计算一组下一步推荐
+                    self.optimizer.mark_pending(config)
+                    outcomes = self.optimizer.plausible_outcomes()
+                    if outcomes:
+                        proposals = await asyncio.to_thread(self.optimizer.suggest_conditioned, config, outcomes)
+                    else:
+                        proposals = [await asyncio.to_thread(self.optimizer.suggest)]
+                results = [await trial]
+                next_config = self._match_proposal(results[0], outcomes, proposals)
+
+            record = self._record_results(results, baseline)
+            if record is None:
+                continue
+            if self._reached_target(record):
+                print("达到性能目标，搜索结束。")
+                break
+            self._advance_phase(record.improvement_ratio)
+            self._export_metrics()
+
+        self.state = AgentState.FINISHED
+        result = self._generate_summary()
+        print(f"\n✅ 任务完成! 总共执行了 {self.current_step} 步")
+        return result
+
+    async def _screen_parameters(self, baseline: float) -> None:
+        """
+        Morris 参数筛选：训练记录为 screening 试验，结果写入试验日志并立即生效。
+        从日志恢复时，日志中已有的 screening 试验按配置依次复用，不再训练也不重复记录
+        """
+        fidelity = self.settings.screening_fidelity
+        train_cmd = self.prompt_builder.train_cmd
+        if fidelity < 1.0 and not (self.trial_runner.fidelity_arg or "{budget}" in train_cmd):
+            print("⚠️ 训练命令不支持截断训练（未配置 fidelity arg），参数筛选的每次训练都是完整训练")
+        journaled: Dict[tuple, List[TrialRecord]] = {}
+        for record in self.trials:
+            if record.source == "screening" and record.fidelity == fidelity:
+                journaled.setdefault(self.search_space.key(record.config), []).append(record)
+        if journaled:
+            print(f"♻️ 复用试验日志中的 {sum(len(records) for records in journaled.values())} 次筛选训练")
+
+        async def evaluate(config: Dict[str, str]) -> Tuple[Optional[float], bool]:
+            previous = journaled.get(self.search_space.key(config))
+            if previous:
+                record = previous.pop(0)
+                if record.training_time is not None:
+                    return record.training_time, False
+                return record.censored_time, record.censored_time is not None
+            result = await self.trial_runner.run(config, fidelity=fidelity)
+            self._record_trial(
+                result.config or config, result.training_time, baseline, source="screening", cached=result.cached,
+                fidelity=result.fidelity, censored=result.censored, censored_time=result.censored_time,
+                telemetry=result.telemetry, metrics=result.metrics, isolation=result.isolation
+            )
+            if result.training_time is None and not result.censored:
+                print(f"❌ 训练失败 (fidelity={fidelity:g}): {result.error}")
+            if result.training_time is not None:
+                return result.training_time, False
+            # 被提前终止的训练只知道耗时的估计，由 MorrisScreening 按惩罚值处理
+            return result.censored_time, result.censored_time is not None
+
+        # 改变一次参数带来的耗时变化低于噪声水平时视为没有影响，噪声至少取 baseline 多次测量的变异系数
+        noise = self.settings.screening_noise
+        if self.baseline_measurement is not None and self.baseline_measurement.n > 1:
+            noise = max(noise, self.baseline_measurement.std / self.baseline_measurement.mean)
+        report = await screen_parameters(
+            self.search_space,
+            evaluate,
+            trajectories=self.settings.screening_trajectories,
+            levels=self.settings.screening_levels,
+            seed=self.settings.screening_seed,
+            threshold=self.settings.screening_threshold,
+            noise=noise,
+            min_active=self.settings.screening_min_active,
+            fidelity=fidelity,
+        )
+        if self.journal is not None:
+            self.journal.record_screening(report)
+        self._apply_screening(report)
+        # 筛选过程中写入过各种取值，恢复默认配置后再开始调优
+        restored = self.sysctl_applier.apply(self.search_space.default_config())
+        if restored.errors:
+            print(f"⚠️ 恢复默认配置失败: {'; '.join(restored.errors)}")
+
+    async def _warm_start(self, baseline: float) -> Optional[TrialRecord]:
+        """
+        从调优经验库中相近的历史会话热启动：优胜配置按各自的提升率折算为本次 baseline 下的先验观测交给优化器，
+        其中最好的几组直接训练（每组占一步），返回提升率最高的记录
+        """
+        baseline_record = next((t for t in self.trials if t.source == "baseline"), None)
+        if self.knowledge is None or baseline_record is None:
+            return None
+        plan = self.knowledge.plan_warm_start(
+            HostProfile.current(),
+            WorkloadSignature.from_trial(baseline_record),
+            self.search_space,
+            k=self.settings.warm_start_neighbors,
+            max_distance=self.settings.warm_start_max_distance,
+            limit=self.settings.warm_start_trials,
+            index=self.grid_index,
+        )
+        if not plan.neighbors:
+            return None
+        print(f"\n📚 {self.knowledge.describe(plan.neighbors)}")
+        if self.optimizer is not None:
+            for config, improvement in plan.priors:
+                self.optimizer.add_prior(config, baseline * (1 - improvement))
+
+        best_record = None
+        for config in plan.seeds:
+            if self.state != AgentState.RUNNING or self.current_step >= self.max_steps:
+                break
+            self._checkpoint(baseline)
+            self.current_step += 1
+            print(f"\n--- 第 {self.current_step} 步 ---")
+            print(f"📚 热启动配置: {config}")
+            result = await self.trial_runner.measure(config)
+            if result.training_time is None and not result.censored:
+                print(f"❌ 训练失败: {result.error}")
+            record = self._record_trial(
+                result.config or config, result.training_time, baseline, source="warm_start", samples=result.samples,
+                cached=result.cached, censored=result.censored, censored_time=result.censored_time,
+                telemetry=result.telemetry, metrics=result.metrics, isolation=result.isolation
+            )
+            if record.improvement_ratio is None:
+                continue
+            if best_record is None or record.improvement_ratio > best_record.improvement_ratio:
+                best_record = record
+            if self._reached_target(record):
+                print("达到性能目标，搜索结束。")
+                self.state = AgentState.FINISHED
+                break
+            self._advance_phase(record.improvement_ratio)
+        return best_record
+
+    def _save_knowledge(self) -> None:
+        """把本次会话的负载特征和提升显著的配置写入调优经验库"""
+        baseline_record = next((t for t in self.trials if t.source == "baseline" and t.training_time), None)
+        if self.knowledge is None or baseline_record is None:
+            return
+        winners = select_winners(self.trials, self.search_space, limit=self.settings.knowledge_base_winners)
+        try:
+            self.knowledge.add(CampaignRecord(
+                session=self.session_id,
+                train_cmd=self.prompt_builder.train_cmd,
+                host=HostProfile.current(),
+                signature=WorkloadSignature.from_trial(baseline_record),
+                baseline=baseline_record.training_time,
+                winners=winners,
+                trials=len(self.trials),
+            ))
+            print(f"📚 本次会话已写入调优经验库: {len(winners)} 组优胜配置")
+        except OSError as e:
+            print(f"⚠️ 调优经验库写入失败: {e}")
+
+    def _apply_screening(self, report: ScreeningReport) -> None:
+        """
+        冻结筛选出的参数：搜索空间就地收缩（优化器、候选筛选和参数写入共用同一个对象），
+        重新生成系统提示词、配置模型和试验工具的参数定义。
+        """
+        self.screening_report = report
+        print(report.describe())
+        self.search_space.freeze(report.frozen)
+        self.prompt_builder.apply_screening(
+            {name: self.search_space.specs[name].default for name in report.frozen}, report.impacts
+        )
+        self.system_prompt = self.prompt_builder.build_system_prompt_messages()
+        if self.trial_tool is not None:
+            if isinstance(self.trial_tool, BatchTrialTool):
+                self.trial_tool.parameters = self.prompt_builder.get_batch_schema()
+            else:
+                self.trial_tool.parameters = self.prompt_builder.get_config_schema()
+            self.trial_tool.config_model = self.prompt_builder.get_config_model()
+            # 重新注册以刷新缓存的工具定义
+            self.tools.register_tool(self.trial_tool)
+
+    def _avoid_measured(self, config: Dict[str, str]) -> Optional[Dict[str, str]]:
+        """优化器推荐的配置与已评估配置过近时改道（或拒绝，返回 None）"""
+        checked, note = self.grid_index.check(config, redirect=self.redirect_duplicates)
+        if note:
+            print(f"🧭 {note}")
+        return checked
+
+    @staticmethod
+    def _match_proposal(
+        result: TrialResult,
+        outcomes: List[float],
+        proposals: List[Dict[str, str]]
+    ) -> Optional[Dict[str, str]]:
+        """
+        按试验的实际结果选用提前算好的推荐：取假设结果与实际耗时最接近的一组。
+        被提前终止的试验按耗时下界比较，失败的试验按最差的假设结果处理
+        """
+        if not proposals:
+            return None
+        if not outcomes:
+            return proposals[0]
+        actual = result.training_time if result.training_time is not None else result.censored_time
+        if actual is None:
+            return proposals[-1]
+        index = min(range(len(outcomes)), key=lambda i: abs(outcomes[i] - actual))
+        print(f"🔀 采用假设耗时 {outcomes[index]:.4f} 秒时的推荐（实际 {actual:.4f} 秒）")
+        return proposals[index]
+
+    def _next_config(self, proposed: Optional[Dict[str, str]] = None) -> Optional[Dict[str, str]]:
+        """
+        优化器的下一组推荐（proposed 为流水线提前算好的推荐），经已评估网格点检查。
+        被拒绝的推荐标记为在途，优化器不再推荐它，然后重新推荐；连续 SUGGEST_ATTEMPTS 次都被拒绝时返回 None
+        """
+        for _ in range(self.SUGGEST_ATTEMPTS):
+            suggested = proposed or self.optimizer.suggest()
+            proposed = None
+            config = self._avoid_measured(suggested)
+            if config is not None:
+                return config
+            self.optimizer.mark_pending(suggested)
+        return None
+
+    def _next_batch(self, n: int) -> List[Dict[str, str]]:
+        """一批 n 组互不相同的推荐，被拒绝的推荐由新的推荐补足，最多尝试 SUGGEST_ATTEMPTS 轮"""
+        configs: List[Dict[str, str]] = []
+        for _ in range(self.SUGGEST_ATTEMPTS):
+            if len(configs) >= n:
+                break
+            for suggested in self.optimizer.suggest_batch(n - len(configs)):
+                config = self._avoid_measured(suggested)
+                if config is not None:
+                    # 改道后的配置也标记为在途，避免同一批里出现重复
+                    self.optimizer.mark_pending(config)
+                    configs.append(config)
+        return configs
+
+    def _record_results(self, results: List[TrialResult], baseline: float) -> Optional[TrialRecord]:
+        """记录优化器驱动的一批试验结果，返回其中提升率最高的完整训练记录"""
+        best_record = None
+        for result in results:
+            if result.censored:
+                self._record_trial(
+                    result.config, None, baseline, source="optimizer", fidelity=result.fidelity,
+                    censored=True, censored_time=result.censored_time, telemetry=result.telemetry, metrics=result.metrics,
+                    isolation=result.isolation
+                )
+                continue
+            if result.training_time is None:
+                print(f"❌ 训练失败 (fidelity={result.fidelity:g}): {result.error}")
+                continue
+            record = self._record_trial(
+                result.config, result.training_time, baseline, source="optimizer",
+                cached=result.cached, fidelity=result.fidelity, samples=result.samples, telemetry=result.telemetry,
+                metrics=result.metrics, isolation=result.isolation
+            )
+            if record.improvement_ratio is None:
+                continue
+            if best_record is None or record.improvement_ratio > best_record.improvement_ratio:
+                best_record = record
+        return best_record
+
+    def _record_trial(
+        self,
+        config: Dict[str, str],
+        training_time: Optional[float],
+        baseline: Optional[float],
+        source: str = "llm",
+        cached: bool = False,
+        fidelity: float = 1.0,
+        censored: bool = False,
+        censored_time: Optional[float] = None,
+        samples: Optional[List[float]] = None,
+        telemetry: Optional[TelemetryDigest] = None,
+        metrics: Optional[TrialMetrics] = None,
+        isolation: Optional[IsolationReport] = None
+    ) -> TrialRecord:
+        """
+        记录一次试验，更新最佳记录并反馈给优化器。
+        截断训练 (fidelity < 1) 的耗时与 baseline 不可比，只做记录，不计算提升率。
+        被提前终止的试验以耗时估计 censored_time 作为删失观测反馈给优化器，让代理模型避开这一区域。
+        有多次测量时，用 Welch t 检验给出提升率的置信区间和显著性。
+        """
+        samples = list(samples) if samples else ([training_time] if training_time is not None else [])
+        if source == "baseline" and samples:
+            self.baseline_measurement = Measurement(samples=samples)
+
+        improvement_ratio = None
+        comparison = None
+        if training_time is not None and baseline and fidelity >= 1.0:
+            improvement_ratio = (baseline - training_time) / baseline
+            if source != "baseline" and self.baseline_measurement is not None:
+                comparison = compare(
+                    self.baseline_measurement, Measurement(samples=samples), self.measurement_policy.confidence
+                )
+                improvement_ratio = comparison.improvement
+        record = TrialRecord(
+            step=self.current_step,
+            config=config,
+            training_time=training_time,
+            samples=samples,
+            improvement_ratio=improvement_ratio,
+            improvement_ci=[comparison.ci_low, comparison.ci_high] if comparison else None,
+            p_value=comparison.p_value if comparison else None,
+            significant=comparison.significant if comparison else False,
+            fidelity=fidelity,
+            source=source,
+            phase=self.tuning_phase.value,
+            cached=cached or self._last_result_cached,
+            censored=censored,
+            censored_time=censored_time,
+            telemetry=telemetry,
+            metrics=metrics,
+            isolation=isolation,
+        )
+        self.trials.append(record)
+        if self.journal is not None:
+            self.journal.record_trial(record)
+        self._observe_trial(record)
+
+        # --- 新增：更新最佳记录 ---
+        if improvement_ratio is not None and baseline is not None and source != "baseline":
+            if improvement_ratio > self.best_improvement_ratio:
+                self.best_improvement_ratio = improvement_ratio
+                self.best_step_index = self.current_step # 记录当前步数为最佳步数
+                print(f"✨ 发现新的最佳效果！提升率: {self._describe_comparison(record) or f'{improvement_ratio:.2%}'}, 步数: {self.current_step}")
+        return record
+
+    def _observe_trial(self, record: TrialRecord) -> None:
+        """把完整训练的结果交给网格索引、候选筛选和优化器"""
+        if record.fidelity < 1.0:
+            return
+        if record.training_time is not None or record.censored_time is not None:
+            self.grid_index.add(record.config, record.phase or None)
+        if self.screener is not None:
+            improved = bool(record.improvement_ratio and record.improvement_ratio > 0)
+            self.screener.observe(record.config, record.training_time, improved=improved)
+        if self.optimizer is not None:
+            if record.training_time is not None:
+                self.optimizer.observe(record.config, record.training_time)
+            elif record.censored_time is not None:
+                # 被提前终止的试验只知道比完成的试验慢，按惩罚值参与拟合，不作为实际观测
+                self.optimizer.observe_censored(record.config, record.censored_time)
+
+    def _reached_target(self, record: TrialRecord) -> bool:
+        """提升率达到目标，且在多次测量时统计显著，才算达到目标"""
+        if record.improvement_ratio is None or record.improvement_ratio < self.prompt_builder.target:
+            return False
+        if record.p_value is not None and not record.significant:
+            print(f"⚠️ 提升率 {record.improvement_ratio:.2%} 达到目标但统计不显著 (p={record.p_value:.3f})，继续搜索")
+            return False
+        return True
+
+    @staticmethod
+    def _describe_comparison(record: TrialRecord) -> str:
+        """'3.00% ± 1.73%, p=0.004 (显著)' 形式的提升率描述，单次测量时为空"""
+        if record.p_value is None or record.improvement_ci is None:
+            return ""
+        half = (record.improvement_ci[1] - record.improvement_ci[0]) / 2
+        verdict = "显著" if record.significant else "不显著"
+        return f"{record.improvement_ratio:.2%} ± {half:.2%}, p={record.p_value:.3f} ({verdict})"
+
+    def _describe_telemetry(self, record: TrialRecord) -> str:
+        """本轮试验的系统观测，与 baseline 的观测对照"""
+        if record.telemetry is None:
+            return ""
+        reference = next((t.telemetry for t in self.trials if t.source == "baseline"), None)
+        return record.telemetry.describe(reference)
+
+    def _advance_phase(self, improvement_ratio: float) -> None:
+        """根据提升率更新调优阶段"""
+        new_phase = self.update_phase(self.tuning_phase, improvement_ratio)
+        if new_phase != self.tuning_phase:
+            print(f"阶段切换：{self.tuning_phase.value} → {new_phase.value}")
+        self._enter_phase(new_phase)
+
+    def _enter_phase(self, phase: Phase) -> None:
+        """
+        切换调优阶段。判重的最小距离按阶段的最小变化幅度相对探索阶段缩放，
+        收敛和精调阶段有意做的小幅调整不会被改道或拒绝
+        """
+        self.tuning_phase = phase
+        self.grid_index.set_phase(phase.value, phase.min_change_ratio / Phase.EXPLORATION.min_change_ratio)
+
+    def _suggest_config(self) -> Optional[Dict[str, str]]:
+        """advisory 模式下向 LLM 提供的优化器建议配置，不含参数筛选冻结的参数"""
+        if self.optimizer is None:
+            return None
+        return {name: value for name, value in self.optimizer.suggest().items() if name not in self.search_space.frozen}
+
+    def _best_trial(self) -> Optional[TrialRecord]:
+        """提升率最高的非 baseline 试验"""
+        candidates = [
+            t for t in self.trials
+            if t.source != "baseline" and t.improvement_ratio is not None and t.config
+        ]
+        if not candidates:
+            return None
+        return max(candidates, key=lambda t: t.improvement_ratio)
+
+    async def think(self, response: Optional[LLMResponse] = None) -> bool:
+        """思考阶段，记录为一个 think span"""
+        with self.tracer.span("think", step=self.current_step, speculative=(response is not None) or None):
+            return await self._think(response)
+
+    async def _think(self, response: Optional[LLMResponse] = None) -> bool:
         """真正执行交互LLM"""
-        """思考阶段：分析当前状态，决定下一步行动"""
+        """思考阶段：分析当前状态，决定下一步行动；传入 response 时直接采用（投机推荐）"""
         print("🤔 正在思考...")
+        self._step_start = len(self.memory.messages)
         
         try:
             # 获取LLM响应
-            response = await self.llm.chat(
-                messages=self.memory.get_messages(),
-                system_prompt=self.system_prompt,
-                tools=self.tools.get_tool_definitions()
-            )
+            if response is None:
+                response = await self._chat_with_recovery()
+                if response is None:
+                    self.state = AgentState.FINISHED
+                    return False
             
             print(f"💭 思考结果: {response.content}")
             print(f"💭 调用工具: {response.tool_calls}")
@@ -144,9 +1023,178 @@ class KernelTuneAgent:
             self.state = AgentState.FINISHED
             return False
     
+    async def _chat_with_recovery(self) -> Optional[LLMResponse]:
+        """
+        请求 LLM。客户端内部已经对暂时性错误做了退避重试；
+        重试耗尽后仍属暂时性错误（推理服务重启等）时，等待 llm_cooldown 秒后重试本轮，
+        最多 llm_failure_budget 次，避免一次故障丢掉整个调优会话。彻底失败时返回 None。
+        """
+        tool_definitions = self.tools.get_tool_definitions()
+        estimated_tokens = self.memory.estimate_tokens() + self._prefix_tokens(tool_definitions)
+        for failure in range(self.llm_failure_budget + 1):
+            try:
+                with self.tracer.span("llm.chat", step=self.current_step, estimated_prompt_tokens=estimated_tokens) as span:
+                    response = await self.llm.chat(
+                        messages=self.memory.get_messages(),
+                        system_prompt=self.system_prompt,
+                        tools=tool_definitions
+                    )
+                    self._annotate_llm_span(span, response)
+            except LLMError as e:
+                if not e.retryable or failure >= self.llm_failure_budget:
+                    print(f"❌ LLM 请求失败，结束调优: {e}")
+                    return None
+                print(f"⚠️ LLM 暂时不可用，{self.llm_cooldown:g} 秒后重试本轮（{failure + 1}/{self.llm_failure_budget}）")
+                await asyncio.sleep(self.llm_cooldown)
+                continue
+            self._record_token_usage(estimated_tokens, response)
+            return response
+        return None
+
+    @staticmethod
+    def _annotate_llm_span(span, response: LLMResponse) -> None:
+        usage = response.usage or {}
+        span.set(
+            prompt_tokens=usage.get("prompt_tokens"),
+            completion_tokens=usage.get("completion_tokens"),
+            first_token_latency=response.first_token_latency,
+            attempts=response.attempts,
+            tool_calls=len(response.tool_calls or []),
+        )
+
+    def _prefix_tokens(self, tool_definitions: List[Dict]) -> int:
+        """系统提示词和工具定义的 token 估算，二者不变时只计算一次"""
+        key = (self.system_prompt, id(tool_definitions))
+        if self._prefix_token_key != key:
+            self._prefix_token_key = key
+            self._prefix_token_count = (
+                estimate_tokens(self.system_prompt)
+                + estimate_tokens(json.dumps(tool_definitions, ensure_ascii=False))
+            )
+        return self._prefix_token_count
+
+    def _speculation_outcomes(self) -> List[Tuple[Phase, bool]]:
+        """在途试验可能带来的 (下一阶段, 是否比 baseline 慢) 组合，每种组合的反馈提示词不同"""
+        outcomes = [(self.tuning_phase, True)]
+        for ratio in (1e-6, 0.05, 0.12):
+            outcome = (self.update_phase(self.tuning_phase, ratio), False)
+            if outcome not in outcomes:
+                outcomes.append(outcome)
+        return outcomes
+
+    def _start_speculation(self, baseline: float) -> None:
+        """
+        本轮要执行 run_trial 时，在训练进行期间并行地为每种可能结果请求下一组配置。
+        请求中用一条占位的工具结果代替尚未返回的训练结果。
+        """
+        if not self.pipeline or self.trial_tool is None or self.current_step >= self.max_steps:
+            return
+        tool_calls = self.memory.messages[-1].tool_calls or []
+        if not any(call["function"]["name"] == self.trial_tool.name for call in tool_calls):
+            return
+        history = self.memory.get_messages() + [
+            {"role": Role.TOOL.value, "content": "训练进行中，结果尚未返回", "tool_call_id": call["id"]}
+            for call in tool_calls
+        ]
+        history_tokens = self.memory.estimate_tokens()
+
+        async def speculate(phase: Phase, slower: bool) -> Tuple[str, LLMResponse]:
+            prompt = Message.user_message(
+                self.prompt_builder.build_feedback_prompt(phase, baseline, None, assumed_slower=slower)
+            )
+            tool_definitions = self.tools.get_tool_definitions()
+            with self.tracer.span("llm.chat", step=self.current_step + 1, speculative=True) as span:
+                response = await self.llm.chat(
+                    messages=history + [prompt.wire],
+                    system_prompt=self.system_prompt,
+                    tools=tool_definitions
+                )
+                self._annotate_llm_span(span, response)
+            self._record_token_usage(history_tokens + prompt.tokens + self._prefix_tokens(tool_definitions), response)
+            return prompt.content, response
+
+        async def speculate_all() -> Dict[Tuple[Phase, bool], Tuple[str, LLMResponse]]:
+            outcomes = self._speculation_outcomes()
+            responses = await asyncio.gather(*(speculate(*outcome) for outcome in outcomes))
+            return dict(zip(outcomes, responses))
+
+        print(f"🔮 训练期间并行生成 {len(self._speculation_outcomes())} 种结果下的下一组推荐")
+        self._speculation = asyncio.ensure_future(speculate_all())
+
+    async def _take_speculation(self, record: TrialRecord) -> Optional[Tuple[str, LLMResponse]]:
+        """
+        取出与本轮实际结果匹配的投机推荐，没有可用推荐时返回 None。
+        本轮试验没有真正完成（例如配置校验失败）时投机推荐的前提不成立，直接丢弃。
+        """
+        if self._speculation is None:
+            return None
+        if record.training_time is None and not record.censored:
+            await self._cancel_speculation()
+            return None
+        task, self._speculation = self._speculation, None
+        try:
+            speculations = await task
+        except Exception as e:
+            print(f"⚠️ 投机推荐失败: {e}")
+            return None
+        slower = record.improvement_ratio is None or record.improvement_ratio < 0
+        speculation = speculations.get((self.tuning_phase, slower))
+        if speculation is None or not speculation[1].tool_calls:
+            return None
+        return speculation
+
+    async def _cancel_speculation(self) -> None:
+        """放弃尚未采用的投机推荐"""
+        if self._speculation is None:
+            return
+        self._speculation.cancel()
+        try:
+            await self._speculation
+        except (asyncio.CancelledError, Exception):
+            pass
+        self._speculation = None
+
+    def _record_token_usage(self, estimated_tokens: int, response: LLMResponse) -> None:
+        """记录本次 LLM 请求的 token 数和延迟，服务端未返回 usage 时只记录估算值"""
+        usage = response.usage
+        entry = {"step": self.current_step, "estimated_prompt_tokens": estimated_tokens}
+        if usage:
+            entry.update(usage)
+        if response.latency is not None:
+            entry["latency"] = round(response.latency, 3)
+        if response.first_token_latency is not None:
+            entry["first_token_latency"] = round(response.first_token_latency, 3)
+        self.token_usage.append(entry)
+        if usage:
+            print(f"📏 提示词 {usage.get('prompt_tokens')} tokens (估算 {estimated_tokens})，生成 {usage.get('completion_tokens')} tokens")
+        else:
+            print(f"📏 提示词估算 {estimated_tokens} tokens")
+
+    def _compact_memory(self) -> None:
+        """
+        对话超过 memory_compaction_tokens 时，把本轮之前的对话折叠为试验汇总表，保留本轮的原始交互。
+        折叠会改变系统提示词之后的前缀，使下一次请求无法命中前缀缓存，所以只在对话积累到阈值时折叠
+        """
+        if not self.memory_compaction or self.memory.estimate_tokens() < self.memory_compaction_tokens:
+            return
+        self.memory.compact(self._step_start, self.prompt_builder.build_trial_table(self.trials))
+
     async def act(self) -> None:
+        """行动阶段，记录为一个 act span"""
+        with self.tracer.span("act", step=self.current_step):
+            await self._act()
+
+    async def _act(self) -> None:
         """行动阶段：执行工具调用"""
         print("⚡ 正在执行行动...")
+        self._last_result_cached = False
+        self._last_censored = False
+        self._last_censored_time = None
+        self._last_metrics = None
+        self._last_isolation = None
+        self._last_telemetry = None
+        if self.trial_tool is not None:
+            self.trial_tool.last_results = []
         
         # 获取最后一条消息的工具调用
         last_message = self.memory.messages[-1]
@@ -163,8 +1211,14 @@ class KernelTuneAgent:
                 arguments = json.loads(tool_call["function"]["arguments"])
                 print(f"🔧 执行工具: {function_name} with {arguments}")
                 
-                # 执行工具
-                result = await self.tools.execute_tool(function_name, **arguments)
+                # 执行工具（训练命令优先查询评估缓存）
+                with self.tracer.span("tool", tool=function_name, step=self.current_step) as span:
+                    result = self._lookup_cached_training(function_name, arguments)
+                    if result is None and self._should_monitor(function_name, arguments):
+                        result = await self._run_monitored_training(arguments["command"])
+                    if result is None:
+                        result = await self.tools.execute_tool(function_name, **arguments)
+                    span.set(success=result.success)
                 
                 # 准备结果消息
                 if result.success:
@@ -194,6 +1248,105 @@ class KernelTuneAgent:
                         tool_call_id=tool_id
                     )
                 )
+    def _is_train_command(self, command: str) -> bool:
+        """判断一条命令是否在运行训练任务"""
+        train_cmd = self.prompt_builder.train_cmd
+        return bool(train_cmd) and command.strip().startswith(train_cmd)
+
+    def _read_effective_config(self) -> dict:
+        """读取启用参数的当前生效值"""
+        return self.sysctl_applier.read(self.prompt_builder.get_active_param_names())
+
+    def _lookup_cached_training(self, function_name: str, arguments: dict) -> Optional[ToolResult]:
+        """
+        训练命令执行前查询评估缓存，命中时直接返回缓存的训练耗时。
+        只拦截以训练命令开头的命令，保证此时参数修改已经全部生效。
+        """
+        if self.eval_cache is None or function_name != "bash_execute":
+            return None
+        if not self._is_train_command(arguments.get("command", "")):
+            return None
+        entry = self.eval_cache.get(self._read_effective_config())
+        if entry is None:
+            return None
+        self._last_result_cached = True
+        self._last_cached_samples = list(entry.samples)
+        print(f"♻️ 命中评估缓存，跳过训练: {entry.training_time:.4f} 秒")
+        return ToolResult(
+            success=True,
+            output=f"平均训练耗时: {entry.training_time} 秒 (当前配置已评估过，结果来自缓存，未重新训练)"
+        )
+
+    def _should_monitor(self, function_name: str, arguments: dict) -> bool:
+        """训练命令改为流式执行：逐行提取指标，开启提前终止时按进度终止"""
+        return function_name == "bash_execute" and self._is_train_command(arguments.get("command", ""))
+
+    async def _run_monitored_training(self, command: str) -> ToolResult:
+        """
+        流式执行 LLM 发出的训练命令，进度明显劣于历史试验时提前终止。
+        训练期间与结构化试验一样采集系统观测，汇总写入反馈提示词。
+        提取到的指标放在输出开头，工具输出被截断时也能保留。
+        """
+        self._last_isolation = await self.trial_runner.isolate()
+        outcome, self._last_telemetry = await self.trial_runner.stream_sampled(command)
+        self._last_metrics = outcome.metrics
+        if outcome.stopped:
+            self._last_censored = True
+            self._last_censored_time = self.trial_runner.censored_value()
+            return ToolResult(
+                success=True,
+                output=(
+                    "训练已被提前终止：按当前进度推算，本轮配置的训练耗时明显劣于已完成的试验，"
+                    "视为失败方案。\n" + outcome.output[-300:]
+                )
+            )
+        self.trial_runner.complete_monitored(outcome, outcome.metrics.training_time)
+        summary = outcome.metrics.describe()
+        output = f"{summary}\n{outcome.output}" if summary else outcome.output
+        if outcome.timed_out:
+            return ToolResult(success=False, output=output, error="命令执行超时")
+        if outcome.returncode == 0:
+            return ToolResult(success=True, output=output)
+        return ToolResult(success=False, output=output, error=outcome.error)
+
+    async def _collect_step_results(self) -> List[TrialResult]:
+        """
+        本轮试验结果：LLM 调用了 run_trial / run_trials 时直接使用结构化结果，
+        否则从工具输出中解析训练耗时，并按测量策略补充重复训练。
+        """
+        if self.trial_tool is not None and self.trial_tool.last_results:
+            return list(self.trial_tool.last_results)
+        training_time = self._extract_training_time_from_last_tool_result()
+        if self._last_censored:
+            # 被提前终止的训练没有耗时结果，不能沿用历史消息里的旧数值
+            training_time = None
+        samples = await self._complete_evaluation(training_time)
+        if samples:
+            training_time = sum(samples) / len(samples)
+        return [TrialResult(
+            config=self._read_effective_config(),
+            training_time=training_time,
+            samples=samples,
+            cached=self._last_result_cached,
+            censored=self._last_censored,
+            censored_time=self._last_censored_time,
+            telemetry=self._last_telemetry,
+            metrics=self._last_metrics,
+            isolation=self._last_isolation,
+        )]
+
+    async def _complete_evaluation(self, training_time: Optional[float], is_baseline: bool = False) -> List[float]:
+        """
+        以 LLM 执行的这次训练为第一次测量，按测量策略补充重复训练，并写入评估缓存。
+        返回全部测量值；结果来自缓存时直接返回缓存的测量值。
+        """
+        if training_time is None:
+            return []
+        if self._last_result_cached:
+            return self._last_cached_samples or [training_time]
+        result = await self.trial_runner.measure(first_sample=training_time, is_baseline=is_baseline)
+        return result.samples
+
     def _truncate_tool_output(self, text: str, max_length: int = 600, keep_head_ratio: float = 0.4) -> str:
         """
         截断过长的工具输出，保留头部和尾部，中间用省略号代替。
@@ -230,21 +1383,21 @@ class KernelTuneAgent:
 
     def _extract_training_time_from_last_tool_result(self) -> Optional[float]:
         """
-            从 memory 中最后一条 tool 消息的内容中提取 '平均训练耗时: XXX 秒' 的浮点数值。
+            本轮训练的耗时：优先使用训练期间从日志和标准输出中提取的指标，
+            其次从 memory 中本轮最后一条 tool 消息的内容中提取 '平均训练耗时: XXX 秒' 的浮点数值（例如缓存命中）。
     
             返回:
             float: 提取到的训练时间（秒），如果未找到则返回 None
         """
-        # 从后往前找第一条 role == Role.TOOL 的消息
-        for msg in reversed(self.memory.messages):
+        if self._last_metrics is not None and self._last_metrics.training_time is not None:
+            return self._last_metrics.training_time
+        # 只在本轮产生的消息中从后往前找，避免本轮失败时读到之前轮次的旧结果
+        for msg in reversed(self.memory.messages[self._step_start:]):
             if msg.role == Role.TOOL and msg.content:
-                # 使用正则匹配 "平均训练耗时: 123.45 秒"
-                match = re.search(r"平均训练耗时:\s*([\d.]+)\s*秒", msg.content)
-                if match:
-                    try:
-                        return float(match.group(1))
-                    except ValueError:
-                        continue  # 格式异常，跳过
+                # 匹配 "平均训练耗时: 123.45 秒"
+                value = parse_training_time(msg.content)
+                if value is not None:
+                    return value
         return None
     def update_phase(self,current_phase: Phase, improvement_ratio: float) -> Phase:
         """
@@ -257,89 +1410,39 @@ class KernelTuneAgent:
         if current_phase == Phase.EXPLOITATION and improvement_ratio >= 0.12:
             return Phase.REFINEMENT
         return current_phase
-    # TODO:从中获取调优效果最好的一次，作为结果返回
+
     def _generate_summary(self) -> str:
         """
         生成任务执行摘要。
-        逻辑：
-        1. 从 SYSCTL_PARAM_META 初始化所有参数的默认值。
-        2. 仅遍历到 best_step_index 为止的消息，解析 sysctl 和 echo 命令。
-        3. 后续轮次的修改不会生效，保证输出的是“最佳时刻”的参数状态。
+        参数取值来自最佳试验记录的实际生效配置；没有优于 baseline 的试验时为默认配置。
         """
-        messages = self.memory.messages
-        if not messages:
+        if not self.memory.messages and not self.trials:
             return "没有执行任何操作"
 
-        # 引入参数元数据
-        SYSCTL_PARAM_META = {
-            "fs.file-max": {"default": "1048576"},
-            "kernel.threads-max": {"default": "3092111"},
-            "vm.watermark_scale_factor": {"default": "10"},
-            "vm.page-cluster": {"default": "3"},
-            "transparent_hugepage": {"default": "madvise"},
-            "vm.dirty_background_ratio": {"default": "10"},
-            "vm.dirty_expire_centisecs": {"default": "3000"},
-            "vm.dirty_ratio": {"default": "30"},
-            "vm.dirty_writeback_centisecs": {"default": "500"},
-            "vm.overcommit_memory": {"default": "0"},
-            "vm.overcommit_ratio": {"default": "50"},
-            "vm.swappiness": {"default": "10"},
-            "kernel.numa_balancing": {"default": "1"},
-        }
-
-        # 1. 初始化参数为默认值
-        final_param_values = {}
-        for param, meta in SYSCTL_PARAM_META.items():
-            final_param_values[param] = meta["default"]
-
-        # 2. 遍历消息，但限制在 best_step_index 之前
-        # 注意：这里的逻辑假设 message 的顺序和 step 是线性对应的
-        # 我们遍历所有消息，但通过逻辑判断是否处理
-        # 为了更精确，我们需要知道每条消息属于哪个 Step。
-        # 由于代码中没有显式的 step_id 在 message 中，我们假设消息是按顺序追加的。
-        # 简单的做法是：统计处理过的 Assistant 消息数量，直到达到 best_step_index。
-        
-        assistant_action_count = 0
-        
-        for msg in messages:
-            # 只有 Assistant 的消息包含工具调用（行动）
-            if msg.role == Role.ASSISTANT and msg.tool_calls:
-                assistant_action_count += 1
-                
-                # 核心修改：如果当前行动轮次超过了最佳轮次，停止解析
-                if assistant_action_count > self.best_step_index:
-                    break
-                
-                for tool_call in msg.tool_calls:
-                    if 'function' in tool_call and 'arguments' in tool_call['function']:
-                        try:
-                            arguments = json.loads(tool_call['function']['arguments'])
-                            command = arguments.get('command', '')
-                            import re
-
-                            # 处理 sysctl 命令
-                            if command.startswith('sysctl'):
-                                matches = re.findall(r'([\w\.\-]+)=([\d\w\.\-]+)', command)
-                                for key, value in matches:
-                                    if key in final_param_values:
-                                        final_param_values[key] = value
-
-                            # 处理 echo 命令
-                            elif command.startswith('echo'):
-                                if 'transparent_hugepage' in command:
-                                    match = re.search(r'echo\s+(\w+)\s+>', command)
-                                    if match:
-                                        value = match.group(1)
-                                        final_param_values['transparent_hugepage'] = value
-
-                        except (json.JSONDecodeError, KeyError):
-                            continue
-
-        # 3. 构建摘要信息
+        final_param_values = self.search_space.default_config()
+        best_trial = self._best_trial()
+        if best_trial is not None:
+            final_param_values.update(best_trial.config)
+
+        # 构建摘要信息
         summary = "📝 任务执行摘要 (基于最佳轮次)\n"
         summary += "-" * 50 + "\n"
         summary += f"最佳效果轮次: 第 {self.best_step_index} 轮\n"
         summary += f"最佳提升率: {self.best_improvement_ratio:.2%}\n"
+        confidence = self.measurement_policy.confidence
+        if self.baseline_measurement is not None:
+            summary += f"baseline 训练耗时: {self.baseline_measurement.describe(confidence)}\n"
+        if best_trial is not None and best_trial.samples:
+            summary += f"最佳配置训练耗时: {Measurement(samples=best_trial.samples).describe(confidence)}\n"
+            comparison_desc = self._describe_comparison(best_trial)
+            if comparison_desc:
+                low, high = best_trial.improvement_ci
+                summary += f"提升率 ({confidence:.0%} 置信区间): {comparison_desc}, 区间 [{low:.2%}, {high:.2%}]\n"
+        warm_starts = [t for t in self.trials if t.source == "warm_start"]
+        if warm_starts:
+            summary += f"热启动: 训练了 {len(warm_starts)} 组历史会话的优胜配置\n"
+        if self.screening_report is not None and self.screening_report.frozen:
+            summary += f"参数筛选冻结为默认值的参数: {', '.join(self.screening_report.frozen)}\n"
         summary += "-" * 50 + "\n"
         summary += "最佳状态下的参数取值:\n"
         
@@ -347,5 +1450,9 @@ class KernelTuneAgent:
             summary += f"  - {param}: {final_param_values[param]}\n"
             
         summary += "-" * 50
+        if self.grid_index.points:
+            summary += f"\n{self.grid_index.describe()}"
+        if hasattr(self.llm, "summary"):
+            summary += f"\n{self.llm.summary()}"
 
         return summary
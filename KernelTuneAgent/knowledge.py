@@ -0,0 +1,274 @@
+"""
+调优经验库：用已完成会话的结果为新会话热启动
+
+每个会话结束时追加一条记录：主机描述、baseline 试验的负载特征、baseline 耗时和提升最大的几组配置。
+新会话测完 baseline 后按负载特征和主机差异查找最相近的历史会话：
+- 它们的优胜配置作为最先尝试的几组配置
+- 按各自的提升率折算为本次 baseline 下的预估耗时，作为先验观测交给优化器
+选取热启动配置 (KnowledgeBase.plan_warm_start) 和会话结束时挑选优胜配置 (select_winners) 都在这里完成，
+训练和记录由代理负责。
+
+负载特征取对数尺度，各维的差异大致可比（相差 1 约为 e 倍）：
+- 每秒缺页/主缺页/直接回收/内存规整/THP 分配与回退/换入换出次数
+- PSI stall 时间占比（乘以 10）
+- 训练进程树平均占用的 CPU 核数、RSS 峰值、读写带宽
+- 训练耗时和平均吞吐
+"""
+import json
+import math
+import os
+import platform
+import time
+from typing import Dict, List, Optional, Tuple
+from pydantic import BaseModel
+from KernelTuneAgent.cache import _read_mem_total, host_fingerprint
+from KernelTuneAgent.schema import TrialRecord
+from KernelTuneAgent.search_space import GridIndex, SearchSpace
+
+# 计入负载特征的 vmstat 计数
+SIGNATURE_COUNTERS = (
+    "pgfault", "pgmajfault", "allocstall", "compact_stall",
+    "thp_fault_alloc", "thp_fault_fallback", "pswpin", "pswpout",
+)
+PRESSURE_SCALE = 10.0
+
+
+class HostProfile(BaseModel):
+    """主机描述：指纹用于判断是否同一台机器，其余字段用于估计不同机器之间的差异"""
+    fingerprint: str = ""
+    machine: str = ""
+    release: str = ""
+    cpus: int = 0
+    mem_kb: float = 0.0
+
+    @classmethod
+    def current(cls) -> "HostProfile":
+        mem_total = _read_mem_total().split()
+        try:
+            mem_kb = float(mem_total[0]) if mem_total else 0.0
+        except ValueError:
+            mem_kb = 0.0
+        return cls(
+            fingerprint=host_fingerprint(),
+            machine=platform.machine(),
+            release=platform.release(),
+            cpus=os.cpu_count() or 0,
+            mem_kb=mem_kb,
+        )
+
+    def distance(self, other: "HostProfile") -> float:
+        """同一主机为 0；否则为 CPU 核数和内存的对数差异，架构或内核版本不同时再加一个固定值"""
+        if self.fingerprint and self.fingerprint == other.fingerprint:
+            return 0.0
+        distance = 0.0
+        for a, b in ((self.cpus, other.cpus), (self.mem_kb, other.mem_kb)):
+            if a > 0 and b > 0:
+                distance += abs(math.log(a / b))
+        if self.machine != other.machine:
+            distance += 1.0
+        if self.release != other.release:
+            distance += 0.25
+        return distance
+
+
+class WorkloadSignature(BaseModel):
+    """负载特征：特征名 -> 对数尺度的取值"""
+    features: Dict[str, float] = {}
+
+    @classmethod
+    def from_trial(cls, record: TrialRecord) -> "WorkloadSignature":
+        """由 baseline 试验的系统观测和训练指标生成负载特征，没有观测的维度不计入"""
+        features: Dict[str, float] = {}
+        if record.training_time:
+            features["training_time"] = math.log(record.training_time)
+        if record.metrics is not None and record.metrics.mean_throughput:
+            features["throughput"] = math.log(record.metrics.mean_throughput)
+        telemetry = record.telemetry
+        if telemetry is not None and telemetry.duration > 0:
+            duration = telemetry.duration
+            for name in SIGNATURE_COUNTERS:
+                if name in telemetry.counters:
+                    features[f"{name}/s"] = math.log1p(max(0.0, telemetry.counters[name]) / duration)
+            for name, value in telemetry.pressure.items():
+                if name.endswith(".some"):
+                    features[f"psi.{name}"] = PRESSURE_SCALE * value
+            process = telemetry.process
+            if process is not None and process.processes:
+                features["cpu_cores"] = math.log1p(process.cpu_time / duration)
+                features["peak_rss_mb"] = math.log1p(process.peak_rss / 1024)
+                features["io_mb/s"] = math.log1p((process.read_bytes + process.write_bytes) / duration / (1 << 20))
+        return cls(features=features)
+
+    def distance(self, other: "WorkloadSignature") -> float:
+        """共同特征上差异的均方根，没有共同特征时为无穷大"""
+        common = [name for name in self.features if name in other.features]
+        if not common:
+            return math.inf
+        return math.sqrt(sum((self.features[name] - other.features[name]) ** 2 for name in common) / len(common))
+
+
+class KnownConfig(BaseModel):
+    """一组历史优胜配置"""
+    config: Dict[str, str]
+    improvement: float            # 相对当时 baseline 的提升率
+    training_time: float
+
+
+class CampaignRecord(BaseModel):
+    """一个已完成调优会话的记录"""
+    session: str = ""
+    train_cmd: str
+    host: HostProfile
+    signature: WorkloadSignature
+    baseline: float
+    winners: List[KnownConfig] = []       # 按提升率从大到小
+    trials: int = 0
+    created_at: float = 0.0
+
+
+class WarmStartPlan(BaseModel):
+    """热启动计划"""
+    neighbors: List[Tuple[CampaignRecord, float]] = []     # (相近的历史会话, 距离)
+    priors: List[Tuple[Dict[str, str], float]] = []        # (对齐到本次搜索空间的优胜配置, 历史提升率)
+    seeds: List[Dict[str, str]] = []                       # 直接训练的配置，按排序取 priors 的前几组
+
+
+def select_winners(trials: List[TrialRecord], space: SearchSpace, limit: int = 3) -> List[KnownConfig]:
+    """
+    本次会话中值得写入经验库的优胜配置：完整训练、优于 baseline 且（有显著性检验时）显著，
+    按提升率从大到小，补全为完整配置后去重，最多 limit 组
+    """
+    candidates = sorted(
+        (
+            t for t in trials
+            if t.source not in ("baseline", "screening") and t.fidelity >= 1.0
+            and t.improvement_ratio is not None and t.improvement_ratio > 0
+            and (t.p_value is None or t.significant)
+        ),
+        key=lambda t: t.improvement_ratio,
+        reverse=True,
+    )
+    defaults = space.default_config()
+    winners: List[KnownConfig] = []
+    seen = set()
+    for trial in candidates:
+        config = {**defaults, **trial.config}
+        key = space.key(config)
+        if key in seen:
+            continue
+        seen.add(key)
+        winners.append(KnownConfig(config=config, improvement=trial.improvement_ratio, training_time=trial.training_time))
+        if len(winners) >= limit:
+            break
+    return winners
+
+
+class KnowledgeBase:
+    """基于 JSON 文件的调优经验库"""
+
+    def __init__(self, path: str, max_records: int = 500):
+        self.path = path
+        self.max_records = max_records
+        self.records: List[CampaignRecord] = []
+        self._load()
+
+    def _load(self):
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+        except FileNotFoundError:
+            return
+        except (OSError, json.JSONDecodeError) as e:
+            print(f"⚠️ 调优经验库 {self.path} 读取失败，忽略: {e}")
+            return
+        for raw in data:
+            try:
+                self.records.append(CampaignRecord(**raw))
+            except Exception:
+                continue
+
+    def _save(self):
+        """先写临时文件再替换，避免进程中断时留下半个文件"""
+        directory = os.path.dirname(os.path.abspath(self.path))
+        os.makedirs(directory, exist_ok=True)
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump([record.model_dump() for record in self.records], f, ensure_ascii=False, indent=2)
+        os.replace(tmp_path, self.path)
+
+    def add(self, record: CampaignRecord) -> None:
+        """追加一条会话记录并立即落盘，同一会话（恢复后再次结束）的旧记录被替换，超过上限时丢弃最旧的记录"""
+        record.created_at = record.created_at or time.time()
+        if record.session:
+            self.records = [r for r in self.records if r.session != record.session]
+        self.records.append(record)
+        self.records = self.records[-self.max_records:]
+        self._save()
+
+    def neighbors(
+        self,
+        host: HostProfile,
+        signature: WorkloadSignature,
+        k: int = 3,
+        max_distance: float = 1.0,
+        host_weight: float = 0.5
+    ) -> List[Tuple[CampaignRecord, float]]:
+        """距离最近的 k 个有优胜配置的历史会话，距离 = 负载特征距离 + host_weight * 主机差异"""
+        scored = []
+        for record in self.records:
+            if not record.winners:
+                continue
+            distance = signature.distance(record.signature) + host_weight * host.distance(record.host)
+            if distance <= max_distance:
+                scored.append((record, distance))
+        scored.sort(key=lambda item: (item[1], -item[0].created_at))
+        return scored[:k]
+
+    @staticmethod
+    def rank_winners(neighbors: List[Tuple[CampaignRecord, float]]) -> List[Tuple[KnownConfig, float]]:
+        """近邻会话的优胜配置，按 提升率 / (1 + 距离) 从大到小排序"""
+        ranked = [
+            (winner, winner.improvement / (1.0 + distance))
+            for record, distance in neighbors for winner in record.winners
+        ]
+        ranked.sort(key=lambda item: item[1], reverse=True)
+        return ranked
+
+    def plan_warm_start(
+        self,
+        host: HostProfile,
+        signature: WorkloadSignature,
+        space: SearchSpace,
+        k: int = 3,
+        max_distance: float = 1.0,
+        limit: int = 3,
+        index: Optional[GridIndex] = None
+    ) -> WarmStartPlan:
+        """
+        相近历史会话的优胜配置对齐到本次的搜索空间（冻结的参数取默认值）后去重，
+        已被 index 覆盖的配置跳过；全部作为先验，排在最前面的 limit 组直接训练
+        """
+        neighbors = self.neighbors(host, signature, k=k, max_distance=max_distance)
+        plan = WarmStartPlan(neighbors=neighbors)
+        seen = set()
+        for winner, _ in self.rank_winners(neighbors):
+            config = space.snap(winner.config)
+            key = space.key(config)
+            if key in seen or (index is not None and index.covers(config)):
+                continue
+            seen.add(key)
+            plan.priors.append((config, winner.improvement))
+            if len(plan.seeds) < limit:
+                plan.seeds.append(config)
+        return plan
+
+    def describe(self, neighbors: List[Tuple[CampaignRecord, float]]) -> str:
+        lines = [f"调优经验库: {len(self.records)} 个历史会话，{len(neighbors)} 个相近:"]
+        for record, distance in neighbors:
+            best = record.winners[0]
+            lines.append(
+                f"  - {time.strftime('%Y-%m-%d %H:%M', time.localtime(record.created_at))} "
+                f"距离 {distance:.3f}, baseline {record.baseline:.4f} 秒, 最佳提升 {best.improvement:.2%}"
+                f" ({record.train_cmd})"
+            )
+        return "\n".join(lines)
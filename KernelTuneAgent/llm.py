@@ -1,82 +1,292 @@
 """
 LLM接口实现
+
+- 所有 SimpleLLM 实例共享同一个 HTTP 连接池，避免每次请求重新建立连接
+- 连接/读取超时可配置，可重试的错误按带抖动的指数退避重试
+- 流式接收响应，增量拼接文本和工具调用
+- 记录每次请求的耗时、首 token 延迟和 token 数
 """
+import asyncio
+import random
+import time
 from typing import List, Dict, Any, Optional
-from openai import AsyncOpenAI
+import httpx
+from openai import (
+    APIConnectionError,
+    APIStatusError,
+    AsyncOpenAI,
+    DefaultAsyncHttpxClient,
+    Timeout,
+)
 from pydantic import BaseModel
 
+# 服务端过载或暂时不可用时返回的状态码，可以重试
+RETRYABLE_STATUS_CODES = {408, 409, 429, 500, 502, 503, 504}
+
+_shared_http_client: Optional[DefaultAsyncHttpxClient] = None
+
+
+def shared_http_client() -> DefaultAsyncHttpxClient:
+    """进程内共享的 HTTP 客户端（连接池）"""
+    global _shared_http_client
+    if _shared_http_client is None or _shared_http_client.is_closed:
+        _shared_http_client = DefaultAsyncHttpxClient()
+    return _shared_http_client
+
+
+class LLMError(Exception):
+    """重试耗尽或不可重试的 LLM 请求错误"""
+
+    def __init__(self, message: str, attempts: int = 1, retryable: bool = False):
+        super().__init__(message)
+        self.attempts = attempts
+        self.retryable = retryable
+
 
 class LLMResponse(BaseModel):
     """LLM响应结果"""
     content: Optional[str] = None
     tool_calls: Optional[List[Dict[str, Any]]] = None
+    usage: Optional[Dict[str, int]] = None   # prompt_tokens / completion_tokens
+    latency: Optional[float] = None          # 最后一次尝试的总耗时（秒）
+    first_token_latency: Optional[float] = None
+    attempts: int = 1
+
+
+class LLMCallMetrics(BaseModel):
+    """一次 chat 调用的统计"""
+    latency: float                       # 含重试等待在内的总耗时
+    first_token_latency: Optional[float] = None
+    prompt_tokens: Optional[int] = None
+    completion_tokens: Optional[int] = None
+    attempts: int = 1
+    error: str = ""
+
+
+def is_retryable(error: Exception) -> bool:
+    """连接错误、超时和服务端暂时性错误可以重试，参数错误和鉴权失败不重试"""
+    if isinstance(error, APIConnectionError):    # 包括 APITimeoutError
+        return True
+    if isinstance(error, httpx.TransportError):
+        # 读取流式响应的过程中连接中断或超时（ReadTimeout、ReadError、RemoteProtocolError），
+        # SDK 不会包装成 APIConnectionError
+        return True
+    if isinstance(error, APIStatusError):
+        return error.status_code in RETRYABLE_STATUS_CODES
+    return isinstance(error, (asyncio.TimeoutError, ConnectionError))
 
 
 class SimpleLLM:
     """简化的LLM接口"""
-    
-    def __init__(self, api_key: str = "token-abc123", model: str = "gpt-4o-mini", base_url: str = "https://api.openai.com/v1"):
+
+    def __init__(
+        self,
+        api_key: str = "token-abc123",
+        model: str = "gpt-4o-mini",
+        base_url: str = "https://api.openai.com/v1",
+        timeout: float = 300.0,
+        connect_timeout: float = 10.0,
+        max_retries: int = 5,
+        backoff_base: float = 1.0,
+        backoff_max: float = 30.0,
+        stream: bool = True,
+        stream_usage: Optional[bool] = None,
+        temperature: float = 0.7,
+        http_client: Optional[DefaultAsyncHttpxClient] = None
+    ):
+        # 重试由本类负责，关闭 SDK 自带的重试
         self.client = AsyncOpenAI(
             api_key=api_key,
-            base_url=base_url
+            base_url=base_url,
+            timeout=Timeout(timeout, connect=connect_timeout),
+            max_retries=0,
+            http_client=http_client or shared_http_client(),
         )
         self.model = model
-    
+        self.base_url = base_url
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.stream = stream
+        # 流式请求是否带 stream_options 请求 token 用量：None 为自动，服务端以 400 拒绝该字段时
+        # （较老的 vLLM、llama.cpp 等）去掉它重发一次，之后的请求都不再携带
+        self.stream_usage = stream_usage
+        self.temperature = temperature
+        self.metrics: List[LLMCallMetrics] = []
+        # 系统提示词对应的消息前缀，内容不变时复用同一个对象
+        self._prefix_prompt: Optional[str] = None
+        self._prefix: List[Dict[str, Any]] = []
+
+    def _system_prefix(self, system_prompt: Optional[str]) -> List[Dict[str, Any]]:
+        """
+        返回系统消息前缀，只在系统提示词变化时重建。
+        系统提示词和工具定义在会话中保持不变，vLLM 等服务端可以据此复用前缀的 KV cache。
+        """
+        if system_prompt != self._prefix_prompt:
+            self._prefix_prompt = system_prompt
+            self._prefix = [{"role": "system", "content": system_prompt}] if system_prompt else []
+        return self._prefix
+
+    def backoff_delay(self, attempt: int) -> float:
+        """第 attempt 次失败后的等待时间：full jitter 指数退避"""
+        return random.uniform(0, min(self.backoff_max, self.backoff_base * 2 ** attempt))
+
     async def chat(
-        self, 
-        messages: List[Dict[str, Any]], 
+        self,
+        messages: List[Dict[str, Any]],
         system_prompt: Optional[str] = None,
         tools: Optional[List[Dict[str, Any]]] = None
     ) -> LLMResponse:
-        """发送聊天请求"""
-        
-        # 构建消息列表
-        chat_messages = []
-        
-        # 添加系统消息
-        if system_prompt:
-            chat_messages.append({"role": "system", "content": system_prompt})
-        
-        # 添加对话历史
-        chat_messages.extend(messages)
-        
+        """发送聊天请求，可重试的错误按退避策略重试，最终失败时抛出 LLMError"""
+
+        # 构建消息列表：固定的系统消息前缀 + 对话历史
+        chat_messages = self._system_prefix(system_prompt) + messages
+
         # 构建请求参数
         request_params = {
             "model": self.model,
             "messages": chat_messages,
-            "temperature": 0.7,
+            "temperature": self.temperature,
         }
-        
+
         # 如果有工具，添加工具调用参数
         if tools:
             request_params["tools"] = tools
             request_params["tool_choice"] = "auto"
-        
-        try:
-            # 调用OpenAI API
-            response = await self.client.chat.completions.create(**request_params)
-            
-            message = response.choices[0].message
-            
-            # 解析响应
-            result = LLMResponse()
-            result.content = message.content
-            
-            # 解析工具调用
-            if message.tool_calls:
-                result.tool_calls = []
-                for tool_call in message.tool_calls:
-                    result.tool_calls.append({
-                        "id": tool_call.id,
-                        "type": "function",
-                        "function": {
-                            "name": tool_call.function.name,
-                            "arguments": tool_call.function.arguments
-                        }
-                    })
-            
+
+        start = time.monotonic()
+        attempt = 0
+        while True:
+            attempt += 1
+            try:
+                if self.stream:
+                    result = await self._stream_chat(request_params)
+                else:
+                    result = await self._plain_chat(request_params)
+            except Exception as e:
+                retryable = is_retryable(e)
+                if not retryable or attempt > self.max_retries:
+                    self.metrics.append(LLMCallMetrics(
+                        latency=time.monotonic() - start, attempts=attempt, error=str(e)
+                    ))
+                    print(f"LLM调用错误: {e}")
+                    raise LLMError(f"LLM调用失败: {e}", attempts=attempt, retryable=retryable) from e
+                delay = self.backoff_delay(attempt - 1)
+                print(f"⚠️ LLM调用失败（第 {attempt} 次）: {e}，{delay:.1f} 秒后重试")
+                await asyncio.sleep(delay)
+                continue
+
+            result.attempts = attempt
+            usage = result.usage or {}
+            self.metrics.append(LLMCallMetrics(
+                latency=time.monotonic() - start,
+                first_token_latency=result.first_token_latency,
+                prompt_tokens=usage.get("prompt_tokens"),
+                completion_tokens=usage.get("completion_tokens"),
+                attempts=attempt,
+            ))
             return result
-            
-        except Exception as e:
-            print(f"LLM调用错误: {e}")
-            return LLMResponse(content=f"LLM调用失败: {str(e)}")
\ No newline at end of file
+
+    async def _plain_chat(self, request_params: Dict[str, Any]) -> LLMResponse:
+        """非流式请求"""
+        start = time.monotonic()
+        response = await self.client.chat.completions.create(**request_params)
+        message = response.choices[0].message
+
+        # 解析响应
+        result = LLMResponse()
+        result.content = message.content
+        result.latency = time.monotonic() - start
+        if getattr(response, "usage", None) is not None:
+            result.usage = {
+                "prompt_tokens": response.usage.prompt_tokens,
+                "completion_tokens": response.usage.completion_tokens,
+            }
+
+        # 解析工具调用
+        if message.tool_calls:
+            result.tool_calls = []
+            for tool_call in message.tool_calls:
+                result.tool_calls.append({
+                    "id": tool_call.id,
+                    "type": "function",
+                    "function": {
+                        "name": tool_call.function.name,
+                        "arguments": tool_call.function.arguments
+                    }
+                })
+        return result
+
+    async def _stream_chat(self, request_params: Dict[str, Any]) -> LLMResponse:
+        """流式请求：增量拼接文本，按 index 拼接分片到达的工具调用"""
+        start = time.monotonic()
+        first_token_latency = None
+        content_parts: List[str] = []
+        tool_calls: Dict[int, Dict[str, Any]] = {}
+        usage = None
+
+        if self.stream_usage is False:
+            stream = await self.client.chat.completions.create(**request_params, stream=True)
+        else:
+            try:
+                stream = await self.client.chat.completions.create(
+                    **request_params, stream=True, stream_options={"include_usage": True}
+                )
+            except APIStatusError as e:
+                if self.stream_usage is not None or e.status_code != 400:
+                    raise
+                stream = await self.client.chat.completions.create(**request_params, stream=True)
+                print(f"⚠️ 服务端不支持 stream_options，不再请求流式 token 用量: {e}")
+                self.stream_usage = False
+            else:
+                self.stream_usage = True
+        async for chunk in stream:
+            if getattr(chunk, "usage", None) is not None:
+                usage = {
+                    "prompt_tokens": chunk.usage.prompt_tokens,
+                    "completion_tokens": chunk.usage.completion_tokens,
+                }
+            if not chunk.choices:
+                continue
+            delta = chunk.choices[0].delta
+            if first_token_latency is None and (delta.content or delta.tool_calls):
+                first_token_latency = time.monotonic() - start
+            if delta.content:
+                content_parts.append(delta.content)
+            for fragment in delta.tool_calls or []:
+                call = tool_calls.setdefault(fragment.index, {
+                    "id": "",
+                    "type": "function",
+                    "function": {"name": "", "arguments": ""}
+                })
+                if fragment.id:
+                    call["id"] = fragment.id
+                if fragment.function is not None:
+                    if fragment.function.name:
+                        call["function"]["name"] += fragment.function.name
+                    if fragment.function.arguments:
+                        call["function"]["arguments"] += fragment.function.arguments
+
+        return LLMResponse(
+            content="".join(content_parts) or None,
+            tool_calls=[tool_calls[index] for index in sorted(tool_calls)] or None,
+            usage=usage,
+            latency=time.monotonic() - start,
+            first_token_latency=first_token_latency,
+        )
+
+    def summary(self) -> str:
+        """请求统计：次数、延迟、重试和 token 数"""
+        if not self.metrics:
+            return "LLM 请求: 0 次"
+        latencies = sorted(m.latency for m in self.metrics)
+        p95 = latencies[min(len(latencies) - 1, int(0.95 * len(latencies)))]
+        failures = sum(1 for m in self.metrics if m.error)
+        retries = sum(m.attempts - 1 for m in self.metrics)
+        prompt_tokens = sum(m.prompt_tokens or 0 for m in self.metrics)
+        completion_tokens = sum(m.completion_tokens or 0 for m in self.metrics)
+        return (
+            f"LLM 请求: {len(self.metrics)} 次 (失败 {failures}, 重试 {retries}), "
+            f"平均延迟 {sum(latencies) / len(latencies):.2f} 秒, p95 {p95:.2f} 秒, "
+            f"提示词 {prompt_tokens} tokens, 生成 {completion_tokens} tokens"
+        )
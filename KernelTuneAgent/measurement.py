@@ -0,0 +1,179 @@
+"""
+带噪声的性能测量
+
+- Measurement: 同一配置的多次训练耗时，给出均值和 t 分布置信区间
+- MeasurementPolicy: 自适应重复，置信区间相对半宽足够小或达到上限时停止
+- compare: Welch t 检验判断候选配置是否显著快于 baseline，并给出提升率的置信区间
+"""
+import math
+from typing import List, Optional, Tuple
+from pydantic import BaseModel
+
+
+def _betacf(a: float, b: float, x: float, max_iter: int = 200, eps: float = 3e-14) -> float:
+    """不完全 Beta 函数的连分式展开（Lentz 方法）"""
+    tiny = 1e-300
+    qab, qap, qam = a + b, a + 1.0, a - 1.0
+    c, d = 1.0, 1.0 - qab * x / qap
+    d = 1.0 / (d if abs(d) > tiny else tiny)
+    h = d
+    for m in range(1, max_iter + 1):
+        m2 = 2 * m
+        aa = m * (b - m) * x / ((qam + m2) * (a + m2))
+        d = 1.0 + aa * d
+        d = 1.0 / (d if abs(d) > tiny else tiny)
+        c = 1.0 + aa / c
+        c = c if abs(c) > tiny else tiny
+        h *= d * c
+        aa = -(a + m) * (qab + m) * x / ((a + m2) * (qap + m2))
+        d = 1.0 + aa * d
+        d = 1.0 / (d if abs(d) > tiny else tiny)
+        c = 1.0 + aa / c
+        c = c if abs(c) > tiny else tiny
+        delta = d * c
+        h *= delta
+        if abs(delta - 1.0) < eps:
+            break
+    return h
+
+
+def regularized_beta(a: float, b: float, x: float) -> float:
+    """正则化不完全 Beta 函数 I_x(a, b)"""
+    if x <= 0.0:
+        return 0.0
+    if x >= 1.0:
+        return 1.0
+    log_front = math.lgamma(a + b) - math.lgamma(a) - math.lgamma(b) + a * math.log(x) + b * math.log(1.0 - x)
+    if x < (a + 1.0) / (a + b + 2.0):
+        return math.exp(log_front) * _betacf(a, b, x) / a
+    return 1.0 - math.exp(log_front) * _betacf(b, a, 1.0 - x) / b
+
+
+def t_cdf(t: float, df: float) -> float:
+    """Student t 分布的累积分布函数"""
+    tail = 0.5 * regularized_beta(df / 2.0, 0.5, df / (df + t * t))
+    return 1.0 - tail if t > 0 else tail
+
+
+def t_ppf(q: float, df: float) -> float:
+    """Student t 分布的分位数（二分求解）"""
+    if q == 0.5:
+        return 0.0
+    if q < 0.5:
+        return -t_ppf(1.0 - q, df)
+    low, high = 0.0, 1.0
+    while t_cdf(high, df) < q:
+        high *= 2.0
+    for _ in range(100):
+        mid = (low + high) / 2.0
+        if t_cdf(mid, df) < q:
+            low = mid
+        else:
+            high = mid
+    return (low + high) / 2.0
+
+
+class Measurement(BaseModel):
+    """同一配置下的多次测量"""
+    samples: List[float] = []
+
+    @property
+    def n(self) -> int:
+        return len(self.samples)
+
+    @property
+    def mean(self) -> float:
+        return sum(self.samples) / self.n if self.samples else float("nan")
+
+    @property
+    def variance(self) -> float:
+        if self.n < 2:
+            return 0.0
+        mean = self.mean
+        return sum((x - mean) ** 2 for x in self.samples) / (self.n - 1)
+
+    @property
+    def std(self) -> float:
+        return math.sqrt(self.variance)
+
+    def half_width(self, confidence: float = 0.95) -> float:
+        """均值置信区间的半宽，样本不足 2 个时为无穷大"""
+        if self.n < 2:
+            return float("inf")
+        return t_ppf((1.0 + confidence) / 2.0, self.n - 1) * self.std / math.sqrt(self.n)
+
+    def relative_half_width(self, confidence: float = 0.95) -> float:
+        if not self.samples or self.mean == 0:
+            return float("inf")
+        return self.half_width(confidence) / abs(self.mean)
+
+    def interval(self, confidence: float = 0.95) -> Tuple[float, float]:
+        half = self.half_width(confidence)
+        return self.mean - half, self.mean + half
+
+    def describe(self, confidence: float = 0.95) -> str:
+        """'123.4567 ± 1.2345 秒 (n=3)' 形式的描述"""
+        if self.n < 2:
+            return f"{self.mean:.4f} 秒 (n={self.n})"
+        return f"{self.mean:.4f} ± {self.half_width(confidence):.4f} 秒 (n={self.n})"
+
+
+class MeasurementPolicy(BaseModel):
+    """自适应重复测量策略"""
+    min_repeats: int = 1
+    max_repeats: int = 1
+    rel_precision: float = 0.01    # 置信区间相对半宽的目标
+    confidence: float = 0.95
+
+    def needs_more(self, measurement: Measurement) -> bool:
+        """是否需要继续重复测量"""
+        if measurement.n < self.min_repeats:
+            return True
+        if measurement.n >= self.max_repeats:
+            return False
+        if measurement.n < 2:
+            return True
+        return measurement.relative_half_width(self.confidence) > self.rel_precision
+
+
+class Comparison(BaseModel):
+    """候选配置相对 baseline 的提升"""
+    improvement: float                 # (baseline - candidate) / baseline
+    ci_low: float
+    ci_high: float
+    p_value: Optional[float] = None    # 单侧检验：候选配置比 baseline 快
+    significant: bool = False
+
+    def describe(self) -> str:
+        if self.p_value is None:
+            return f"{self.improvement:.2%} (单次测量，无法做显著性检验)"
+        half = (self.ci_high - self.ci_low) / 2
+        verdict = "显著" if self.significant else "不显著"
+        return f"{self.improvement:.2%} ± {half:.2%}, p={self.p_value:.3f} ({verdict})"
+
+
+def compare(baseline: Measurement, candidate: Measurement, confidence: float = 0.95) -> Comparison:
+    """Welch t 检验比较候选配置与 baseline"""
+    base_mean = baseline.mean
+    improvement = (base_mean - candidate.mean) / base_mean
+    if baseline.n < 2 or candidate.n < 2:
+        # 单次测量无法估计噪声，退化为直接比较
+        return Comparison(improvement=improvement, ci_low=improvement, ci_high=improvement, significant=improvement > 0)
+
+    vb, vc = baseline.variance / baseline.n, candidate.variance / candidate.n
+    se = math.sqrt(vb + vc)
+    diff = base_mean - candidate.mean
+    if se == 0:
+        p_value = 0.0 if diff > 0 else 1.0
+        half = 0.0
+    else:
+        df = (vb + vc) ** 2 / (vb ** 2 / (baseline.n - 1) + vc ** 2 / (candidate.n - 1))
+        p_value = 1.0 - t_cdf(diff / se, df)
+        half = t_ppf((1.0 + confidence) / 2.0, df) * se / base_mean
+    return Comparison(
+        improvement=improvement,
+        ci_low=improvement - half,
+        ci_high=improvement + half,
+        p_value=p_value,
+        significant=p_value < 1.0 - confidence,
+    )
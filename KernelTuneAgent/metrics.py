@@ -0,0 +1,240 @@
+"""
+训练指标提取
+
+训练期间从保存的偏移处增量读取日志新增的完整行（新增内容较多时用 mmap 映射，只解码到最后一个换行符），
+连同标准输出逐行交给一组可插拔的解析器，为每次试验生成结构化的指标记录：
+- RegexParser: 正则匹配，默认匹配 '平均训练耗时: X 秒'
+- JsonLinesParser: 每行一个 JSON 对象，按字段名取值
+- ThroughputParser: 'X samples/sec'、'X img/s' 形式的吞吐
+- EpochTimeParser: 每个 epoch 的耗时
+训练耗时直接由代理读出，不需要 LLM 从日志中查找，也不会因为工具输出被截断而丢失。
+"""
+import json
+import mmap
+import os
+import re
+from typing import Dict, List, Optional
+from pydantic import BaseModel
+
+TRAINING_TIME_PATTERN = re.compile(r"平均训练耗时:\s*([\d.]+)\s*秒")
+DEFAULT_THROUGHPUT_PATTERN = r"(?i)([\d.]+)\s*(?:samples|images|imgs|img|tokens)\s*/\s*s(?:ec)?\b"
+DEFAULT_EPOCH_TIME_PATTERN = r"(?i)epoch\s*\[?\s*\d+(?:\s*/\s*\d+)?\]?.*?(?:time|took|耗时)\s*[:=]?\s*([\d.]+)\s*(?:s\b|sec|秒)"
+
+
+def parse_training_time(text: str) -> Optional[float]:
+    """从文本中提取最后一个 '平均训练耗时: XXX 秒' 数值"""
+    value = None
+    for match in TRAINING_TIME_PATTERN.finditer(text or ""):
+        try:
+            value = float(match.group(1))
+        except ValueError:
+            continue
+    return value
+
+
+class TrialMetrics(BaseModel):
+    """一次试验从日志和标准输出中提取的指标"""
+    training_time: Optional[float] = None      # 最后一次出现的训练耗时（秒）
+    throughput: List[float] = []               # 吞吐读数（样本/秒）
+    epoch_times: List[float] = []              # 每个 epoch 的耗时（秒）
+    values: Dict[str, float] = {}              # 其它命名指标的最后取值
+    lines: int = 0                             # 解析过的行数
+
+    def record(self, name: str, value: float) -> None:
+        if name == "training_time":
+            self.training_time = value
+        elif name == "throughput":
+            self.throughput.append(value)
+        elif name == "epoch_time":
+            self.epoch_times.append(value)
+        else:
+            self.values[name] = value
+
+    @property
+    def mean_throughput(self) -> Optional[float]:
+        return sum(self.throughput) / len(self.throughput) if self.throughput else None
+
+    def describe(self) -> str:
+        """一行指标描述，训练耗时沿用日志中的 '平均训练耗时: X 秒' 格式"""
+        parts = []
+        if self.training_time is not None:
+            parts.append(f"平均训练耗时: {self.training_time} 秒")
+        if self.throughput:
+            parts.append(f"平均吞吐 {self.mean_throughput:.2f} 样本/秒")
+        if self.epoch_times:
+            parts.append(
+                f"{len(self.epoch_times)} 个 epoch, 平均 {sum(self.epoch_times) / len(self.epoch_times):.2f} 秒/epoch"
+            )
+        parts.extend(f"{name}={value:g}" for name, value in self.values.items())
+        return ", ".join(parts)
+
+
+class MetricParser:
+    """解析器基类：逐行解析，把读到的指标写入 TrialMetrics"""
+
+    def feed(self, line: str, metrics: TrialMetrics) -> None:
+        raise NotImplementedError
+
+
+class RegexParser(MetricParser):
+    """正则匹配一个指标，取最后一个分组（或 group 指定的分组）"""
+
+    def __init__(self, name: str, pattern: str, group: Optional[int] = None):
+        self.name = name
+        self.pattern = re.compile(pattern)
+        self.group = group
+
+    def feed(self, line: str, metrics: TrialMetrics) -> None:
+        for match in self.pattern.finditer(line):
+            try:
+                value = float(match.group(self.group if self.group is not None else match.lastindex or 0))
+            except (IndexError, ValueError):
+                continue
+            metrics.record(self.name, value)
+
+
+class ThroughputParser(RegexParser):
+    """吞吐（样本/秒）"""
+
+    def __init__(self, pattern: str = DEFAULT_THROUGHPUT_PATTERN):
+        super().__init__("throughput", pattern)
+
+
+class EpochTimeParser(RegexParser):
+    """每个 epoch 的耗时（秒）"""
+
+    def __init__(self, pattern: str = DEFAULT_EPOCH_TIME_PATTERN):
+        super().__init__("epoch_time", pattern)
+
+
+class JsonLinesParser(MetricParser):
+    """每行一个 JSON 对象，fields 为 指标名 -> JSON 字段名（支持 a.b 形式的嵌套字段）"""
+
+    def __init__(self, fields: Dict[str, str]):
+        self.fields = fields
+
+    def feed(self, line: str, metrics: TrialMetrics) -> None:
+        line = line.strip()
+        if not line.startswith("{"):
+            return
+        try:
+            record = json.loads(line)
+        except json.JSONDecodeError:
+            return
+        for name, key in self.fields.items():
+            value = record
+            for part in key.split("."):
+                value = value.get(part) if isinstance(value, dict) else None
+            if isinstance(value, (int, float)) and not isinstance(value, bool):
+                metrics.record(name, float(value))
+
+
+def default_parsers(
+    training_time_pattern: str = TRAINING_TIME_PATTERN.pattern,
+    json_fields: str = "",
+    throughput_pattern: str = DEFAULT_THROUGHPUT_PATTERN,
+    epoch_time_pattern: str = DEFAULT_EPOCH_TIME_PATTERN
+) -> List[MetricParser]:
+    """
+    按配置生成解析器。json_fields 为 'training_time=train_time, throughput=samples_per_sec' 形式，
+    为空时不解析 JSON 行；某个正则为空字符串时不启用对应的解析器。
+    """
+    parsers: List[MetricParser] = []
+    if training_time_pattern:
+        parsers.append(RegexParser("training_time", training_time_pattern))
+    fields = dict(
+        item.split("=", 1) for item in (part.strip() for part in json_fields.split(",")) if "=" in item
+    )
+    if fields:
+        parsers.append(JsonLinesParser({name.strip(): key.strip() for name, key in fields.items()}))
+    if throughput_pattern:
+        parsers.append(ThroughputParser(throughput_pattern))
+    if epoch_time_pattern:
+        parsers.append(EpochTimeParser(epoch_time_pattern))
+    return parsers
+
+
+class LogTailer:
+    """
+    从保存的偏移处增量读取日志中新增的完整行。
+    未以换行结束的半行留在文件中，下次读取时再取；新增内容超过 mmap_threshold 时用 mmap 映射文件，
+    在映射上查找最后一个换行符，只拷贝和解码完整的行。
+    """
+
+    def __init__(self, path: str, mmap_threshold: int = 1 << 20):
+        self.path = path
+        self.mmap_threshold = mmap_threshold
+        self.offset = 0
+        self.seen_size = 0             # 最近一次看到的文件大小，用于判断日志是否仍在增长
+        self.bytes_read = 0
+
+    def reset(self, offset: Optional[int] = None) -> None:
+        """从 offset 处开始读取，默认从文件当前末尾开始（只读取之后新增的内容）"""
+        if offset is None:
+            try:
+                offset = os.path.getsize(self.path)
+            except OSError:
+                offset = 0
+        self.offset = offset
+        self.seen_size = offset
+
+    def read_lines(self, final: bool = False) -> List[str]:
+        """读取新增的完整行；final 为 True 时连同末尾的半行一起读出"""
+        try:
+            size = os.path.getsize(self.path)
+        except OSError:
+            return []
+        self.seen_size = size
+        if size < self.offset:
+            # 日志被截断或重建，从头读取
+            self.offset = 0
+        if size == self.offset:
+            return []
+        try:
+            with open(self.path, "rb") as f:
+                if size - self.offset >= self.mmap_threshold:
+                    with mmap.mmap(f.fileno(), size, access=mmap.ACCESS_READ) as mapped:
+                        end = size if final else mapped.rfind(b"\n", self.offset, size) + 1
+                        data = mapped[self.offset:end] if end > self.offset else b""
+                else:
+                    f.seek(self.offset)
+                    data = f.read(size - self.offset)
+                    if not final:
+                        data = data[:data.rfind(b"\n") + 1]
+        except (OSError, ValueError):
+            return []
+        self.offset += len(data)
+        self.bytes_read += len(data)
+        return data.decode("utf-8", errors="replace").splitlines()
+
+
+class MetricExtractor:
+    """增量读取训练日志，把日志和标准输出的每一行交给解析器，生成本次试验的指标记录"""
+
+    def __init__(self, log_path: str, parsers: Optional[List[MetricParser]] = None, mmap_threshold: int = 1 << 20):
+        self.tailer = LogTailer(log_path, mmap_threshold=mmap_threshold)
+        self.parsers = parsers if parsers is not None else default_parsers()
+        self.metrics = TrialMetrics()
+
+    def start(self) -> None:
+        """开始一次新的试验：清空指标，从日志当前末尾开始读取"""
+        self.metrics = TrialMetrics()
+        self.tailer.reset()
+
+    def feed(self, line: str) -> None:
+        for parser in self.parsers:
+            parser.feed(line, self.metrics)
+        self.metrics.lines += 1
+
+    def poll(self, final: bool = False) -> List[str]:
+        """读取日志新增的行（不解析，调用方逐行 feed）"""
+        return self.tailer.read_lines(final=final)
+
+    def extract(self, text: str) -> TrialMetrics:
+        """解析一段完整文本，不影响当前试验的指标"""
+        metrics = TrialMetrics()
+        for line in (text or "").splitlines():
+            for parser in self.parsers:
+                parser.feed(line, metrics)
+            metrics.lines += 1
+        return metrics
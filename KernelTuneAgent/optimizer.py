@@ -0,0 +1,310 @@
+"""
+参数推荐优化器
+
+根据 SearchSpace 和历史试验结果推荐下一组配置。目标是最小化训练耗时。
+- RandomSearchOptimizer: 随机搜索，作为对照
+- BayesianOptimizer: 高斯过程代理模型 + 期望提升(EI) 采集函数
+"""
+import math
+import random
+from abc import ABC, abstractmethod
+from typing import Dict, List, Optional, Tuple
+from KernelTuneAgent.search_space import SearchSpace
+
+
+class BaseOptimizer(ABC):
+    """优化器基类"""
+
+    def __init__(self, space: SearchSpace, seed: Optional[int] = None):
+        self.space = space
+        self.rng = random.Random(seed)
+        self.observations: List[Tuple[Dict[str, str], float]] = []
+        # 先验观测：由历史会话估计的耗时，只参与代理模型拟合，不计入最优结果，被实际观测取代
+        self.priors: List[Tuple[Dict[str, str], float]] = []
+        # 删失观测：被提前终止的试验及其耗时估计，只知道比完成的试验慢，不计入最优结果，
+        # 拟合代理模型时按惩罚值处理（见 penalized）
+        self.censored: List[Tuple[Dict[str, str], float]] = []
+        # 已推荐但尚未观测到结果的配置，推荐时视为已访问
+        self._pending: set = set()
+
+    def observe(self, config: Dict[str, object], value: float) -> None:
+        """记录一次试验结果（训练耗时，越小越好）"""
+        if value is None:
+            return
+        snapped = self.space.snap(config)
+        key = self.space.key(snapped)
+        self._pending.discard(key)
+        self.priors = [(c, v) for c, v in self.priors if self.space.key(c) != key]
+        self.observations.append((snapped, float(value)))
+
+    def observe_censored(self, config: Dict[str, object], bound: float) -> None:
+        """记录一次被提前终止的试验，bound 为其训练耗时的估计（不低于最快的完成试验）"""
+        if bound is None:
+            return
+        snapped = self.space.snap(config)
+        key = self.space.key(snapped)
+        self._pending.discard(key)
+        self.priors = [(c, v) for c, v in self.priors if self.space.key(c) != key]
+        self.censored.append((snapped, float(bound)))
+
+    def penalized(self) -> List[Tuple[Dict[str, str], float]]:
+        """删失观测的惩罚值：耗时估计与最差的完成观测中的较大者"""
+        worst = max((value for _, value in self.observations), default=0.0)
+        return [(config, max(bound, worst)) for config, bound in self.censored]
+
+    def add_prior(self, config: Dict[str, object], value: float) -> None:
+        """记录一次先验观测（预估的训练耗时），已有实际观测的配置忽略"""
+        snapped = self.space.snap(config)
+        key = self.space.key(snapped)
+        if any(self.space.key(c) == key for c, _ in self.observations + self.censored + self.priors):
+            return
+        self.priors.append((snapped, float(value)))
+
+    def best(self) -> Optional[Tuple[Dict[str, str], float]]:
+        if not self.observations:
+            return None
+        return min(self.observations, key=lambda item: item[1])
+
+    def _visited(self) -> set:
+        return {self.space.key(config) for config, _ in self.observations + self.censored} | self._pending
+
+    def _random_unvisited(self, tries: int = 200) -> Dict[str, str]:
+        visited = self._visited()
+        config = self.space.sample(self.rng)
+        for _ in range(tries):
+            if self.space.key(config) not in visited:
+                break
+            config = self.space.sample(self.rng)
+        return config
+
+    @abstractmethod
+    def suggest(self) -> Dict[str, str]:
+        """推荐下一组配置"""
+        pass
+
+    def suggest_batch(self, n: int) -> List[Dict[str, str]]:
+        """一次推荐 n 组互不相同的配置"""
+        batch = []
+        for _ in range(n):
+            config = self.suggest()
+            self._pending.add(self.space.key(config))
+            batch.append(config)
+        return batch
+
+    def score_candidates(self, configs: List[Dict[str, str]]) -> Optional[List[float]]:
+        """用代理模型给候选配置打分（越大越好），没有代理模型时返回 None"""
+        return None
+
+    def mark_pending(self, config: Dict[str, object]) -> None:
+        """标记一组正在评估的配置，结果出来之前不再重复推荐"""
+        self._pending.add(self.space.key(config))
+
+    def clear_pending(self) -> None:
+        """丢弃未观测到结果的推荐（例如被淘汰的低 fidelity 候选）"""
+        self._pending.clear()
+
+    def plausible_outcomes(self) -> List[float]:
+        """在途试验可能的结果：与当前最优相当（好）和与最差观测相当（差），没有观测时为空"""
+        values = [value for _, value in self.observations]
+        if not values:
+            return []
+        return sorted({min(values), max(values)})
+
+    def suggest_conditioned(self, config: Dict[str, object], outcomes: List[float]) -> List[Dict[str, str]]:
+        """
+        在途配置分别假设取得 outcomes 中的每个结果（常数谎言）时的下一组推荐，与 outcomes 一一对应。
+        假设的观测只在推荐期间临时加入，不影响实际观测
+        """
+        snapped = self.space.snap(config)
+        suggestions = []
+        for value in outcomes:
+            self.observations.append((snapped, float(value)))
+            try:
+                suggestions.append(self.suggest())
+            finally:
+                self.observations.pop()
+        return suggestions
+
+
+class RandomSearchOptimizer(BaseOptimizer):
+    """随机搜索"""
+
+    def suggest(self) -> Dict[str, str]:
+        return self._random_unvisited()
+
+
+def _matern52(a: List[float], b: List[float], lengthscale: float) -> float:
+    d2 = 0.0
+    for x, y in zip(a, b):
+        d2 += (x - y) * (x - y)
+    r = math.sqrt(5.0 * d2) / lengthscale
+    return (1.0 + r + r * r / 3.0) * math.exp(-r)
+
+
+def _cholesky(matrix: List[List[float]]) -> List[List[float]]:
+    n = len(matrix)
+    lower = [[0.0] * n for _ in range(n)]
+    for i in range(n):
+        for j in range(i + 1):
+            s = matrix[i][j] - sum(lower[i][k] * lower[j][k] for k in range(j))
+            if i == j:
+                lower[i][j] = math.sqrt(max(s, 1e-12))
+            else:
+                lower[i][j] = s / lower[j][j]
+    return lower
+
+
+def _solve_lower(lower: List[List[float]], b: List[float]) -> List[float]:
+    x = [0.0] * len(b)
+    for i in range(len(b)):
+        x[i] = (b[i] - sum(lower[i][k] * x[k] for k in range(i))) / lower[i][i]
+    return x
+
+
+def _solve_upper_t(lower: List[List[float]], b: List[float]) -> List[float]:
+    """求解 L^T x = b"""
+    n = len(b)
+    x = [0.0] * n
+    for i in reversed(range(n)):
+        x[i] = (b[i] - sum(lower[k][i] * x[k] for k in range(i + 1, n))) / lower[i][i]
+    return x
+
+
+class GaussianProcess:
+    """零均值高斯过程，输入为 [0,1] 特征，输出做标准化"""
+
+    LENGTHSCALES = (0.1, 0.2, 0.4, 0.8, 1.6)
+
+    def __init__(self, noise: float = 1e-2):
+        self.noise = noise
+        self.lengthscale = 0.4
+        self.x: List[List[float]] = []
+        self._y: List[float] = []
+        self.y_mean = 0.0
+        self.y_std = 1.0
+        self._lower: List[List[float]] = []
+        self._alpha: List[float] = []
+
+    def _factor(self, lengthscale: float) -> Tuple[List[List[float]], List[float], float]:
+        n = len(self.x)
+        k = [
+            [_matern52(self.x[i], self.x[j], lengthscale) + (self.noise if i == j else 0.0) for j in range(n)]
+            for i in range(n)
+        ]
+        lower = _cholesky(k)
+        alpha = _solve_upper_t(lower, _solve_lower(lower, self._y))
+        # 对数边际似然（省略常数项）
+        log_likelihood = -0.5 * sum(a * b for a, b in zip(self._y, alpha)) - sum(math.log(lower[i][i]) for i in range(n))
+        return lower, alpha, log_likelihood
+
+    def fit(self, x: List[List[float]], y: List[float]) -> None:
+        self.x = x
+        self.y_mean = sum(y) / len(y)
+        variance = sum((v - self.y_mean) ** 2 for v in y) / len(y)
+        self.y_std = math.sqrt(variance) if variance > 0 else 1.0
+        self._y = [(v - self.y_mean) / self.y_std for v in y]
+        best = None
+        for lengthscale in self.LENGTHSCALES:
+            lower, alpha, log_likelihood = self._factor(lengthscale)
+            if best is None or log_likelihood > best[0]:
+                best = (log_likelihood, lengthscale, lower, alpha)
+        _, self.lengthscale, self._lower, self._alpha = best
+
+    def predict(self, x: List[float]) -> Tuple[float, float]:
+        """返回原始尺度下的 (均值, 标准差)"""
+        k_star = [_matern52(x, xi, self.lengthscale) for xi in self.x]
+        mean = sum(a * b for a, b in zip(k_star, self._alpha))
+        v = _solve_lower(self._lower, k_star)
+        variance = max(1.0 - sum(t * t for t in v), 1e-12)
+        return self.y_mean + mean * self.y_std, math.sqrt(variance) * self.y_std
+
+
+def expected_improvement(mean: float, std: float, best: float, xi: float = 0.0) -> float:
+    """最小化问题的期望提升"""
+    if std <= 0:
+        return max(best - mean - xi, 0.0)
+    improvement = best - mean - xi
+    z = improvement / std
+    cdf = 0.5 * (1.0 + math.erf(z / math.sqrt(2.0)))
+    pdf = math.exp(-0.5 * z * z) / math.sqrt(2.0 * math.pi)
+    return improvement * cdf + std * pdf
+
+
+class BayesianOptimizer(BaseOptimizer):
+    """
+    贝叶斯优化：用高斯过程拟合 (配置 -> 训练耗时)，
+    在随机候选和当前最优邻域候选中选取期望提升最大的配置。
+    """
+
+    def __init__(
+        self,
+        space: SearchSpace,
+        seed: Optional[int] = None,
+        n_initial: int = 3,
+        n_candidates: int = 500,
+        n_local: int = 100,
+        xi: float = 0.01
+    ):
+        super().__init__(space, seed)
+        self.n_initial = n_initial
+        self.n_candidates = n_candidates
+        self.n_local = n_local
+        self.xi = xi
+        self.gp = GaussianProcess()
+
+    def _fit(self) -> None:
+        data = self.observations + self.penalized() + self.priors
+        x = [self.space.encode(config) for config, _ in data]
+        y = [value for _, value in data]
+        self.gp.fit(x, y)
+
+    def score(self, config: Dict[str, str]) -> float:
+        """候选配置的期望提升，观测不足时返回 0"""
+        if len(self.observations) < 2:
+            return 0.0
+        mean, std = self.gp.predict(self.space.encode(config))
+        best_value = self.best()[1]
+        return expected_improvement(mean, std, best_value, self.xi * abs(best_value))
+
+    def score_candidates(self, configs: List[Dict[str, str]]) -> Optional[List[float]]:
+        """按期望提升给候选配置打分，观测不足 n_initial 次时返回 None"""
+        if len(self.observations) < self.n_initial:
+            return None
+        self._fit()
+        return [self.score(config) for config in configs]
+
+    def suggest(self) -> Dict[str, str]:
+        if len(self.observations) < self.n_initial:
+            return self._random_unvisited()
+
+        self._fit()
+        visited = self._visited()
+        best_config = self.best()[0]
+        candidates = [self.space.sample(self.rng) for _ in range(self.n_candidates)]
+        candidates += [self.space.neighbor(best_config, self.rng) for _ in range(self.n_local)]
+
+        chosen, chosen_score = None, -1.0
+        for config in candidates:
+            if self.space.key(config) in visited:
+                continue
+            score = self.score(config)
+            if score > chosen_score:
+                chosen, chosen_score = config, score
+        return chosen if chosen is not None else self._random_unvisited()
+
+
+OPTIMIZERS = {
+    "bo": BayesianOptimizer,
+    "bayesian": BayesianOptimizer,
+    "random": RandomSearchOptimizer,
+}
+
+
+def create_optimizer(name: str, space: SearchSpace, seed: Optional[int] = None) -> Optional[BaseOptimizer]:
+    """按名称创建优化器，名称为空或 none 时返回 None"""
+    key = (name or "").strip().lower()
+    if key in ("", "none", "off", "false"):
+        return None
+    if key not in OPTIMIZERS:
+        raise ValueError(f"未知的优化器: {name}，可选: {', '.join(OPTIMIZERS)}")
+    return OPTIMIZERS[key](space, seed=seed)
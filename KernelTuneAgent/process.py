@@ -0,0 +1,192 @@
+"""
+异步子进程执行
+
+所有命令都通过 asyncio.create_subprocess_exec 在独立会话中启动，执行期间不阻塞事件循环：
+- 标准输出/标准错误增量读取，只保留末尾 max_output_bytes 字节
+- 超时、看门狗（长时间无输出）、任务取消、回调请求终止时，终止整个进程组
+"""
+import asyncio
+import os
+import signal
+import time
+from collections import deque
+from typing import Callable, List, Optional
+from pydantic import BaseModel
+
+READ_CHUNK_SIZE = 65536
+
+
+class ProcessResult(BaseModel):
+    """子进程执行结果"""
+    returncode: Optional[int] = None
+    stdout: str = ""
+    stderr: str = ""
+    wall_time: float = 0.0
+    timed_out: bool = False        # 超过总超时时间
+    idle_timed_out: bool = False   # 看门狗：长时间没有任何输出
+    stopped: bool = False          # on_line 回调请求终止
+    truncated: bool = False        # 输出超过上限，只保留了末尾部分
+
+
+class TailBuffer:
+    """只保留末尾若干字节的输出缓冲"""
+
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        self.chunks = deque()
+        self.size = 0
+        self.truncated = False
+
+    def append(self, data: bytes) -> None:
+        self.chunks.append(data)
+        self.size += len(data)
+        while self.size > self.max_bytes and self.chunks:
+            overflow = self.size - self.max_bytes
+            head = self.chunks[0]
+            if len(head) <= overflow:
+                self.chunks.popleft()
+                self.size -= len(head)
+            else:
+                self.chunks[0] = head[overflow:]
+                self.size -= overflow
+            self.truncated = True
+
+    def text(self) -> str:
+        return b"".join(self.chunks).decode("utf-8", errors="replace")
+
+
+class Watchdog:
+    """记录最近一次活动时间，超过 idle_timeout 没有活动即视为卡死"""
+
+    def __init__(self, idle_timeout: Optional[float]):
+        self.idle_timeout = idle_timeout
+        self.last_activity = time.monotonic()
+
+    def touch(self) -> None:
+        self.last_activity = time.monotonic()
+
+    def expired(self) -> bool:
+        if not self.idle_timeout:
+            return False
+        return time.monotonic() - self.last_activity > self.idle_timeout
+
+
+async def kill_process_group(process: asyncio.subprocess.Process, grace: float = 5.0) -> None:
+    """
+    先发 SIGTERM，宽限期后仍未退出再发 SIGKILL，作用于整个进程组。
+    主进程已经退出时仍会向进程组发送信号，清理残留的子进程。
+    """
+    for sig, wait in ((signal.SIGTERM, grace), (signal.SIGKILL, None)):
+        try:
+            os.killpg(process.pid, sig)
+        except (ProcessLookupError, PermissionError):
+            return
+        try:
+            await asyncio.wait_for(process.wait(), timeout=wait)
+            return
+        except asyncio.TimeoutError:
+            continue
+
+
+async def run_process(
+    args: List[str],
+    timeout: Optional[float] = None,
+    watchdog: Optional[Watchdog] = None,
+    max_output_bytes: int = 1024 * 1024,
+    on_line: Optional[Callable[[str], bool]] = None,
+    stop_event: Optional[asyncio.Event] = None,
+    env: Optional[dict] = None,
+    kill_grace: float = 5.0,
+    poll_interval: float = 1.0,
+    on_start: Optional[Callable[[int], None]] = None
+) -> ProcessResult:
+    """
+    执行子进程并等待结束。
+
+    on_line 会收到标准输出和标准错误的每一行，返回 True 时终止进程组；
+    外部也可以通过 stop_event 请求终止。
+    on_start 在进程启动后收到其 pid（同时也是会话 ID 和进程组 ID）。
+    任务被取消时同样会先终止进程组，再把 CancelledError 继续抛出。
+    """
+    result = ProcessResult()
+    stdout_buffer = TailBuffer(max_output_bytes)
+    stderr_buffer = TailBuffer(max_output_bytes)
+    stop_requested = stop_event or asyncio.Event()
+    start = time.monotonic()
+
+    process = await asyncio.create_subprocess_exec(
+        *args,
+        stdout=asyncio.subprocess.PIPE,
+        stderr=asyncio.subprocess.PIPE,
+        env=env,
+        start_new_session=True,
+    )
+    if on_start is not None:
+        on_start(process.pid)
+
+    async def pump(stream: asyncio.StreamReader, buffer: TailBuffer) -> None:
+        pending = b""
+        while True:
+            chunk = await stream.read(READ_CHUNK_SIZE)
+            if not chunk:
+                break
+            buffer.append(chunk)
+            if watchdog is not None:
+                watchdog.touch()
+            if on_line is None:
+                continue
+            pending += chunk
+            *lines, pending = pending.split(b"\n")
+            for line in lines:
+                if on_line(line.decode("utf-8", errors="replace")):
+                    stop_requested.set()
+            if len(pending) > max_output_bytes:
+                pending = pending[-max_output_bytes:]
+        if on_line is not None and pending:
+            if on_line(pending.decode("utf-8", errors="replace")):
+                stop_requested.set()
+
+    async def supervise() -> None:
+        """超时、看门狗和终止请求的检查"""
+        while True:
+            if stop_requested.is_set():
+                result.stopped = True
+                return
+            if timeout is not None and time.monotonic() - start > timeout:
+                result.timed_out = True
+                return
+            if watchdog is not None and watchdog.expired():
+                result.idle_timed_out = True
+                return
+            try:
+                await asyncio.wait_for(stop_requested.wait(), timeout=poll_interval)
+            except asyncio.TimeoutError:
+                pass
+
+    readers = asyncio.gather(pump(process.stdout, stdout_buffer), pump(process.stderr, stderr_buffer))
+    finished = asyncio.ensure_future(asyncio.gather(readers, process.wait()))
+    supervisor = asyncio.ensure_future(supervise())
+    try:
+        await asyncio.wait({finished, supervisor}, return_when=asyncio.FIRST_COMPLETED)
+        if not finished.done():
+            await kill_process_group(process, kill_grace)
+            await finished
+    except asyncio.CancelledError:
+        await kill_process_group(process, kill_grace)
+        finished.cancel()
+        raise
+    finally:
+        supervisor.cancel()
+
+    result.stopped = result.stopped or stop_requested.is_set()
+    result.returncode = process.returncode
+    result.stdout = stdout_buffer.text()
+    result.stderr = stderr_buffer.text()
+    result.truncated = stdout_buffer.truncated or stderr_buffer.truncated
+    result.wall_time = time.monotonic() - start
+    return result
+
+
+async def run_shell(command: str, **kwargs) -> ProcessResult:
+    """用 bash -c 执行一条命令行"""
+    return await run_process(["/bin/bash", "-c", command], **kwargs)
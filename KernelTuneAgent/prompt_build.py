@@ -1,18 +1,56 @@
 """生成系统提示词和反馈提示词"""
-from pydantic import BaseModel, create_model
-from typing import Dict, Any
-from enum import Enum
-from KernelTuneAgent.config import FIXED_SYSCTL_PARAMS,Phase,DYNAMIC_SYSCTL_PARAMS,SYSCTL_PARAM_META
+from pydantic import BaseModel, BeforeValidator, Field, create_model
+import copy
+import os
+from typing import Annotated, Dict, Any, List, Optional, Type
+from KernelTuneAgent.config import Phase,SYSCTL_PARAM_META,ImpactLevel,merge_catalog
+from KernelTuneAgent.hardware import HardwareProbe, HardwareProfile, apply_device_defaults, scale_param_meta
+from KernelTuneAgent.sysctl import sysctl_path
+from KernelTuneAgent.schema import TrialRecord
+from KernelTuneAgent.search_space import SearchSpace
+from KernelTuneAgent.settings import AgentSettings
 
 class PromptBuilder:
     def __init__(self, config_path: str = "./sys.config"):
         self.config_path = config_path
         self.train_cmd=""
+        self.target= 0.08
+        self.log_path = "/root/dongjing/result.log"
+        self.options: Dict[str, str] = {}
         self.sys_cfg = self._load_sys_config()
-        #self.SysctlConfig = self._build_sysctl_config()
+        # 代理使用的设置，按字段类型解析一次
+        self.settings = AgentSettings.from_options(self.options)
+        # 额外的参数目录（逗号分隔），与内置的 tunables.toml 合并，同名参数以后者为准
+        for path in filter(None, (p.strip() for p in self.get_option("tunable catalog").split(","))):
+            print(f"📖 加载参数目录 {path}: {', '.join(merge_catalog(path))}")
+        # 本机的参数表：按硬件缩放范围、按块设备替换默认值都只作用于这份拷贝，不改动全局的参数目录
+        self.param_meta: Dict[str, Dict] = copy.deepcopy(SYSCTL_PARAM_META)
+        # 硬件探测：生成实验环境描述；sys.config 未显式配置的动态参数开关由硬件决定，内存相关参数的范围按本机缩放
+        self.hardware: Optional[HardwareProfile] = None
+        if self.get_bool_option("hardware probe", default=True):
+            self.hardware = HardwareProbe(self.get_option("hardware root", "/")).probe()
+            for switch, enabled in self.hardware.switches().items():
+                self.sys_cfg.setdefault(switch, enabled)
+            if self.get_bool_option("scale ranges", default=True):
+                scale_param_meta(self.param_meta, self.hardware)
+        # 块设备参数的调优对象：sys.config 指定的设备，否则为探测到的容量最大的磁盘
+        self.block_device = self.get_option("block device")
+        disk = self.hardware.primary_disk() if self.hardware is not None else None
+        if not self.block_device and disk is not None:
+            self.block_device = disk.name
+        if disk is not None and disk.name == self.block_device:
+            apply_device_defaults(self.param_meta, disk)
+        self.active_params = self._resolve_active_params()
+        # 结构化输出：LLM 调用 run_trial 一次性给出整组配置，由代理校验、对齐、应用并训练
+        self.structured_config = self.get_bool_option("structured config", default=True)
+        # 批量候选：一次请求 batch_candidates 组配置，预筛选后只训练前 batch_top_k 组
+        self.batch_candidates = max(1, int(self.get_option("batch candidates", "1")))
+        self.batch_top_k = max(1, int(self.get_option("batch top k", "1")))
+        # 参数筛选的结果：冻结为默认值的参数不再出现在配置模型中，其余参数使用实测的 impact 等级
+        self.frozen_params: Dict[str, str] = {}
+        self.impact_overrides: Dict[str, ImpactLevel] = {}
+        self.SysctlConfig = self._build_sysctl_config()
         self.param_info = self._build_param_info()
-        self.target= 0.08
-    # TODO:读取所有实验环境、路径信息
     def _load_sys_config(self) -> Dict[str, bool]:
         """从配置文件加载参数开关"""
         cfg = {}
@@ -25,11 +63,16 @@ class PromptBuilder:
                     key, value = line.split(":", 1)
                     key = key.strip().lower()
                     value = value.strip()
+                    self.options[key] = value
 
                     # 读取训练命令
                     if key in ["train command", "train_command"]:
                         self.train_cmd = value
                         continue
+                    # 读取训练日志路径
+                    if key in ["log file", "log_file"]:
+                        self.log_path = value
+                        continue
                     # 🎯 读取 target 目标值
                     if key in ["target", "target_ratio", "improvement_target"]:
                         try:
@@ -46,50 +89,134 @@ class PromptBuilder:
         return cfg
 
     def _collect_sysctl_fields(self) -> Dict[str, tuple]:
+        """
+        固定参数 + 开关打开的动态参数，不含参数筛选冻结的参数。
+        参数名含 '.' 和 '-'，字段名用下划线替换，原名作为 alias。
+        整数参数允许模型给出 "10" 这样的字符串，离散参数统一转为字符串，取值对齐在校验之后单独进行。
+        """
         fields = {}
-
-        # 固定参数：无条件加入
-        for name in FIXED_SYSCTL_PARAMS:
-            fields[name] = (int, ...)
-
-        # 动态参数：由 sys.config 控制
-        for name, spec in DYNAMIC_SYSCTL_PARAMS.items():
-            if self.sys_cfg.get(spec["switch"], False):
-                fields[name] = (int, ...)
-
+        space = SearchSpace.from_meta(self.get_active_param_names(), self.param_meta)
+        for name, spec in space.specs.items():
+            if name in self.frozen_params:
+                continue
+            field_name = name.replace(".", "_").replace("-", "_")
+            if spec.kind == "int":
+                annotation = int
+                extra = {"minimum": spec.low, "maximum": spec.high}
+                description = f"range {spec.low}-{spec.high}, step {spec.step}, default {spec.default}"
+            else:
+                annotation = Annotated[str, BeforeValidator(lambda v: str(v).strip())]
+                extra = {"enum": spec.choices}
+                description = f"choices {'/'.join(spec.choices)}, default {spec.default}"
+            fields[field_name] = (
+                annotation,
+                Field(..., alias=name, description=description, json_schema_extra=extra),
+            )
         return fields
 
-    #def _build_sysctl_config(self):
-    #    fields = self._collect_sysctl_fields()
-    #    model_name = f"SysctlConfig_{hash(frozenset(self.sys_cfg.items()))}"
-    #    return create_model(model_name, **fields, __base__=BaseModel)
+    def _build_sysctl_config(self) -> Type[BaseModel]:
+        fields = self._collect_sysctl_fields()
+        model_name = f"SysctlConfig_{abs(hash((frozenset(self.sys_cfg.items()), frozenset(self.frozen_params))))}"
+        return create_model(model_name, **fields, __base__=BaseModel)
 
     def _build_param_info(self) -> str:
         lines = []
-        for name, meta in SYSCTL_PARAM_META.items():
-            sw = meta.get("switch")
-            if sw is not None and not self.sys_cfg.get(sw, False):
+        for name in self.get_active_param_names():
+            meta = self.param_meta[name]
+            if name in self.frozen_params:
                 continue
             line = (
                 f"{name}: range {meta['range']}, "
                 f"default {meta['default']}, "
                 f"step {meta['step']}, "
-                f"impact {meta['impact']}, " 
+                f"impact {self.impact_overrides.get(name, meta['impact'])}, " 
                 f"coupling {meta['coupling']}." 
             )
             lines.append(line)
+        if self.frozen_params:
+            frozen = ", ".join(f"{name}={value}" for name, value in self.frozen_params.items())
+            lines.append(f"以下参数经筛选对训练耗时没有显著影响，已固定为默认值，不要修改: {frozen}")
         return "\n".join(lines)
+    def apply_screening(self, frozen: Dict[str, str], impacts: Dict[str, ImpactLevel]) -> None:
+        """采用参数筛选结果：冻结的参数移出配置模型，参数描述改用实测的 impact 等级"""
+        self.frozen_params = dict(frozen)
+        self.impact_overrides = dict(impacts)
+        self.SysctlConfig = self._build_sysctl_config()
+        self.param_info = self._build_param_info()
+
     def get_param_info(self) -> str:
         """返回当前启用的 sysctl 参数描述信息（多行字符串）"""
         return self.param_info
 
-    # TODO:改成动态加载
+    def get_environment_info(self) -> str:
+        """实验环境描述：探测到的硬件信息和 sys.config 中配置的模型名称"""
+        lines = self.hardware.describe() if self.hardware is not None else []
+        if not lines:
+            lines = ["未探测硬件信息"]
+        model = self.get_option("model")
+        if model:
+            lines.append(f"深度学习模型: {model}")
+        return "\n                    ".join(lines)
+
+    def get_option(self, key: str, default: str = "") -> str:
+        """返回 sys.config 中某一项的原始字符串取值"""
+        return self.options.get(key, default)
+
+    def get_bool_option(self, key: str, default: bool = False) -> bool:
+        """返回 sys.config 中某一项的布尔取值"""
+        if key not in self.options:
+            return default
+        return self.options[key].lower() == "true"
+
+    def sysctl_roots(self) -> Dict[str, str]:
+        """参数文件的根目录，均可配置为伪造的 sysfs 目录树"""
+        block_root = ""
+        if self.block_device:
+            block_root = os.path.join(self.get_option("block root", "/sys/block"), self.block_device)
+        return {
+            "proc_root": self.get_option("proc root", "/proc/sys"),
+            "mm_root": self.get_option("mm root", "/sys/kernel/mm"),
+            "block_root": block_root,
+        }
+
+    def _resolve_active_params(self) -> List[str]:
+        """
+        固定参数 + 开关打开的动态参数；声明了 requires = "exists" 的参数只在文件存在时启用，
+        内核版本不支持或没有指定块设备时自动跳过
+        """
+        roots = self.sysctl_roots()
+        names = []
+        skipped = []
+        for name, meta in self.param_meta.items():
+            sw = meta.get("switch")
+            if sw is not None and not self.sys_cfg.get(sw, False):
+                continue
+            if meta.get("requires") == "exists":
+                path = sysctl_path(name, **roots)
+                if not path or not os.path.exists(path):
+                    skipped.append(name)
+                    continue
+            names.append(name)
+        if skipped:
+            print(f"⚠️ 以下参数在本机不存在，已跳过: {', '.join(skipped)}")
+        return names
+
+    def get_active_param_names(self) -> List[str]:
+        """返回当前启用的参数名列表（固定参数 + 开关打开且本机支持的动态参数）"""
+        return list(self.active_params)
+
     # 运行训练命令: python /root/dongjing/model/resnet50.py
     # ./lora.sh
     def build_system_prompt_messages(self) -> str:
         train_cmd = self.train_cmd if self.train_cmd else "未配置训练命令"
 
         """构建第一轮推荐 sysctl 配置的 prompt（用于获取 baseline）"""
+        trial_tool_desc = ""
+        if self.structured_config and self.train_cmd:
+            if self.batch_candidates > 1:
+                trial_tool_desc = "run_trials: 提交一批候选配置，自动判重、检查约束并排序，只训练最有希望的几组，返回训练耗时"
+            else:
+                trial_tool_desc = "run_trial: 提交一整组参数配置，自动校验、对齐到合法取值、应用并训练，返回训练耗时"
         content = (
             f"""
                 根据实验环境推荐 sysctl 配置,运行训练命令,获取日志信息,得到默认系统配置下的训练时长。之后进行配置推荐，并修改参数,运行训练命令，获取新的配置下日志信息。重复这一过程。
@@ -98,29 +225,19 @@ class PromptBuilder:
                     python_execute: 执行Python代码
                     file_editor: 读写文件和查看目录
                     bash_execute: 执行命令行命令
+                    sysctl_apply: 一次性修改全部内核参数并读回生效值，取值会按范围和步长校验
+                    {trial_tool_desc}
 
                 【实验环境】
-                    CPU: 48 cores
-                    内存: 366GB
-                    磁盘: 250GB SSD
-                    操作系统: Ubuntu 22.04
-                    深度学习模型: ResNet50
+                    {self.get_environment_info()}
 
                 【常用命令】
                     运行训练命令: {train_cmd}
-                    获取日志信息命令: grep "平均训练耗时:" /root/dongjing/result.log && rm -f /root/dongjing/result.log
-                    修改参数命令:    sysctl -w fs.file-max=XXX
-                                    sysctl -w kernel.threads-max=XXX
-                                    sysctl -w vm.watermark_scale_factor=XXX
-                                    sysctl -w vm.dirty_background_ratio=XXX
-                                    sysctl -w vm.dirty_expire_centisecs=XXX
-                                    sysctl -w vm.dirty_ratio=XXX
-                                    sysctl -w vm.dirty_writeback_centisecs=XXX
-                                    sysctl -w vm.overcommit_memory=XXX
-                                    sysctl -w vm.overcommit_ratio=XXX
-                                    sysctl -w vm.page-cluster=XXX
-                                    sysctl -w vm.swappiness=XXX
-                                    echo always > /sys/kernel/mm/transparent_hugepage/enabled 
+                    获取日志信息命令: grep "平均训练耗时:" {self.log_path} && rm -f {self.log_path}
+                    修改参数: 调用一次 sysctl_apply，action 为 apply，config 中包含全部要修改的参数，例如
+                              {{"vm.swappiness": "10", "vm.dirty_ratio": "40", "transparent_hugepage": "always"}}
+                    读取当前参数: sysctl_apply，action 为 read
+                    恢复初始参数: sysctl_apply，action 为 restore
                     
                 【可调参数详情】
                     {self.get_param_info()}
@@ -128,12 +245,34 @@ class PromptBuilder:
             """
         )
         return content
-    def build_feedback_prompt(self, phase: Phase, baseline: float, last_value: float) -> str:
-        """性能反馈的 prompt 构建"""
+    def build_feedback_prompt(
+        self,
+        phase: Phase,
+        baseline: float,
+        last_value: float,
+        suggestion: Optional[Dict[str, str]] = None,
+        comparison_desc: str = "",
+        assumed_slower: Optional[bool] = None,
+        telemetry_desc: str = ""
+    ) -> str:
+        """
+        性能反馈的 prompt 构建。
+        assumed_slower 不为 None 时用于投机推荐：上一轮训练尚未结束，按假设的结果给出反馈。
+        telemetry_desc 为上一轮训练期间的系统观测汇总。
+        """
         perf_desc = ""
         failure_rule = ""
+        suggestion_desc = ""
+        telemetry_section = ""
     
-        if last_value is not None:
+        if assumed_slower is not None:
+            outcome = "慢" if assumed_slower else "快"
+            perf_desc = f"上一轮训练尚未结束，请假设其结果比 baseline {outcome}，据此推荐下一组配置"
+            if assumed_slower:
+                failure_rule = (
+                "- 上一轮参数组合未带来性能提升，视为失败方案，本轮避免返回与上一轮相似的配置\n"
+                )
+        elif last_value is not None:
             diff = (last_value - baseline) / baseline * 100
             if diff > 0:
                 perf_desc = f"上一轮比 baseline 慢了 {diff:.2f}%"
@@ -142,10 +281,36 @@ class PromptBuilder:
                 )
             else:
                 perf_desc = f"上一轮比 baseline 快了 {abs(diff):.2f}%"
+            if comparison_desc:
+                perf_desc += f"\n多次测量统计: 提升率 {comparison_desc}，不显著的差异视为测量噪声"
+
+        if telemetry_desc:
+            telemetry_section = (
+                f"【系统观测】\n"
+                f"上一轮训练期间的系统统计（括号内为 baseline），优先调整与观测到的瓶颈相关的参数:\n"
+                f"{telemetry_desc}\n"
+            )
+
+        if suggestion:
+            lines = "\n".join(f"{k}: {v}" for k, v in suggestion.items())
+            suggestion_desc = (
+                f"【优化器建议】\n"
+                f"代理模型根据历史试验推荐的下一组配置（仅供参考，可结合阶段规则调整）:\n"
+                f"{lines}\n"
+            )
 
+        if self.structured_config and self.train_cmd and self.batch_candidates > 1:
+            request = (
+                f"根据调优阶段规则推荐 {self.batch_candidates} 组互不相同的候选配置，调用一次 run_trials 工具提交，"
+                f"每组包含全部参数；工具会剔除重复和违反约束的候选，只训练最有希望的 {self.batch_top_k} 组并返回训练耗时\n"
+            )
+        elif self.structured_config and self.train_cmd:
+            request = "根据调优阶段规则进行参数推荐，调用一次 run_trial 工具提交全部参数的推荐取值，工具会应用配置并返回训练耗时\n"
+        else:
+            request = "根据调优阶段规则进行参数推荐，每个字段以 'key: value' 格式返回，通过命令行修改所有参数取值为推荐值，跑一次模型，读取日志文件\n"
         return (
             f"【用户请求】"
-            f"根据调优阶段规则进行参数推荐，每个字段以 'key: value' 格式返回，通过命令行修改所有参数取值为推荐值，跑一次模型，读取日志文件\n"
+            f"{request}"
             f"【阶段规则】\n"
             f"- 当前阶段 {phase.value}, {phase.desc}"
             f"- 优先调整impact为 {phase.impact} 的参数\n"
@@ -155,21 +320,78 @@ class PromptBuilder:
             f"baseline: {baseline:.4f} 秒\n"
             f"{perf_desc}\n\n"
             f"{failure_rule}\n\n"
+            f"{telemetry_section}"
+            f"{suggestion_desc}"
         )
     
-    #def get_config_model(self):
-     #   """返回动态生成的 Pydantic 模型，可用于校验 LLM 输出"""
-      #  return self.SysctlConfig
-
-    #def get_active_param_names(self) -> list[str]:
-    #    """返回当前启用的参数名列表"""
-    #    return list(self.SysctlConfig.model_fields.keys())
-
-
-
-
-
+    def build_trial_table(self, trials: List[TrialRecord], max_rows: int = 20) -> str:
+        """
+        把已完成的试验折叠为紧凑的汇总表（替代历史对话原文），
+        配置只列出与默认值不同的参数。行数超过 max_rows 时保留最近的试验和最佳试验。
+        """
+        baseline = next((t for t in trials if t.source == "baseline"), None)
+        # 参数筛选的训练以筛选结论的形式出现在参数描述中，不逐条列出
+        rows = [t for t in trials if t.source not in ("baseline", "screening")]
+        if len(rows) > max_rows:
+            best = max(
+                (t for t in rows if t.improvement_ratio is not None),
+                key=lambda t: t.improvement_ratio,
+                default=None
+            )
+            recent = rows[-(max_rows - 1):]
+            rows = ([best] if best is not None and best not in recent else []) + recent
 
+        lines = ["【历史试验汇总】(此前的对话已折叠，配置为实际生效值)"]
+        if baseline is not None and baseline.training_time is not None:
+            lines.append(f"baseline: {baseline.training_time:.4f} 秒")
+        lines.append("步 | 训练耗时(秒) | 提升率 | 与默认值不同的参数")
+        for trial in rows:
+            if trial.censored:
+                timing = "提前终止"
+            elif trial.training_time is None:
+                timing = "失败"
+            else:
+                timing = f"{trial.training_time:.4f}"
+            ratio = "-" if trial.improvement_ratio is None else f"{trial.improvement_ratio:+.2%}"
+            if trial.p_value is not None and not trial.significant:
+                ratio += "(不显著)"
+            changed = [
+                f"{name}={value}" for name, value in trial.config.items()
+                if name in self.param_meta and value != self.param_meta[name]["default"]
+            ]
+            if trial.fidelity < 1.0:
+                timing += f" (fidelity {trial.fidelity:g})"
+            lines.append(f"{trial.step} | {timing} | {ratio} | {', '.join(changed) or '全部为默认值'}")
+        return "\n".join(lines)
 
+    def get_config_model(self) -> Type[BaseModel]:
+        """返回动态生成的 Pydantic 模型，可用于校验 LLM 输出"""
+        return self.SysctlConfig
 
+    def get_config_schema(self) -> Dict[str, Any]:
+        """run_trial 工具的参数 JSON Schema，字段名为 sysctl 参数原名"""
+        schema = self.SysctlConfig.model_json_schema(by_alias=True)
+        return {
+            "type": "object",
+            "properties": {
+                name: {k: v for k, v in prop.items() if k != "title"}
+                for name, prop in schema["properties"].items()
+            },
+            "required": schema.get("required", []),
+        }
 
+    def get_batch_schema(self) -> Dict[str, Any]:
+        """run_trials 工具的参数 JSON Schema：batch_candidates 组配置组成的数组"""
+        return {
+            "type": "object",
+            "properties": {
+                "configs": {
+                    "type": "array",
+                    "description": f"{self.batch_candidates} 组互不相同的候选配置",
+                    "items": self.get_config_schema(),
+                    "minItems": 1,
+                    "maxItems": self.batch_candidates,
+                }
+            },
+            "required": ["configs"],
+        }
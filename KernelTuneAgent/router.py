@@ -0,0 +1,220 @@
+"""
+多推理端点路由
+
+在多个 OpenAI 兼容的推理副本之间分发请求：
+- least_outstanding: 选择当前未完成请求最少的端点，按观测延迟打破平局
+- latency: 选择 (未完成请求数 + 1) × 平滑延迟 最小的端点
+- 请求失败（可重试错误）时把端点标记为不可用并立即切换到下一个端点，
+  不可用时间按连续失败次数指数增长，到期后重新参与调度
+- 后台定期请求 /models 做健康检查，恢复的端点重新上线
+"""
+import asyncio
+import time
+from typing import Any, Dict, List, Optional, Set, Union
+from KernelTuneAgent.llm import LLMError, LLMResponse, SimpleLLM
+
+
+class Endpoint:
+    """一个推理端点及其调度状态"""
+
+    def __init__(self, llm: SimpleLLM, latency_alpha: float = 0.3):
+        self.llm = llm
+        self.url = llm.base_url
+        self.latency_alpha = latency_alpha
+        self.outstanding = 0
+        self.latency: Optional[float] = None    # 请求耗时的指数滑动平均
+        self.healthy = True
+        self.down_until = 0.0
+        self.failures = 0                       # 连续失败次数
+        self.requests = 0
+
+    def available(self, now: float) -> bool:
+        """健康，或者不可用时间已经到期（允许试探性请求）"""
+        return self.healthy or now >= self.down_until
+
+    def observe(self, latency: Optional[float]) -> None:
+        """记录一次成功请求"""
+        self.healthy = True
+        self.failures = 0
+        if latency is None:
+            return
+        if self.latency is None:
+            self.latency = latency
+        else:
+            self.latency += self.latency_alpha * (latency - self.latency)
+
+    def mark_down(self, cooldown: float) -> None:
+        """标记为不可用，连续失败时冷却时间翻倍"""
+        self.failures += 1
+        self.healthy = False
+        self.down_until = time.monotonic() + cooldown * 2 ** min(self.failures - 1, 5)
+
+    def describe(self) -> str:
+        latency = f"{self.latency:.2f} 秒" if self.latency is not None else "-"
+        status = "正常" if self.healthy else "不可用"
+        return f"{self.url} [{status}] 请求 {self.requests} 次, 平滑延迟 {latency}"
+
+
+class LLMRouter:
+    """与 SimpleLLM 接口一致的多端点路由，可以直接传给 KernelTuneAgent"""
+
+    STRATEGIES = ("least_outstanding", "latency")
+
+    def __init__(
+        self,
+        llms: List[SimpleLLM],
+        strategy: str = "least_outstanding",
+        cooldown: float = 30.0,
+        health_interval: Optional[float] = 30.0,
+        health_timeout: float = 5.0
+    ):
+        if not llms:
+            raise ValueError("至少需要一个推理端点")
+        if strategy not in self.STRATEGIES:
+            raise ValueError(f"未知的路由策略: {strategy}，可选: {', '.join(self.STRATEGIES)}")
+        self.endpoints = [Endpoint(llm) for llm in llms]
+        self.strategy = strategy
+        self.cooldown = cooldown
+        self.health_interval = health_interval
+        self.health_timeout = health_timeout
+        self._health_task: Optional[asyncio.Task] = None
+
+    @classmethod
+    def from_urls(
+        cls,
+        base_urls: List[str],
+        retries_per_endpoint: int = 1,
+        strategy: str = "least_outstanding",
+        cooldown: float = 30.0,
+        health_interval: Optional[float] = 30.0,
+        **llm_kwargs: Any
+    ) -> "LLMRouter":
+        """
+        为每个地址创建一个 SimpleLLM。单个端点只做少量重试，
+        失败后尽快切换到其他副本，而不是在故障副本上退避等待。
+        """
+        llms = [SimpleLLM(base_url=url, max_retries=retries_per_endpoint, **llm_kwargs) for url in base_urls]
+        return cls(llms, strategy=strategy, cooldown=cooldown, health_interval=health_interval)
+
+    @property
+    def model(self) -> str:
+        return self.endpoints[0].llm.model
+
+    def _load(self, endpoint: Endpoint) -> float:
+        """调度代价，越小越优先"""
+        if self.strategy == "latency":
+            known = [e.latency for e in self.endpoints if e.latency is not None]
+            # 还没有延迟数据的端点按已知最快端点估计，保证新端点也能分到请求
+            latency = endpoint.latency if endpoint.latency is not None else min(known, default=1.0)
+            return (endpoint.outstanding + 1) * latency
+        return endpoint.outstanding
+
+    def _pick(self, tried: Set[int]) -> Optional[int]:
+        """选择下一个端点；全部不可用时退而选择最早恢复的端点"""
+        now = time.monotonic()
+        candidates = [i for i in range(len(self.endpoints)) if i not in tried]
+        if not candidates:
+            return None
+        available = [i for i in candidates if self.endpoints[i].available(now)]
+        if not available:
+            return min(candidates, key=lambda i: self.endpoints[i].down_until)
+        return min(
+            available,
+            key=lambda i: (
+                self._load(self.endpoints[i]),
+                self.endpoints[i].latency or 0.0,
+                self.endpoints[i].requests,
+            )
+        )
+
+    async def chat(
+        self,
+        messages: List[Dict[str, Any]],
+        system_prompt: Optional[str] = None,
+        tools: Optional[List[Dict[str, Any]]] = None
+    ) -> LLMResponse:
+        """按调度策略发送请求，可重试的失败自动切换端点，每个端点最多尝试一次"""
+        self._ensure_health_checks()
+        tried: Set[int] = set()
+        attempts = 0
+        last_error: Optional[LLMError] = None
+        while True:
+            index = self._pick(tried)
+            if index is None:
+                break
+            tried.add(index)
+            endpoint = self.endpoints[index]
+            endpoint.outstanding += 1
+            endpoint.requests += 1
+            try:
+                response = await endpoint.llm.chat(messages, system_prompt=system_prompt, tools=tools)
+            except LLMError as e:
+                attempts += e.attempts
+                if not e.retryable:
+                    raise
+                endpoint.mark_down(self.cooldown)
+                last_error = e
+                print(f"⚠️ 推理端点 {endpoint.url} 不可用，切换到其他端点")
+                continue
+            finally:
+                endpoint.outstanding -= 1
+            endpoint.observe(response.latency)
+            response.attempts += attempts
+            return response
+        raise LLMError(f"所有推理端点均不可用: {last_error}", attempts=attempts, retryable=True)
+
+    async def check_health(self) -> None:
+        """并发请求每个端点的 /models，更新健康状态"""
+        async def probe(endpoint: Endpoint) -> None:
+            try:
+                await asyncio.wait_for(endpoint.llm.client.models.list(), timeout=self.health_timeout)
+            except Exception:
+                if endpoint.healthy or time.monotonic() >= endpoint.down_until:
+                    endpoint.mark_down(self.cooldown)
+                return
+            if not endpoint.healthy:
+                print(f"✅ 推理端点 {endpoint.url} 已恢复")
+            endpoint.healthy = True
+            endpoint.failures = 0
+
+        await asyncio.gather(*(probe(endpoint) for endpoint in self.endpoints))
+
+    def _ensure_health_checks(self) -> None:
+        """第一次请求时在当前事件循环中启动后台健康检查"""
+        if not self.health_interval or len(self.endpoints) < 2:
+            return
+        if self._health_task is None or self._health_task.done():
+            self._health_task = asyncio.create_task(self._health_loop())
+
+    async def _health_loop(self) -> None:
+        while True:
+            await asyncio.sleep(self.health_interval)
+            await self.check_health()
+
+    async def close(self) -> None:
+        """停止后台健康检查"""
+        if self._health_task is not None:
+            self._health_task.cancel()
+            try:
+                await self._health_task
+            except asyncio.CancelledError:
+                pass
+            self._health_task = None
+
+    def summary(self) -> str:
+        """各端点的调度状态和请求统计"""
+        lines = [f"LLM 路由 ({self.strategy}, {len(self.endpoints)} 个端点):"]
+        for endpoint in self.endpoints:
+            lines.append(f"  - {endpoint.describe()}")
+            lines.append(f"    {endpoint.llm.summary()}")
+        return "\n".join(lines)
+
+
+def create_llm(base_urls: List[str], strategy: str = "least_outstanding", **llm_kwargs: Any) -> Union[SimpleLLM, LLMRouter]:
+    """只有一个推理地址时直接使用 SimpleLLM，有多个副本时创建路由，在副本之间负载均衡并自动故障切换"""
+    if not base_urls:
+        raise ValueError("至少需要一个推理端点")
+    if len(base_urls) == 1:
+        return SimpleLLM(base_url=base_urls[0], **llm_kwargs)
+    llm_kwargs.pop("max_retries", None)
+    return LLMRouter.from_urls(base_urls, strategy=strategy, **llm_kwargs)
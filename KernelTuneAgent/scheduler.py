@@ -0,0 +1,61 @@
+"""
+多 fidelity 试验调度
+
+SuccessiveHalving: 先用截断训练评估全部候选，每一轮只保留耗时最短的 1/eta，
+同时把训练预算放大 eta 倍，直到剩下的候选以完整训练 (fidelity=1) 评估。
+"""
+from typing import Dict, List
+from KernelTuneAgent.trial import TrialResult, TrialRunner
+
+
+class SuccessiveHalving:
+    """逐轮减半调度器"""
+
+    def __init__(self, runner: TrialRunner, min_fidelity: float = 0.1, eta: int = 3):
+        if not 0 < min_fidelity <= 1:
+            raise ValueError(f"min_fidelity 必须在 (0, 1] 之间: {min_fidelity}")
+        if eta < 2:
+            raise ValueError(f"eta 必须不小于 2: {eta}")
+        self.runner = runner
+        self.min_fidelity = min_fidelity
+        self.eta = eta
+
+    def rungs(self) -> List[float]:
+        """每一轮的 fidelity，最后一轮固定为 1"""
+        fidelities = []
+        fidelity = self.min_fidelity
+        # 放大 eta 倍后仍不超过完整训练时才单独成为一轮，避免出现 0.9 -> 1 这样几乎重复的轮次
+        while fidelity < 1.0 and fidelity * self.eta <= 1.0 + 1e-9:
+            fidelities.append(round(fidelity, 6))
+            fidelity *= self.eta
+        fidelities.append(1.0)
+        return fidelities
+
+    async def run(self, configs: List[Dict[str, str]]) -> List[TrialResult]:
+        """依次评估各轮，返回所有 fidelity 下的结果"""
+        survivors = list(configs)
+        results: List[TrialResult] = []
+        rungs = self.rungs()
+        for index, fidelity in enumerate(rungs):
+            print(f"🪜 第 {index + 1}/{len(rungs)} 轮: {len(survivors)} 个候选, fidelity={fidelity:g}")
+            rung_results = []
+            for config in survivors:
+                if fidelity >= 1.0:
+                    # 完整训练按测量策略重复，结果才能与 baseline 做显著性比较
+                    rung_results.append(await self.runner.measure(config))
+                else:
+                    rung_results.append(await self.runner.run(config, fidelity=fidelity))
+            results.extend(rung_results)
+            if fidelity >= 1.0:
+                break
+
+            finished = sorted(
+                (r for r in rung_results if r.training_time is not None),
+                key=lambda r: r.training_time
+            )
+            if not finished:
+                print("⚠️ 本轮没有候选成功完成训练，停止晋级")
+                break
+            keep = max(1, len(finished) // self.eta)
+            survivors = [r.config for r in finished[:keep]]
+        return results
@@ -1,9 +1,13 @@
 """
 核心数据结构定义
 """
+import json
 from enum import Enum
 from typing import List, Optional, Dict, Any
 from pydantic import BaseModel
+from KernelTuneAgent.isolation import IsolationReport
+from KernelTuneAgent.metrics import TrialMetrics
+from KernelTuneAgent.telemetry import TelemetryDigest
 
 
 class Role(str, Enum):
@@ -19,11 +23,83 @@ class AgentState(str, Enum):
     FINISHED = "finished"
 
 
-class Message(BaseModel):
-    role: Role
-    content: Optional[str] = None
-    tool_calls: Optional[List[Dict[str, Any]]] = None
-    tool_call_id: Optional[str] = None
+def estimate_tokens(text: str) -> int:
+    """粗略估算 token 数：中日韩字符约 1 token/字，其余约 4 字符/token"""
+    if not text:
+        return 0
+    cjk = sum(1 for ch in text if "\u2e80" <= ch <= "\u9fff" or "\uff00" <= ch <= "\uffef")
+    return cjk + (len(text) - cjk + 3) // 4
+
+
+class Message:
+    """
+    一条对话消息。
+
+    消息追加后不再修改，构造时即转换为 OpenAI API 格式并缓存在 wire 中，
+    之后每一步组装请求时直接复用，不再重复转换。
+    不是 pydantic 模型，但保留了原来的 model_dump / model_validate 接口和按字段比较。
+    """
+    __slots__ = ("role", "content", "tool_calls", "tool_call_id", "wire", "tokens")
+    FIELDS = ("role", "content", "tool_calls", "tool_call_id")
+
+    def __init__(
+        self,
+        role: Role,
+        content: Optional[str] = None,
+        tool_calls: Optional[List[Dict[str, Any]]] = None,
+        tool_call_id: Optional[str] = None
+    ):
+        self.role = Role(role)
+        self.content = content
+        self.tool_calls = tool_calls
+        self.tool_call_id = tool_call_id
+        self.wire = self._to_wire()
+        self.tokens = self._count_tokens()
+
+    def _to_wire(self) -> Dict[str, Any]:
+        """转换为OpenAI API格式"""
+        message_dict: Dict[str, Any] = {"role": self.role.value}
+        if self.content:
+            message_dict["content"] = self.content
+        if self.tool_calls:
+            message_dict["tool_calls"] = self.tool_calls
+        if self.tool_call_id:
+            message_dict["tool_call_id"] = self.tool_call_id
+        return message_dict
+
+    def _count_tokens(self) -> int:
+        total = estimate_tokens(self.content or "")
+        for tool_call in self.tool_calls or []:
+            total += estimate_tokens(json.dumps(tool_call, ensure_ascii=False))
+        return total
+
+    def __repr__(self) -> str:
+        return f"Message(role={self.role.value!r}, content={self.content!r}, tool_calls={self.tool_calls!r}, tool_call_id={self.tool_call_id!r})"
+
+    def __eq__(self, other: object) -> bool:
+        if not isinstance(other, Message):
+            return NotImplemented
+        return all(getattr(self, name) == getattr(other, name) for name in self.FIELDS)
+
+    __hash__ = None
+
+    def model_dump(self, mode: str = "python", exclude_none: bool = False) -> Dict[str, Any]:
+        """与 pydantic 模型相同的字段字典，mode="json" 时 role 为字符串"""
+        data = {name: getattr(self, name) for name in self.FIELDS}
+        if mode == "json":
+            data["role"] = self.role.value
+        if exclude_none:
+            data = {key: value for key, value in data.items() if value is not None}
+        return data
+
+    @classmethod
+    def model_validate(cls, obj: Any) -> "Message":
+        """由字段字典（或另一条消息）构造消息"""
+        if isinstance(obj, Message):
+            return obj
+        if not isinstance(obj, dict) or "role" not in obj:
+            raise ValueError(f"无效的消息: {obj!r}")
+        return cls(**{name: obj.get(name) for name in cls.FIELDS})
     
     @classmethod
     def user_message(cls, content: str) -> "Message":
@@ -37,23 +113,111 @@ class Message(BaseModel):
     def tool_message(cls, content: str, tool_call_id: str) -> "Message":
         return cls(role=Role.TOOL, content=content, tool_call_id=tool_call_id)
 
+    @classmethod
+    def from_wire(cls, wire: Dict[str, Any]) -> "Message":
+        """由 API 格式的字典还原消息"""
+        return cls(
+            role=wire["role"],
+            content=wire.get("content"),
+            tool_calls=wire.get("tool_calls"),
+            tool_call_id=wire.get("tool_call_id"),
+        )
+
 
-class Memory(BaseModel):
-    messages: List[Message] = []
+class TrialRecord(BaseModel):
+    """一次调优试验的记录"""
+    step: int
+    config: Dict[str, str] = {}
+    training_time: Optional[float] = None  # 多次测量时为均值
+    samples: List[float] = []
+    improvement_ratio: Optional[float] = None
+    improvement_ci: Optional[List[float]] = None   # 提升率的置信区间 [下界, 上界]
+    p_value: Optional[float] = None                # 单侧 Welch t 检验
+    significant: bool = False
+    fidelity: float = 1.0          # 训练预算占完整训练的比例
+    source: str = "llm"            # llm / optimizer / baseline / screening / warm_start
+    phase: str = ""                # 试验时所处的调优阶段
+    cached: bool = False
+    censored: bool = False         # 训练被提前终止，training_time 为空
+    censored_time: Optional[float] = None  # 被终止试验的训练耗时下界估计
+    telemetry: Optional[TelemetryDigest] = None    # 训练期间的系统观测
+    metrics: Optional[TrialMetrics] = None         # 从训练日志和标准输出中提取的指标
+    isolation: Optional[IsolationReport] = None    # 训练前执行的隔离步骤及各自耗时
+
+
+class Memory:
+    """
+    对话记忆。
+
+    messages 只追加不修改，每条消息的 API 格式在追加时已经生成；
+    compact() 把 compacted_upto 之前的消息折叠为一条试验汇总，
+    get_messages() 只发送汇总和之后的原始消息，控制提示词长度。
+
+    汇总位于系统提示词之后的第一条，每折叠一次，从汇总开始的全部对话都不能命中推理服务的前缀缓存；
+    两次折叠之间只追加消息，前缀不变。因此不宜每一步都折叠：调用方在未折叠的对话积累到一定长度时才折叠，
+    用较长的提示词换取大多数请求的前缀缓存命中。
+    与 Message 一样保留了 Memory(messages=...) 构造和 model_dump / model_validate 接口。
+    """
+    __slots__ = ("messages", "summary", "compacted_upto", "_wire", "_summary_wire", "_tokens")
+
+    def __init__(self, messages: Optional[List[Any]] = None):
+        self.messages: List[Message] = []
+        self.summary: Optional[str] = None   # 已折叠试验的汇总表
+        self.compacted_upto: int = 0         # messages 中该下标之前的消息已被折叠
+        self._wire: List[Dict[str, Any]] = []
+        self._summary_wire: Optional[Dict[str, Any]] = None
+        self._tokens: int = 0                # 未折叠消息的 token 估算之和
+        for message in messages or []:
+            self.add_message(Message.model_validate(message))
+
+    def model_dump(self, mode: str = "python", exclude_none: bool = False) -> Dict[str, Any]:
+        return {"messages": [message.model_dump(mode=mode, exclude_none=exclude_none) for message in self.messages]}
+
+    @classmethod
+    def model_validate(cls, obj: Any) -> "Memory":
+        if isinstance(obj, Memory):
+            return obj
+        if not isinstance(obj, dict):
+            raise ValueError(f"无效的对话记忆: {obj!r}")
+        return cls(messages=obj.get("messages", []))
     
     def add_message(self, message: Message):
         self.messages.append(message)
+        self._wire.append(message.wire)
+        self._tokens += message.tokens
+
+    def compact(self, upto: int, summary: str):
+        """
+        把 upto 之前的消息折叠为 summary。
+        upto 必须落在一轮交互的开头，保证工具结果消息不会和对应的工具调用分离。
+        """
+        upto = max(self.compacted_upto, min(upto, len(self.messages)))
+        for message in self.messages[self.compacted_upto:upto]:
+            self._tokens -= message.tokens
+        self.compacted_upto = upto
+        self.summary = summary
+        self._summary_wire = {"role": Role.USER.value, "content": summary} if summary else None
+
+    def estimate_tokens(self) -> int:
+        """估算 get_messages() 结果的 token 数"""
+        return self._tokens + estimate_tokens(self.summary or "")
     
     def get_messages(self) -> List[Dict[str, Any]]:
-        """转换为OpenAI API格式"""
-        result = []
-        for msg in self.messages:
-            message_dict = {"role": msg.role.value}
-            if msg.content:
-                message_dict["content"] = msg.content
-            if msg.tool_calls:
-                message_dict["tool_calls"] = msg.tool_calls
-            if msg.tool_call_id:
-                message_dict["tool_call_id"] = msg.tool_call_id
-            result.append(message_dict)
-        return result
\ No newline at end of file
+        """转换为OpenAI API格式，汇总放在最前面，其后按原顺序排列未折叠的消息"""
+        if self._summary_wire is None:
+            return self._wire[self.compacted_upto:]
+        return [self._summary_wire] + self._wire[self.compacted_upto:]
+
+    def snapshot(self) -> Dict[str, Any]:
+        """折叠后的对话：汇总表和未折叠的消息，用于写入试验日志"""
+        return {"summary": self.summary, "messages": self._wire[self.compacted_upto:]}
+
+    @classmethod
+    def from_snapshot(cls, data: Dict[str, Any]) -> "Memory":
+        """由 snapshot() 的结果还原记忆，已折叠的原始消息不再保留"""
+        memory = cls()
+        for wire in data.get("messages", []):
+            memory.add_message(Message.from_wire(wire))
+        if data.get("summary"):
+            memory.compact(0, data["summary"])
+        return memory
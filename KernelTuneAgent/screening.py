@@ -0,0 +1,93 @@
+"""
+候选配置预筛选
+
+一次 LLM 请求给出一批候选配置，训练之前先做廉价的筛选：
+- 判重：与历史试验或同一批中更靠前的候选对齐后相同的配置直接剔除，
+  与已评估配置的距离小于 GridIndex 最小距离的候选视为已经测量过，同样剔除
+- 约束检查：违反参数间约束（config.PARAM_CONSTRAINTS）的配置剔除
+- 排序：有代理模型时按期望提升排序，否则按与历史最优配置的距离排序
+只有排在最前面的少数候选会真正训练。
+"""
+import math
+from typing import Dict, List, Optional
+from pydantic import BaseModel
+from KernelTuneAgent.optimizer import BaseOptimizer
+from KernelTuneAgent.search_space import GridIndex, SearchSpace
+
+
+class Candidate(BaseModel):
+    """一个候选配置的筛选结果"""
+    config: Dict[str, str]
+    score: Optional[float] = None
+    rejected: str = ""             # 被剔除的原因，为空表示通过筛选
+
+
+class CandidateScreener:
+    """对一批候选配置判重、检查约束并排序"""
+
+    def __init__(
+        self,
+        space: SearchSpace,
+        optimizer: Optional[BaseOptimizer] = None,
+        max_winners: int = 3,
+        index: Optional[GridIndex] = None
+    ):
+        self.space = space
+        self.optimizer = optimizer
+        self.index = index
+        self.max_winners = max_winners
+        self.seen: set = set()
+        # (训练耗时, 配置)，只保留优于 baseline 的前 max_winners 个
+        self.winners: List[tuple] = []
+
+    def observe(self, config: Dict[str, str], training_time: Optional[float] = None, improved: bool = False) -> None:
+        """记录一次已经评估过的配置"""
+        self.seen.add(self.space.key(config))
+        if improved and training_time is not None:
+            self.winners.append((training_time, self.space.snap(config)))
+            self.winners.sort(key=lambda item: item[0])
+            del self.winners[self.max_winners:]
+
+    def _similarity(self, config: Dict[str, str]) -> float:
+        """与历史最优配置的相似度：编码空间中到最近一个优胜配置距离的相反数"""
+        features = self.space.encode(config)
+        return -min(
+            math.dist(features, self.space.encode(winner))
+            for _, winner in self.winners
+        )
+
+    def screen(self, configs: List[Dict[str, object]]) -> List[Candidate]:
+        """返回全部候选：通过筛选的按得分从高到低排在前面，被剔除的排在最后"""
+        accepted: List[Candidate] = []
+        rejected: List[Candidate] = []
+        batch_keys = set()
+        for raw in configs:
+            config = self.space.snap(raw)
+            key = self.space.key(config)
+            if key in self.seen:
+                rejected.append(Candidate(config=config, rejected="与已评估的配置相同"))
+            elif self.index is not None and self.index.covers(config):
+                rejected.append(Candidate(
+                    config=config, rejected=f"与已评估的配置过近（最小距离 {self.index.min_distance:g}），视为已经测量过"
+                ))
+            elif key in batch_keys:
+                rejected.append(Candidate(config=config, rejected="与本批中的其它候选相同"))
+            else:
+                problems = self.space.violations(config)
+                if problems:
+                    rejected.append(Candidate(config=config, rejected="违反约束: " + "; ".join(problems)))
+                else:
+                    accepted.append(Candidate(config=config))
+            batch_keys.add(key)
+
+        scores = None
+        if self.optimizer is not None and accepted:
+            scores = self.optimizer.score_candidates([c.config for c in accepted])
+        if scores is None and self.winners:
+            scores = [self._similarity(c.config) for c in accepted]
+        if scores is not None:
+            for candidate, score in zip(accepted, scores):
+                candidate.score = score
+            # 稳定排序：得分相同时保留 LLM 给出的顺序
+            accepted.sort(key=lambda c: c.score, reverse=True)
+        return accepted + rejected
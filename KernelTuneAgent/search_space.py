@@ -0,0 +1,339 @@
+"""
+参数搜索空间
+
+把参数目录 (SYSCTL_PARAM_META) 中的 range/step/default 文本解析为结构化的参数定义，
+供优化器采样、编码和把取值对齐到合法网格；GridIndex 记录已评估的网格点，
+拦截与已评估配置过近的推荐。
+"""
+import math
+import random
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple, Union
+from pydantic import BaseModel
+from KernelTuneAgent.config import PARAM_CONSTRAINTS, SYSCTL_PARAM_META
+
+
+class ParamSpec(BaseModel):
+    """单个参数的取值空间"""
+    name: str
+    kind: str                      # "int": 整数区间, "choice": 离散取值
+    low: int = 0
+    high: int = 0
+    step: int = 1
+    choices: List[str] = []
+    default: str
+
+    @classmethod
+    def from_meta(cls, name: str, meta: Dict) -> "ParamSpec":
+        text = str(meta["range"]).strip()
+        default = str(meta["default"]).strip()
+        if text.startswith("["):
+            choices = [c.strip() for c in text.strip("[]").split(",") if c.strip()]
+            return cls(name=name, kind="choice", choices=choices, default=default)
+        if "/" in text:
+            choices = [c.strip() for c in text.split("/") if c.strip()]
+            return cls(name=name, kind="choice", choices=choices, default=default)
+        low, high = text.split("-", 1)
+        step = int(str(meta.get("step", "1")).strip() or 1)
+        return cls(name=name, kind="int", low=int(low), high=int(high), step=max(step, 1), default=default)
+
+    @property
+    def size(self) -> int:
+        """网格点数量"""
+        if self.kind == "choice":
+            return len(self.choices)
+        return (self.high - self.low) // self.step + 1
+
+    def grid_values(self) -> List[str]:
+        """全部合法网格取值（包含默认值）"""
+        if self.kind == "choice":
+            return list(self.choices)
+        values = [str(v) for v in range(self.low, self.high + 1, self.step)]
+        if self.default not in values:
+            values.append(self.default)
+            values.sort(key=int)
+        return values
+
+    def snap(self, value: Union[str, int, float]) -> str:
+        """把任意取值对齐到最近的合法网格点，默认值本身始终合法"""
+        text = str(value).strip()
+        if self.kind == "choice":
+            lowered = text.strip("[]").lower()
+            for choice in self.choices:
+                if choice.lower() == lowered:
+                    return choice
+            try:
+                # 数值型离散取值：取最接近的一项
+                number = float(lowered)
+                return min(self.choices, key=lambda c: abs(float(c) - number))
+            except ValueError:
+                return self.default
+        try:
+            number = float(text)
+        except ValueError:
+            return self.default
+        if text == self.default or number == float(self.default):
+            return self.default
+        number = min(max(number, self.low), self.high)
+        index = round((number - self.low) / self.step)
+        snapped = min(self.low + index * self.step, self.high)
+        return str(int(snapped))
+
+    def is_valid(self, value: Union[str, int, float]) -> bool:
+        """判断取值是否在合法网格上"""
+        return self.snap(value) == str(value).strip()
+
+    def sample(self, rng: random.Random) -> str:
+        """均匀采样一个网格点"""
+        if self.kind == "choice":
+            return rng.choice(self.choices)
+        return str(self.low + rng.randrange(self.size) * self.step)
+
+    def neighbor(self, value: str, rng: random.Random, max_steps: int = 2) -> str:
+        """在当前取值附近随机挪动若干步"""
+        if self.kind == "choice":
+            others = [c for c in self.choices if c != value] or self.choices
+            return rng.choice(others)
+        delta = rng.choice([d for d in range(-max_steps, max_steps + 1) if d != 0])
+        return self.snap(float(self.snap(value)) + delta * self.step)
+
+    def distance(self, a: str, b: str) -> float:
+        """两个取值的归一化距离：整数为差值占取值范围的比例，离散取值不同记为 1"""
+        if self.kind == "choice":
+            return 0.0 if self.snap(a) == self.snap(b) else 1.0
+        if self.high == self.low:
+            return 0.0
+        return abs(float(self.snap(a)) - float(self.snap(b))) / (self.high - self.low)
+
+    def encode(self, value: str) -> List[float]:
+        """编码为 [0,1] 区间的特征：整数归一化，离散取值 one-hot"""
+        if self.kind == "choice":
+            snapped = self.snap(value)
+            return [1.0 if c == snapped else 0.0 for c in self.choices]
+        if self.high == self.low:
+            return [0.0]
+        return [(float(self.snap(value)) - self.low) / (self.high - self.low)]
+
+
+class SearchSpace:
+    """启用参数组成的联合搜索空间"""
+
+    def __init__(self, specs: List[ParamSpec]):
+        self.specs: Dict[str, ParamSpec] = {spec.name: spec for spec in specs}
+        # 被参数筛选冻结的参数的原始定义
+        self.frozen: Dict[str, ParamSpec] = {}
+
+    @classmethod
+    def from_meta(cls, param_names: Iterable[str], meta: Optional[Dict] = None) -> "SearchSpace":
+        meta = meta if meta is not None else SYSCTL_PARAM_META
+        return cls([ParamSpec.from_meta(name, meta[name]) for name in param_names])
+
+    @property
+    def names(self) -> List[str]:
+        return list(self.specs.keys())
+
+    @property
+    def tunable_names(self) -> List[str]:
+        """取值不止一个（未冻结）的参数"""
+        return [name for name, spec in self.specs.items() if spec.size > 1]
+
+    def freeze(self, names: Iterable[str]) -> None:
+        """
+        把参数固定为默认值：就地替换为只有默认值一个取值的离散参数，
+        共用同一个搜索空间的优化器、候选筛选、试验工具和参数写入随之只能使用默认值。
+        """
+        for name in names:
+            spec = self.specs.get(name)
+            if spec is None or name in self.frozen:
+                continue
+            self.frozen[name] = spec
+            self.specs[name] = ParamSpec(name=name, kind="choice", choices=[spec.default], default=spec.default)
+
+    def default_config(self) -> Dict[str, str]:
+        return {name: spec.default for name, spec in self.specs.items()}
+
+    def snap(self, config: Dict[str, object]) -> Dict[str, str]:
+        """对齐整组配置，缺失的参数取默认值"""
+        return {
+            name: spec.snap(config[name]) if config.get(name) is not None else spec.default
+            for name, spec in self.specs.items()
+        }
+
+    def sample(self, rng: random.Random) -> Dict[str, str]:
+        return {name: spec.sample(rng) for name, spec in self.specs.items()}
+
+    def neighbor(self, config: Dict[str, str], rng: random.Random, max_changes: int = 3) -> Dict[str, str]:
+        """随机修改 1~max_changes 个参数得到邻近配置"""
+        result = self.snap(config)
+        names = self.tunable_names or self.names
+        count = rng.randint(1, max(1, min(max_changes, len(names))))
+        for name in rng.sample(names, count):
+            result[name] = self.specs[name].neighbor(result[name], rng)
+        return result
+
+    def encode(self, config: Dict[str, str]) -> List[float]:
+        features: List[float] = []
+        for name, spec in self.specs.items():
+            features.extend(spec.encode(config.get(name, spec.default)))
+        return features
+
+    def violations(
+        self,
+        config: Dict[str, object],
+        constraints: Sequence[Tuple[str, str]] = PARAM_CONSTRAINTS
+    ) -> List[str]:
+        """检查参数间约束，只检查两个参数都启用的约束"""
+        snapped = self.snap(config)
+        problems = []
+        for lower, upper in constraints:
+            if lower not in self.specs or upper not in self.specs:
+                continue
+            if float(snapped[lower]) >= float(snapped[upper]):
+                problems.append(f"{lower}={snapped[lower]} 应小于 {upper}={snapped[upper]}")
+        return problems
+
+    def key(self, config: Dict[str, object]) -> tuple:
+        """对齐后的配置元组，用于判重"""
+        snapped = self.snap(config)
+        return tuple(snapped[name] for name in self.specs)
+
+    def distance(self, a: Dict[str, object], b: Dict[str, object]) -> float:
+        """两组配置的距离：各未冻结参数归一化距离的最大值"""
+        a, b = self.snap(a), self.snap(b)
+        return max((self.specs[name].distance(a[name], b[name]) for name in self.tunable_names), default=0.0)
+
+
+class GridIndex:
+    """
+    已评估网格点的索引。
+    配置先对齐到合法网格；与某个已评估点的距离小于 min_distance（每个参数的差异都不到取值范围的
+    min_distance）时视为已经测量过，可以拒绝，或改道到附近尚未评估的网格点。
+    min_distance 随调优阶段缩放（见 set_phase），后期阶段的小幅调整不会被当作重复。
+    按调优阶段统计评估的网格点、各参数取值的覆盖率和被拦截的推荐。
+    """
+
+    def __init__(self, space: SearchSpace, min_distance: float = 0.05, max_radius: int = 3, seed: Optional[int] = None):
+        self.space = space
+        self.base_distance = min_distance
+        self.min_distance = min_distance
+        self.max_radius = max_radius
+        self.rng = random.Random(seed)
+        self.phase = ""
+        # 网格点 -> (对齐后的配置, 首次评估时的阶段)
+        self.points: Dict[tuple, Tuple[Dict[str, str], str]] = {}
+        # 阶段 -> {"points": 新增网格点, "repeats": 重复评估, "redirected": 改道, "rejected": 拒绝}
+        self.stats: Dict[str, Dict[str, int]] = {}
+
+    def set_phase(self, phase: str, scale: float = 1.0) -> None:
+        """切换到新的调优阶段，最小距离取配置值的 scale 倍"""
+        self.phase = phase
+        self.min_distance = self.base_distance * scale
+
+    def _count(self, event: str, phase: Optional[str] = None) -> None:
+        counts = self.stats.setdefault(phase if phase is not None else self.phase, {})
+        counts[event] = counts.get(event, 0) + 1
+
+    def add(self, config: Dict[str, object], phase: Optional[str] = None) -> None:
+        """记录一个已评估的配置"""
+        phase = phase if phase is not None else self.phase
+        snapped = self.space.snap(config)
+        key = self.space.key(snapped)
+        if key in self.points:
+            self._count("repeats", phase)
+            return
+        self.points[key] = (snapped, phase)
+        self._count("points", phase)
+
+    def nearest(self, config: Dict[str, object]) -> Tuple[Optional[Dict[str, str]], float]:
+        """最近的已评估配置及其距离，没有已评估配置时返回 (None, inf)"""
+        snapped = self.space.snap(config)
+        key = self.space.key(snapped)
+        if key in self.points:
+            return self.points[key][0], 0.0
+        best, best_distance = None, math.inf
+        for visited, _ in self.points.values():
+            distance = self.space.distance(snapped, visited)
+            if distance < best_distance:
+                best, best_distance = visited, distance
+        return best, best_distance
+
+    def covers(self, config: Dict[str, object]) -> bool:
+        """是否与某个已评估配置过近"""
+        return self.nearest(config)[1] < self.min_distance
+
+    def _shifted(self, spec: ParamSpec, value: str, radius: int) -> List[str]:
+        """把一个参数向两侧移动 radius 个最小距离后的取值"""
+        if spec.kind == "choice":
+            return [c for c in spec.choices if c != spec.snap(value)] if radius == 1 else []
+        steps = radius * max(1, math.ceil(self.min_distance * (spec.high - spec.low) / spec.step))
+        current = float(spec.snap(value))
+        values = []
+        for direction in (1, -1):
+            shifted = spec.snap(current + direction * steps * spec.step)
+            if float(shifted) != current and shifted not in values:
+                values.append(shifted)
+        return values
+
+    def redirect(self, config: Dict[str, object]) -> Optional[Dict[str, str]]:
+        """
+        附近尚未评估、且不比原配置违反更多参数间约束的配置：依次尝试只改变一个参数、
+        移动 1..max_radius 倍最小距离，都不可行时随机采样满足约束的配置，仍找不到时返回 None
+        """
+        snapped = self.space.snap(config)
+        allowed = len(self.space.violations(snapped))
+        names = self.space.tunable_names
+        for radius in range(1, self.max_radius + 1):
+            order = list(names)
+            self.rng.shuffle(order)
+            for name in order:
+                for value in self._shifted(self.space.specs[name], snapped[name], radius):
+                    candidate = dict(snapped)
+                    candidate[name] = value
+                    if not self.covers(candidate) and len(self.space.violations(candidate)) <= allowed:
+                        return candidate
+        for _ in range(200):
+            candidate = self.space.sample(self.rng)
+            if not self.covers(candidate) and not self.space.violations(candidate):
+                return candidate
+        return None
+
+    def check(self, config: Dict[str, object], redirect: bool = True) -> Tuple[Optional[Dict[str, str]], str]:
+        """
+        训练之前检查一组配置，返回 (实际要评估的配置, 说明)。
+        未被评估过时原样返回（对齐后）；过近时改道到附近的未评估配置，redirect 为 False 或无处可去时返回 None。
+        """
+        snapped = self.space.snap(config)
+        _, distance = self.nearest(snapped)
+        if distance >= self.min_distance:
+            return snapped, ""
+        what = "相同" if distance == 0 else f"过近（距离 {distance:.3f}，最小距离 {self.min_distance:g}）"
+        if redirect:
+            moved = self.redirect(snapped)
+            if moved is not None:
+                self._count("redirected")
+                changed = ", ".join(f"{name}: {snapped[name]} -> {value}" for name, value in moved.items() if snapped[name] != value)
+                return moved, f"该配置与已评估的配置{what}，已改为附近尚未评估的配置: {changed}"
+        self._count("rejected")
+        return None, f"该配置与已评估的配置{what}，视为已经测量过"
+
+    def coverage(self, phase: str) -> float:
+        """该阶段评估的网格点在各未冻结参数上覆盖的取值比例（各参数平均）"""
+        configs = [config for config, point_phase in self.points.values() if point_phase == phase]
+        names = self.space.tunable_names
+        if not configs or not names:
+            return 0.0
+        fractions = [
+            min(1.0, len({config[name] for config in configs}) / len(self.space.specs[name].grid_values()))
+            for name in names
+        ]
+        return sum(fractions) / len(fractions)
+
+    def describe(self) -> str:
+        """各阶段的覆盖情况"""
+        lines = [f"搜索空间覆盖 (已评估 {len(self.points)} 个网格点, 最小距离 {self.min_distance:g}):"]
+        for phase, counts in self.stats.items():
+            lines.append(
+                f"  - {phase or '-'}: 新网格点 {counts.get('points', 0)} 个, "
+                f"参数取值覆盖率 {self.coverage(phase):.1%}, 重复评估 {counts.get('repeats', 0)} 次, "
+                f"改道 {counts.get('redirected', 0)} 次, 拒绝 {counts.get('rejected', 0)} 次"
+            )
+        return "\n".join(lines)
@@ -0,0 +1,229 @@
+"""
+参数敏感性筛选
+
+会话开始时用 Morris 基本效应法 (elementary effects) 在低 fidelity 下估计每个参数对训练耗时的实际影响：
+- 每条轨迹从随机网格点出发，按随机顺序每次只改变一个参数，共 k+1 次训练
+- 参数 i 的基本效应 = 相对训练耗时的变化 / 参数归一化后的变化量（离散取值之间记为 1）
+- mu*（基本效应绝对值的均值）衡量总体影响，sigma（标准差）反映非线性和与其他参数的交互
+
+影响低于噪声水平、或远小于最重要参数的参数在本次会话中冻结为默认值，
+其余参数按 mu* 排序重新划分 impact 等级，替代 SYSCTL_PARAM_META 中人工标注的等级。
+screen_parameters 串起整个流程，训练和试验记录由调用方的 evaluate 负责。
+"""
+import math
+import random
+import statistics
+from typing import Awaitable, Callable, Dict, List, Optional, Tuple
+from pydantic import BaseModel
+from KernelTuneAgent.config import ImpactLevel
+from KernelTuneAgent.search_space import ParamSpec, SearchSpace
+
+# 轨迹上的一个点: (配置, 相对上一个点改变的参数, 训练耗时, 是否被提前终止)
+TrajectoryPoint = Tuple[Dict[str, str], Optional[str], Optional[float], bool]
+
+
+class ParameterEffect(BaseModel):
+    """一个参数的基本效应统计"""
+    name: str
+    mu_star: float = 0.0       # 基本效应绝对值的均值
+    mu: float = 0.0            # 基本效应的均值（离散参数没有方向，仅供参考）
+    sigma: float = 0.0         # 基本效应的标准差
+    change: float = 0.0        # 改变该参数一次带来的平均相对耗时变化
+    effects: int = 0           # 有效的基本效应个数（两端训练都成功）
+
+    def describe(self) -> str:
+        return f"mu*={self.mu_star:.4f}, sigma={self.sigma:.4f}, 单次改变耗时变化 {self.change:.2%} (n={self.effects})"
+
+
+class ScreeningReport(BaseModel):
+    """参数筛选结果"""
+    effects: List[ParameterEffect] = []        # 按 mu* 从大到小
+    frozen: List[str] = []
+    impacts: Dict[str, ImpactLevel] = {}       # 未冻结参数重新划分的 impact 等级
+    runs: int = 0
+    fidelity: float = 1.0
+
+    def describe(self) -> str:
+        lines = [f"参数筛选 ({self.runs} 次训练, fidelity={self.fidelity:g}):"]
+        for effect in self.effects:
+            status = "冻结为默认值" if effect.name in self.frozen else f"impact {self.impacts[effect.name].value}"
+            lines.append(f"  - {effect.name}: {effect.describe()} [{status}]")
+        return "\n".join(lines)
+
+
+class MorrisScreening:
+    """Morris 轨迹设计与基本效应分析"""
+
+    def __init__(self, space: SearchSpace, trajectories: int = 4, levels: int = 4, seed: Optional[int] = None):
+        if levels < 2 or levels % 2:
+            raise ValueError(f"levels 必须是不小于 2 的偶数: {levels}")
+        if trajectories < 1:
+            raise ValueError(f"trajectories 必须不小于 1: {trajectories}")
+        self.space = space
+        self.trajectories = trajectories
+        self.levels = levels
+        # 标准 Morris 步长：levels/2 个层级，保证各层级被等概率访问
+        self.delta = levels / (2 * (levels - 1))
+        self.rng = random.Random(seed)
+        # 只有一个取值的参数（已冻结）不参与筛选
+        self.names = [name for name, spec in space.specs.items() if spec.size > 1]
+
+    @property
+    def runs(self) -> int:
+        """完整设计需要的训练次数"""
+        return self.trajectories * (len(self.names) + 1)
+
+    @staticmethod
+    def _value(spec: ParamSpec, level: float) -> str:
+        """[0,1] 层级对应的网格取值"""
+        if spec.kind == "choice":
+            return spec.choices[min(len(spec.choices) - 1, int(round(level * (len(spec.choices) - 1))))]
+        return spec.snap(spec.low + level * (spec.high - spec.low))
+
+    @staticmethod
+    def _distance(spec: ParamSpec, before: str, after: str) -> float:
+        """两个取值之间带方向的归一化距离，离散取值之间记为 1"""
+        if spec.kind == "choice":
+            return 1.0
+        return (float(after) - float(before)) / (spec.high - spec.low)
+
+    def _move(self, spec: ParamSpec, level: float, value: str) -> Tuple[float, str]:
+        """把一个参数移动 delta 个层级，返回 (新层级, 新取值)"""
+        target = level + self.delta if level + self.delta <= 1 + 1e-9 else level - self.delta
+        moved = self._value(spec, target)
+        if moved == value:
+            # 离散取值较少时目标层级可能落在同一个取值上，改取另一个取值，保证每一步都有变化
+            if spec.kind == "choice":
+                moved = self.rng.choice([c for c in spec.choices if c != value])
+            else:
+                step = spec.step if int(value) + spec.step <= spec.high else -spec.step
+                moved = spec.snap(int(value) + step)
+        return target, moved
+
+    def trajectory(self) -> List[Tuple[Dict[str, str], Optional[str]]]:
+        """一条轨迹: k+1 组配置，除第一组外每组只比上一组多改变一个参数"""
+        grid = [i / (self.levels - 1) for i in range(self.levels)]
+        levels = {name: self.rng.choice(grid) for name in self.names}
+        config = self.space.default_config()
+        for name in self.names:
+            config[name] = self._value(self.space.specs[name], levels[name])
+        points: List[Tuple[Dict[str, str], Optional[str]]] = [(dict(config), None)]
+        order = list(self.names)
+        self.rng.shuffle(order)
+        for name in order:
+            levels[name], config[name] = self._move(self.space.specs[name], levels[name], config[name])
+            points.append((dict(config), name))
+        return points
+
+    def design(self) -> List[List[Tuple[Dict[str, str], Optional[str]]]]:
+        return [self.trajectory() for _ in range(self.trajectories)]
+
+    async def run(
+        self,
+        evaluate: Callable[[Dict[str, str]], Awaitable[Tuple[Optional[float], bool]]]
+    ) -> List[ParameterEffect]:
+        """
+        依次训练每条轨迹上的配置，evaluate 返回 (训练耗时, 是否被提前终止)，失败时耗时为 None；
+        被提前终止的训练耗时为估计值
+        """
+        paths: List[List[TrajectoryPoint]] = []
+        for index, trajectory in enumerate(self.design()):
+            print(f"🔬 参数筛选: 第 {index + 1}/{self.trajectories} 条轨迹 ({len(trajectory)} 次训练)")
+            path = []
+            for config, changed in trajectory:
+                value, censored = await evaluate(config)
+                path.append((config, changed, value, censored))
+            paths.append(path)
+        return self.analyze(paths)
+
+    @staticmethod
+    def _penalize(paths: List[List[TrajectoryPoint]]) -> List[List[Tuple[Dict[str, str], Optional[str], Optional[float]]]]:
+        """被提前终止的训练按惩罚值计：耗时估计与最慢的完成训练中的较大者"""
+        worst = max((t for path in paths for _, _, t, censored in path if t and not censored), default=0.0)
+        return [
+            [(config, name, max(t, worst) if censored and t is not None else t) for config, name, t, censored in path]
+            for path in paths
+        ]
+
+    def analyze(self, paths: List[List[TrajectoryPoint]]) -> List[ParameterEffect]:
+        """由轨迹上的训练耗时计算每个参数的基本效应统计，按 mu* 从大到小排序"""
+        # 参考耗时只取完成的训练
+        times = [t for path in paths for _, _, t, censored in path if t and not censored]
+        reference = statistics.median(times) if times else 0.0
+        samples: Dict[str, List[Tuple[float, float]]] = {name: [] for name in self.names}
+        for path in self._penalize(paths):
+            for (before, _, t0), (after, name, t1) in zip(path, path[1:]):
+                if not reference or t0 is None or t1 is None or name not in samples:
+                    continue
+                distance = self._distance(self.space.specs[name], before[name], after[name])
+                if distance == 0:
+                    continue
+                change = (t1 - t0) / reference
+                samples[name].append((change / distance, change))
+
+        effects = []
+        for name, values in samples.items():
+            if not values:
+                effects.append(ParameterEffect(name=name))
+                continue
+            elementary = [value for value, _ in values]
+            effects.append(ParameterEffect(
+                name=name,
+                mu_star=sum(abs(v) for v in elementary) / len(elementary),
+                mu=sum(elementary) / len(elementary),
+                sigma=statistics.stdev(elementary) if len(elementary) > 1 else 0.0,
+                change=sum(abs(c) for _, c in values) / len(values),
+                effects=len(values),
+            ))
+        effects.sort(key=lambda e: e.mu_star, reverse=True)
+        return effects
+
+
+def select_frozen(
+    effects: List[ParameterEffect],
+    threshold: float = 0.1,
+    noise: float = 0.01,
+    min_active: int = 3
+) -> List[str]:
+    """
+    需要冻结的参数：mu* 低于最大 mu* 的 threshold 倍，或改变一次带来的耗时变化小于噪声水平 noise。
+    没有有效基本效应的参数影响未知，不冻结；mu* 最大的 min_active 个参数始终保留。
+    """
+    ranked = sorted(effects, key=lambda e: e.mu_star, reverse=True)
+    top = ranked[0].mu_star if ranked else 0.0
+    return [
+        effect.name for effect in ranked[min_active:]
+        if effect.effects and (effect.mu_star < threshold * top or effect.change < noise)
+    ]
+
+
+def assign_impacts(effects: List[ParameterEffect], frozen: List[str]) -> Dict[str, ImpactLevel]:
+    """未冻结的参数按 mu* 排序三等分为 high / medium / low"""
+    active = [e.name for e in sorted(effects, key=lambda e: e.mu_star, reverse=True) if e.name not in frozen]
+    size = math.ceil(len(active) / 3) if active else 1
+    levels = (ImpactLevel.HIGH, ImpactLevel.MEDIUM, ImpactLevel.LOW)
+    return {name: levels[min(index // size, 2)] for index, name in enumerate(active)}
+
+
+async def screen_parameters(
+    space: SearchSpace,
+    evaluate: Callable[[Dict[str, str]], Awaitable[Tuple[Optional[float], bool]]],
+    trajectories: int = 4,
+    levels: int = 4,
+    seed: Optional[int] = None,
+    threshold: float = 0.1,
+    noise: float = 0.01,
+    min_active: int = 3,
+    fidelity: float = 1.0
+) -> ScreeningReport:
+    """
+    按 Morris 设计依次训练（evaluate 同 MorrisScreening.run），选出需要冻结的参数并重新划分 impact 等级。
+    fidelity 只记录在报告中，截断训练由 evaluate 自行完成
+    """
+    morris = MorrisScreening(space, trajectories=trajectories, levels=levels, seed=seed)
+    print(f"\n🔬 参数筛选: {len(morris.names)} 个参数, {morris.runs} 次训练 (fidelity={fidelity:g})")
+    effects = await morris.run(evaluate)
+    frozen = select_frozen(effects, threshold=threshold, noise=noise, min_active=min_active)
+    return ScreeningReport(
+        effects=effects, frozen=frozen, impacts=assign_impacts(effects, frozen), runs=morris.runs, fidelity=fidelity
+    )
@@ -0,0 +1,142 @@
+"""
+代理的运行设置
+
+sys.config 中的各项在这里声明为带类型和默认值的字段，字段别名即配置文件中的键名。
+PromptBuilder 读取配置文件后构建一次，代理直接使用解析好的取值，不再在各处转换字符串。
+取值无法解析的项给出警告并使用默认值。
+"""
+from typing import Annotated, Any, Dict, List, Optional
+from pydantic import BaseModel, BeforeValidator, ConfigDict, Field, ValidationError
+from KernelTuneAgent.early_stop import DEFAULT_PROGRESS_PATTERN
+from KernelTuneAgent.metrics import DEFAULT_EPOCH_TIME_PATTERN, DEFAULT_THROUGHPUT_PATTERN, TRAINING_TIME_PATTERN
+
+
+def _split_list(value: Any) -> Any:
+    """逗号分隔的列表，去掉空项"""
+    if isinstance(value, str):
+        return [item.strip() for item in value.split(",") if item.strip()]
+    return value
+
+
+def _empty_to_none(value: Any) -> Any:
+    return None if isinstance(value, str) and not value.strip() else value
+
+
+def _lower(value: Any) -> Any:
+    return value.strip().lower() if isinstance(value, str) else value
+
+
+CommaList = Annotated[List[str], BeforeValidator(_split_list)]
+OptionalFloat = Annotated[Optional[float], BeforeValidator(_empty_to_none)]
+OptionalBool = Annotated[Optional[bool], BeforeValidator(_empty_to_none)]
+LowerStr = Annotated[str, BeforeValidator(_lower)]
+
+
+class AgentSettings(BaseModel):
+    """sys.config 中代理使用的设置"""
+    model_config = ConfigDict(populate_by_name=True)
+
+    # —— 工具超时与看门狗 —— #
+    watchdog_idle_timeout: OptionalFloat = Field(None, alias="watchdog idle timeout")
+    bash_timeout: OptionalFloat = Field(None, alias="bash timeout")
+    python_timeout: OptionalFloat = Field(None, alias="python timeout")
+    train_timeout: float = Field(3600.0, alias="train timeout")
+
+    # —— 推理服务、LLM 请求与对话记忆 —— #
+    llm_base_urls: CommaList = Field(["http://localhost:8001/v1"], alias="llm base urls")
+    llm_router_strategy: LowerStr = Field("least_outstanding", alias="llm router strategy")
+    llm_model: str = Field("output/qwen3_lora", alias="llm model")
+    llm_api_key: str = Field("token-abc123", alias="llm api key")
+    llm_timeout: float = Field(300.0, alias="llm timeout")
+    llm_max_retries: int = Field(5, alias="llm max retries")
+    llm_stream: bool = Field(True, alias="llm stream")
+    llm_stream_usage: OptionalBool = Field(None, alias="llm stream usage")
+    memory_compaction: bool = Field(True, alias="memory compaction")
+    memory_compaction_tokens: int = Field(4000, alias="memory compaction tokens")
+    llm_failure_budget: int = Field(3, alias="llm failure budget")
+    llm_cooldown: float = Field(60.0, alias="llm cooldown")
+
+    # —— 评估缓存、试验日志、调优经验库 —— #
+    eval_cache: bool = Field(True, alias="eval cache")
+    cache_path: str = Field("./eval_cache.json", alias="cache path")
+    journal: bool = Field(True, alias="journal")
+    journal_path: str = Field("./trial_journal.jsonl", alias="journal path")
+    knowledge_base: bool = Field(True, alias="knowledge base")
+    knowledge_base_path: str = Field("./kta_knowledge.json", alias="knowledge base path")
+    knowledge_base_winners: int = Field(3, alias="knowledge base winners")
+    warm_start_neighbors: int = Field(3, alias="warm start neighbors")
+    warm_start_max_distance: float = Field(1.0, alias="warm start max distance")
+    warm_start_trials: int = Field(3, alias="warm start trials")
+
+    # —— 优化器与搜索空间 —— #
+    optimizer: LowerStr = Field("none", alias="optimizer")
+    optimizer_mode: LowerStr = Field("advisory", alias="optimizer mode")
+    min_distance: float = Field(0.05, alias="min distance")
+    duplicate_policy: LowerStr = Field("redirect", alias="duplicate policy")
+    pipeline: bool = Field(False, alias="pipeline")
+    successive_halving: bool = Field(False, alias="successive halving")
+    sh_candidates: int = Field(9, alias="sh candidates")
+    sh_min_fidelity: float = Field(0.1, alias="sh min fidelity")
+    sh_eta: int = Field(3, alias="sh eta")
+
+    # —— 提前终止与测量 —— #
+    early_stopping: bool = Field(False, alias="early stopping")
+    early_stop_rule: LowerStr = Field("median", alias="early stop rule")
+    early_stop_min_fraction: float = Field(0.2, alias="early stop min fraction")
+    early_stop_margin: float = Field(0.05, alias="early stop margin")
+    min_repeats: int = Field(1, alias="min repeats")
+    max_repeats: int = Field(1, alias="max repeats")
+    target_precision: float = Field(0.01, alias="target precision")
+    confidence: float = Field(0.95, alias="confidence")
+    fidelity_arg: str = Field("", alias="fidelity arg")
+    full_budget: int = Field(0, alias="full budget")
+
+    # —— 训练指标提取 —— #
+    progress_pattern: str = Field(DEFAULT_PROGRESS_PATTERN, alias="progress pattern")
+    training_time_pattern: str = Field(TRAINING_TIME_PATTERN.pattern, alias="training time pattern")
+    metric_json_fields: str = Field("", alias="metric json fields")
+    throughput_pattern: str = Field(DEFAULT_THROUGHPUT_PATTERN, alias="throughput pattern")
+    epoch_time_pattern: str = Field(DEFAULT_EPOCH_TIME_PATTERN, alias="epoch time pattern")
+
+    # —— 追踪与系统观测 —— #
+    trace_file: str = Field("", alias="trace file")
+    metrics_file: str = Field("", alias="metrics file")
+    metrics_port: int = Field(0, alias="metrics port")
+    telemetry: bool = Field(True, alias="telemetry")
+    telemetry_root: str = Field("/proc", alias="telemetry root")
+    telemetry_interval: float = Field(1.0, alias="telemetry interval")
+    telemetry_numa_interval: float = Field(10.0, alias="telemetry numa interval")
+
+    # —— 试验隔离 —— #
+    isolation_steps: CommaList = Field([], alias="isolation steps")
+    isolation_root: str = Field("/proc", alias="isolation root")
+    isolation_drop_caches: int = Field(3, alias="isolation drop caches")
+    isolation_prewarm_paths: CommaList = Field([], alias="isolation prewarm paths")
+    isolation_prewarm_limit: float = Field(0.0, alias="isolation prewarm limit")    # MB，0 表示不限
+    isolation_quiesce_load: float = Field(0.5, alias="isolation quiesce load")
+    isolation_quiesce_pressure: float = Field(1.0, alias="isolation quiesce pressure")
+    isolation_quiesce_timeout: float = Field(60.0, alias="isolation quiesce timeout")
+    isolation_warmup_fidelity: float = Field(0.1, alias="isolation warmup fidelity")
+
+    # —— 参数筛选 —— #
+    screening: bool = Field(False, alias="screening")
+    screening_fidelity: float = Field(0.1, alias="screening fidelity")
+    screening_trajectories: int = Field(4, alias="screening trajectories")
+    screening_levels: int = Field(4, alias="screening levels")
+    screening_seed: int = Field(0, alias="screening seed")
+    screening_noise: float = Field(0.02, alias="screening noise")
+    screening_threshold: float = Field(0.1, alias="screening threshold")
+    screening_min_active: int = Field(3, alias="screening min active")
+
+    @classmethod
+    def from_options(cls, options: Dict[str, str]) -> "AgentSettings":
+        """由 sys.config 的键值构建，无法解析的项给出警告并使用默认值，未声明的键忽略"""
+        aliases = {field.alias for field in cls.model_fields.values()}
+        values = {key: value for key, value in options.items() if key in aliases}
+        try:
+            return cls.model_validate(values)
+        except ValidationError as e:
+            invalid = {str(error["loc"][0]) for error in e.errors() if error["loc"]}
+            for key in sorted(invalid):
+                print(f"⚠️ 警告：{key} 的取值 '{values.get(key)}' 无效，使用默认值")
+            return cls.model_validate({key: value for key, value in values.items() if key not in invalid})
@@ -0,0 +1,210 @@
+"""
+内核参数读写工具
+
+直接读写 /proc/sys、/sys/kernel/mm 和 /sys/block/<设备> 下的文件，不经过 sysctl 命令和 shell。
+每个参数的文件路径和读取格式由参数目录 (tunables.toml) 声明；
+根目录都可以配置，便于在伪造的 sysfs 目录树上验证。
+"""
+import os
+import re
+from typing import Dict, Iterable, List, Optional
+from pydantic import BaseModel
+from KernelTuneAgent.config import SYSCTL_PARAM_META
+from KernelTuneAgent.search_space import SearchSpace
+
+
+def sysctl_path(
+    name: str,
+    proc_root: str = "/proc/sys",
+    mm_root: str = "/sys/kernel/mm",
+    block_root: str = ""
+) -> str:
+    """返回参数对应的内核文件路径；block_root 为某个块设备的目录，未指定设备时块设备参数的路径为空"""
+    meta = SYSCTL_PARAM_META.get(name)
+    if meta is None:
+        return os.path.join(proc_root, *name.split("."))
+    root = {"proc": proc_root, "mm": mm_root, "block": block_root}[meta["root"]]
+    if not root:
+        return ""
+    return os.path.join(root, *meta["path"].split("/"))
+
+
+def parse_selected_value(raw: str) -> str:
+    """解析 'always [madvise] never' 这类带选中标记的取值"""
+    match = re.search(r"\[([^\]\s]+)\]", raw)
+    if match:
+        return match.group(1)
+    return raw.strip()
+
+
+def read_sysctl_value(
+    name: str,
+    proc_root: str = "/proc/sys",
+    mm_root: str = "/sys/kernel/mm",
+    block_root: str = ""
+) -> Optional[str]:
+    """读取单个参数的当前取值，读取失败返回 None"""
+    path = sysctl_path(name, proc_root, mm_root, block_root)
+    try:
+        with open(path, "r") as f:
+            raw = f.read()
+    except OSError:
+        return None
+    if SYSCTL_PARAM_META.get(name, {}).get("format") == "selected":
+        return parse_selected_value(raw)
+    return " ".join(raw.split())
+
+
+def read_current_config(
+    names: Iterable[str],
+    proc_root: str = "/proc/sys",
+    mm_root: str = "/sys/kernel/mm",
+    block_root: str = ""
+) -> Dict[str, str]:
+    """读取一组参数的当前生效值，跳过无法读取的参数"""
+    config = {}
+    for name in names:
+        value = read_sysctl_value(name, proc_root, mm_root, block_root)
+        if value is not None:
+            config[name] = value
+    return config
+
+
+def write_sysctl_value(
+    name: str,
+    value: str,
+    proc_root: str = "/proc/sys",
+    mm_root: str = "/sys/kernel/mm",
+    block_root: str = ""
+) -> None:
+    """写入单个参数，失败时抛出 OSError；文件不存在时不创建"""
+    path = sysctl_path(name, proc_root, mm_root, block_root)
+    if not path or not os.path.exists(path):
+        raise FileNotFoundError(2, "内核不支持该参数", path)
+    with open(path, "w") as f:
+        f.write(f"{value}\n")
+
+
+class ApplyResult(BaseModel):
+    """一次批量修改的结果"""
+    requested: Dict[str, str] = {}
+    previous: Dict[str, str] = {}      # 修改前的取值
+    effective: Dict[str, str] = {}     # 修改后读回的生效值
+    errors: List[str] = []
+    rolled_back: bool = False
+
+    @property
+    def success(self) -> bool:
+        return not self.errors
+
+    @property
+    def mismatched(self) -> Dict[str, str]:
+        """写入成功但读回值与请求值不一致的参数（内核可能对取值做了截断）"""
+        if self.rolled_back:
+            return {}
+        return {
+            name: self.effective.get(name, "")
+            for name, value in self.requested.items()
+            if name in self.effective and self.effective[name] != value
+        }
+
+    def describe(self) -> str:
+        lines = []
+        if self.errors:
+            lines.append("修改失败: " + "; ".join(self.errors))
+            if self.rolled_back:
+                lines.append("已回滚到修改前的取值")
+        for name, value in self.effective.items():
+            before = self.previous.get(name)
+            change = f"{before} -> {value}" if before is not None and before != value else value
+            lines.append(f"{name}: {change}")
+        for name, value in self.mismatched.items():
+            lines.append(f"⚠️ {name} 请求值 {self.requested[name]}，实际生效 {value}")
+        return "\n".join(lines)
+
+
+class SysctlApplier:
+    """
+    按搜索空间校验并批量修改内核参数。
+
+    修改前保存快照：last_snapshot 为最近一次修改前的取值，
+    original 为本会话中每个参数第一次被修改前的取值，可用 restore() 恢复。
+    """
+
+    def __init__(
+        self,
+        space: SearchSpace,
+        proc_root: str = "/proc/sys",
+        mm_root: str = "/sys/kernel/mm",
+        block_root: str = ""
+    ):
+        self.space = space
+        self.proc_root = proc_root
+        self.mm_root = mm_root
+        self.block_root = block_root
+        self.original: Dict[str, str] = {}
+        self.last_snapshot: Dict[str, str] = {}
+
+    def read(self, names: Optional[Iterable[str]] = None) -> Dict[str, str]:
+        """读取参数的当前生效值，默认读取搜索空间中的全部参数"""
+        return read_current_config(
+            names if names is not None else self.space.names, self.proc_root, self.mm_root, self.block_root
+        )
+
+    def validate(self, config: Dict[str, object]) -> List[str]:
+        """检查参数名和取值是否在参数目录规定的范围和步长上"""
+        errors = []
+        for name, value in config.items():
+            spec = self.space.specs.get(name)
+            if spec is None:
+                errors.append(f"{name}: 不是可调参数")
+            elif not spec.is_valid(value):
+                if name in self.space.frozen:
+                    errors.append(f"{name}={value}: 该参数已在参数筛选中冻结，只能取默认值 {spec.default}")
+                    continue
+                if spec.kind == "choice":
+                    legal = "/".join(spec.choices)
+                else:
+                    legal = f"{spec.low}-{spec.high}, step {spec.step}"
+                errors.append(f"{name}={value}: 不合法（取值范围 {legal}，最接近的合法值为 {spec.snap(value)}）")
+        return errors
+
+    def _write_all(self, config: Dict[str, str]) -> List[str]:
+        errors = []
+        for name, value in config.items():
+            try:
+                write_sysctl_value(name, value, self.proc_root, self.mm_root, self.block_root)
+            except OSError as e:
+                errors.append(f"{name}: {e.strerror or e}")
+        return errors
+
+    def apply(self, config: Dict[str, object], rollback: bool = True) -> ApplyResult:
+        """
+        校验并写入整组配置，读回生效值。
+        任一取值不合法时不做任何修改；写入出错且 rollback 为 True 时恢复修改前的取值。
+        """
+        requested = {name: str(value).strip() for name, value in config.items()}
+        result = ApplyResult(requested=requested)
+        result.errors = self.validate(requested)
+        if result.errors:
+            return result
+
+        result.previous = self.read(requested)
+        self.last_snapshot = dict(result.previous)
+        for name, value in result.previous.items():
+            self.original.setdefault(name, value)
+
+        result.errors = self._write_all(requested)
+        if result.errors and rollback:
+            self._write_all({name: value for name, value in result.previous.items() if name in requested})
+            result.rolled_back = True
+        result.effective = self.read(requested)
+        return result
+
+    def restore(self, snapshot: Optional[Dict[str, str]] = None) -> ApplyResult:
+        """恢复快照（默认恢复会话开始前的取值），不做范围校验"""
+        snapshot = dict(self.original if snapshot is None else snapshot)
+        result = ApplyResult(requested=snapshot, previous=self.read(snapshot))
+        result.errors = self._write_all(snapshot)
+        result.effective = self.read(snapshot)
+        return result
@@ -0,0 +1,472 @@
+"""
+试验期间的系统观测
+
+训练运行时按固定间隔采样：
+- /proc/vmstat: 缺页、直接回收、内存规整、THP 分配、换页、NUMA 迁移、脏页写回等累计计数，记录每个间隔的增量
+- /proc/meminfo: 可用内存、脏页、回写中页面、匿名大页等瞬时值
+- /proc/pressure/{cpu,memory,io}: PSI stall 累计时间，换算为试验期间的 stall 时间占比
+
+训练进程启动后，ProcessTracker 按会话 ID 跟踪整个训练进程树，读取每个进程的
+stat / status / schedstat / io / numa_maps，得到训练任务自身的缺页、上下文切换、
+运行队列等待、IO 字节数和各 NUMA 节点上的内存分布，用于判断参数修改是否真正影响了训练任务。
+采样读取 /proc 文件和查找进程树（需要遍历 /proc 下的全部进程）都在线程中执行，
+不阻塞事件循环上的输出读取和提前终止判断。
+
+采样结果按列保存在 array 中，试验结束后汇总为 TelemetryDigest，
+附在试验记录上并写入反馈提示词，让参数调整依据实际观测到的瓶颈。
+"""
+import asyncio
+import math
+import os
+import time
+from array import array
+from typing import Dict, List, Optional, Tuple
+from pydantic import BaseModel
+
+# vmstat 计数 -> 在旧内核上按内存区域拆分的同名计数（如 allocstall_normal）
+VMSTAT_COUNTERS = (
+    "pgfault", "pgmajfault", "pswpin", "pswpout",
+    "allocstall", "pgscan_direct", "pgsteal_direct", "pgscan_kswapd",
+    "compact_stall", "compact_fail", "compact_success",
+    "thp_fault_alloc", "thp_fault_fallback", "thp_collapse_alloc",
+    "nr_dirtied", "nr_written", "numa_hint_faults", "numa_pages_migrated",
+)
+ZONE_SUFFIXES = ("dma", "dma32", "normal", "high", "movable", "device")
+MEMINFO_GAUGES = ("MemAvailable", "Cached", "Dirty", "Writeback", "AnonHugePages")
+PSI_RESOURCES = ("cpu", "memory", "io")
+
+# 判断瓶颈的阈值：PSI some 的 stall 时间占比
+MEMORY_PRESSURE_THRESHOLD = 0.05
+IO_PRESSURE_THRESHOLD = 0.05
+CPU_PRESSURE_THRESHOLD = 0.20
+
+
+class TimeSeries:
+    """按列存储的时间序列：每个指标一个 array('d')，缺失值为 nan"""
+
+    def __init__(self, names: List[str]):
+        self.names = list(names)
+        self.index = {name: i for i, name in enumerate(self.names)}
+        self.timestamps = array("d")
+        self.columns = [array("d") for _ in self.names]
+
+    def __len__(self) -> int:
+        return len(self.timestamps)
+
+    def append(self, timestamp: float, values: Dict[str, float]) -> None:
+        self.timestamps.append(timestamp)
+        for name, column in zip(self.names, self.columns):
+            column.append(values.get(name, math.nan))
+
+    def column(self, name: str) -> array:
+        return self.columns[self.index[name]]
+
+
+class ProcessDigest(BaseModel):
+    """训练进程树在一次试验中的资源使用"""
+    processes: int = 0                  # 观测到的进程数
+    minor_faults: float = 0.0
+    major_faults: float = 0.0
+    voluntary_switches: float = 0.0
+    involuntary_switches: float = 0.0
+    cpu_time: float = 0.0               # 用户态 + 内核态 CPU 时间（秒）
+    runqueue_wait: float = 0.0          # 在运行队列中等待的时间（秒）
+    read_bytes: float = 0.0             # 实际落到块设备的读写字节数
+    write_bytes: float = 0.0
+    peak_rss: float = 0.0               # 进程树 RSS 之和的峰值（kB）
+    numa_nodes: Dict[str, float] = {}   # 节点 -> 驻留内存（kB），最后一次读取 numa_maps 的结果
+
+    def numa_locality(self) -> Optional[float]:
+        """驻留内存最多的节点所占比例，单节点或没有数据时为 None"""
+        total = sum(self.numa_nodes.values())
+        if len(self.numa_nodes) < 2 or total <= 0:
+            return None
+        return max(self.numa_nodes.values()) / total
+
+    def describe(self, reference: Optional["ProcessDigest"] = None) -> str:
+        def value(name: str, scale: float = 1.0, fmt: str = ".0f") -> str:
+            text = f"{getattr(self, name) / scale:{fmt}}"
+            if reference is not None:
+                text += f" (baseline {getattr(reference, name) / scale:{fmt}})"
+            return text
+
+        line = (
+            f"训练进程 ({self.processes} 个): 缺页 {value('minor_faults')}, 主缺页 {value('major_faults')}, "
+            f"自愿/非自愿切换 {value('voluntary_switches')}/{value('involuntary_switches')}, "
+            f"CPU {value('cpu_time', fmt='.1f')} 秒, 运行队列等待 {value('runqueue_wait', fmt='.2f')} 秒, "
+            f"读/写 {value('read_bytes', 1 << 20)}/{value('write_bytes', 1 << 20)} MB, "
+            f"RSS 峰值 {value('peak_rss', 1024)} MB"
+        )
+        locality = self.numa_locality()
+        if locality is not None:
+            nodes = ", ".join(f"{node} {kb / 1024:.0f} MB" for node, kb in sorted(self.numa_nodes.items()))
+            line += f"\nNUMA 内存分布: {nodes}，主节点占比 {locality:.1%}"
+            if reference is not None and reference.numa_locality() is not None:
+                line += f" (baseline {reference.numa_locality():.1%})"
+        return line
+
+
+class TelemetryDigest(BaseModel):
+    """一次试验期间的系统观测汇总"""
+    duration: float = 0.0
+    samples: int = 0
+    counters: Dict[str, float] = {}        # vmstat 计数在试验期间的增量
+    peak_rates: Dict[str, float] = {}      # 单个采样间隔内每秒增量的峰值
+    gauges: Dict[str, List[float]] = {}    # meminfo 瞬时值 [均值, 最大值]，单位 kB
+    pressure: Dict[str, float] = {}        # "memory.some" -> 试验期间 stall 时间占比
+    process: Optional[ProcessDigest] = None
+    hints: List[str] = []
+
+    def _counter(self, name: str, reference: Optional["TelemetryDigest"]) -> str:
+        value = f"{self.counters.get(name, 0):.0f}"
+        if reference is not None and name in reference.counters:
+            value += f" (baseline {reference.counters[name]:.0f})"
+        return value
+
+    def describe(self, reference: Optional["TelemetryDigest"] = None) -> str:
+        """紧凑的文字描述，reference 为 baseline 试验的观测，用于对照"""
+        lines = [
+            f"缺页 {self._counter('pgfault', reference)}, 主缺页 {self._counter('pgmajfault', reference)}, "
+            f"直接回收 allocstall {self._counter('allocstall', reference)}, "
+            f"内存规整 compact_stall {self._counter('compact_stall', reference)}, "
+            f"THP 分配 {self._counter('thp_fault_alloc', reference)} / 回退 {self._counter('thp_fault_fallback', reference)}, "
+            f"换入/换出 {self._counter('pswpin', reference)}/{self._counter('pswpout', reference)}"
+        ]
+        if self.pressure:
+            lines.append("PSI some: " + ", ".join(
+                f"{resource} {self.pressure[f'{resource}.some']:.1%}"
+                for resource in PSI_RESOURCES if f"{resource}.some" in self.pressure
+            ))
+        if "Dirty" in self.gauges:
+            dirty_mean, dirty_max = self.gauges["Dirty"]
+            writeback_max = self.gauges.get("Writeback", [0.0, 0.0])[1]
+            lines.append(
+                f"脏页 平均 {dirty_mean / 1024:.0f} MB, 峰值 {dirty_max / 1024:.0f} MB, 回写中峰值 {writeback_max / 1024:.0f} MB"
+            )
+        if self.process is not None:
+            lines.append(self.process.describe(reference.process if reference is not None else None))
+        lines.extend(f"- {hint}" for hint in self.hints)
+        return "\n".join(lines)
+
+
+def _read_key_values(path: str) -> Dict[str, float]:
+    """读取 'key value' 或 'key: value kB' 格式的文件"""
+    values = {}
+    try:
+        with open(path, "r") as f:
+            for line in f:
+                parts = line.replace(":", " ").split()
+                if len(parts) < 2:
+                    continue
+                try:
+                    values[parts[0]] = float(parts[1])
+                except ValueError:
+                    continue
+    except OSError:
+        pass
+    return values
+
+
+def _read_pressure(path: str) -> Dict[str, float]:
+    """读取 PSI 文件中 some/full 的累计 stall 时间（微秒）"""
+    totals = {}
+    try:
+        with open(path, "r") as f:
+            for line in f:
+                parts = line.split()
+                if not parts:
+                    continue
+                for field in parts[1:]:
+                    if field.startswith("total="):
+                        totals[parts[0]] = float(field[len("total="):])
+    except (OSError, ValueError):
+        pass
+    return totals
+
+
+class ProcessTracker:
+    """
+    跟踪以 root_pid 为会话首进程的训练进程树。
+    进程在试验中启动，各项累计计数从 0 开始，保存每个进程最后一次读到的值即可得到整个试验的用量；
+    上下文切换和运行队列等待按线程统计，需要遍历 task 目录。numa_maps 较大，按 numa_interval 降低读取频率。
+    """
+
+    def __init__(self, proc_root: str, root_pid: int, numa_interval: float = 10.0):
+        self.proc_root = proc_root
+        self.root_pid = root_pid
+        self.numa_interval = numa_interval
+        self.clock_ticks = os.sysconf("SC_CLK_TCK") if hasattr(os, "sysconf") else 100
+        self.counters: Dict[int, Dict[str, float]] = {}
+        self.peak_rss = 0.0
+        self.numa_nodes: Dict[str, float] = {}
+        self._last_numa = -math.inf
+
+    def members(self) -> List[int]:
+        """会话 ID 等于 root_pid 的所有进程"""
+        pids = []
+        try:
+            entries = os.listdir(self.proc_root)
+        except OSError:
+            return pids
+        for entry in entries:
+            if not entry.isdigit():
+                continue
+            fields = self._stat_fields(int(entry))
+            if fields is not None and int(fields[3]) == self.root_pid:
+                pids.append(int(entry))
+        return pids
+
+    def _stat_fields(self, pid: int) -> Optional[List[str]]:
+        """/proc/<pid>/stat 中进程名之后的字段（进程名可能含空格和括号）"""
+        try:
+            with open(os.path.join(self.proc_root, str(pid), "stat"), "r") as f:
+                text = f.read()
+        except OSError:
+            return None
+        return text[text.rfind(")") + 2:].split()
+
+    def _read_process(self, pid: int, fields: List[str]) -> Dict[str, float]:
+        base = os.path.join(self.proc_root, str(pid))
+        counters = {
+            "minor_faults": float(fields[7]),
+            "major_faults": float(fields[9]),
+            "cpu_time": (float(fields[11]) + float(fields[12])) / self.clock_ticks,
+            "voluntary_switches": 0.0,
+            "involuntary_switches": 0.0,
+            "runqueue_wait": 0.0,
+        }
+        try:
+            tids = os.listdir(os.path.join(base, "task"))
+        except OSError:
+            tids = []
+        for tid in tids:
+            task = os.path.join(base, "task", tid)
+            status = _read_key_values(os.path.join(task, "status"))
+            counters["voluntary_switches"] += status.get("voluntary_ctxt_switches", 0.0)
+            counters["involuntary_switches"] += status.get("nonvoluntary_ctxt_switches", 0.0)
+            try:
+                with open(os.path.join(task, "schedstat"), "r") as f:
+                    counters["runqueue_wait"] += float(f.read().split()[1]) / 1e9
+            except (OSError, IndexError, ValueError):
+                pass
+        io = _read_key_values(os.path.join(base, "io"))
+        counters["read_bytes"] = io.get("read_bytes", 0.0)
+        counters["write_bytes"] = io.get("write_bytes", 0.0)
+        counters["rss"] = _read_key_values(os.path.join(base, "status")).get("VmRSS", 0.0)
+        return counters
+
+    def _read_numa(self, pids: List[int]) -> Dict[str, float]:
+        """按 numa_maps 中的 N<node>=<pages> 和 kernelpagesize_kB 汇总各节点的驻留内存"""
+        nodes: Dict[str, float] = {}
+        for pid in pids:
+            try:
+                with open(os.path.join(self.proc_root, str(pid), "numa_maps"), "r") as f:
+                    for line in f:
+                        page_kb = 4.0
+                        pages = []
+                        for field in line.split()[2:]:
+                            key, _, value = field.partition("=")
+                            if key == "kernelpagesize_kB":
+                                page_kb = float(value)
+                            elif key[:1] == "N" and key[1:].isdigit():
+                                pages.append((key, float(value)))
+                        for node, count in pages:
+                            nodes[node] = nodes.get(node, 0.0) + count * page_kb
+            except (OSError, ValueError):
+                continue
+        return nodes
+
+    def sample(self, now: float) -> None:
+        pids = self.members()
+        rss = 0.0
+        for pid in pids:
+            fields = self._stat_fields(pid)
+            if fields is None:
+                continue
+            try:
+                counters = self._read_process(pid, fields)
+            except (IndexError, ValueError):
+                continue
+            rss += counters.pop("rss")
+            self.counters[pid] = counters
+        self.peak_rss = max(self.peak_rss, rss)
+        if pids and now - self._last_numa >= self.numa_interval:
+            nodes = self._read_numa(pids)
+            if nodes:
+                self.numa_nodes = nodes
+            self._last_numa = now
+
+    def digest(self) -> ProcessDigest:
+        totals: Dict[str, float] = {}
+        for counters in self.counters.values():
+            for name, value in counters.items():
+                totals[name] = totals.get(name, 0.0) + value
+        return ProcessDigest(processes=len(self.counters), peak_rss=self.peak_rss, numa_nodes=self.numa_nodes, **totals)
+
+
+class TelemetrySampler:
+    """训练期间在后台按固定间隔采样系统统计"""
+
+    def __init__(self, proc_root: str = "/proc", interval: float = 1.0, numa_interval: float = 10.0):
+        self.proc_root = proc_root
+        self.interval = interval
+        self.numa_interval = numa_interval
+        self.series: Optional[TimeSeries] = None
+        self.tracker: Optional[ProcessTracker] = None
+        self._task: Optional[asyncio.Task] = None
+        self._stopping: Optional[asyncio.Event] = None
+        self._first: Dict[str, float] = {}
+        self._previous: Dict[str, float] = {}
+        self._start = 0.0
+
+    def available(self) -> bool:
+        return os.path.exists(os.path.join(self.proc_root, "vmstat"))
+
+    def snapshot(self) -> Tuple[Dict[str, float], Dict[str, float]]:
+        """返回 (累计计数, 瞬时值)；PSI 累计时间以 'memory.some' 形式计入累计计数"""
+        vmstat = _read_key_values(os.path.join(self.proc_root, "vmstat"))
+        counters = {}
+        for name in VMSTAT_COUNTERS:
+            if name in vmstat:
+                counters[name] = vmstat[name]
+                continue
+            zones = [vmstat[f"{name}_{zone}"] for zone in ZONE_SUFFIXES if f"{name}_{zone}" in vmstat]
+            if zones:
+                counters[name] = sum(zones)
+        for resource in PSI_RESOURCES:
+            for kind, total in _read_pressure(os.path.join(self.proc_root, "pressure", resource)).items():
+                counters[f"{resource}.{kind}"] = total
+        meminfo = _read_key_values(os.path.join(self.proc_root, "meminfo"))
+        gauges = {name: meminfo[name] for name in MEMINFO_GAUGES if name in meminfo}
+        return counters, gauges
+
+    async def start(self) -> None:
+        """记录初始快照并启动后台采样"""
+        counters, gauges = await asyncio.to_thread(self.snapshot)
+        self._first = self._previous = counters
+        self._start = time.monotonic()
+        self.tracker = None
+        self.series = TimeSeries(sorted(counters) + sorted(gauges))
+        self.series.append(0.0, {**{name: 0.0 for name in counters}, **gauges})
+        self._stopping = asyncio.Event()
+        self._task = asyncio.create_task(self._loop())
+
+    def track(self, pid: int) -> None:
+        """训练进程启动后调用，开始跟踪以 pid 为会话首进程的进程树，从下一个采样点开始读取"""
+        self.tracker = ProcessTracker(self.proc_root, pid, self.numa_interval)
+
+    async def _loop(self) -> None:
+        while True:
+            try:
+                await asyncio.wait_for(self._stopping.wait(), self.interval)
+                return
+            except asyncio.TimeoutError:
+                pass
+            await self._sample()
+            await self._sample_processes()
+
+    async def _sample_processes(self) -> None:
+        """在线程中读取训练进程树"""
+        if self.tracker is not None:
+            await asyncio.to_thread(self.tracker.sample, time.monotonic())
+
+    async def _sample(self) -> None:
+        """追加一个采样点：累计计数记录相对上一个采样点的增量"""
+        counters, gauges = await asyncio.to_thread(self.snapshot)
+        values = {name: counters[name] - self._previous[name] for name in counters if name in self._previous}
+        values.update(gauges)
+        self.series.append(time.monotonic() - self._start, values)
+        self._previous = counters
+
+    async def stop(self) -> Optional[TelemetryDigest]:
+        """停止采样，补充最后一个采样点并返回汇总；未启动时返回 None"""
+        if self._task is None:
+            return None
+        # 不取消采样任务：线程中的进程树读取无法随任务取消，等它读完再补充最后一个采样点
+        self._stopping.set()
+        await self._task
+        self._task = None
+        await self._sample()
+        await self._sample_processes()
+        return self.digest()
+
+    def digest(self) -> TelemetryDigest:
+        """汇总已采集的序列：累计计数取首尾快照之差，瞬时值取均值和最大值"""
+        series, first, last = self.series, self._first, self._previous
+        duration = series.timestamps[-1] if len(series) else 0.0
+        counters = {
+            name: last[name] - first[name]
+            for name in VMSTAT_COUNTERS if name in last and name in first
+        }
+        pressure = {}
+        if duration > 0:
+            for name in last:
+                if "." in name and name in first:
+                    pressure[name] = min(1.0, (last[name] - first[name]) / (duration * 1e6))
+
+        # 每秒增量的峰值；停止采样时补充的最后一个间隔可能很短，不足半个间隔的不参与统计
+        peak_rates = {}
+        for name in counters:
+            if name not in series.index:
+                continue
+            column = series.column(name)
+            best = 0.0
+            for i in range(1, len(series)):
+                dt = series.timestamps[i] - series.timestamps[i - 1]
+                if dt >= self.interval / 2 and not math.isnan(column[i]):
+                    best = max(best, column[i] / dt)
+            peak_rates[name] = best
+
+        gauges = {}
+        for name in MEMINFO_GAUGES:
+            if name not in series.index:
+                continue
+            values = [v for v in series.column(name) if not math.isnan(v)]
+            if values:
+                gauges[name] = [sum(values) / len(values), max(values)]
+
+        digest = TelemetryDigest(
+            duration=duration,
+            samples=len(series),
+            counters=counters,
+            peak_rates=peak_rates,
+            gauges=gauges,
+            pressure=pressure,
+            process=self.tracker.digest() if self.tracker is not None else None,
+        )
+        digest.hints = diagnose(digest)
+        return digest
+
+
+def diagnose(digest: TelemetryDigest) -> List[str]:
+    """根据观测到的计数给出与可调参数对应的瓶颈提示"""
+    counters, pressure = digest.counters, digest.pressure
+    hints = []
+    if counters.get("allocstall", 0) > 0 or counters.get("pgscan_direct", 0) > 0:
+        hints.append(
+            f"出现直接回收 (allocstall {counters.get('allocstall', 0):.0f}, pgscan_direct {counters.get('pgscan_direct', 0):.0f})，"
+            f"可提高 vm.watermark_scale_factor 让 kswapd 更早回收"
+        )
+    if counters.get("pswpin", 0) + counters.get("pswpout", 0) > 0:
+        hints.append("发生换页，可降低 vm.swappiness")
+    if counters.get("compact_stall", 0) > 0:
+        hints.append(
+            f"直接内存规整 {counters['compact_stall']:.0f} 次，THP 分配可能引入停顿，可考虑 transparent_hugepage=madvise 或 never"
+        )
+    if counters.get("thp_fault_fallback", 0) > 0:
+        hints.append(f"THP 分配回退 {counters['thp_fault_fallback']:.0f} 次，连续大页不足")
+    if counters.get("numa_pages_migrated", 0) > 0:
+        hints.append(
+            f"NUMA 自动平衡迁移了 {counters['numa_pages_migrated']:.0f} 页，可对比 kernel.numa_balancing 开关的效果"
+        )
+    if pressure.get("io.some", 0) > IO_PRESSURE_THRESHOLD:
+        hints.append(
+            f"IO stall 占比 {pressure['io.some']:.1%}，可调整 vm.dirty_background_ratio / vm.dirty_ratio / vm.dirty_expire_centisecs"
+        )
+    if pressure.get("memory.some", 0) > MEMORY_PRESSURE_THRESHOLD:
+        hints.append(f"内存 stall 占比 {pressure['memory.some']:.1%}，存在内存压力")
+    if pressure.get("cpu.some", 0) > CPU_PRESSURE_THRESHOLD:
+        hints.append(f"CPU stall 占比 {pressure['cpu.some']:.1%}，瓶颈在 CPU 争用，内存参数的影响可能有限")
+    if not hints:
+        hints.append("未观测到明显的内存或 IO 瓶颈")
+    return hints
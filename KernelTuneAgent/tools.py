@@ -2,10 +2,16 @@
 工具系统实现
 """
 import os
-import subprocess
+import sys
 from abc import ABC, abstractmethod
-from typing import Dict, Any, List
-from pydantic import BaseModel
+from typing import Dict, Any, List, Optional, Tuple, Type
+from pydantic import BaseModel, ValidationError
+from KernelTuneAgent.measurement import Measurement
+from KernelTuneAgent.process import ProcessResult, Watchdog, run_process, run_shell
+from KernelTuneAgent.screening import CandidateScreener
+from KernelTuneAgent.search_space import GridIndex, SearchSpace
+from KernelTuneAgent.sysctl import SysctlApplier
+from KernelTuneAgent.trial import TrialResult, TrialRunner
 
 
 class ToolResult(BaseModel):
@@ -20,6 +26,9 @@ class BaseTool(ABC, BaseModel):
     name: str
     description: str
     parameters: Dict[str, Any]
+    timeout: Optional[float] = None         # 单次执行的总超时（秒）
+    idle_timeout: Optional[float] = None    # 看门狗：超过该时间没有任何输出即终止
+    max_output_bytes: int = 1024 * 1024     # 输出缓冲上限，只保留末尾部分
     
     @abstractmethod
     async def execute(self, **kwargs) -> ToolResult:
@@ -53,27 +62,20 @@ class PythonExecutor(BaseTool):
         "required": ["code"]
     }
     
+    timeout: Optional[float] = 300
+    
     async def execute(self, code: str, **kwargs) -> ToolResult:
+        # 在独立的解释器进程中执行，避免阻塞事件循环
         try:
-            # 简化版本：使用exec执行代码
-            local_vars = {}
-            global_vars = {"__builtins__": __builtins__}
-            
-            # 捕获输出
-            import io
-            import sys
-            old_stdout = sys.stdout
-            sys.stdout = mystdout = io.StringIO()
-            
-            try:
-                exec(code, global_vars, local_vars)
-                output = mystdout.getvalue()
-            finally:
-                sys.stdout = old_stdout
-            
-            return ToolResult(success=True, output=output)
+            result = await run_process(
+                [sys.executable, "-c", code],
+                timeout=self.timeout,
+                watchdog=Watchdog(self.idle_timeout),
+                max_output_bytes=self.max_output_bytes,
+            )
         except Exception as e:
             return ToolResult(success=False, error=str(e))
+        return process_to_tool_result(result)
 
 
 class FileEditor(BaseTool):
@@ -139,31 +141,221 @@ class BashExecutor(BaseTool):
         "required": ["command"]
     }
     
+    timeout: Optional[float] = 3600
+    
     async def execute(self, command: str, **kwargs) -> ToolResult:
         try:
-            result = subprocess.run(
+            result = await run_shell(
                 command,
-                shell=True,
-                capture_output=True,
-                text=True,
-                timeout=3600
+                timeout=self.timeout,
+                watchdog=Watchdog(self.idle_timeout),
+                max_output_bytes=self.max_output_bytes,
             )
-            
-            if result.returncode == 0:
-                return ToolResult(success=True, output=result.stdout)
+        except Exception as e:
+            return ToolResult(success=False, error=str(e))
+        return process_to_tool_result(result)
+
+
+class SysctlApplyTool(BaseTool):
+    """批量修改内核参数工具"""
+    model_config = {"arbitrary_types_allowed": True}
+
+    name: str = "sysctl_apply"
+    description: str = (
+        "一次性修改一组内核参数（含 transparent_hugepage），按可调参数的范围和步长校验后直接写入，"
+        "返回修改前后的生效值。也可读取当前取值或恢复到会话开始前的取值"
+    )
+    parameters: Dict[str, Any] = {
+        "type": "object",
+        "properties": {
+            "action": {
+                "type": "string",
+                "enum": ["apply", "read", "restore"],
+                "description": "操作类型：apply(修改), read(读取当前取值), restore(恢复到会话开始前的取值)"
+            },
+            "config": {
+                "type": "object",
+                "description": "apply 时要修改的参数，形如 {\"vm.swappiness\": \"10\", \"transparent_hugepage\": \"always\"}",
+                "additionalProperties": {"type": ["string", "integer"]}
+            }
+        },
+        "required": ["action"]
+    }
+    applier: SysctlApplier
+
+    async def execute(self, action: str = "apply", config: Optional[Dict[str, Any]] = None, **kwargs) -> ToolResult:
+        try:
+            if action == "read":
+                current = self.applier.read()
+                return ToolResult(success=True, output="\n".join(f"{k}: {v}" for k, v in current.items()))
+            if action == "restore":
+                result = self.applier.restore()
+            elif action == "apply":
+                if not config:
+                    return ToolResult(success=False, error="apply 需要提供 config")
+                result = self.applier.apply(config)
             else:
-                return ToolResult(success=False, error=result.stderr)
-                
-        except subprocess.TimeoutExpired:
-            return ToolResult(success=False, error="命令执行超时")
+                return ToolResult(success=False, error=f"未知操作: {action}")
         except Exception as e:
             return ToolResult(success=False, error=str(e))
+        if result.success:
+            return ToolResult(success=True, output=result.describe())
+        return ToolResult(success=False, output=result.describe(), error="; ".join(result.errors))
+
+
+class TrialTool(BaseTool):
+    """
+    结构化试验工具：LLM 一次提交整组配置，
+    经生成的 Pydantic 模型校验并对齐到合法网格后，直接应用并按测量策略训练。
+    结果保存在 last_results 中，由代理直接记录，不再从工具输出中解析。
+    有 index 时，与已评估配置过近的提交改道到附近的未评估配置（redirect 为 False 时拒绝）。
+    """
+    model_config = {"arbitrary_types_allowed": True}
+
+    name: str = "run_trial"
+    description: str = (
+        "提交一整组内核参数配置：校验并对齐到合法取值后应用，运行训练并返回训练耗时。"
+        "每轮只调用一次，参数必须包含全部可调参数"
+    )
+    parameters: Dict[str, Any]
+    config_model: Type[BaseModel]
+    space: SearchSpace
+    runner: TrialRunner
+    index: Optional[GridIndex] = None
+    redirect: bool = True
+    last_results: List[TrialResult] = []
+
+    def _validate(self, raw: Dict[str, Any]) -> Tuple[Optional[Dict[str, str]], List[str], str]:
+        """校验并对齐一组配置，返回 (对齐后的配置, 被调整的取值说明, 错误信息)"""
+        try:
+            validated = self.config_model.model_validate(raw)
+        except ValidationError as e:
+            errors = "; ".join(f"{'.'.join(str(p) for p in err['loc'])}: {err['msg']}" for err in e.errors())
+            return None, [], f"配置校验失败: {errors}"
+        requested = {name: str(value) for name, value in validated.model_dump(by_alias=True).items()}
+        config = self.space.snap(requested)
+        adjusted = [
+            f"{name}: {requested[name]} -> {value}" for name, value in config.items()
+            if name in requested and requested[name] != value
+        ]
+        return config, adjusted, ""
+
+    def _describe(self, result: TrialResult) -> List[str]:
+        """一次试验结果的文字描述"""
+        if result.censored:
+            return ["训练已被提前终止：按当前进度推算，本轮配置明显劣于已完成的试验，视为失败方案"]
+        if result.training_time is None:
+            return [f"训练失败: {result.error}"]
+        measurement = Measurement(samples=result.samples)
+        source = "（结果来自缓存，未重新训练）" if result.cached else ""
+        lines = [f"平均训练耗时: {result.training_time} 秒 {source}"]
+        if measurement.n > 1:
+            lines.append(f"多次测量: {measurement.describe(self.runner.policy.confidence)}")
+        return lines
+
+    async def execute(self, **kwargs) -> ToolResult:
+        self.last_results = []
+        config, adjusted, error = self._validate(kwargs)
+        if config is None:
+            return ToolResult(success=False, error=error)
+        note = ""
+        if self.index is not None:
+            config, note = self.index.check(config, redirect=self.redirect)
+            if config is None:
+                return ToolResult(success=False, error=f"{note}，请提交与历史试验差异更大的配置")
+
+        try:
+            result = await self.runner.measure(config)
+        except Exception as e:
+            return ToolResult(success=False, error=str(e))
+        self.last_results = [result]
+
+        lines = ["已应用配置:"] + [f"{name}: {value}" for name, value in result.config.items()]
+        if adjusted:
+            lines.append("以下取值已对齐到合法网格: " + ", ".join(adjusted))
+        if note:
+            lines.append(note)
+        lines.extend(self._describe(result))
+        if result.training_time is None and not result.censored:
+            return ToolResult(success=False, output="\n".join(lines), error=result.error)
+        return ToolResult(success=True, output="\n".join(lines))
+
+
+class BatchTrialTool(TrialTool):
+    """
+    批量候选试验工具：LLM 一次提交一批候选配置，
+    校验、判重、约束检查并按代理模型排序后，只训练排在最前面的 top_k 组。
+    """
+    name: str = "run_trials"
+    description: str = (
+        "一次提交一批互不相同的候选配置（每组包含全部可调参数），"
+        "工具会剔除重复和违反约束的候选，按历史试验排序后只训练最有希望的几组，返回训练耗时"
+    )
+    screener: CandidateScreener
+    top_k: int = 1
+
+    async def execute(self, configs: Optional[List[Dict[str, Any]]] = None, **kwargs) -> ToolResult:
+        self.last_results = []
+        if not configs:
+            return ToolResult(success=False, error="需要提供 configs 候选列表")
+
+        notes = []
+        valid = []
+        indices = {}                   # 对齐后的配置 -> 候选序号
+        for index, raw in enumerate(configs, 1):
+            config, _, error = self._validate(raw if isinstance(raw, dict) else {})
+            if config is None:
+                notes.append(f"候选 {index}: 剔除，{error[:200]}")
+                continue
+            valid.append(config)
+            indices.setdefault(self.space.key(config), index)
+        candidates = self.screener.screen(valid)
+        selected = [c for c in candidates if not c.rejected][:self.top_k]
+        for candidate in candidates:
+            if candidate.rejected:
+                notes.append(f"候选 {indices[self.space.key(candidate.config)]}: 剔除，{candidate.rejected}")
+        skipped = len([c for c in candidates if not c.rejected]) - len(selected)
+        if skipped:
+            notes.append(f"另有 {skipped} 个候选排名靠后，未训练")
+        if not selected:
+            notes.append("没有候选通过筛选，请重新提交与历史试验不同且满足约束的配置")
+            return ToolResult(success=False, output="\n".join(notes), error="没有候选通过筛选")
+
+        # 每个候选的训练结果各占一行放在最前面，输出过长被截断时优先保留
+        lines = []
+        details = []
+        defaults = self.space.default_config()
+        for rank, candidate in enumerate(selected, 1):
+            index = indices[self.space.key(candidate.config)]
+            score = "" if candidate.score is None else f"，得分 {candidate.score:.4g}"
+            print(f"🧪 训练第 {rank}/{len(selected)} 个入选候选: 候选 {index}{score}")
+            try:
+                result = await self.runner.measure(candidate.config)
+            except Exception as e:
+                return ToolResult(success=False, output="\n".join(lines + details + notes), error=str(e))
+            self.last_results.append(result)
+            lines.append(f"候选 {index}{score}: {'；'.join(self._describe(result))}")
+            changed = [f"{name}={value}" for name, value in result.config.items() if defaults.get(name) != value]
+            details.append(f"候选 {index} 与默认值不同的参数: {', '.join(changed) or '无'}")
+        return ToolResult(success=True, output="\n".join(lines + details + notes))
+
+
+def process_to_tool_result(result: ProcessResult) -> ToolResult:
+    """把子进程结果转换为工具结果"""
+    if result.timed_out:
+        return ToolResult(success=False, output=result.stdout, error="命令执行超时")
+    if result.idle_timed_out:
+        return ToolResult(success=False, output=result.stdout, error="命令长时间没有输出，已被看门狗终止")
+    if result.returncode == 0:
+        return ToolResult(success=True, output=result.stdout)
+    return ToolResult(success=False, output=result.stdout, error=result.stderr or f"命令退出码: {result.returncode}")
 
 
 class ToolCollection:
     """工具集合管理"""
     def __init__(self):
         self.tools: Dict[str, BaseTool] = {}
+        self._definitions: Optional[List[Dict[str, Any]]] = None
         
         # 注册默认工具
         self.register_tool(PythonExecutor())
@@ -173,10 +365,29 @@ class ToolCollection:
     def register_tool(self, tool: BaseTool):
         """注册工具"""
         self.tools[tool.name] = tool
+        self._definitions = None
+
+    def configure_tool(
+        self,
+        name: str,
+        timeout: Optional[float] = None,
+        idle_timeout: Optional[float] = None
+    ):
+        """设置某个工具的超时和看门狗时间，传 None 的项保持不变"""
+        tool = self.tools[name]
+        if timeout is not None:
+            tool.timeout = timeout
+        if idle_timeout is not None:
+            tool.idle_timeout = idle_timeout
     
     def get_tool_definitions(self) -> List[Dict[str, Any]]:
-        """获取所有工具的函数定义"""
-        return [tool.to_function_def() for tool in self.tools.values()]
+        """
+        获取所有工具的函数定义。
+        定义只在注册工具后重新生成，每次请求返回同一份内容，便于服务端复用前缀缓存。
+        """
+        if self._definitions is None:
+            self._definitions = [tool.to_function_def() for tool in self.tools.values()]
+        return self._definitions
     
     async def execute_tool(self, name: str, **kwargs) -> ToolResult:
         """执行指定工具"""
@@ -0,0 +1,212 @@
+"""
+调优会话的耗时追踪
+
+用 span 记录会话中每一段工作的起止时间：
+- session / think / act: 代理主循环
+- llm.chat: 每次 LLM 请求（含投机请求），附带 token 数、延迟和重试次数
+- tool: 每次工具执行
+- trial / measure: 每次训练和每组配置的重复测量，附带 trial_id
+
+span 结束时追加写入 JSONL 文件（每行一条）；同时按名称聚合为直方图，
+可以导出为 Prometheus 文本格式写入文件，或通过本地 HTTP 端口提供 /metrics。
+"""
+import asyncio
+import contextvars
+import json
+import os
+import time
+import uuid
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+# 直方图桶的上界（秒），覆盖从毫秒级的代理开销到小时级的训练
+DEFAULT_BUCKETS = (0.01, 0.05, 0.1, 0.5, 1, 5, 10, 30, 60, 300, 900, 3600, 7200)
+
+# 计入会话耗时拆分的 span 类别（试验隔离在训练 span 之内，单独列出其中的耗时）
+BREAKDOWN_SPANS = (("llm.chat", "LLM 请求"), ("tool", "工具执行"), ("trial", "训练"), ("isolation", "其中试验隔离"))
+
+_current_span: contextvars.ContextVar[Optional["Span"]] = contextvars.ContextVar("kta_current_span", default=None)
+
+
+class Span:
+    """一段有起止时间的工作"""
+    __slots__ = ("name", "span_id", "parent_id", "start", "end", "attributes", "_t0", "_t1")
+
+    def __init__(self, name: str, parent_id: Optional[str], attributes: Dict[str, Any]):
+        self.name = name
+        self.span_id = uuid.uuid4().hex[:16]
+        self.parent_id = parent_id
+        self.start = time.time()
+        self.end: Optional[float] = None
+        self.attributes = attributes
+        self._t0 = time.monotonic()
+        self._t1: Optional[float] = None
+
+    def set(self, **attributes: Any) -> None:
+        """补充属性，值为 None 的忽略"""
+        self.attributes.update({key: value for key, value in attributes.items() if value is not None})
+
+    def finish(self) -> None:
+        self._t1 = time.monotonic()
+        self.end = self.start + (self._t1 - self._t0)
+
+    @property
+    def duration(self) -> float:
+        return (self._t1 if self._t1 is not None else time.monotonic()) - self._t0
+
+    def interval(self) -> Tuple[float, float]:
+        """单调时钟上的 (开始, 结束)"""
+        return self._t0, self._t1 if self._t1 is not None else time.monotonic()
+
+    def to_dict(self, session_id: str) -> Dict[str, Any]:
+        return {
+            "session": session_id,
+            "span": self.name,
+            "span_id": self.span_id,
+            "parent_id": self.parent_id,
+            "start": round(self.start, 6),
+            "duration": round(self.duration, 6),
+            **self.attributes,
+        }
+
+
+class Tracer:
+    """收集 span，写入 JSONL 并维护 Prometheus 指标"""
+
+    def __init__(self, jsonl_path: Optional[str] = None, buckets: Tuple[float, ...] = DEFAULT_BUCKETS):
+        self.session_id = uuid.uuid4().hex[:12]
+        self.jsonl_path = jsonl_path
+        self.buckets = tuple(sorted(buckets))
+        self.spans: List[Span] = []
+        # 名称 -> [各桶计数..., +Inf 计数]，以及总耗时
+        self._bucket_counts: Dict[str, List[int]] = {}
+        self._duration_sums: Dict[str, float] = {}
+        self._tokens: Dict[str, int] = {"prompt": 0, "completion": 0}
+        self._errors: Dict[str, int] = {}
+        self._file = None
+        self._server: Optional[asyncio.AbstractServer] = None
+        if jsonl_path:
+            directory = os.path.dirname(os.path.abspath(jsonl_path))
+            os.makedirs(directory, exist_ok=True)
+            self._file = open(jsonl_path, "a", encoding="utf-8")
+
+    @contextmanager
+    def span(self, name: str, **attributes: Any) -> Iterator[Span]:
+        """with tracer.span("trial", trial_id=3) as span: ...，嵌套的 span 自动记录父 span"""
+        parent = _current_span.get()
+        span = Span(name, parent.span_id if parent is not None else None,
+                    {key: value for key, value in attributes.items() if value is not None})
+        token = _current_span.set(span)
+        try:
+            yield span
+        except BaseException as e:
+            span.set(error=type(e).__name__)
+            raise
+        finally:
+            _current_span.reset(token)
+            span.finish()
+            self._record(span)
+
+    def _record(self, span: Span) -> None:
+        self.spans.append(span)
+        counts = self._bucket_counts.setdefault(span.name, [0] * (len(self.buckets) + 1))
+        duration = span.duration
+        for i, bound in enumerate(self.buckets):
+            if duration <= bound:
+                counts[i] += 1
+        counts[-1] += 1
+        self._duration_sums[span.name] = self._duration_sums.get(span.name, 0.0) + duration
+        self._tokens["prompt"] += int(span.attributes.get("prompt_tokens") or 0)
+        self._tokens["completion"] += int(span.attributes.get("completion_tokens") or 0)
+        if "error" in span.attributes:
+            self._errors[span.name] = self._errors.get(span.name, 0) + 1
+        if self._file is not None:
+            self._file.write(json.dumps(span.to_dict(self.session_id), ensure_ascii=False, default=str) + "\n")
+            self._file.flush()
+
+    def prometheus_text(self) -> str:
+        """Prometheus 文本格式的指标"""
+        lines = [
+            "# HELP kta_span_duration_seconds Duration of agent spans.",
+            "# TYPE kta_span_duration_seconds histogram",
+        ]
+        for name in sorted(self._bucket_counts):
+            counts = self._bucket_counts[name]
+            for bound, count in zip(self.buckets, counts):
+                lines.append(f'kta_span_duration_seconds_bucket{{span="{name}",le="{bound:g}"}} {count}')
+            lines.append(f'kta_span_duration_seconds_bucket{{span="{name}",le="+Inf"}} {counts[-1]}')
+            lines.append(f'kta_span_duration_seconds_sum{{span="{name}"}} {self._duration_sums[name]:.6f}')
+            lines.append(f'kta_span_duration_seconds_count{{span="{name}"}} {counts[-1]}')
+        lines.append("# HELP kta_span_errors_total Spans that ended with an exception.")
+        lines.append("# TYPE kta_span_errors_total counter")
+        for name in sorted(self._errors):
+            lines.append(f'kta_span_errors_total{{span="{name}"}} {self._errors[name]}')
+        lines.append("# HELP kta_llm_tokens_total Tokens reported by the LLM server.")
+        lines.append("# TYPE kta_llm_tokens_total counter")
+        for kind, count in self._tokens.items():
+            lines.append(f'kta_llm_tokens_total{{kind="{kind}"}} {count}')
+        return "\n".join(lines) + "\n"
+
+    def write_prometheus(self, path: str) -> None:
+        """写入文件（先写临时文件再替换，node_exporter textfile collector 不会读到半个文件）"""
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            f.write(self.prometheus_text())
+        os.replace(tmp_path, path)
+
+    async def serve(self, port: int, host: str = "127.0.0.1") -> None:
+        """在本地端口上提供 GET /metrics"""
+        async def handle(reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+            try:
+                request = await reader.readline()
+                while (await reader.readline()) not in (b"\r\n", b"\n", b""):
+                    pass
+                if request.split(b" ")[1:2] == [b"/metrics"]:
+                    body, status = self.prometheus_text().encode(), "200 OK"
+                else:
+                    body, status = b"not found\n", "404 Not Found"
+                writer.write(
+                    f"HTTP/1.1 {status}\r\nContent-Type: text/plain; version=0.0.4\r\n"
+                    f"Content-Length: {len(body)}\r\nConnection: close\r\n\r\n".encode() + body
+                )
+                await writer.drain()
+            finally:
+                writer.close()
+
+        self._server = await asyncio.start_server(handle, host, port)
+        print(f"📈 指标地址: http://{host}:{port}/metrics")
+
+    def breakdown(self, session: Optional[Span] = None) -> str:
+        """
+        会话耗时拆分：各类 span 的总耗时，以及不被任何 LLM 请求、工具执行、训练覆盖的代理自身耗时。
+        投机请求与训练并行，按时间区间取并集，避免重复计算。
+        """
+        session = session or next((span for span in reversed(self.spans) if span.name == "session"), None)
+        if session is None:
+            return ""
+        begin, end = session.interval()
+        lines = [f"会话耗时 {session.duration:.1f} 秒:"]
+        intervals = []
+        for name, label in BREAKDOWN_SPANS:
+            spans = [span for span in self.spans if span.name == name and span.interval()[0] >= begin]
+            if not spans:
+                continue
+            lines.append(f"  - {label}: {sum(span.duration for span in spans):.1f} 秒 ({len(spans)} 次)")
+            intervals.extend(span.interval() for span in spans)
+        covered, cursor = 0.0, begin
+        for start, stop in sorted(intervals):
+            start, stop = max(start, cursor), min(stop, end)
+            if stop > start:
+                covered += stop - start
+                cursor = stop
+        lines.append(f"  - 代理自身: {max(0.0, (end - begin) - covered):.1f} 秒")
+        return "\n".join(lines)
+
+    async def close(self) -> None:
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+            self._server = None
+        if self._file is not None:
+            self._file.close()
+            self._file = None
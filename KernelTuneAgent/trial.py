@@ -0,0 +1,387 @@
+"""
+试验执行器：应用一组配置，运行训练命令，读取训练耗时
+"""
+import asyncio
+import os
+import time
+from collections import deque
+from typing import Callable, Dict, List, Optional, Tuple
+from pydantic import BaseModel
+from KernelTuneAgent.cache import EvalCache
+from KernelTuneAgent.early_stop import EarlyStopper, ProgressParser
+from KernelTuneAgent.isolation import IsolationProtocol, IsolationReport
+from KernelTuneAgent.measurement import Measurement, MeasurementPolicy
+from KernelTuneAgent.metrics import MetricExtractor, TrialMetrics
+from KernelTuneAgent.process import Watchdog, run_shell
+from KernelTuneAgent.search_space import SearchSpace
+from KernelTuneAgent.sysctl import SysctlApplier
+from KernelTuneAgent.telemetry import TelemetryDigest, TelemetrySampler
+from KernelTuneAgent.tracing import Tracer
+
+class TrialResult(BaseModel):
+    """单次试验结果"""
+    config: Dict[str, str] = {}
+    training_time: Optional[float] = None  # 多次测量时为均值
+    samples: List[float] = []
+    fidelity: float = 1.0
+    cached: bool = False
+    # 被提前终止的试验：censored_time 为训练耗时的下界估计
+    censored: bool = False
+    censored_time: Optional[float] = None
+    telemetry: Optional[TelemetryDigest] = None    # 训练期间的系统观测（多次测量时为第一次）
+    metrics: Optional[TrialMetrics] = None         # 从日志和标准输出中提取的指标（多次测量时为第一次）
+    isolation: Optional[IsolationReport] = None    # 训练前执行的隔离步骤（多次测量时为第一次）
+    error: str = ""
+
+
+class StreamOutcome(BaseModel):
+    """流式执行训练命令的结果"""
+    returncode: Optional[int] = None
+    output: str = ""               # 标准输出末尾部分
+    error: str = ""                # 标准错误末尾部分
+    log_text: str = ""             # 训练日志中读到的末尾若干行
+    wall_time: float = 0.0
+    stopped: bool = False          # 是否被提前终止
+    timed_out: bool = False
+    metrics: TrialMetrics = TrialMetrics()
+
+
+class TrialRunner:
+    """
+    不经过 LLM，直接应用配置并运行训练。
+
+    fidelity 为训练预算占完整训练的比例 (0, 1]。小于 1 时，训练命令中的 {budget}
+    占位符会被替换为截断后的迭代数；命令中没有占位符时，把 fidelity_arg 追加到命令末尾。
+    同时通过环境变量 KTA_FIDELITY / KTA_BUDGET 传给训练脚本。
+    替换 {budget} 需要配置完整训练的预算 full_budget：训练命令中有占位符而没有预算时无法生成命令，直接报错；
+    只有 fidelity_arg 中有占位符时不做截断训练。
+
+    训练过程中持续读取标准输出并增量读取日志文件，逐行交给 extractor 提取训练耗时等指标；配置了 early_stopper 时，
+    一旦进度显示本次试验明显劣于历史试验就终止整个进程组，结果记为 censored。
+    配置了 sampler 时，训练期间在后台采样系统统计并跟踪训练进程树，汇总附在试验结果上。
+    配置了 isolation 时，每次训练前先执行隔离协议（清理缓存、等待系统平静、预热训练等）。
+    """
+
+    def __init__(
+        self,
+        train_cmd: str,
+        log_path: str,
+        param_names,
+        cache: Optional[EvalCache] = None,
+        fidelity_arg: str = "",
+        full_budget: int = 0,
+        early_stopper: Optional[EarlyStopper] = None,
+        progress_parser: Optional[ProgressParser] = None,
+        policy: Optional[MeasurementPolicy] = None,
+        timeout: float = 3600,
+        idle_timeout: Optional[float] = None,
+        poll_interval: float = 1.0,
+        max_output_lines: int = 200,
+        max_output_bytes: int = 1024 * 1024,
+        applier: Optional[SysctlApplier] = None,
+        sampler: Optional[TelemetrySampler] = None,
+        tracer: Optional[Tracer] = None,
+        extractor: Optional[MetricExtractor] = None,
+        isolation: Optional[IsolationProtocol] = None
+    ):
+        if full_budget <= 0 and "{budget}" in train_cmd:
+            raise ValueError("训练命令包含 {budget} 占位符，需要配置 full budget（完整训练的迭代数）")
+        if full_budget <= 0 and "{budget}" in fidelity_arg:
+            print("⚠️ fidelity arg 包含 {budget} 占位符但没有配置 full budget，不做截断训练")
+            fidelity_arg = ""
+        self.train_cmd = train_cmd
+        self.log_path = log_path
+        self.param_names = list(param_names)
+        self.cache = cache
+        self.fidelity_arg = fidelity_arg
+        self.full_budget = full_budget
+        self.early_stopper = early_stopper
+        self.progress_parser = progress_parser or ProgressParser()
+        self.policy = policy or MeasurementPolicy()
+        self.timeout = timeout
+        self.idle_timeout = idle_timeout
+        self.poll_interval = poll_interval
+        self.max_output_lines = max_output_lines
+        self.max_output_bytes = max_output_bytes
+        self.applier = applier or SysctlApplier(SearchSpace.from_meta(self.param_names))
+        self.sampler = sampler
+        self.tracer = tracer or Tracer()
+        self.extractor = extractor or MetricExtractor(log_path)
+        self.isolation = isolation
+        self.trial_seq = 0
+
+    def build_command(self, fidelity: float = 1.0) -> str:
+        """生成指定 fidelity 下的训练命令"""
+        if fidelity >= 1.0:
+            return self.train_cmd.replace("{budget}", str(self.full_budget)) if self.full_budget else self.train_cmd
+        budget = max(1, int(round(self.full_budget * fidelity))) if self.full_budget else 0
+        if "{budget}" in self.train_cmd:
+            command = self.train_cmd.replace("{budget}", str(budget))
+        elif self.fidelity_arg:
+            command = f"{self.train_cmd} {self.fidelity_arg.replace('{budget}', str(budget))}"
+        else:
+            command = self.train_cmd
+        return f"export KTA_FIDELITY={fidelity:g} KTA_BUDGET={budget}; {command}"
+
+    async def apply_config(self, config: Dict[str, str]) -> str:
+        """应用配置，返回错误信息（成功时为空字符串）"""
+        result = self.applier.apply(config)
+        return "; ".join(result.errors)
+
+    async def stream_command(
+        self,
+        command: str,
+        fidelity: float = 1.0,
+        on_start: Optional[Callable[[int], None]] = None,
+        early_stop: bool = True
+    ) -> StreamOutcome:
+        """
+        执行训练命令，同时流式读取标准输出和日志文件中的新增内容，
+        每一行都交给 extractor 提取指标，每解析到一条进度就交给 early_stopper 判断是否终止（early_stop 为 False 时不判断）。
+        标准输出和日志都长时间没有新内容时，由看门狗终止卡死的训练。
+        """
+        log_lines = deque(maxlen=self.max_output_lines)
+        extractor = self.extractor
+        extractor.start()
+        stop_event = asyncio.Event()
+        watchdog = Watchdog(self.idle_timeout)
+        early_stopper = self.early_stopper if early_stop else None
+        if early_stopper is not None:
+            early_stopper.start(fidelity)
+        start = time.monotonic()
+
+        def on_line(line: str) -> bool:
+            extractor.feed(line)
+            progress = self.progress_parser.parse(line)
+            if progress is None or early_stopper is None or stop_event.is_set():
+                return False
+            if early_stopper.update(progress[0], progress[1], time.monotonic() - start):
+                print(f"⏹️ 进度 {progress[0]}/{progress[1]} 明显劣于历史试验，提前终止训练")
+                stop_event.set()
+                return True
+            return False
+
+        def read_log_increment(final: bool = False) -> None:
+            seen_size = extractor.tailer.seen_size
+            lines = extractor.poll(final=final)
+            if lines or extractor.tailer.seen_size != seen_size:
+                # 只写了半行（例如进度条）也算有输出
+                watchdog.touch()
+            for line in lines:
+                log_lines.append(line)
+                on_line(line)
+
+        async def tail_log() -> None:
+            while True:
+                read_log_increment()
+                await asyncio.sleep(self.poll_interval)
+
+        tailer = asyncio.create_task(tail_log())
+        try:
+            result = await run_shell(
+                command,
+                timeout=self.timeout,
+                watchdog=watchdog,
+                on_line=on_line,
+                stop_event=stop_event,
+                max_output_bytes=self.max_output_bytes,
+                on_start=on_start,
+            )
+        finally:
+            tailer.cancel()
+            read_log_increment(final=True)
+
+        if result.idle_timed_out:
+            print(f"🐕 训练超过 {self.idle_timeout:g} 秒没有任何输出，看门狗已终止训练")
+        return StreamOutcome(
+            returncode=result.returncode,
+            output=result.stdout,
+            error=result.stderr,
+            log_text="\n".join(log_lines),
+            wall_time=result.wall_time,
+            stopped=result.stopped,
+            timed_out=result.timed_out or result.idle_timed_out,
+            metrics=extractor.metrics,
+        )
+
+    async def stream_sampled(
+        self,
+        command: str,
+        fidelity: float = 1.0
+    ) -> Tuple[StreamOutcome, Optional[TelemetryDigest]]:
+        """执行训练命令；配置了 sampler 时训练期间采样系统统计并跟踪训练进程树，返回执行结果和观测汇总"""
+        if self.sampler is None:
+            return await self.stream_command(command, fidelity), None
+        await self.sampler.start()
+        try:
+            outcome = await self.stream_command(command, fidelity, on_start=self.sampler.track)
+        finally:
+            telemetry = await self.sampler.stop()
+        return outcome, telemetry
+
+    async def isolate(self, fidelity: float = 1.0) -> Optional[IsolationReport]:
+        """
+        训练前执行隔离协议。预热训练以 warmup_fidelity（不超过本次 fidelity）运行一次，
+        耗时和指标都丢弃，结束后删除它写入的日志。
+        预热训练不做提前终止判断：它的 fidelity 与历史曲线不同，而且被终止就达不到预热的目的
+        """
+        if self.isolation is None:
+            return None
+
+        async def warmup() -> str:
+            warmup_fidelity = min(fidelity, self.isolation.warmup_fidelity)
+            outcome = await self.stream_command(self.build_command(warmup_fidelity), warmup_fidelity, early_stop=False)
+            if os.path.exists(self.log_path):
+                os.remove(self.log_path)
+            status = "已终止" if outcome.stopped or outcome.timed_out else f"退出码 {outcome.returncode}"
+            return f"预热训练 {outcome.wall_time:.1f} 秒, {status}, 结果丢弃"
+
+        report = await self.isolation.prepare(warmup=warmup)
+        print(f"🧹 {report.describe()}")
+        return report
+
+    def complete_monitored(self, outcome: StreamOutcome, training_time: Optional[float]) -> None:
+        """把正常结束的试验加入提前终止的历史曲线"""
+        if self.early_stopper is not None and not outcome.stopped and training_time is not None:
+            self.early_stopper.complete(outcome.wall_time, training_time)
+
+    def censored_value(self) -> Optional[float]:
+        """最近一次被终止试验的训练耗时下界估计"""
+        if self.early_stopper is None:
+            return None
+        return self.early_stopper.censored_value()
+
+    async def run(
+        self,
+        config: Optional[Dict[str, str]] = None,
+        is_baseline: bool = False,
+        fidelity: float = 1.0,
+        use_cache: bool = True,
+        store: bool = True
+    ) -> TrialResult:
+        """应用配置（为 None 时保持当前配置）并以指定 fidelity 训练一次，记录为一个 trial span"""
+        self.trial_seq += 1
+        with self.tracer.span("trial", trial_id=self.trial_seq, fidelity=fidelity, baseline=is_baseline or None) as span:
+            result = await self._run(config, is_baseline, fidelity, use_cache, store)
+            span.set(
+                training_time=result.training_time,
+                cached=result.cached or None,
+                censored=result.censored or None,
+                failed=bool(result.error) or None,
+            )
+        return result
+
+    async def _run(
+        self,
+        config: Optional[Dict[str, str]],
+        is_baseline: bool,
+        fidelity: float,
+        use_cache: bool,
+        store: bool
+    ) -> TrialResult:
+        if config:
+            error = await self.apply_config(config)
+            if error:
+                print(f"⚠️ 部分参数修改失败: {error}")
+        effective = self.applier.read(self.param_names)
+
+        if self.cache is not None and use_cache:
+            entry = self.cache.get(effective, fidelity=fidelity)
+            if entry is not None:
+                print(f"♻️ 命中评估缓存，跳过训练: {entry.training_time:.4f} 秒 (fidelity={fidelity:g})")
+                return TrialResult(
+                    config=effective,
+                    training_time=entry.training_time,
+                    samples=entry.samples or [entry.training_time],
+                    fidelity=fidelity,
+                    cached=True,
+                )
+
+        isolation = await self.isolate(fidelity)
+        # 清理上一次的日志，避免读到旧结果
+        if os.path.exists(self.log_path):
+            os.remove(self.log_path)
+
+        command = self.build_command(fidelity)
+        print(f"🏃 运行训练命令: {command}")
+        outcome, telemetry = await self.stream_sampled(command, fidelity)
+        if outcome.stopped:
+            return TrialResult(
+                config=effective,
+                fidelity=fidelity,
+                censored=True,
+                censored_time=self.censored_value(),
+                telemetry=telemetry,
+                metrics=outcome.metrics,
+                isolation=isolation,
+                error="训练进度明显劣于历史试验，已提前终止",
+            )
+        training_time = outcome.metrics.training_time
+        if training_time is None:
+            error = "训练超时" if outcome.timed_out else "未从日志中解析到训练耗时"
+            return TrialResult(
+                config=effective, fidelity=fidelity, telemetry=telemetry, metrics=outcome.metrics, isolation=isolation,
+                error=f"{error}: {(outcome.error or outcome.output)[-500:]}"
+            )
+        self.complete_monitored(outcome, training_time)
+
+        if self.cache is not None and store:
+            self.cache.put(effective, training_time, is_baseline=is_baseline and fidelity >= 1.0, fidelity=fidelity)
+        return TrialResult(
+            config=effective, training_time=training_time, samples=[training_time], fidelity=fidelity,
+            telemetry=telemetry, metrics=outcome.metrics, isolation=isolation
+        )
+
+    async def measure(
+        self,
+        config: Optional[Dict[str, str]] = None,
+        is_baseline: bool = False,
+        fidelity: float = 1.0,
+        first_sample: Optional[float] = None
+    ) -> TrialResult:
+        """
+        按 policy 自适应重复训练同一配置，直到置信区间足够窄或达到重复上限，
+        返回的 training_time 为多次测量的均值。
+        first_sample 为已经测得的第一次结果（例如 LLM 执行的训练），此时不再重复第一次。
+        """
+        with self.tracer.span("measure", first_trial_id=self.trial_seq + (first_sample is None)) as span:
+            result = await self._measure(config, is_baseline, fidelity, first_sample)
+            span.set(repeats=len(result.samples), training_time=result.training_time, cached=result.cached or None)
+        return result
+
+    async def _measure(
+        self,
+        config: Optional[Dict[str, str]],
+        is_baseline: bool,
+        fidelity: float,
+        first_sample: Optional[float]
+    ) -> TrialResult:
+        if first_sample is None:
+            result = await self.run(config, is_baseline=is_baseline, fidelity=fidelity, store=False)
+            if result.cached or result.training_time is None:
+                return result
+        else:
+            result = TrialResult(
+                config=self.applier.read(self.param_names),
+                training_time=first_sample,
+                samples=[first_sample],
+                fidelity=fidelity,
+            )
+
+        measurement = Measurement(samples=list(result.samples))
+        while self.policy.needs_more(measurement):
+            print(f"🔁 重复测量第 {measurement.n + 1} 次（当前 {measurement.describe(self.policy.confidence)}）")
+            repeat = await self.run(None, fidelity=fidelity, use_cache=False, store=False)
+            if repeat.training_time is None:
+                print(f"⚠️ 重复测量失败，使用已有的 {measurement.n} 次结果: {repeat.error}")
+                break
+            measurement.samples.append(repeat.training_time)
+
+        result.samples = measurement.samples
+        result.training_time = measurement.mean
+        if self.cache is not None:
+            self.cache.put(
+                result.config, measurement.mean,
+                is_baseline=is_baseline and fidelity >= 1.0, fidelity=fidelity, samples=measurement.samples
+            )
+        return result
@@ -2,8 +2,8 @@
 KernelTuneAgent 主运行文件
 """
 import asyncio
+import sys
 from KernelTuneAgent import KernelTuneAgent
-from KernelTuneAgent.llm import SimpleLLM
 
 
 async def main():
@@ -16,16 +16,9 @@ async def main():
         print("   export OPENAI_API_KEY='你的API密钥'")
         return """
     
-    # 创建LLM实例
-    llm = SimpleLLM(
-        # api_key=api_key,
-        model="output/qwen3_lora",  # 本地模型
-        base_url="http://localhost:8001/v1"
-    )
-    
-    # 创建代理
+    # 创建代理：推理服务地址、模型和超时等在 sys.config 中配置（llm base urls 等），
+    # 有多个副本时请求会在副本之间负载均衡并自动故障切换
     agent = KernelTuneAgent(
-        llm=llm,
         name="KernelTuneAgent",
         max_steps=10
     )
@@ -38,12 +31,15 @@ async def main():
     try:
             
         # 执行任务
-        # 连续执行，不需要用户输入
-        result = await agent.run()
+        # 连续执行，不需要用户输入；--resume 从试验日志继续上一次中断的会话
+        if "--resume" in sys.argv:
+            result = await agent.resume()
+        else:
+            result = await agent.run()
         print(f"\n📋 执行结果:\n{result}")
             
     except KeyboardInterrupt:
-        print("\n👋 程序被中断，再见!")
+        print("\n👋 程序被中断，再见! 使用 --resume 参数可以从中断处继续")
     except Exception as e:
         print(f"❌ 发生错误: {e}")
 
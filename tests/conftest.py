@@ -0,0 +1,69 @@
+import os
+import sys
+
+import pytest
+
+# 直接从源码目录导入 KernelTuneAgent
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+FIXTURES = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures")
+
+
+@pytest.fixture
+def host_root() -> str:
+    """伪造的 procfs/sysfs 目录树：2 路 8 线程、2 个 NUMA 节点、16GB 内存、一块 NVMe 和一块机械盘"""
+    return os.path.join(FIXTURES, "hostroot")
+
+
+# 伪造的训练脚本：训练耗时由当前的 vm.swappiness 决定，每次运行在 runs 文件中追加一行
+TRAIN_SCRIPT = """
+import sys
+root, log = sys.argv[1], sys.argv[2]
+swappiness = int(open(root + "/proc/sys/vm/swappiness").read())
+with open(root + "/runs", "a") as f:
+    f.write(f"{swappiness}\\n")
+for epoch in range(1, 4):
+    print(f"epoch {epoch}/3", flush=True)
+with open(log, "a") as f:
+    f.write(f"平均训练耗时: {100 + abs(swappiness - 40) / 10} 秒\\n")
+"""
+
+
+@pytest.fixture
+def agent_factory(tmp_path, monkeypatch):
+    """
+    在临时目录中创建代理：伪造的 /proc/sys 和 /sys/kernel/mm（参数文件取默认值）、伪造的训练脚本，
+    sys.config 中的缓存、试验日志、经验库都放在临时目录下。extra 追加到 sys.config 末尾
+    """
+    from KernelTuneAgent.config import SYSCTL_PARAM_META
+    from KernelTuneAgent.kerneltune_agent import KernelTuneAgent
+    from KernelTuneAgent.sysctl import sysctl_path
+
+    proc, mm = tmp_path / "proc/sys", tmp_path / "mm"
+    for name, meta in SYSCTL_PARAM_META.items():
+        if meta["root"] == "block":
+            continue
+        path = sysctl_path(name, str(proc), str(mm))
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, "w") as f:
+            f.write(f"{meta['default']}\n")
+    (tmp_path / "train.py").write_text(TRAIN_SCRIPT, encoding="utf-8")
+    monkeypatch.chdir(tmp_path)
+
+    def make(extra: str = "", llm=None, max_steps: int = 3) -> KernelTuneAgent:
+        (tmp_path / "sys.config").write_text(
+            f"train command: {sys.executable} {tmp_path}/train.py {tmp_path} {tmp_path}/result.log\n"
+            f"log file: {tmp_path}/result.log\n"
+            f"proc root: {proc}\n"
+            f"mm root: {mm}\n"
+            "hardware probe: false\n"
+            "telemetry: false\n"
+            "knowledge base: false\n"
+            "optimizer: random\n"
+            "optimizer mode: auto\n"
+            f"{extra}",
+            encoding="utf-8",
+        )
+        return KernelTuneAgent(llm=llm or object(), max_steps=max_steps)
+
+    return make
@@ -0,0 +1,117 @@
+import asyncio
+import json
+from KernelTuneAgent.journal import TrialJournal
+from KernelTuneAgent.kerneltune_agent import KernelTuneAgent
+from KernelTuneAgent.schema import Message, TrialRecord
+from KernelTuneAgent.trial import TrialResult
+
+PROPOSALS = [{"vm.swappiness": "20"}, {"vm.swappiness": "60"}]
+
+
+def test_best_trial(agent_factory):
+    agent = agent_factory()
+    assert agent._best_trial() is None
+    agent.trials = [
+        TrialRecord(step=0, source="baseline", config={"vm.swappiness": "10"}, training_time=100.0, improvement_ratio=0.0),
+        TrialRecord(step=1, config={"vm.swappiness": "20"}, training_time=95.0, improvement_ratio=0.05),
+        TrialRecord(step=2, config={"vm.swappiness": "30"}, censored=True, censored_time=120.0),
+        TrialRecord(step=3, config={}, training_time=90.0, improvement_ratio=0.10),
+    ]
+    # baseline、没有提升率的试验（失败或被终止）和空配置都不参与比较
+    assert agent._best_trial().step == 1
+    agent.trials.append(TrialRecord(step=4, config={"vm.swappiness": "40"}, training_time=80.0, improvement_ratio=0.2))
+    assert agent._best_trial().step == 4
+
+
+def test_best_trial_without_improvement(agent_factory):
+    agent = agent_factory()
+    agent.trials = [
+        TrialRecord(step=0, source="baseline", config={"vm.swappiness": "10"}, training_time=100.0, improvement_ratio=0.0),
+        TrialRecord(step=1, config={"vm.swappiness": "20"}, training_time=110.0, improvement_ratio=-0.1),
+    ]
+    # 比 baseline 慢的试验也会返回，是否采用由调用方判断
+    assert agent._best_trial().step == 1
+
+
+def test_match_proposal_picks_closest_outcome():
+    match = KernelTuneAgent._match_proposal
+    outcomes = [90.0, 110.0]
+    assert match(TrialResult(training_time=92.0), outcomes, PROPOSALS) == PROPOSALS[0]
+    assert match(TrialResult(training_time=105.0), outcomes, PROPOSALS) == PROPOSALS[1]
+    # 被提前终止的试验按删失值比较
+    assert match(TrialResult(censored=True, censored_time=95.0), outcomes, PROPOSALS) == PROPOSALS[0]
+
+
+def test_match_proposal_fallbacks():
+    match = KernelTuneAgent._match_proposal
+    assert match(TrialResult(training_time=92.0), [90.0, 110.0], []) is None
+    # 没有假设结果时只有一组推荐
+    assert match(TrialResult(training_time=92.0), [], PROPOSALS) == PROPOSALS[0]
+    # 失败的试验按最差的假设结果处理
+    assert match(TrialResult(error="训练失败"), [90.0, 110.0], PROPOSALS) == PROPOSALS[1]
+
+
+def test_memory_is_compacted_at_coarse_boundaries(agent_factory):
+    agent = agent_factory(extra="memory compaction tokens: 100\n")
+    agent.trials = [TrialRecord(step=0, source="baseline", config={"vm.swappiness": "10"}, training_time=100.0)]
+    agent.memory.add_message(Message.user_message("第一轮反馈"))
+    agent.memory.add_message(Message.assistant_message("第一轮推荐"))
+    agent._step_start = 2
+    # 未达到阈值时只追加，上一次请求的消息是下一次请求的前缀，可以命中前缀缓存
+    before = agent.memory.get_messages()
+    agent._compact_memory()
+    agent.memory.add_message(Message.user_message("第二轮反馈"))
+    assert agent.memory.get_messages()[:len(before)] == before
+
+    agent.memory.add_message(Message.assistant_message("很长的推荐理由" * 20))
+    agent._step_start = 3
+    agent._compact_memory()
+    messages = agent.memory.get_messages()
+    assert agent.memory.compacted_upto == 3
+    assert messages[0]["content"] == agent.memory.summary and messages[1]["content"].startswith("很长的推荐理由")
+
+
+def test_memory_compaction_can_be_disabled(agent_factory):
+    agent = agent_factory(extra="memory compaction: false\nmemory compaction tokens: 1\n")
+    agent.memory.add_message(Message.user_message("第一轮反馈"))
+    agent._step_start = 1
+    agent._compact_memory()
+    assert agent.memory.compacted_upto == 0 and agent.memory.summary is None
+
+
+def test_resume_does_not_repeat_screening(agent_factory, tmp_path):
+    extra = "screening: true\nscreening fidelity: 1\nscreening trajectories: 1\neval cache: false\n"
+    first = agent_factory(extra=extra, max_steps=1)
+    asyncio.run(first.run())
+    runs = first.screening_report.runs
+
+    # 模拟筛选进行到第 5 次训练后进程被杀死：截掉之后的日志
+    journal = tmp_path / "trial_journal.jsonl"
+    kept, screened = [], 0
+    for line in journal.read_text(encoding="utf-8").splitlines():
+        record = json.loads(line)
+        if record["type"] == "trial" and record["trial"]["source"] == "screening":
+            if screened == 5:
+                break
+            screened += 1
+        kept.append(line)
+    journal.write_text("\n".join(kept) + "\n", encoding="utf-8")
+    (tmp_path / "runs").write_text("")
+
+    resumed = agent_factory(extra=extra, max_steps=1)
+    asyncio.run(resumed.resume())
+    state = TrialJournal(str(journal)).load()
+    assert len([t for t in state.trials if t.source == "screening"]) == runs
+    assert state.screening.frozen == first.screening_report.frozen
+    # 已记录的 5 次筛选训练不再运行
+    tuning = sum(max(1, len(t.samples)) for t in resumed.trials if t.source not in ("baseline", "screening"))
+    assert len((tmp_path / "runs").read_text().splitlines()) == runs - 5 + tuning
+
+    # 筛选结果已写入日志后再次恢复，不再筛选
+    kept = [line for line in journal.read_text(encoding="utf-8").splitlines() if json.loads(line)["type"] != "finished"]
+    journal.write_text("\n".join(kept) + "\n", encoding="utf-8")
+    (tmp_path / "runs").write_text("")
+    again = agent_factory(extra=extra, max_steps=2)
+    asyncio.run(again.resume())
+    assert again.session_id == resumed.session_id
+    assert len([t for t in TrialJournal(str(journal)).load().trials if t.source == "screening"]) == runs
@@ -0,0 +1,76 @@
+import asyncio
+from KernelTuneAgent.cache import EvalCache, normalize_config
+
+PARAMS = ["vm.swappiness", "vm.dirty_ratio", "transparent_hugepage"]
+
+
+def make_cache(tmp_path, train_cmd="python train.py", host="host-a"):
+    return EvalCache(str(tmp_path / "cache.json"), train_cmd, PARAMS, host=host)
+
+
+def test_equivalent_configs_share_a_key(tmp_path):
+    cache = make_cache(tmp_path)
+    key = cache.make_key({"vm.swappiness": "10", "vm.dirty_ratio": "20", "transparent_hugepage": "never"})
+    assert cache.make_key({"transparent_hugepage": "never", "vm.dirty_ratio": 20, "vm.swappiness": 10}) == key
+    assert cache.make_key({"vm.swappiness": " 10 ", "vm.dirty_ratio": 20.0, "transparent_hugepage": "always madvise [never]"}) == key
+    # 缺失的参数按默认值补齐
+    assert cache.make_key({}) == cache.make_key({"vm.swappiness": "10", "vm.dirty_ratio": "30", "transparent_hugepage": "madvise"})
+    assert normalize_config({"vm.swappiness": 10.0}, ["vm.swappiness"]) == {"vm.swappiness": "10"}
+
+
+def test_key_changes_with_context(tmp_path):
+    config = {"vm.swappiness": "10"}
+    key = make_cache(tmp_path).make_key(config)
+    assert make_cache(tmp_path, train_cmd="python train.py --epochs 2").make_key(config) != key
+    assert make_cache(tmp_path, host="host-b").make_key(config) != key
+    assert make_cache(tmp_path).make_key({"vm.swappiness": "12"}) != key
+    assert make_cache(tmp_path).make_key(config, fidelity=0.5) != key
+    assert make_cache(tmp_path).make_key(config, fidelity=1.0) == key
+
+
+def test_entries_persist(tmp_path):
+    cache = make_cache(tmp_path)
+    cache.put({"vm.swappiness": 10}, 98.5, samples=[98.0, 99.0])
+    reloaded = make_cache(tmp_path)
+    entry = reloaded.get({"vm.swappiness": "10"})
+    assert entry.training_time == 98.5 and entry.samples == [98.0, 99.0]
+    assert make_cache(tmp_path, host="host-b").get({"vm.swappiness": "10"}) is None
+    assert not (tmp_path / "cache.json.tmp").exists()
+
+
+def test_corrupt_cache_is_ignored(tmp_path, capsys):
+    (tmp_path / "cache.json").write_text("{not json")
+    assert make_cache(tmp_path).entries == {}
+    assert "读取失败" in capsys.readouterr().out
+
+
+def test_get_baseline(tmp_path):
+    cache = make_cache(tmp_path)
+    assert cache.get_baseline() is None
+    cache.put({"vm.swappiness": "20"}, 101.0, is_baseline=True)
+    assert cache.get_baseline().training_time == 101.0
+    # 默认配置的结果优先
+    cache.put({}, 100.0)
+    assert cache.get_baseline().training_time == 100.0
+    # 再次写入不会丢掉 baseline 标记
+    cache.put({"vm.swappiness": "20"}, 102.0)
+    assert cache.entries[cache.make_key({"vm.swappiness": "20"})].is_baseline
+
+
+def test_cached_baseline_is_reused(agent_factory, tmp_path):
+    agent = agent_factory(max_steps=1)
+    agent.eval_cache.put({}, 123.0, is_baseline=True, samples=[122.0, 124.0])
+    asyncio.run(agent.run())
+    # baseline 取自缓存，训练脚本一次都没有运行
+    assert not (tmp_path / "runs").exists()
+    baseline = agent.trials[0]
+    assert baseline.source == "baseline" and baseline.training_time == 123.0 and baseline.samples == [122.0, 124.0]
+
+
+def test_baseline_is_cached_for_the_next_session(agent_factory, tmp_path):
+    asyncio.run(agent_factory(max_steps=1).run())
+    assert (tmp_path / "runs").read_text().splitlines() == ["10"]
+    agent = agent_factory(max_steps=1)
+    asyncio.run(agent.run())
+    assert (tmp_path / "runs").read_text().splitlines() == ["10"]
+    assert agent.trials[0].training_time == 103.0
@@ -0,0 +1,138 @@
+import copy
+import pytest
+from KernelTuneAgent import config
+from KernelTuneAgent.config import (
+    DYNAMIC_SYSCTL_PARAMS, FIXED_SYSCTL_PARAMS, PARAM_CONSTRAINTS, SYSCTL_PARAM_META, ImpactLevel, load_catalog,
+    merge_catalog,
+)
+from KernelTuneAgent.search_space import SearchSpace
+
+EXTRA_CATALOG = """
+["vm.swappiness"]
+type = "int"
+range = [0, 60]
+step = 5
+default = 30
+impact = "high"
+
+["kernel.numa_balancing"]
+type = "int"
+range = [0, 1]
+default = 0
+
+["vm.min_free_kbytes"]
+type = "int"
+range = [1024, 1048576]
+default = 67584
+switch = "reclaim"
+scale = "mem_total"
+
+[[constraint]]
+lower = "vm.dirty_background_ratio"
+upper = "vm.dirty_ratio"
+
+[[constraint]]
+lower = "vm.min_free_kbytes"
+upper = "vm.watermark_scale_factor"
+"""
+
+
+@pytest.fixture
+def restore_catalog():
+    """merge_catalog 就地修改全局目录，测试结束后恢复"""
+    saved = (copy.deepcopy(SYSCTL_PARAM_META), list(PARAM_CONSTRAINTS), set(FIXED_SYSCTL_PARAMS),
+             copy.deepcopy(DYNAMIC_SYSCTL_PARAMS))
+    yield
+    meta, constraints, fixed, dynamic = saved
+    SYSCTL_PARAM_META.clear()
+    SYSCTL_PARAM_META.update(meta)
+    PARAM_CONSTRAINTS[:] = constraints
+    FIXED_SYSCTL_PARAMS.clear()
+    FIXED_SYSCTL_PARAMS.update(fixed)
+    DYNAMIC_SYSCTL_PARAMS.clear()
+    DYNAMIC_SYSCTL_PARAMS.update(dynamic)
+
+
+def write(tmp_path, text, name="extra.toml"):
+    path = tmp_path / name
+    path.write_text(text, encoding="utf-8")
+    return str(path)
+
+
+def test_bundled_catalog():
+    swappiness = SYSCTL_PARAM_META["vm.swappiness"]
+    assert swappiness["range"] == "0-90" and swappiness["step"] == "2" and swappiness["default"] == "10"
+    assert swappiness["root"] == "proc" and swappiness["path"] == "vm/swappiness" and swappiness["format"] == "plain"
+    assert ("vm.dirty_background_ratio", "vm.dirty_ratio") in PARAM_CONSTRAINTS
+    assert "vm.swappiness" in FIXED_SYSCTL_PARAMS
+    assert DYNAMIC_SYSCTL_PARAMS["kernel.numa_balancing"] == {"switch": "numa"}
+
+
+def test_choice_ranges(tmp_path):
+    meta, constraints = load_catalog(write(tmp_path, """
+["transparent_hugepage"]
+type = "choice"
+choices = ["always", "madvise", "never"]
+default = "madvise"
+root = "mm"
+path = "transparent_hugepage/enabled"
+format = "selected"
+
+["kernel.numa_balancing"]
+type = "choice"
+choices = [0, 1]
+default = 1
+"""))
+    assert constraints == []
+    assert meta["transparent_hugepage"]["range"] == "[always,madvise,never]"
+    assert meta["transparent_hugepage"]["format"] == "selected"
+    assert meta["kernel.numa_balancing"]["range"] == "0/1" and meta["kernel.numa_balancing"]["impact"] is ImpactLevel.MEDIUM
+
+
+@pytest.mark.parametrize("item, message", [
+    ('type = "float"\nrange = [0, 1]\ndefault = 0', "未知的参数类型"),
+    ('type = "int"\nrange = [0, 1]\ndefault = 0\nroot = "sys"', "未知的 root"),
+    ('type = "int"\nrange = [0, 1]\ndefault = 0\nroot = "block"', "必须给出 path"),
+    ('type = "int"\nrange = [0, 1]\ndefault = 0\nformat = "json"', "未知的 format"),
+    ('type = "int"\ndefault = 0', "缺少或错误的字段"),
+    ('type = "int"\nrange = [0, 1]\ndefault = 0\nimpact = "huge"', "vm.bad"),
+])
+def test_invalid_entries(tmp_path, item, message):
+    with pytest.raises(ValueError, match=message):
+        load_catalog(write(tmp_path, f'["vm.bad"]\n{item}\n'))
+
+
+def test_merge_catalog_overrides_and_appends(tmp_path, restore_catalog):
+    before = len(PARAM_CONSTRAINTS)
+    names = merge_catalog(write(tmp_path, EXTRA_CATALOG))
+    assert names == ["vm.swappiness", "kernel.numa_balancing", "vm.min_free_kbytes"]
+
+    # 同名参数整体覆盖
+    swappiness = SYSCTL_PARAM_META["vm.swappiness"]
+    assert swappiness["range"] == "0-60" and swappiness["step"] == "5" and swappiness["default"] == "30"
+    assert swappiness["impact"] is ImpactLevel.HIGH
+    # 覆盖后没有 switch 的参数始终启用，新参数按 switch 控制
+    assert "kernel.numa_balancing" in FIXED_SYSCTL_PARAMS and "kernel.numa_balancing" not in DYNAMIC_SYSCTL_PARAMS
+    assert DYNAMIC_SYSCTL_PARAMS["vm.min_free_kbytes"] == {"switch": "reclaim"}
+    assert "vm.min_free_kbytes" not in FIXED_SYSCTL_PARAMS
+    assert SYSCTL_PARAM_META["vm.min_free_kbytes"]["scale"] == "mem_total"
+    assert SYSCTL_PARAM_META["vm.min_free_kbytes"]["floor"] == "1"
+
+    # 约束追加，已有的约束不重复
+    assert len(PARAM_CONSTRAINTS) == before + 1
+    assert PARAM_CONSTRAINTS[-1] == ("vm.min_free_kbytes", "vm.watermark_scale_factor")
+    merge_catalog(write(tmp_path, EXTRA_CATALOG))
+    assert len(PARAM_CONSTRAINTS) == before + 1
+
+    # 已经导入目录的模块看到的是同一个对象
+    assert config.SYSCTL_PARAM_META is SYSCTL_PARAM_META
+    spec = SearchSpace.from_meta(["vm.swappiness"]).specs["vm.swappiness"]
+    assert (spec.low, spec.high, spec.step, spec.default) == (0, 60, 5, "30")
+
+
+def test_invalid_catalog_is_not_merged(tmp_path, restore_catalog):
+    path = write(tmp_path, EXTRA_CATALOG + '\n["vm.bad"]\ntype = "float"\n')
+    with pytest.raises(ValueError):
+        merge_catalog(path)
+    assert SYSCTL_PARAM_META["vm.swappiness"]["range"] == "0-90"
+    assert "vm.min_free_kbytes" not in SYSCTL_PARAM_META
@@ -0,0 +1,91 @@
+import pytest
+from KernelTuneAgent.early_stop import EarlyStopper, ProgressParser
+
+
+def complete_run(stopper, seconds_per_epoch, epochs=10, training_time=90.0):
+    """记录一次每个 epoch 耗时相同的完整训练"""
+    stopper.start()
+    for epoch in range(1, epochs + 1):
+        assert not stopper.update(epoch, epochs, epoch * seconds_per_epoch)
+    stopper.complete(wall_time=epochs * seconds_per_epoch, training_time=training_time)
+
+
+def run_until_stopped(stopper, seconds_per_epoch, epochs=10):
+    """按给定速度推进试验，返回被终止时的 epoch，没有被终止时返回 None"""
+    stopper.start()
+    for epoch in range(1, epochs + 1):
+        if stopper.update(epoch, epochs, epoch * seconds_per_epoch):
+            return epoch
+    return None
+
+
+def test_progress_parser():
+    parser = ProgressParser()
+    assert parser.parse("Epoch [3/10] loss 0.2") == (3, 10)
+    assert parser.parse("step: 200/5000") == (200, 5000)
+    assert parser.parse("epoch 11/10") is None
+    assert parser.parse("loss 0.2") is None
+
+
+def test_median_rule_projects_early_stop_to_full_run():
+    stopper = EarlyStopper(rule="median", min_fraction=0.2, margin=0.05)
+    complete_run(stopper, 10.0)
+    # 每个 epoch 12 秒：第 2 个 epoch 时 24 秒超过参考的 20 × 1.05 秒
+    assert run_until_stopped(stopper, 12.0) == 2
+    # 单位进度耗时不足 3 个，按已完成比例外推：24 / 0.2 = 120 秒，训练耗时 90 × 120 / 100
+    assert stopper.projected_time == pytest.approx(120.0)
+    assert stopper.censored_value() == pytest.approx(108.0)
+
+
+def test_censored_value_is_not_below_best_completed():
+    stopper = EarlyStopper(rule="median", margin=0.05)
+    complete_run(stopper, 10.0)
+    stopper.start()
+    # 外推的总用时比最快的完成试验还短时，删失值至少取其训练耗时的 (1 + margin) 倍
+    stopper.projected_time = 95.0
+    assert stopper.censored_value() == pytest.approx(90.0 * 1.05)
+    stopper.projected_time = 200.0
+    assert stopper.censored_value() == pytest.approx(180.0)
+
+
+def test_median_rule_keeps_fast_trials():
+    stopper = EarlyStopper(rule="median")
+    complete_run(stopper, 10.0)
+    assert run_until_stopped(stopper, 9.0) is None
+    assert run_until_stopped(stopper, 10.4) is None
+
+
+def test_bound_rule_needs_three_intervals():
+    stopper = EarlyStopper(rule="bound", min_fraction=0.1, margin=0.05)
+    complete_run(stopper, 10.0)
+    stopper.start()
+    assert not stopper.update(1, 10, 30.0)
+    assert not stopper.update(2, 10, 60.0)
+    assert not stopper.update(3, 10, 90.0)
+    # 第 4 个 epoch 时有 3 个单位进度耗时，均值 30 秒且没有波动，外推总用时 120 + 6 × 30
+    assert stopper.update(4, 10, 120.0)
+    assert stopper.projected_time == pytest.approx(300.0)
+    assert stopper.censored_value() == pytest.approx(270.0)
+
+
+def test_bound_rule_uses_confidence_lower_bound():
+    stopper = EarlyStopper(rule="bound", min_fraction=0.1, margin=0.05, z=1.645)
+    complete_run(stopper, 10.0)
+    stopper.start()
+    # 单位进度耗时 10/11/10 秒，均值的置信下界约 9.8 秒，外推总用时不超过 105 秒，不终止
+    for epoch, elapsed in enumerate([10.0, 20.0, 31.0, 41.0], 1):
+        assert not stopper.update(epoch, 10, elapsed)
+    assert stopper.projected_time < 100.0 * 1.05
+
+
+def test_history_is_kept_per_fidelity():
+    stopper = EarlyStopper(rule="median")
+    complete_run(stopper, 10.0)
+    stopper.start(fidelity=0.5)
+    assert not stopper.update(5, 10, 500.0)
+    assert stopper.censored_value() is None
+
+
+def test_unknown_rule():
+    with pytest.raises(ValueError):
+        EarlyStopper(rule="hyperband")
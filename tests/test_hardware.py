@@ -0,0 +1,96 @@
+import copy
+
+from KernelTuneAgent.config import SYSCTL_PARAM_META
+from KernelTuneAgent.hardware import (
+    REFERENCE_MEM_KB, HardwareProbe, HardwareProfile, apply_device_defaults, scale_param_meta,
+)
+from KernelTuneAgent.prompt_build import PromptBuilder
+
+
+def test_probe_cpu_memory_and_numa(host_root):
+    profile = HardwareProbe(host_root).probe()
+    assert profile.cpu_model.startswith("Intel(R) Xeon(R) Gold 6240R")
+    assert (profile.sockets, profile.cores, profile.threads) == (2, 4, 8)
+    assert profile.mem_kb == 16 * 1024 * 1024
+    assert [node.node for node in profile.numa_nodes] == [0, 1]
+    assert profile.numa_nodes[1].cpus == "2-3,6-7"
+    assert profile.numa_nodes[0].mem_kb == 8 * 1024 * 1024
+    assert profile.multi_numa
+    assert profile.switches() == {"numa": True}
+
+
+def test_probe_block_devices_and_os(host_root):
+    profile = HardwareProbe(host_root).probe()
+    # loop 设备不计入
+    assert [device.name for device in profile.block_devices] == ["nvme0n1", "sda"]
+    nvme, sda = profile.block_devices
+    assert (nvme.scheduler, nvme.rotational, nvme.read_ahead_kb, nvme.nr_requests) == ("none", False, 128, 1023)
+    assert (sda.scheduler, sda.rotational, sda.read_ahead_kb) == ("bfq", True, 4096)
+    assert profile.primary_disk().name == "nvme0n1"
+    assert profile.os_name == "Ubuntu 22.04.3 LTS"
+    assert profile.kernel == "5.15.0-91-generic"
+    text = "\n".join(profile.describe())
+    assert "NUMA: 2 个节点" in text and "nvme0n1: 1000GB NVMe SSD" in text and "sda: 250GB HDD" in text
+
+
+def test_probe_missing_root(tmp_path):
+    profile = HardwareProbe(str(tmp_path)).probe()
+    assert profile.threads == 0 and profile.mem_kb == 0 and not profile.block_devices
+    assert profile.describe() == []
+
+
+def test_scale_keeps_default_inside_range():
+    meta = copy.deepcopy(SYSCTL_PARAM_META)
+    default = meta["fs.file-max"]["default"]
+    scaled = scale_param_meta(meta, HardwareProfile(mem_kb=16 * 1024 * 1024))
+    assert "fs.file-max" in scaled and "kernel.threads-max" in scaled
+    for name in scaled:
+        item = meta[name]
+        low, high = (int(v) for v in item["range"].split("-"))
+        # baseline 写入的默认值不缩放，范围扩展到包含默认值
+        assert item["default"] == SYSCTL_PARAM_META[name]["default"]
+        assert low <= int(item["default"]) <= high
+        assert low >= int(item["floor"])
+    assert meta["fs.file-max"]["default"] == default
+    assert int(meta["fs.file-max"]["range"].split("-")[0]) < int(SYSCTL_PARAM_META["fs.file-max"]["range"].split("-")[0])
+
+
+def test_scale_is_idempotent_and_identity_on_reference_host():
+    meta = copy.deepcopy(SYSCTL_PARAM_META)
+    profile = HardwareProfile(mem_kb=64 * 1024 * 1024)
+    scale_param_meta(meta, profile)
+    once = copy.deepcopy(meta)
+    scale_param_meta(meta, profile)
+    assert meta == once
+    scale_param_meta(meta, HardwareProfile(mem_kb=REFERENCE_MEM_KB))
+    for name in ("fs.file-max", "kernel.threads-max"):
+        assert meta[name]["range"] == SYSCTL_PARAM_META[name]["range"]
+        assert meta[name]["step"] == SYSCTL_PARAM_META[name]["step"]
+    assert scale_param_meta(meta, HardwareProfile()) == []
+
+
+def test_device_defaults_add_probed_scheduler(host_root):
+    meta = copy.deepcopy(SYSCTL_PARAM_META)
+    sda = HardwareProbe(host_root).probe().block_devices[1]
+    apply_device_defaults(meta, sda)
+    assert meta["block.read_ahead_kb"]["default"] == "4096"
+    assert meta["block.scheduler"]["default"] == "bfq"
+    assert "bfq" in meta["block.scheduler"]["range"]
+
+
+def test_prompt_builder_does_not_touch_global_catalog(host_root, tmp_path):
+    before = copy.deepcopy(SYSCTL_PARAM_META)
+    config = tmp_path / "sys.config"
+    config.write_text(f"hardware root: {host_root}\n")
+    builder = PromptBuilder(str(config))
+    assert SYSCTL_PARAM_META == before
+    assert builder.sys_cfg["numa"] is True
+    assert builder.block_device == "nvme0n1"
+    assert builder.param_meta["block.scheduler"]["default"] == "none"
+    assert builder.param_meta["block.nr_requests"]["default"] == "1023"
+    assert builder.param_meta["fs.file-max"]["range"] != before["fs.file-max"]["range"]
+    # 第二个构建器从未修改的参数目录开始
+    plain = tmp_path / "plain.config"
+    plain.write_text("hardware probe: false\n")
+    other = PromptBuilder(str(plain))
+    assert other.param_meta == before
@@ -0,0 +1,123 @@
+import asyncio
+import sys
+import pytest
+from KernelTuneAgent.isolation import IsolationProtocol
+from KernelTuneAgent.trial import TrialRunner
+
+# 按进度输出 3 个 epoch，把收到的参数写入 argv.txt，训练日志写入 train.log
+WARMUP_SCRIPT = """
+import sys
+with open("argv.txt", "a") as f:
+    f.write(" ".join(sys.argv[1:]) + "\\n")
+with open("train.log", "w") as f:
+    f.write("warmup\\n")
+for i in range(1, 4):
+    print(f"epoch {i}/3", flush=True)
+"""
+
+
+def make_proc(tmp_path, load="0.00", pressure=None):
+    proc = tmp_path / "proc"
+    (proc / "sys" / "vm").mkdir(parents=True)
+    (proc / "loadavg").write_text(f"{load} 0.00 0.00 1/100 1234\n")
+    if pressure is not None:
+        (proc / "pressure").mkdir()
+        for resource in ("cpu", "memory", "io"):
+            (proc / "pressure" / resource).write_text(
+                f"some avg10={pressure} avg60=0.00 avg300=0.00 total=0\nfull avg10=0.00 avg60=0.00 avg300=0.00 total=0\n"
+            )
+    return proc
+
+
+def test_steps_run_in_fixed_order(tmp_path):
+    proc = make_proc(tmp_path)
+    protocol = IsolationProtocol(["quiesce", "drop_caches", "sync", "warmup"], proc_root=str(proc))
+    calls = []
+
+    async def warmup():
+        calls.append("warmup")
+        return "预热训练"
+
+    report = asyncio.run(protocol.prepare(warmup=warmup))
+    assert [step.name for step in report.steps] == ["warmup", "sync", "drop_caches", "quiesce"]
+    assert all(step.ok for step in report.steps) and calls == ["warmup"]
+    assert (proc / "sys" / "vm" / "drop_caches").read_text() == "3\n"
+    assert report.steps[0].detail == "预热训练"
+    assert "试验隔离" in report.describe()
+
+
+def test_warmup_is_skipped_without_callback(tmp_path):
+    protocol = IsolationProtocol(["warmup", "sync"], proc_root=str(make_proc(tmp_path)))
+    report = asyncio.run(protocol.prepare())
+    assert [step.name for step in report.steps] == ["sync"]
+
+
+def test_unknown_step():
+    with pytest.raises(ValueError):
+        IsolationProtocol(["sync", "reboot"])
+
+
+def test_failed_step_does_not_stop_the_protocol(tmp_path):
+    # 没有 vm 目录（相当于没有写权限）时写入失败，只记录
+    protocol = IsolationProtocol(["drop_caches", "compact_memory", "sync"], proc_root=str(tmp_path / "missing"))
+    report = asyncio.run(protocol.prepare())
+    assert [(step.name, step.ok) for step in report.steps] == [("sync", True), ("drop_caches", False), ("compact_memory", False)]
+    assert "⚠️" in report.describe()
+
+
+def test_prewarm_reads_up_to_limit(tmp_path):
+    data = tmp_path / "data"
+    (data / "sub").mkdir(parents=True)
+    (data / "a.bin").write_bytes(b"x" * 1000)
+    (data / "sub" / "b.bin").write_bytes(b"y" * 3000)
+    protocol = IsolationProtocol(["prewarm"], prewarm_paths=[str(data)])
+    assert protocol._read_files() == {"files": 2, "bytes": 4000}
+    protocol.prewarm_limit = 500
+    assert protocol._read_files() == {"files": 1, "bytes": 1000}
+    ok, detail = asyncio.run(IsolationProtocol(["prewarm"])._prewarm())
+    assert not ok and detail == "未配置预热路径"
+
+
+def test_quiesce(tmp_path):
+    quiet = IsolationProtocol(["quiesce"], proc_root=str(make_proc(tmp_path / "quiet", pressure="0.20")))
+    ok, detail = asyncio.run(quiet._quiesce())
+    assert ok and "PSI 0.2%" in detail
+    busy = IsolationProtocol(
+        ["quiesce"], proc_root=str(make_proc(tmp_path / "busy", load="10000.00")), quiesce_timeout=0
+    )
+    ok, detail = asyncio.run(busy._quiesce())
+    assert not ok and "仍未平静" in detail
+
+
+class AlwaysStop:
+    """任何进度都判定为应当终止的提前终止器"""
+
+    def __init__(self):
+        self.starts = []
+
+    def start(self, fidelity=1.0):
+        self.starts.append(fidelity)
+
+    def update(self, current, total, elapsed):
+        return True
+
+
+def test_warmup_is_truncated_and_not_early_stopped(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    (tmp_path / "train.py").write_text(WARMUP_SCRIPT)
+    stopper = AlwaysStop()
+    runner = TrialRunner(
+        f"{sys.executable} train.py", str(tmp_path / "train.log"), ["vm.swappiness"],
+        fidelity_arg="--budget {budget}", full_budget=100, early_stopper=stopper, poll_interval=0.05,
+        isolation=IsolationProtocol(["warmup"], warmup_fidelity=0.1),
+    )
+    report = asyncio.run(runner.isolate(fidelity=1.0))
+    # 预热训练按 warmup_fidelity 截断，完整跑完，日志被删除
+    assert (tmp_path / "argv.txt").read_text() == "--budget 10\n"
+    assert "退出码 0" in report.steps[0].detail
+    assert stopper.starts == []
+    assert not (tmp_path / "train.log").exists()
+
+    # 本次试验本身的 fidelity 更低时，预热训练不超过它
+    asyncio.run(runner.isolate(fidelity=0.05))
+    assert (tmp_path / "argv.txt").read_text().splitlines()[-1] == "--budget 5"
@@ -0,0 +1,76 @@
+import json
+from KernelTuneAgent.journal import TrialJournal
+from KernelTuneAgent.schema import TrialRecord
+
+
+def write_session(journal, trials=2, **header):
+    journal.start_session(train_cmd="python train.py", **header)
+    for step in range(1, trials + 1):
+        journal.record_trial(TrialRecord(step=step, config={"vm.swappiness": str(10 * step)}, training_time=100.0 - step))
+    journal.checkpoint(step=trials, trial_count=trials)
+
+
+def test_load_missing_journal(tmp_path):
+    assert TrialJournal(str(tmp_path / "journal.jsonl")).load() is None
+
+
+def test_load_last_session(tmp_path):
+    journal = TrialJournal(str(tmp_path / "journal.jsonl"))
+    write_session(journal, trials=1, attempt=1)
+    journal.finish()
+    write_session(journal, trials=3, attempt=2)
+    journal.record_trial(TrialRecord(step=4, training_time=95.0))
+    journal.close()
+
+    state = journal.load()
+    assert state.session["attempt"] == 2 and not state.finished
+    assert [trial.step for trial in state.trials] == [1, 2, 3, 4]
+    assert state.checkpoint["trial_count"] == 3
+    assert [trial.step for trial in state.trials_after_checkpoint()] == [4]
+
+
+def test_torn_last_line_is_ignored(tmp_path, capsys):
+    path = tmp_path / "journal.jsonl"
+    journal = TrialJournal(str(path))
+    write_session(journal)
+    journal.close()
+    # 进程在写入最后一条记录的过程中被杀死
+    with open(path, "a", encoding="utf-8") as f:
+        f.write('{"type": "trial", "trial": {"step": 3, "config": {"vm.swa')
+
+    state = journal.load()
+    assert [trial.step for trial in state.trials] == [1, 2]
+    assert "损坏" not in capsys.readouterr().out
+
+
+def test_append_after_torn_line(tmp_path, capsys):
+    path = tmp_path / "journal.jsonl"
+    journal = TrialJournal(str(path))
+    write_session(journal)
+    journal.close()
+    with open(path, "a", encoding="utf-8") as f:
+        f.write('{"type": "checkpoint", "st')
+
+    # 恢复后继续追加：新记录另起一行，不会与半行记录粘在一起
+    resumed = TrialJournal(str(path))
+    resumed.record_trial(TrialRecord(step=3, training_time=96.0))
+    resumed.finish()
+    resumed.close()
+
+    lines = path.read_text(encoding="utf-8").splitlines()
+    assert lines[-3] == '{"type": "checkpoint", "st'
+    assert json.loads(lines[-2])["type"] == "trial"
+    state = resumed.load()
+    assert [trial.step for trial in state.trials] == [1, 2, 3] and state.finished
+    # 中间的损坏行给出警告
+    assert f"第 {len(lines) - 2} 行损坏" in capsys.readouterr().out
+
+
+def test_records_before_first_session_are_skipped(tmp_path):
+    path = tmp_path / "journal.jsonl"
+    path.write_text('{"type": "trial", "trial": {"step": 9}}\n', encoding="utf-8")
+    journal = TrialJournal(str(path))
+    assert journal.load() is None
+    write_session(journal, trials=1)
+    journal.close()
+    assert [trial.step for trial in journal.load().trials] == [1]
@@ -0,0 +1,139 @@
+import asyncio
+import math
+import pytest
+from KernelTuneAgent.knowledge import (
+    CampaignRecord, HostProfile, KnowledgeBase, KnownConfig, WorkloadSignature, select_winners,
+)
+from KernelTuneAgent.schema import TrialRecord
+from KernelTuneAgent.search_space import GridIndex, SearchSpace
+
+PARAMS = ["vm.swappiness", "transparent_hugepage"]
+HOST = HostProfile(fingerprint="host-a", machine="x86_64", release="6.1", cpus=16, mem_kb=64e6)
+
+
+def campaign(session, training_time, winners, host=HOST, created_at=0.0):
+    return CampaignRecord(
+        session=session, train_cmd="python train.py", host=host,
+        signature=WorkloadSignature(features={"training_time": math.log(training_time)}),
+        baseline=training_time, created_at=created_at,
+        winners=[KnownConfig(config=config, improvement=improvement, training_time=training_time * (1 - improvement))
+                 for config, improvement in winners],
+    )
+
+
+def signature(training_time):
+    return WorkloadSignature(features={"training_time": math.log(training_time)})
+
+
+def test_host_distance():
+    assert HOST.distance(HOST.model_copy(update={"cpus": 4})) == 0.0
+    other = HostProfile(fingerprint="host-b", machine="aarch64", release="6.8", cpus=4, mem_kb=64e6)
+    assert HOST.distance(other) == pytest.approx(math.log(4) + 1.0 + 0.25)
+
+
+def test_signature_from_baseline_trial():
+    record = TrialRecord(step=0, training_time=math.e)
+    assert WorkloadSignature.from_trial(record).features == {"training_time": 1.0}
+    assert signature(100).distance(WorkloadSignature(features={"throughput": 1.0})) == math.inf
+    assert signature(100).distance(signature(100 * math.e)) == pytest.approx(1.0)
+
+
+def test_records_persist_and_replace_the_same_session(tmp_path):
+    path = tmp_path / "kb" / "knowledge.json"
+    kb = KnowledgeBase(str(path), max_records=2)
+    kb.add(campaign("s1", 100, []))
+    kb.add(campaign("s2", 100, []))
+    kb.add(campaign("s1", 120, []))
+    assert [record.session for record in kb.records] == ["s2", "s1"]
+    kb.add(campaign("s3", 100, []))
+    reloaded = KnowledgeBase(str(path))
+    assert [record.session for record in reloaded.records] == ["s1", "s3"]
+    assert reloaded.records[0].baseline == 120 and reloaded.records[0].created_at > 0
+
+
+def test_corrupt_knowledge_base_is_ignored(tmp_path, capsys):
+    path = tmp_path / "knowledge.json"
+    path.write_text("[{", encoding="utf-8")
+    assert KnowledgeBase(str(path)).records == []
+    assert "读取失败" in capsys.readouterr().out
+
+
+def test_neighbors_and_ranking(tmp_path):
+    kb = KnowledgeBase(str(tmp_path / "knowledge.json"))
+    kb.records = [
+        campaign("near", 100, [({"vm.swappiness": "40"}, 0.05)]),
+        campaign("empty", 100, []),
+        campaign("far", 1000, [({"vm.swappiness": "60"}, 0.5)]),
+        campaign("other-host", 100, [({"vm.swappiness": "30"}, 0.08)],
+                 host=HOST.model_copy(update={"fingerprint": "host-b", "cpus": 8})),
+    ]
+    neighbors = kb.neighbors(HOST, signature(100), k=3, max_distance=1.0)
+    # 没有优胜配置和负载差异过大的会话不参与；其它主机按主机差异加上距离
+    assert [(record.session, round(distance, 3)) for record, distance in neighbors] == [
+        ("near", 0.0), ("other-host", round(0.5 * math.log(2), 3)),
+    ]
+    ranked = KnowledgeBase.rank_winners(neighbors)
+    # 提升率按距离折算: 0.08 / (1 + 0.347) > 0.05
+    assert [winner.config["vm.swappiness"] for winner, _ in ranked] == ["30", "40"]
+    assert kb.neighbors(HOST, signature(100), k=1)[0][0].session == "near"
+
+
+def test_plan_warm_start(tmp_path):
+    space = SearchSpace.from_meta(PARAMS)
+    space.freeze(["transparent_hugepage"])
+    index = GridIndex(space, min_distance=0.05)
+    index.add({"vm.swappiness": "61", "transparent_hugepage": space.specs["transparent_hugepage"].default})
+    kb = KnowledgeBase(str(tmp_path / "knowledge.json"))
+    kb.records = [
+        campaign("a", 100, [
+            ({"vm.swappiness": "41", "transparent_hugepage": "never"}, 0.10),
+            ({"vm.swappiness": "60", "transparent_hugepage": "always"}, 0.08),
+        ]),
+        campaign("b", 101, [
+            ({"vm.swappiness": "40", "transparent_hugepage": "madvise"}, 0.07),
+            ({"vm.swappiness": "20", "transparent_hugepage": "never"}, 0.02),
+            ({"vm.swappiness": "10", "transparent_hugepage": "never"}, 0.01),
+        ]),
+    ]
+    plan = kb.plan_warm_start(HOST, signature(100), space, limit=1, index=index)
+    assert [record.session for record, _ in plan.neighbors] == ["a", "b"]
+    # 对齐网格后冻结的参数取默认值：41 与 40 合并，60 已被评估过的 61 覆盖
+    default = space.specs["transparent_hugepage"].default
+    assert [(config["vm.swappiness"], improvement) for config, improvement in plan.priors] == [
+        ("40", 0.10), ("20", 0.02), ("10", 0.01),
+    ]
+    assert all(config["transparent_hugepage"] == default for config, _ in plan.priors)
+    assert plan.seeds == [plan.priors[0][0]]
+    assert kb.plan_warm_start(HOST, signature(10000), space).neighbors == []
+
+
+def test_select_winners():
+    space = SearchSpace.from_meta(PARAMS)
+    trials = [
+        TrialRecord(step=0, source="baseline", config={"vm.swappiness": "10"}, training_time=100, improvement_ratio=0.0),
+        TrialRecord(step=1, source="screening", config={"vm.swappiness": "90"}, training_time=80, improvement_ratio=0.2),
+        TrialRecord(step=2, config={"vm.swappiness": "40"}, training_time=95, improvement_ratio=0.05),
+        TrialRecord(step=3, config={"vm.swappiness": "40"}, training_time=96, improvement_ratio=0.04),
+        TrialRecord(step=4, config={"vm.swappiness": "50"}, training_time=97, improvement_ratio=0.03,
+                    p_value=0.3, significant=False),
+        TrialRecord(step=5, config={"vm.swappiness": "60"}, training_time=90, improvement_ratio=0.1, fidelity=0.3),
+        TrialRecord(step=6, source="warm_start", config={"vm.swappiness": "30"}, training_time=98, improvement_ratio=0.02),
+    ]
+    winners = select_winners(trials, space, limit=3)
+    # 完整配置、去重、只保留显著的完整训练
+    assert [(w.config["vm.swappiness"], w.improvement) for w in winners] == [("40", 0.05), ("30", 0.02)]
+    assert set(winners[0].config) == set(PARAMS)
+    assert len(select_winners(trials, space, limit=1)) == 1
+
+
+def test_agent_warm_starts_from_a_similar_session(agent_factory, tmp_path):
+    # 伪造的训练脚本在默认 swappiness=10 下耗时 103 秒，在 40 下耗时 100 秒
+    kb = KnowledgeBase(str(tmp_path / "kta_knowledge.json"))
+    kb.add(campaign("past", 103, [({"vm.swappiness": "40"}, 0.03)], host=HostProfile.current()))
+    agent = agent_factory(extra="knowledge base: true\nwarm start trials: 1\n", max_steps=2)
+    asyncio.run(agent.run())
+    warm = [t for t in agent.trials if t.source == "warm_start"]
+    assert len(warm) == 1 and warm[0].config["vm.swappiness"] == "40" and warm[0].training_time == 100.0
+    # 会话结束时写入本次的优胜配置
+    saved = KnowledgeBase(str(tmp_path / "kta_knowledge.json")).records[-1]
+    assert saved.session == agent.session_id and saved.winners[0].config["vm.swappiness"] == "40"
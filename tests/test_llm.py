@@ -0,0 +1,129 @@
+import asyncio
+from types import SimpleNamespace
+import httpx
+import pytest
+from openai import APIConnectionError, APIStatusError
+from KernelTuneAgent.llm import LLMError, SimpleLLM, is_retryable
+
+REQUEST = httpx.Request("POST", "http://llm.test/v1/chat/completions")
+
+
+def status_error(code):
+    return APIStatusError(f"status {code}", response=httpx.Response(code, request=REQUEST), body=None)
+
+
+def chunk(content=None, usage=None):
+    choices = [] if content is None else [SimpleNamespace(delta=SimpleNamespace(content=content, tool_calls=None))]
+    return SimpleNamespace(choices=choices, usage=usage)
+
+
+class FakeStream:
+    """按顺序产生分片，全部产生后抛出 error（连接中断）"""
+
+    def __init__(self, chunks, error=None):
+        self.chunks = chunks
+        self.error = error
+
+    def __aiter__(self):
+        return self._iterate()
+
+    async def _iterate(self):
+        for item in self.chunks:
+            yield item
+        if self.error is not None:
+            raise self.error
+
+
+class FakeCompletions:
+    """依次返回 outcomes 中的结果：异常直接抛出，其余作为流返回"""
+
+    def __init__(self, outcomes):
+        self.outcomes = list(outcomes)
+        self.calls = []
+
+    async def create(self, **params):
+        self.calls.append(params)
+        outcome = self.outcomes.pop(0)
+        if isinstance(outcome, Exception):
+            raise outcome
+        return outcome
+
+
+def make_llm(outcomes, **kwargs):
+    llm = SimpleLLM(base_url="http://llm.test/v1", backoff_base=0.0, **kwargs)
+    completions = FakeCompletions(outcomes)
+    llm.client = SimpleNamespace(chat=SimpleNamespace(completions=completions))
+    return llm, completions
+
+
+def chat(llm):
+    return asyncio.run(llm.chat([{"role": "user", "content": "hi"}], system_prompt="sys"))
+
+
+def test_is_retryable():
+    assert is_retryable(APIConnectionError(request=REQUEST))
+    assert is_retryable(httpx.ReadTimeout("timed out", request=REQUEST))
+    assert is_retryable(httpx.RemoteProtocolError("peer closed connection", request=REQUEST))
+    assert is_retryable(status_error(503)) and is_retryable(status_error(429))
+    assert not is_retryable(status_error(400)) and not is_retryable(status_error(401))
+    assert not is_retryable(ValueError("bad"))
+
+
+def test_stream_assembles_content_and_usage():
+    usage = SimpleNamespace(prompt_tokens=12, completion_tokens=3)
+    llm, completions = make_llm([FakeStream([chunk("he"), chunk("llo"), chunk(usage=usage)])])
+    response = chat(llm)
+    assert response.content == "hello" and response.attempts == 1
+    assert response.usage == {"prompt_tokens": 12, "completion_tokens": 3}
+    assert completions.calls[0]["stream_options"] == {"include_usage": True}
+    assert completions.calls[0]["messages"][0] == {"role": "system", "content": "sys"}
+    assert llm.stream_usage is True
+
+
+def test_dropped_stream_is_retried():
+    dropped = FakeStream([chunk("par")], httpx.RemoteProtocolError("peer closed connection", request=REQUEST))
+    llm, completions = make_llm([dropped, status_error(503), FakeStream([chunk("ok")])])
+    response = chat(llm)
+    assert response.content == "ok" and response.attempts == 3
+    assert len(completions.calls) == 3
+    assert llm.metrics[-1].attempts == 3 and not llm.metrics[-1].error
+
+
+def test_retries_are_bounded():
+    llm, _ = make_llm([status_error(503)] * 3, max_retries=2)
+    with pytest.raises(LLMError) as raised:
+        chat(llm)
+    assert raised.value.attempts == 3 and raised.value.retryable
+    assert llm.metrics[-1].error
+
+
+def test_client_errors_are_not_retried():
+    llm, completions = make_llm([status_error(401), FakeStream([chunk("unused")])])
+    with pytest.raises(LLMError) as raised:
+        chat(llm)
+    assert raised.value.attempts == 1 and not raised.value.retryable
+    assert len(completions.calls) == 1
+
+
+def test_backoff_is_capped():
+    llm = SimpleLLM(base_url="http://llm.test/v1", backoff_base=1.0, backoff_max=5.0)
+    assert all(0 <= llm.backoff_delay(attempt) <= 5.0 for attempt in range(10))
+
+
+def test_stream_options_fallback():
+    llm, completions = make_llm([status_error(400), FakeStream([chunk("a")]), FakeStream([chunk("b")])])
+    assert chat(llm).content == "a"
+    assert chat(llm).content == "b"
+    # 服务端以 400 拒绝 stream_options 后去掉重发，之后的请求都不再携带
+    assert "stream_options" in completions.calls[0]
+    assert "stream_options" not in completions.calls[1] and "stream_options" not in completions.calls[2]
+    assert llm.stream_usage is False
+
+
+def test_stream_options_disabled_explicitly():
+    llm, _ = make_llm([status_error(400)], stream_usage=True)
+    with pytest.raises(LLMError):
+        chat(llm)
+    llm, completions = make_llm([FakeStream([chunk("a")])], stream_usage=False)
+    assert chat(llm).content == "a"
+    assert "stream_options" not in completions.calls[0]
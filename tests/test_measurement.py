@@ -0,0 +1,71 @@
+import pytest
+from KernelTuneAgent.measurement import Measurement, MeasurementPolicy, compare, t_cdf, t_ppf
+
+
+@pytest.mark.parametrize("q, df, expected", [
+    (0.975, 10, 2.2281),
+    (0.975, 1, 12.7062),
+    (0.95, 5, 2.0150),
+    (0.995, 3, 5.8409),
+    (0.975, 30, 2.0423),
+])
+def test_t_ppf_known_quantiles(q, df, expected):
+    assert t_ppf(q, df) == pytest.approx(expected, abs=1e-4)
+    assert t_ppf(1 - q, df) == pytest.approx(-expected, abs=1e-4)
+
+
+def test_t_cdf():
+    assert t_cdf(0.0, 7) == pytest.approx(0.5)
+    # df=1 为 Cauchy 分布，F(1) = 0.75
+    assert t_cdf(1.0, 1) == pytest.approx(0.75)
+    assert t_cdf(2.2281, 10) == pytest.approx(0.975, abs=1e-5)
+    assert t_cdf(-2.2281, 10) == pytest.approx(0.025, abs=1e-5)
+    assert t_cdf(t_ppf(0.9, 4.5), 4.5) == pytest.approx(0.9)
+
+
+def test_measurement_interval():
+    m = Measurement(samples=[10.0, 12.0, 11.0])
+    assert m.mean == pytest.approx(11.0) and m.std == pytest.approx(1.0)
+    # t(0.975, 2) = 4.3027
+    assert m.half_width() == pytest.approx(4.3027 / 3 ** 0.5, abs=1e-4)
+    assert Measurement(samples=[5.0]).half_width() == float("inf")
+    assert m.describe().endswith("(n=3)")
+
+
+def test_policy_stops_at_precision_or_limit():
+    policy = MeasurementPolicy(min_repeats=2, max_repeats=4, rel_precision=0.01)
+    assert policy.needs_more(Measurement(samples=[100.0]))
+    assert not policy.needs_more(Measurement(samples=[100.0, 100.1]))
+    assert policy.needs_more(Measurement(samples=[100.0, 110.0]))
+    assert not policy.needs_more(Measurement(samples=[100.0, 110.0, 90.0, 105.0]))
+
+
+def test_compare_single_samples():
+    result = compare(Measurement(samples=[100.0]), Measurement(samples=[90.0]))
+    assert result.improvement == pytest.approx(0.1)
+    assert result.p_value is None and result.significant
+    assert "单次测量" in result.describe()
+
+
+def test_compare_significant_improvement():
+    baseline = Measurement(samples=[100.0, 101.0, 99.0, 100.5])
+    candidate = Measurement(samples=[90.0, 91.0, 89.5, 90.5])
+    result = compare(baseline, candidate)
+    assert result.significant and result.p_value < 0.001
+    assert result.ci_low < result.improvement < result.ci_high
+    assert result.ci_low > 0
+
+
+def test_compare_noise_is_not_significant():
+    baseline = Measurement(samples=[100.0, 110.0, 90.0])
+    candidate = Measurement(samples=[98.0, 108.0, 92.0])
+    result = compare(baseline, candidate)
+    assert result.improvement > 0 and not result.significant
+    assert result.ci_low < 0 < result.ci_high
+
+
+def test_compare_without_variance():
+    faster = compare(Measurement(samples=[100.0, 100.0]), Measurement(samples=[95.0, 95.0]))
+    assert faster.p_value == 0.0 and faster.significant
+    slower = compare(Measurement(samples=[100.0, 100.0]), Measurement(samples=[105.0, 105.0]))
+    assert slower.p_value == 1.0 and not slower.significant
@@ -0,0 +1,88 @@
+import pytest
+from KernelTuneAgent.metrics import LogTailer, MetricExtractor
+
+# 阈值为 1 时每次读取都走 mmap，阈值很大时走普通读取
+THRESHOLDS = [1, 1 << 20]
+
+
+def append(path, data):
+    with open(path, "ab") as f:
+        f.write(data)
+
+
+@pytest.mark.parametrize("threshold", THRESHOLDS)
+def test_partial_lines_wait_for_newline(tmp_path, threshold):
+    log = tmp_path / "train.log"
+    log.write_bytes(b"")
+    tailer = LogTailer(str(log), mmap_threshold=threshold)
+    append(log, b"epoch 1\nepoch 2 los")
+    assert tailer.read_lines() == ["epoch 1"]
+    assert tailer.offset == len(b"epoch 1\n")
+    assert tailer.read_lines() == []
+    append(log, "s 0.5\n耗时 3 秒\n".encode())
+    assert tailer.read_lines() == ["epoch 2 loss 0.5", "耗时 3 秒"]
+    assert tailer.bytes_read == log.stat().st_size
+
+
+@pytest.mark.parametrize("threshold", THRESHOLDS)
+def test_final_reads_trailing_partial_line(tmp_path, threshold):
+    log = tmp_path / "train.log"
+    log.write_bytes("done\n平均训练耗时: 12.5 秒".encode())
+    tailer = LogTailer(str(log), mmap_threshold=threshold)
+    assert tailer.read_lines() == ["done"]
+    assert tailer.read_lines(final=True) == ["平均训练耗时: 12.5 秒"]
+    assert tailer.read_lines(final=True) == []
+
+
+@pytest.mark.parametrize("threshold", THRESHOLDS)
+def test_truncated_log_is_read_from_start(tmp_path, threshold):
+    log = tmp_path / "train.log"
+    log.write_bytes(b"old line 1\nold line 2\n")
+    tailer = LogTailer(str(log), mmap_threshold=threshold)
+    assert len(tailer.read_lines()) == 2
+    log.write_bytes(b"new\n")
+    assert tailer.read_lines() == ["new"]
+    assert tailer.offset == 4 and tailer.seen_size == 4
+
+
+def test_reset_skips_existing_content(tmp_path):
+    log = tmp_path / "train.log"
+    log.write_bytes(b"previous trial\n")
+    tailer = LogTailer(str(log))
+    tailer.reset()
+    assert tailer.offset == log.stat().st_size
+    assert tailer.read_lines() == []
+    append(log, b"this trial\n")
+    assert tailer.read_lines() == ["this trial"]
+    tailer.reset(0)
+    assert tailer.read_lines() == ["previous trial", "this trial"]
+
+
+def test_missing_log(tmp_path):
+    tailer = LogTailer(str(tmp_path / "missing.log"))
+    tailer.reset()
+    assert tailer.offset == 0 and tailer.read_lines() == []
+
+
+def test_mmap_and_plain_reads_agree(tmp_path):
+    log = tmp_path / "train.log"
+    lines = [f"step {i} 1024 samples/s" for i in range(5000)]
+    log.write_bytes(("\n".join(lines) + "\npartial").encode())
+    mapped = LogTailer(str(log), mmap_threshold=1024)
+    plain = LogTailer(str(log), mmap_threshold=1 << 30)
+    assert mapped.read_lines() == plain.read_lines() == lines
+    assert mapped.offset == plain.offset
+
+
+def test_extractor_polls_new_lines(tmp_path):
+    log = tmp_path / "train.log"
+    log.write_text("平均训练耗时: 99 秒\n", encoding="utf-8")
+    extractor = MetricExtractor(str(log))
+    extractor.start()
+    append(log, "512 samples/s\n平均训练耗时: 12.5 秒\n".encode())
+    for line in extractor.poll(final=True):
+        extractor.feed(line)
+    assert extractor.metrics.lines == 2
+    assert extractor.metrics.training_time == 12.5 and extractor.metrics.mean_throughput == 512
+    assert extractor.extract("平均训练耗时: 7 秒").lines == 1
+    assert extractor.metrics.lines == 2
@@ -0,0 +1,118 @@
+import math
+import pytest
+from KernelTuneAgent.optimizer import (
+    BayesianOptimizer, GaussianProcess, RandomSearchOptimizer, _cholesky, create_optimizer, expected_improvement,
+)
+from KernelTuneAgent.search_space import SearchSpace
+
+PARAMS = ["vm.swappiness", "vm.page-cluster"]
+
+
+def objective(config):
+    """最优点在 swappiness=40、page-cluster=5"""
+    return 100.0 + (int(config["vm.swappiness"]) - 40) ** 2 / 100.0 + (int(config["vm.page-cluster"]) - 5) ** 2
+
+
+def test_cholesky():
+    matrix = [[4.0, 2.0, 0.6], [2.0, 5.0, 1.5], [0.6, 1.5, 3.0]]
+    lower = _cholesky(matrix)
+    for i in range(3):
+        for j in range(3):
+            assert sum(lower[i][k] * lower[j][k] for k in range(3)) == pytest.approx(matrix[i][j])
+            if j > i:
+                assert lower[i][j] == 0.0
+
+
+def test_gaussian_process_interpolates():
+    x = [[i / 10] for i in range(11)]
+    y = [math.sin(3 * v[0]) * 10 + 50 for v in x]
+    gp = GaussianProcess(noise=1e-4)
+    gp.fit(x, y)
+    for xi, yi in zip(x, y):
+        mean, std = gp.predict(xi)
+        assert mean == pytest.approx(yi, abs=0.1)
+        assert std < 0.5
+    mean, std = gp.predict([0.55])
+    assert mean == pytest.approx(math.sin(1.65) * 10 + 50, abs=0.5)
+    # 远离观测点时不确定性更大
+    assert gp.predict([3.0])[1] > gp.predict([0.55])[1]
+
+
+def test_expected_improvement():
+    # 标准差为 0 时退化为确定的提升
+    assert expected_improvement(90.0, 0.0, 100.0) == 10.0
+    assert expected_improvement(110.0, 0.0, 100.0) == 0.0
+    # 均值等于当前最优时 EI = std * φ(0)
+    assert expected_improvement(100.0, 2.0, 100.0) == pytest.approx(2.0 / math.sqrt(2 * math.pi))
+    assert expected_improvement(95.0, 1.0, 100.0) > expected_improvement(100.0, 1.0, 100.0) > expected_improvement(105.0, 1.0, 100.0) > 0
+    assert expected_improvement(100.0, 2.0, 100.0, xi=1.0) < expected_improvement(100.0, 2.0, 100.0)
+
+
+def run(optimizer, trials):
+    for _ in range(trials):
+        config = optimizer.suggest()
+        optimizer.observe(config, objective(config))
+    return optimizer.best()[1]
+
+
+def test_bayesian_optimizer_finds_optimum():
+    space = SearchSpace.from_meta(PARAMS)
+    optimizer = BayesianOptimizer(space, seed=0, n_candidates=200, n_local=50)
+    best = run(optimizer, 15)
+    assert best < 100.5
+    # 不重复推荐已评估的配置
+    keys = [space.key(config) for config, _ in optimizer.observations]
+    assert len(keys) == len(set(keys))
+
+
+def test_scores_need_initial_observations():
+    space = SearchSpace.from_meta(PARAMS)
+    optimizer = BayesianOptimizer(space, seed=1)
+    candidates = [space.default_config()]
+    assert optimizer.score_candidates(candidates) is None
+    run(optimizer, 3)
+    scores = optimizer.score_candidates(candidates)
+    assert len(scores) == 1 and scores[0] >= 0
+
+
+def test_suggest_conditioned_keeps_observations():
+    space = SearchSpace.from_meta(PARAMS)
+    optimizer = BayesianOptimizer(space, seed=2)
+    assert optimizer.plausible_outcomes() == []
+    run(optimizer, 4)
+    outcomes = optimizer.plausible_outcomes()
+    values = [value for _, value in optimizer.observations]
+    assert outcomes == [min(values), max(values)]
+
+    before = list(optimizer.observations)
+    pending = optimizer.suggest()
+    optimizer.mark_pending(pending)
+    proposals = optimizer.suggest_conditioned(pending, outcomes)
+    assert len(proposals) == 2
+    assert optimizer.observations == before
+    assert all(space.key(config) != space.key(pending) for config in proposals)
+
+
+def test_create_optimizer():
+    space = SearchSpace.from_meta(PARAMS)
+    assert create_optimizer("none", space) is None
+    assert isinstance(create_optimizer(" BO ", space), BayesianOptimizer)
+    assert isinstance(create_optimizer("random", space), RandomSearchOptimizer)
+    with pytest.raises(ValueError):
+        create_optimizer("cmaes", space)
+
+
+def test_censored_trials_are_penalties():
+    space = SearchSpace.from_meta(PARAMS)
+    optimizer = BayesianOptimizer(space, seed=3)
+    run(optimizer, 3)
+    worst = max(value for _, value in optimizer.observations)
+    killed = {"vm.swappiness": "90", "vm.page-cluster": "0"}
+    optimizer.observe_censored(killed, 50.0)
+    # 删失观测不计入最优结果和在途结果的假设，拟合时不低于最差的完成观测
+    assert optimizer.best()[1] >= 100.0
+    assert optimizer.plausible_outcomes()[-1] == worst
+    assert optimizer.penalized() == [(space.snap(killed), worst)]
+    assert space.key(killed) in optimizer._visited()
+    optimizer.add_prior(killed, 10.0)
+    assert optimizer.priors == []
@@ -0,0 +1,52 @@
+import asyncio
+import json
+from KernelTuneAgent.config import Phase
+from KernelTuneAgent.llm import LLMResponse
+
+PIPELINE = "optimizer mode: advisory\nstructured config: true\npipeline: true\n"
+
+
+class TrialLLM:
+    """每次都推荐一组配置：vm.swappiness 依次取 20、30、40…，其余参数取 schema 中的第一个取值或下限"""
+
+    def __init__(self):
+        self.requests = []
+
+    async def chat(self, messages, system_prompt=None, tools=None, **kwargs):
+        # 请求中有占位的工具结果时为训练期间的投机请求
+        speculative = any(m.get("content") == "训练进行中，结果尚未返回" for m in messages)
+        self.requests.append(speculative)
+        tool = next(t for t in tools if t["function"]["name"] == "run_trial")["function"]
+        config = {
+            name: spec["enum"][0] if "enum" in spec else spec.get("minimum", 0)
+            for name, spec in tool["parameters"]["properties"].items()
+        }
+        config["vm.swappiness"] = 10 + 10 * len(self.requests)
+        call = {"id": f"call-{len(self.requests)}", "type": "function",
+                "function": {"name": "run_trial", "arguments": json.dumps(config)}}
+        return LLMResponse(content="", tool_calls=[call])
+
+
+def test_speculation_outcomes(agent_factory):
+    agent = agent_factory(extra=PIPELINE)
+    agent._enter_phase(Phase.EXPLORATION)
+    # 提升 5% 以上进入 exploitation，从 exploration 一步最多前进一个阶段
+    assert agent._speculation_outcomes() == [
+        (Phase.EXPLORATION, True), (Phase.EXPLORATION, False), (Phase.EXPLOITATION, False),
+    ]
+    agent._enter_phase(Phase.REFINEMENT)
+    assert agent._speculation_outcomes() == [(Phase.REFINEMENT, True), (Phase.REFINEMENT, False)]
+
+
+def test_speculative_proposals_replace_llm_requests(agent_factory, tmp_path):
+    llm = TrialLLM()
+    # 第 1 步测量 baseline，之后 3 步各训练一组推荐
+    agent = agent_factory(extra=PIPELINE, llm=llm, max_steps=4)
+    asyncio.run(agent.run())
+    trials = [t for t in agent.trials if t.source != "baseline"]
+    assert len(trials) == 3
+    # 只有第一步真正等待 LLM：之后每一步都采用上一次训练期间按实际结果生成的推荐
+    assert llm.requests.count(False) == 1
+    # 最后一步之后不再投机；每次投机为每种可能的结果各请求一次
+    assert llm.requests.count(True) >= 2 * 2
+    assert len({t.config["vm.swappiness"] for t in trials}) == 3
@@ -0,0 +1,83 @@
+import asyncio
+import time
+from KernelTuneAgent.process import TailBuffer, Watchdog, run_shell
+
+# 后台启动一个长时间睡眠的子进程并记下它的 pid，然后不再有任何输出
+SPAWN_CHILD = "sleep 30 & echo $! > {pid_file}; echo started; wait"
+
+
+def alive(pid: int) -> bool:
+    """进程存在且不是僵尸进程（被杀死的孤儿进程可能暂时没有被回收）"""
+    try:
+        with open(f"/proc/{pid}/stat") as f:
+            state = f.read().rsplit(")", 1)[1].split()[0]
+    except (OSError, IndexError):
+        return False
+    return state not in ("Z", "X")
+
+
+def wait_dead(pid: int, timeout: float = 2.0) -> bool:
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if not alive(pid):
+            return True
+        time.sleep(0.05)
+    return False
+
+
+def test_watchdog_kills_the_whole_group(tmp_path):
+    pid_file = tmp_path / "child.pid"
+    result = asyncio.run(run_shell(
+        SPAWN_CHILD.format(pid_file=pid_file), watchdog=Watchdog(0.3), poll_interval=0.05, kill_grace=1.0
+    ))
+    assert result.idle_timed_out and not result.timed_out
+    assert result.stdout == "started\n"
+    # 子进程同样被终止，否则它持有的输出管道会让读取一直等到 sleep 结束
+    assert result.wall_time < 10
+    assert wait_dead(int(pid_file.read_text()))
+
+
+def test_timeout_escalates_to_sigkill(tmp_path):
+    pid_file = tmp_path / "child.pid"
+    # 忽略 SIGTERM 的进程组在宽限期后被 SIGKILL 终止（忽略的信号会被子进程继承）
+    result = asyncio.run(run_shell(
+        "trap '' TERM; " + SPAWN_CHILD.format(pid_file=pid_file), timeout=0.3, poll_interval=0.05, kill_grace=0.3
+    ))
+    assert result.timed_out and result.returncode == -9
+    assert wait_dead(int(pid_file.read_text()))
+
+
+def test_on_line_stops_the_group(tmp_path):
+    pid_file = tmp_path / "child.pid"
+    result = asyncio.run(run_shell(
+        SPAWN_CHILD.format(pid_file=pid_file), on_line=lambda line: line == "started", poll_interval=0.05, kill_grace=1.0
+    ))
+    assert result.stopped and result.wall_time < 10
+    assert wait_dead(int(pid_file.read_text()))
+
+
+def test_cancel_kills_the_group(tmp_path):
+    pid_file = tmp_path / "child.pid"
+
+    async def cancel_after_start():
+        task = asyncio.ensure_future(run_shell(SPAWN_CHILD.format(pid_file=pid_file), poll_interval=0.05, kill_grace=1.0))
+        while not pid_file.exists() or not pid_file.read_text().strip():
+            await asyncio.sleep(0.05)
+        task.cancel()
+        try:
+            await task
+        except asyncio.CancelledError:
+            return True
+        return False
+
+    assert asyncio.run(cancel_after_start())
+    assert wait_dead(int(pid_file.read_text()))
+
+
+def test_output_keeps_the_tail():
+    buffer = TailBuffer(8)
+    for chunk in (b"0123", b"4567", b"89ab"):
+        buffer.append(chunk)
+    assert buffer.text() == "456789ab" and buffer.truncated
+    result = asyncio.run(run_shell("seq 1 1000", max_output_bytes=16))
+    assert result.truncated and result.stdout.endswith("999\n1000\n") and len(result.stdout) == 16
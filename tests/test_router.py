@@ -0,0 +1,153 @@
+import asyncio
+import time
+import pytest
+from KernelTuneAgent.llm import LLMError, LLMResponse, SimpleLLM
+from KernelTuneAgent.router import LLMRouter, create_llm
+
+
+class FakeLLM:
+    """按预设结果应答的推理端点，记录收到的请求"""
+
+    def __init__(self, url, errors=(), latency=0.5):
+        self.base_url = url
+        self.model = "fake"
+        self.errors = list(errors)
+        self.latency = latency
+        self.calls = 0
+
+    async def chat(self, messages, system_prompt=None, tools=None):
+        self.calls += 1
+        if self.errors:
+            raise self.errors.pop(0)
+        return LLMResponse(content=self.base_url, latency=self.latency)
+
+    def summary(self):
+        return f"{self.base_url}: {self.calls} 次"
+
+
+def retryable(attempts=1):
+    return LLMError("连接失败", attempts=attempts, retryable=True)
+
+
+def make_router(*llms, strategy="least_outstanding", cooldown=30.0):
+    return LLMRouter(list(llms), strategy=strategy, cooldown=cooldown, health_interval=None)
+
+
+def ask(router):
+    return asyncio.run(router.chat([{"role": "user", "content": "hi"}]))
+
+
+def test_failover_to_next_endpoint(capsys):
+    a, b, c = FakeLLM("a", errors=[retryable(attempts=2)]), FakeLLM("b"), FakeLLM("c")
+    router = make_router(a, b, c)
+    response = ask(router)
+    # 端点按顺序打破平局，a 失败后立即切换到 b
+    assert response.content == "b" and response.attempts == 3
+    assert (a.calls, b.calls, c.calls) == (1, 1, 0)
+    assert not router.endpoints[0].healthy and router.endpoints[1].latency == 0.5
+    assert "推理端点 a 不可用" in capsys.readouterr().out
+    # a 冷却期间不再参与调度，请求数相同时按延迟选择未用过的 c
+    assert ask(router).content == "c"
+    assert a.calls == 1
+
+
+def test_least_outstanding_prefers_idle_endpoint():
+    a, b = FakeLLM("a"), FakeLLM("b")
+    router = make_router(a, b)
+    router.endpoints[0].outstanding = 2
+    assert ask(router).content == "b"
+    router.endpoints[0].outstanding = 0
+    # 未完成请求数相同时选择延迟更低的端点
+    router.endpoints[0].latency, router.endpoints[1].latency = 0.2, 0.9
+    assert ask(router).content == "a"
+
+
+def test_latency_strategy():
+    a, b = FakeLLM("a"), FakeLLM("b")
+    router = make_router(a, b, strategy="latency")
+    router.endpoints[0].latency, router.endpoints[1].latency = 1.0, 3.0
+    # (1 + 1) × 1.0 < (0 + 1) × 3.0
+    router.endpoints[0].outstanding = 1
+    assert ask(router).content == "a"
+    # (3 + 1) × 1.0 > (0 + 1) × 3.0
+    router.endpoints[0].outstanding = 3
+    assert ask(router).content == "b"
+    # 没有延迟数据的端点按已知最快端点估计
+    c = FakeLLM("c")
+    router = make_router(a, c, strategy="latency")
+    router.endpoints[0].latency, router.endpoints[0].outstanding = 1.0, 1
+    assert ask(router).content == "c"
+
+
+def test_non_retryable_error_is_raised():
+    a, b = FakeLLM("a", errors=[LLMError("请求无效")]), FakeLLM("b")
+    router = make_router(a, b)
+    with pytest.raises(LLMError, match="请求无效"):
+        ask(router)
+    assert b.calls == 0 and router.endpoints[0].healthy
+    assert router.endpoints[0].outstanding == 0
+
+
+def test_all_endpoints_down():
+    a, b = FakeLLM("a", errors=[retryable()]), FakeLLM("b", errors=[retryable(attempts=3)])
+    router = make_router(a, b)
+    with pytest.raises(LLMError, match="所有推理端点均不可用") as info:
+        ask(router)
+    assert info.value.retryable and info.value.attempts == 4
+    assert (a.calls, b.calls) == (1, 1)
+
+
+def test_mark_down_backs_off_exponentially():
+    router = make_router(FakeLLM("a"), FakeLLM("b"), cooldown=10.0)
+    endpoint = router.endpoints[0]
+    for failures, cooldown in [(1, 10.0), (2, 20.0), (3, 40.0)]:
+        before = time.monotonic()
+        endpoint.mark_down(router.cooldown)
+        assert endpoint.failures == failures and not endpoint.healthy
+        assert before + cooldown <= endpoint.down_until <= time.monotonic() + cooldown
+    # 最多翻倍 5 次
+    endpoint.failures = 10
+    endpoint.mark_down(router.cooldown)
+    assert endpoint.down_until <= time.monotonic() + 320.0
+    assert not endpoint.available(time.monotonic()) and endpoint.available(endpoint.down_until)
+    # 成功请求后恢复
+    endpoint.observe(0.1)
+    assert endpoint.healthy and endpoint.failures == 0
+
+
+def test_pick_earliest_recovery_when_all_down():
+    a, b, c = FakeLLM("a"), FakeLLM("b"), FakeLLM("c")
+    router = make_router(a, b, c)
+    now = time.monotonic()
+    for endpoint, delay in zip(router.endpoints, [60.0, 5.0, 30.0]):
+        endpoint.healthy, endpoint.down_until = False, now + delay
+    assert router._pick(set()) == 1
+    assert router._pick({1}) == 2
+    assert router._pick({0, 1, 2}) is None
+    # 全部不可用时仍然试探最早恢复的端点
+    assert ask(router).content == "b"
+    assert router.endpoints[1].healthy
+
+
+def test_summary():
+    router = make_router(FakeLLM("a"), FakeLLM("b"))
+    ask(router)
+    text = router.summary()
+    assert "LLM 路由 (least_outstanding, 2 个端点)" in text
+    assert "a [正常] 请求 1 次, 平滑延迟 0.50 秒" in text and "b [正常] 请求 0 次, 平滑延迟 -" in text
+
+
+def test_create_llm():
+    single = create_llm(["http://localhost:8000/v1"], max_retries=2)
+    assert isinstance(single, SimpleLLM) and single.max_retries == 2
+    router = create_llm(["http://a/v1", "http://b/v1"], strategy="latency", max_retries=5, health_interval=None)
+    assert isinstance(router, LLMRouter) and router.strategy == "latency"
+    # 多个副本时每个端点只重试一次，尽快切换
+    assert [endpoint.llm.max_retries for endpoint in router.endpoints] == [1, 1]
+    assert [endpoint.url for endpoint in router.endpoints] == ["http://a/v1", "http://b/v1"]
+    with pytest.raises(ValueError):
+        create_llm([])
+    with pytest.raises(ValueError, match="未知的路由策略"):
+        create_llm(["http://a/v1", "http://b/v1"], strategy="round_robin")
+    with pytest.raises(ValueError):
+        LLMRouter([])
@@ -0,0 +1,86 @@
+import asyncio
+import pytest
+from KernelTuneAgent.scheduler import SuccessiveHalving
+from KernelTuneAgent.trial import TrialResult, TrialRunner
+
+PARAMS = ["vm.swappiness"]
+
+
+class FakeRunner:
+    """训练耗时由 swappiness 决定，截断训练按 fidelity 等比例缩短"""
+
+    def __init__(self, failing=()):
+        self.calls = []
+        self.failing = set(failing)
+
+    def evaluate(self, config, fidelity, label=None):
+        self.calls.append((config["vm.swappiness"], label or fidelity))
+        if config["vm.swappiness"] in self.failing:
+            return TrialResult(config=config, fidelity=fidelity, error="训练失败")
+        return TrialResult(config=config, fidelity=fidelity, training_time=int(config["vm.swappiness"]) * fidelity)
+
+    async def run(self, config, fidelity=1.0):
+        return self.evaluate(config, fidelity)
+
+    async def measure(self, config):
+        return self.evaluate(config, 1.0, "measure")
+
+
+def configs(*values):
+    return [{"vm.swappiness": str(value)} for value in values]
+
+
+def test_rungs():
+    assert SuccessiveHalving(FakeRunner()).rungs() == [0.1, 0.3, 1.0]
+    assert SuccessiveHalving(FakeRunner(), min_fidelity=0.5, eta=2).rungs() == [0.5, 1.0]
+    # 0.4 放大 3 倍超过完整训练，不单独成为一轮
+    assert SuccessiveHalving(FakeRunner(), min_fidelity=0.4).rungs() == [1.0]
+    with pytest.raises(ValueError):
+        SuccessiveHalving(FakeRunner(), min_fidelity=0)
+    with pytest.raises(ValueError):
+        SuccessiveHalving(FakeRunner(), eta=1)
+
+
+def test_promotes_fastest_candidates():
+    runner = FakeRunner()
+    results = asyncio.run(SuccessiveHalving(runner).run(configs(*range(90, 0, -10))))
+    # 9 个候选 -> 3 个 -> 1 个，最后一轮按测量策略完整训练
+    assert len(results) == 9 + 3 + 1
+    assert [value for value, fidelity in runner.calls if fidelity == 0.3] == ["10", "20", "30"]
+    assert runner.calls[-1] == ("10", "measure")
+
+
+def test_failed_candidates_are_not_promoted():
+    runner = FakeRunner(failing={"10", "20"})
+    asyncio.run(SuccessiveHalving(runner, min_fidelity=0.5, eta=2).run(configs(10, 20, 30, 40)))
+    assert runner.calls[-1] == ("30", "measure")
+
+
+def test_stops_when_no_candidate_finishes():
+    runner = FakeRunner(failing={"10", "20"})
+    results = asyncio.run(SuccessiveHalving(runner).run(configs(10, 20)))
+    assert len(results) == 2 and all(fidelity == 0.1 for _, fidelity in runner.calls)
+
+
+def test_budget_placeholder_in_train_command():
+    runner = TrialRunner("python train.py --steps {budget}", "train.log", PARAMS, full_budget=5000)
+    assert runner.build_command() == "python train.py --steps 5000"
+    assert runner.build_command(0.1) == "export KTA_FIDELITY=0.1 KTA_BUDGET=500; python train.py --steps 500"
+    # 预算至少为 1
+    assert runner.build_command(0.0001).endswith("--steps 1")
+
+
+def test_budget_appended_as_fidelity_arg():
+    runner = TrialRunner("python train.py", "train.log", PARAMS, fidelity_arg="--max-steps {budget}", full_budget=300)
+    assert runner.build_command() == "python train.py"
+    assert runner.build_command(1 / 3) == "export KTA_FIDELITY=0.333333 KTA_BUDGET=100; python train.py --max-steps 100"
+
+
+def test_budget_placeholder_needs_full_budget(capsys):
+    with pytest.raises(ValueError):
+        TrialRunner("python train.py --steps {budget}", "train.log", PARAMS)
+    # fidelity arg 无法替换时不做截断，只通过环境变量告知训练脚本
+    runner = TrialRunner("python train.py", "train.log", PARAMS, fidelity_arg="--max-steps {budget}")
+    assert "full budget" in capsys.readouterr().out
+    assert runner.fidelity_arg == ""
+    assert runner.build_command(0.5) == "export KTA_FIDELITY=0.5 KTA_BUDGET=0; python train.py"
@@ -0,0 +1,27 @@
+from KernelTuneAgent.schema import Memory, Message, Role, estimate_tokens
+
+
+def test_message_pydantic_surface():
+    message = Message.assistant_message("ok", tool_calls=[{"id": "c1", "type": "function"}])
+    data = message.model_dump()
+    assert data["role"] is Role.ASSISTANT and data["tool_call_id"] is None
+    assert message.model_dump(mode="json", exclude_none=True) == {
+        "role": "assistant", "content": "ok", "tool_calls": [{"id": "c1", "type": "function"}],
+    }
+    assert Message.model_validate(data) == message
+    assert Message.model_validate({"role": "tool", "content": "x", "tool_call_id": "c1"}).wire == {
+        "role": "tool", "content": "x", "tool_call_id": "c1",
+    }
+
+
+def test_memory_round_trip_and_compaction():
+    memory = Memory(messages=[Message.user_message("a"), {"role": "assistant", "content": "b"}])
+    assert Memory.model_validate(memory.model_dump()).get_messages() == memory.get_messages()
+    memory.add_message(Message.user_message("第三条"))
+    memory.compact(2, "汇总")
+    assert memory.get_messages() == [
+        {"role": "user", "content": "汇总"}, {"role": "user", "content": "第三条"},
+    ]
+    assert memory.estimate_tokens() == estimate_tokens("第三条") + estimate_tokens("汇总")
+    restored = Memory.from_snapshot(memory.snapshot())
+    assert restored.get_messages() == memory.get_messages()
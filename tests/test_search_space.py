@@ -0,0 +1,104 @@
+import pytest
+from KernelTuneAgent.search_space import GridIndex, SearchSpace
+
+PARAMS = ["vm.swappiness", "transparent_hugepage"]
+
+
+def make_index(min_distance=0.05, params=PARAMS):
+    return GridIndex(SearchSpace.from_meta(params), min_distance=min_distance, seed=0)
+
+
+def test_add_and_nearest():
+    index = make_index()
+    assert index.nearest({"vm.swappiness": "10"}) == (None, float("inf"))
+    index.add({"vm.swappiness": "11", "transparent_hugepage": "never"}, phase="exploration")
+    index.add({"vm.swappiness": "12", "transparent_hugepage": "never"}, phase="exploration")
+    assert len(index.points) == 1 and index.stats["exploration"] == {"points": 1, "repeats": 1}
+
+    config, distance = index.nearest({"vm.swappiness": "12", "transparent_hugepage": "never"})
+    assert config == {"vm.swappiness": "12", "transparent_hugepage": "never"} and distance == 0.0
+    # 距离取各参数归一化距离的最大值，离散参数不同记为 1
+    assert index.nearest({"vm.swappiness": "16", "transparent_hugepage": "never"})[1] == 4 / 90
+    assert index.nearest({"vm.swappiness": "12", "transparent_hugepage": "always"})[1] == 1.0
+
+
+def test_covers():
+    index = make_index()
+    index.add({"vm.swappiness": "10", "transparent_hugepage": "madvise"})
+    assert index.covers({"vm.swappiness": "14", "transparent_hugepage": "madvise"})
+    assert not index.covers({"vm.swappiness": "20", "transparent_hugepage": "madvise"})
+    assert not index.covers({"vm.swappiness": "10", "transparent_hugepage": "never"})
+
+
+def test_check_new_config_is_snapped():
+    index = make_index()
+    index.add({"vm.swappiness": "10", "transparent_hugepage": "madvise"})
+    config, note = index.check({"vm.swappiness": 62.6, "transparent_hugepage": "never"})
+    assert config == {"vm.swappiness": "62", "transparent_hugepage": "never"} and note == ""
+
+
+def test_check_redirects_to_unvisited_point():
+    index = make_index()
+    index.phase = "exploration"
+    index.add({"vm.swappiness": "10", "transparent_hugepage": "madvise"})
+    config, note = index.check({"vm.swappiness": "12", "transparent_hugepage": "madvise"})
+    assert config is not None and not index.covers(config)
+    assert "已改为附近尚未评估的配置" in note
+    assert index.stats["exploration"]["redirected"] == 1
+
+
+def test_check_rejects_without_redirect():
+    index = make_index()
+    index.add({"vm.swappiness": "10", "transparent_hugepage": "madvise"})
+    config, note = index.check({"vm.swappiness": "10", "transparent_hugepage": "madvise"}, redirect=False)
+    assert config is None and "相同" in note
+    assert index.stats[""]["rejected"] == 1
+
+
+def test_redirect_keeps_constraints():
+    index = make_index(params=["vm.dirty_background_ratio", "vm.dirty_ratio"])
+    start = {"vm.dirty_background_ratio": "10", "vm.dirty_ratio": "14"}
+    index.add(start)
+    for _ in range(20):
+        moved = index.redirect(start)
+        assert moved is not None and not index.covers(moved)
+        assert not index.space.violations(moved)
+        index.add(moved)
+
+
+def test_redirect_gives_up_when_space_is_covered():
+    index = make_index(min_distance=0.5, params=["kernel.numa_balancing"])
+    index.add({"kernel.numa_balancing": "0"})
+    index.add({"kernel.numa_balancing": "1"})
+    config, note = index.check({"kernel.numa_balancing": "1"})
+    assert config is None and "视为已经测量过" in note
+
+
+def test_coverage_and_describe():
+    index = make_index()
+    index.add({"vm.swappiness": "0", "transparent_hugepage": "always"}, phase="exploration")
+    index.add({"vm.swappiness": "90", "transparent_hugepage": "never"}, phase="exploration")
+    index.add({"vm.swappiness": "40", "transparent_hugepage": "never"}, phase="exploitation")
+    # swappiness 46 个取值中覆盖 2 个，THP 3 个取值中覆盖 2 个
+    assert index.coverage("exploration") == (2 / 46 + 2 / 3) / 2
+    assert index.coverage("missing") == 0.0
+    text = index.describe()
+    assert "已评估 3 个网格点" in text
+    assert "exploration: 新网格点 2 个" in text and "exploitation: 新网格点 1 个" in text
+
+
+def test_refinement_step_is_not_redirected():
+    index = make_index(params=["vm.swappiness", "fs.file-max"])
+    start = {"vm.swappiness": "10", "fs.file-max": "5000000"}
+    index.set_phase("exploration")
+    index.add(start)
+    # 探索阶段单步移动视为重复
+    one_step = {"vm.swappiness": "12", "fs.file-max": "6000000"}
+    assert index.covers(one_step)
+    # 精调阶段（最小变化幅度 0.02，探索阶段 0.20）最小距离缩小到十分之一，单步移动原样训练
+    index.set_phase("refinement", 0.02 / 0.20)
+    assert index.min_distance == pytest.approx(0.005)
+    config, note = index.check(one_step)
+    assert config == one_step and note == ""
+    # 完全相同的配置仍然视为重复
+    assert index.check(start, redirect=False)[0] is None
@@ -0,0 +1,110 @@
+import asyncio
+import pytest
+from KernelTuneAgent.config import ImpactLevel
+from KernelTuneAgent.search_space import SearchSpace
+from KernelTuneAgent.sensitivity import (
+    MorrisScreening, ParameterEffect, assign_impacts, screen_parameters, select_frozen,
+)
+
+PARAMS = ["vm.swappiness", "vm.page-cluster", "kernel.numa_balancing"]
+
+
+def test_censored_runs_are_penalized():
+    morris = MorrisScreening(SearchSpace.from_meta(PARAMS), trajectories=2, seed=0)
+    killed = []
+
+    async def evaluate(config):
+        # page-cluster 大于 4 的训练被提前终止，耗时估计明显偏低
+        if int(config["vm.page-cluster"]) > 4:
+            killed.append(config)
+            return 20.0, True
+        return 100.0 + int(config["vm.swappiness"]) / 10, False
+
+    effects = {effect.name: effect for effect in asyncio.run(morris.run(evaluate))}
+    assert killed
+    # 惩罚值不低于最慢的完成训练，被终止的训练不会让该参数看起来在加速训练
+    assert effects["vm.page-cluster"].mu >= 0
+
+
+async def swappiness_only(config):
+    """只有 swappiness 影响训练耗时"""
+    return 100.0 + int(config["vm.swappiness"]) / 10, False
+
+
+def test_trajectories_change_one_parameter_at_a_time():
+    space = SearchSpace.from_meta(PARAMS + ["transparent_hugepage"])
+    space.freeze(["kernel.numa_balancing"])
+    morris = MorrisScreening(space, trajectories=3, levels=4, seed=1)
+    # 已冻结的参数不参与筛选
+    assert morris.names == ["vm.swappiness", "vm.page-cluster", "transparent_hugepage"]
+    assert morris.runs == 3 * 4
+    for trajectory in morris.design():
+        assert len(trajectory) == 4 and trajectory[0][1] is None
+        assert sorted(name for _, name in trajectory[1:]) == sorted(morris.names)
+        for (before, _), (after, name) in zip(trajectory, trajectory[1:]):
+            assert [key for key in before if before[key] != after[key]] == [name]
+            assert after["kernel.numa_balancing"] == space.specs["kernel.numa_balancing"].default
+
+
+def test_invalid_design():
+    space = SearchSpace.from_meta(PARAMS)
+    with pytest.raises(ValueError):
+        MorrisScreening(space, levels=3)
+    with pytest.raises(ValueError):
+        MorrisScreening(space, trajectories=0)
+
+
+def test_effects_rank_influential_parameters():
+    morris = MorrisScreening(SearchSpace.from_meta(PARAMS), trajectories=4, seed=2)
+    effects = asyncio.run(morris.run(swappiness_only))
+    assert [effect.name for effect in effects][0] == "vm.swappiness"
+    top = effects[0]
+    # 耗时随 swappiness 线性增加：每条轨迹上的基本效应相同
+    assert top.effects == 4 and top.mu == pytest.approx(top.mu_star) and top.sigma == pytest.approx(0.0, abs=1e-9)
+    assert all(effect.mu_star == 0.0 and effect.effects == 4 for effect in effects[1:])
+
+
+def test_failed_runs_are_skipped():
+    morris = MorrisScreening(SearchSpace.from_meta(PARAMS), trajectories=2, seed=3)
+
+    async def evaluate(config):
+        if config["kernel.numa_balancing"] == "1":
+            return None, False
+        return await swappiness_only(config)
+
+    effects = {effect.name: effect for effect in asyncio.run(morris.run(evaluate))}
+    # 两端都成功的移动才计入基本效应
+    assert all(effect.effects < 2 for effect in effects.values())
+
+
+def test_select_frozen():
+    effects = [
+        ParameterEffect(name="a", mu_star=1.0, change=0.10, effects=4),
+        ParameterEffect(name="b", mu_star=0.5, change=0.05, effects=4),
+        ParameterEffect(name="c", mu_star=0.05, change=0.03, effects=4),    # 远小于最重要的参数
+        ParameterEffect(name="d", mu_star=0.4, change=0.005, effects=4),    # 低于噪声
+        ParameterEffect(name="e", mu_star=0.0, effects=0),                  # 没有有效的基本效应，影响未知
+    ]
+    assert select_frozen(effects, threshold=0.1, noise=0.01, min_active=1) == ["d", "c"]
+    # mu* 最大的 min_active 个参数始终保留
+    assert select_frozen(effects, threshold=0.1, noise=0.01, min_active=3) == ["c"]
+    assert select_frozen([], min_active=0) == []
+
+
+def test_assign_impacts():
+    effects = [ParameterEffect(name=name, mu_star=mu) for name, mu in zip("abcdefg", (7, 6, 5, 4, 3, 2, 1))]
+    impacts = assign_impacts(effects, frozen=["b"])
+    assert "b" not in impacts
+    assert [impacts[name] for name in "acdefg"] == [ImpactLevel.HIGH] * 2 + [ImpactLevel.MEDIUM] * 2 + [ImpactLevel.LOW] * 2
+    assert assign_impacts(effects[:1], frozen=["a"]) == {}
+
+
+def test_screen_parameters_report():
+    space = SearchSpace.from_meta(PARAMS)
+    report = asyncio.run(screen_parameters(space, swappiness_only, trajectories=2, seed=4, min_active=1, fidelity=0.1))
+    assert report.runs == 2 * 4 and report.fidelity == 0.1
+    assert sorted(report.frozen) == ["kernel.numa_balancing", "vm.page-cluster"]
+    assert report.impacts == {"vm.swappiness": ImpactLevel.HIGH}
+    text = report.describe()
+    assert "参数筛选 (8 次训练, fidelity=0.1)" in text
+    assert "vm.swappiness" in text and "[impact high]" in text and "[冻结为默认值]" in text
@@ -0,0 +1,49 @@
+from KernelTuneAgent.prompt_build import PromptBuilder
+from KernelTuneAgent.settings import AgentSettings
+
+
+def test_defaults_without_options():
+    settings = AgentSettings.from_options({})
+    assert settings.train_timeout == 3600 and settings.bash_timeout is None
+    assert settings.eval_cache and not settings.pipeline
+    assert settings.isolation_steps == []
+
+
+def test_parses_types_and_lists():
+    settings = AgentSettings.from_options({
+        "max repeats": "5",
+        "llm cooldown": "0.5",
+        "pipeline": "true",
+        "duplicate policy": "Reject",
+        "isolation steps": "sync, drop_caches,,quiesce",
+        "bash timeout": "",
+        "unrelated key": "x",
+    })
+    assert settings.max_repeats == 5 and settings.llm_cooldown == 0.5 and settings.pipeline
+    assert settings.duplicate_policy == "reject"
+    assert settings.isolation_steps == ["sync", "drop_caches", "quiesce"]
+    assert settings.bash_timeout is None
+
+
+def test_invalid_values_fall_back_to_defaults(capsys):
+    settings = AgentSettings.from_options({"max repeats": "many", "min distance": "0.2"})
+    assert settings.max_repeats == 1 and settings.min_distance == 0.2
+    assert "max repeats" in capsys.readouterr().out
+
+
+def test_prompt_builder_builds_settings(tmp_path):
+    config = tmp_path / "sys.config"
+    config.write_text("hardware probe: false\nscreening: true\nscreening fidelity: 0.25\n")
+    settings = PromptBuilder(str(config)).settings
+    assert settings.screening and settings.screening_fidelity == 0.25
+
+
+def test_llm_endpoints():
+    settings = AgentSettings.from_options({
+        "llm base urls": "http://a:8001/v1, http://b:8001/v1",
+        "llm router strategy": "Latency",
+        "llm stream usage": "false",
+    })
+    assert settings.llm_base_urls == ["http://a:8001/v1", "http://b:8001/v1"]
+    assert settings.llm_router_strategy == "latency" and settings.llm_stream_usage is False
+    assert AgentSettings.from_options({}).llm_stream_usage is None
@@ -0,0 +1,106 @@
+from KernelTuneAgent.search_space import SearchSpace
+from KernelTuneAgent.sysctl import ApplyResult, SysctlApplier, parse_selected_value, read_sysctl_value
+
+PARAMS = ["vm.swappiness", "vm.dirty_ratio", "transparent_hugepage", "block.scheduler"]
+
+
+def make_applier(tmp_path):
+    """在临时目录中伪造 /proc/sys、/sys/kernel/mm 和一个块设备目录"""
+    proc, mm, block = tmp_path / "proc/sys", tmp_path / "mm", tmp_path / "block/sda"
+    files = {
+        proc / "vm/swappiness": "60\n",
+        proc / "vm/dirty_ratio": "20\n",
+        mm / "transparent_hugepage/enabled": "always [madvise] never\n",
+        block / "queue/scheduler": "[mq-deadline] none\n",
+    }
+    for path, content in files.items():
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_text(content)
+    space = SearchSpace.from_meta(PARAMS)
+    return SysctlApplier(space, proc_root=str(proc), mm_root=str(mm), block_root=str(block))
+
+
+def test_parse_selected_value():
+    assert parse_selected_value("always [madvise] never\n") == "madvise"
+    assert parse_selected_value("[none] mq-deadline kyber") == "none"
+    assert parse_selected_value(" 60\n") == "60"
+
+
+def test_read_selected_format(tmp_path):
+    applier = make_applier(tmp_path)
+    assert applier.read() == {
+        "vm.swappiness": "60",
+        "vm.dirty_ratio": "20",
+        "transparent_hugepage": "madvise",
+        "block.scheduler": "mq-deadline",
+    }
+    assert read_sysctl_value("block.scheduler") is None
+
+
+def test_validate(tmp_path):
+    applier = make_applier(tmp_path)
+    assert applier.validate({"vm.swappiness": "10", "transparent_hugepage": "never"}) == []
+    errors = applier.validate({"vm.swappiness": "11", "transparent_hugepage": "sometimes", "vm.bogus": "1"})
+    assert len(errors) == 3
+    assert "最接近的合法值为 12" in errors[0]
+    assert "vm.bogus: 不是可调参数" in errors
+
+
+def test_invalid_config_is_not_written(tmp_path):
+    applier = make_applier(tmp_path)
+    result = applier.apply({"vm.swappiness": "10", "vm.dirty_ratio": "81"})
+    assert not result.success and not result.previous
+    assert (tmp_path / "proc/sys/vm/swappiness").read_text() == "60\n"
+
+
+def test_apply_snapshot_and_read_back(tmp_path):
+    applier = make_applier(tmp_path)
+    result = applier.apply({"vm.swappiness": 10, "transparent_hugepage": "never", "block.scheduler": "none"})
+    assert result.success and not result.rolled_back
+    assert result.previous == {"vm.swappiness": "60", "transparent_hugepage": "madvise", "block.scheduler": "mq-deadline"}
+    assert result.effective == {"vm.swappiness": "10", "transparent_hugepage": "never", "block.scheduler": "none"}
+    assert applier.last_snapshot == result.previous
+    assert (tmp_path / "proc/sys/vm/swappiness").read_text() == "10\n"
+
+    # original 只记录第一次修改前的取值，restore() 恢复到会话开始前
+    applier.apply({"vm.swappiness": 20})
+    assert applier.last_snapshot == {"vm.swappiness": "10"}
+    assert applier.original["vm.swappiness"] == "60"
+    restored = applier.restore()
+    assert restored.success
+    assert applier.read(["vm.swappiness", "block.scheduler"]) == {"vm.swappiness": "60", "block.scheduler": "mq-deadline"}
+
+
+def test_mismatched_read_back():
+    # 内核对取值做了截断时，读回值与请求值不一致；回滚后不再报告
+    result = ApplyResult(requested={"vm.swappiness": "10"}, effective={"vm.swappiness": "12"})
+    assert result.mismatched == {"vm.swappiness": "12"}
+    assert "⚠️ vm.swappiness 请求值 10，实际生效 12" in result.describe()
+    result.rolled_back = True
+    assert result.mismatched == {}
+
+
+def test_failed_write_rolls_back(tmp_path):
+    applier = make_applier(tmp_path)
+    # 把 dirty_ratio 换成目录，写入必然失败
+    path = tmp_path / "proc/sys/vm/dirty_ratio"
+    path.unlink()
+    path.mkdir()
+    result = applier.apply({"vm.swappiness": "10", "vm.dirty_ratio": "40"})
+    assert not result.success and result.rolled_back
+    assert any(error.startswith("vm.dirty_ratio") for error in result.errors)
+    assert result.effective == {"vm.swappiness": "60"}
+    assert (tmp_path / "proc/sys/vm/swappiness").read_text() == "60\n"
+    assert result.mismatched == {}
+
+    # 不回滚时保留已写入的参数
+    result = applier.apply({"vm.swappiness": "10", "vm.dirty_ratio": "40"}, rollback=False)
+    assert not result.rolled_back and result.effective == {"vm.swappiness": "10"}
+
+
+def test_missing_file_is_not_created(tmp_path):
+    applier = make_applier(tmp_path)
+    applier.block_root = ""
+    result = applier.apply({"block.scheduler": "none"})
+    assert not result.success and result.rolled_back
+    assert (tmp_path / "block/sda/queue/scheduler").read_text() == "[mq-deadline] none\n"
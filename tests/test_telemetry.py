@@ -0,0 +1,152 @@
+import asyncio
+import os
+import shutil
+import threading
+from types import SimpleNamespace
+import pytest
+from KernelTuneAgent import telemetry
+from KernelTuneAgent.telemetry import ProcessTracker, TelemetrySampler
+
+# 一次试验开始和结束时的 vmstat / meminfo / PSI
+PROCFS = os.path.join(os.path.dirname(__file__), "fixtures", "procfs")
+
+
+def write_process(proc, pid, session, minflt=0, majflt=0, utime=0, stime=0, rss=0, threads=(), io=(0, 0), numa=""):
+    """在假的 /proc 下写一个进程：stat、status、io、numa_maps 以及 task/<tid> 下的切换次数和调度统计"""
+    base = proc / str(pid)
+    base.mkdir(parents=True)
+    # 进程名带空格和括号，字段从最后一个右括号之后开始
+    (base / "stat").write_text(
+        f"{pid} (py (worker) 1) S 1 {session} {session} 0 -1 4194304 {minflt} 0 {majflt} 0 {utime} {stime} 0 0 20 0\n"
+    )
+    (base / "status").write_text(f"Name:\tpython\nVmRSS:\t{rss} kB\n")
+    (base / "io").write_text(f"rchar: 1\nwchar: 1\nread_bytes: {io[0]}\nwrite_bytes: {io[1]}\n")
+    (base / "numa_maps").write_text(numa)
+    for tid, (voluntary, involuntary, wait_ns) in threads:
+        task = base / "task" / str(tid)
+        task.mkdir(parents=True)
+        (task / "status").write_text(
+            f"voluntary_ctxt_switches:\t{voluntary}\nnonvoluntary_ctxt_switches:\t{involuntary}\n"
+        )
+        (task / "schedstat").write_text(f"1000 {wait_ns} 3\n")
+
+
+@pytest.fixture
+def fake_proc(tmp_path):
+    proc = tmp_path / "proc"
+    (proc / "self").mkdir(parents=True)
+    # 100 为训练进程（会话首进程），101 为它启动的子进程，200 属于其它会话
+    write_process(
+        proc, 100, 100, minflt=1000, majflt=5, utime=150, stime=50, rss=2048,
+        threads=[(100, (10, 2, 500_000_000)), (102, (5, 1, 250_000_000))], io=(4096, 8192),
+        numa="7f00 default anon=10 dirty=10 N0=300 N1=100 kernelpagesize_kB=4\n",
+    )
+    write_process(
+        proc, 101, 100, minflt=500, majflt=1, utime=100, stime=0, rss=1024,
+        threads=[(101, (3, 0, 250_000_000))], numa="7f10 default huge N1=2 kernelpagesize_kB=2048\n",
+    )
+    write_process(proc, 200, 200, minflt=99999, rss=99999, threads=[(200, (100, 100, 10**9))])
+    return proc
+
+
+def test_members_follow_the_session(fake_proc):
+    assert sorted(ProcessTracker(str(fake_proc), 100).members()) == [100, 101]
+    assert ProcessTracker(str(fake_proc / "missing"), 100).members() == []
+
+
+def test_usage_is_attributed_to_the_training_tree(fake_proc):
+    tracker = ProcessTracker(str(fake_proc), 100)
+    tracker.clock_ticks = 100
+    tracker.sample(0.0)
+    digest = tracker.digest()
+    assert digest.processes == 2
+    assert digest.minor_faults == 1500 and digest.major_faults == 6
+    assert digest.cpu_time == pytest.approx(3.0)
+    assert digest.voluntary_switches == 18 and digest.involuntary_switches == 3
+    assert digest.runqueue_wait == pytest.approx(1.0)
+    assert digest.read_bytes == 4096 and digest.write_bytes == 8192
+    assert digest.peak_rss == 3072
+    # N0 300 页 × 4 kB，N1 100 页 × 4 kB + 2 个 2 MB 大页
+    assert digest.numa_nodes == {"N0": 1200.0, "N1": 400.0 + 4096.0}
+
+
+def test_exited_process_keeps_its_last_reading(fake_proc):
+    tracker = ProcessTracker(str(fake_proc), 100, numa_interval=10.0)
+    tracker.sample(0.0)
+    for path in sorted((fake_proc / "101").rglob("*"), reverse=True):
+        path.rmdir() if path.is_dir() else path.unlink()
+    (fake_proc / "101").rmdir()
+    tracker.sample(1.0)
+    digest = tracker.digest()
+    assert digest.processes == 2 and digest.minor_faults == 1500
+    # RSS 峰值取进程树之和的最大值，numa_maps 未到读取间隔时保留上次结果
+    assert digest.peak_rss == 3072 and "N1" in digest.numa_nodes
+
+
+def test_sampler_reads_the_process_tree_off_the_event_loop(fake_proc, monkeypatch):
+    (fake_proc / "vmstat").write_text("pgfault 10\n")
+    threads = []
+    original = ProcessTracker.sample
+
+    def sample(self, now):
+        threads.append(threading.current_thread() is threading.main_thread())
+        original(self, now)
+
+    monkeypatch.setattr(ProcessTracker, "sample", sample)
+
+    async def trial():
+        sampler = TelemetrySampler(str(fake_proc), interval=0.01)
+        await sampler.start()
+        sampler.track(100)
+        await asyncio.sleep(0.05)
+        return await sampler.stop()
+
+    digest = asyncio.run(trial())
+    assert threads and not any(threads)
+    assert digest.process.processes == 2
+
+
+def test_stop_without_start():
+    assert asyncio.run(TelemetrySampler().stop()) is None
+
+
+def test_digest_from_procfs_fixture(tmp_path, monkeypatch):
+    proc = tmp_path / "proc"
+    shutil.copytree(os.path.join(PROCFS, "start"), proc)
+    clock = SimpleNamespace(now=0.0)
+    monkeypatch.setattr(telemetry, "time", SimpleNamespace(monotonic=lambda: clock.now))
+    reads = []
+    snapshot = TelemetrySampler.snapshot
+
+    def tracked_snapshot(self):
+        reads.append(threading.current_thread() is threading.main_thread())
+        return snapshot(self)
+
+    monkeypatch.setattr(TelemetrySampler, "snapshot", tracked_snapshot)
+
+    async def trial():
+        sampler = TelemetrySampler(str(proc), interval=10.0)
+        await sampler.start()
+        shutil.copytree(os.path.join(PROCFS, "end"), proc, dirs_exist_ok=True)
+        clock.now = 10.0
+        return await sampler.stop()
+
+    digest = asyncio.run(trial())
+    # /proc 的读取都不在事件循环所在的线程
+    assert reads and not any(reads)
+    assert digest.duration == 10.0 and digest.samples == 2
+    # 按内存区域拆分的 allocstall 合并计数
+    assert digest.counters["pgfault"] == 50000 and digest.counters["allocstall"] == 4
+    assert digest.counters["thp_fault_fallback"] == 4 and digest.counters["nr_dirtied"] == 50000
+    assert digest.peak_rates["pgfault"] == 5000.0
+    assert digest.gauges["Dirty"] == [(1024 + 205824) / 2, 205824]
+    assert digest.pressure["io.some"] == pytest.approx(0.2)
+    assert digest.pressure["memory.some"] == pytest.approx(0.1)
+    assert digest.pressure["cpu.some"] == pytest.approx(0.05)
+    assert digest.process is None
+
+    hints = "\n".join(digest.hints)
+    assert "直接回收" in hints and "THP 分配回退 4 次" in hints and "IO stall 占比 20.0%" in hints
+    assert "内存 stall" in hints and "CPU stall" not in hints
+    text = digest.describe()
+    assert "直接回收 allocstall 4" in text and "峰值 201 MB" in text
@@ -0,0 +1,114 @@
+import asyncio
+import json
+import pytest
+from KernelTuneAgent.tracing import Span, Tracer
+
+
+def record(tracer, name, start, end, parent=None, **attributes):
+    """按给定的单调时钟区间记录一个已结束的 span"""
+    span = Span(name, parent.span_id if parent is not None else None, attributes)
+    span._t0, span._t1 = start, end
+    tracer._record(span)
+    return span
+
+
+def test_jsonl_export(tmp_path):
+    path = tmp_path / "trace" / "spans.jsonl"
+    tracer = Tracer(str(path))
+    with tracer.span("session", agent="kta") as session:
+        with tracer.span("trial", trial_id=3, cached=None) as trial:
+            trial.set(training_time=12.5, samples=None)
+        with pytest.raises(RuntimeError):
+            with tracer.span("tool", tool="bash"):
+                raise RuntimeError("boom")
+    asyncio.run(tracer.close())
+
+    lines = [json.loads(line) for line in path.read_text(encoding="utf-8").splitlines()]
+    # span 结束时写入：子 span 在前
+    assert [line["span"] for line in lines] == ["trial", "tool", "session"]
+    trial_line, tool_line, session_line = lines
+    assert set(trial_line) == {"session", "span", "span_id", "parent_id", "start", "duration", "trial_id", "training_time"}
+    assert trial_line["trial_id"] == 3 and trial_line["training_time"] == 12.5
+    assert trial_line["parent_id"] == tool_line["parent_id"] == session.span_id == session_line["span_id"]
+    assert session_line["parent_id"] is None and session_line["agent"] == "kta"
+    assert tool_line["error"] == "RuntimeError"
+    assert {line["session"] for line in lines} == {tracer.session_id}
+    assert session_line["duration"] >= trial_line["duration"] >= 0
+
+
+def test_prometheus_histogram_and_counters():
+    tracer = Tracer(buckets=(10, 0.5))
+    record(tracer, "trial", 0.0, 0.2)
+    record(tracer, "trial", 0.0, 3.0)
+    record(tracer, "trial", 0.0, 20.0, error="TimeoutError")
+    record(tracer, "llm.chat", 0.0, 1.0, prompt_tokens=1200, completion_tokens=80)
+    record(tracer, "llm.chat", 0.0, 1.0, prompt_tokens=1300, completion_tokens=None)
+    lines = tracer.prometheus_text().splitlines()
+
+    # 桶按上界排序，计数是累计的
+    assert 'kta_span_duration_seconds_bucket{span="trial",le="0.5"} 1' in lines
+    assert 'kta_span_duration_seconds_bucket{span="trial",le="10"} 2' in lines
+    assert 'kta_span_duration_seconds_bucket{span="trial",le="+Inf"} 3' in lines
+    assert 'kta_span_duration_seconds_sum{span="trial"} 23.200000' in lines
+    assert 'kta_span_duration_seconds_count{span="trial"} 3' in lines
+    assert 'kta_span_duration_seconds_count{span="llm.chat"} 2' in lines
+    assert 'kta_span_errors_total{span="trial"} 1' in lines
+    assert 'kta_llm_tokens_total{kind="prompt"} 2500' in lines
+    assert 'kta_llm_tokens_total{kind="completion"} 80' in lines
+    # 每个指标族都有 HELP 和 TYPE，llm.chat 的桶排在 trial 之前
+    assert lines.count("# TYPE kta_span_duration_seconds histogram") == 1
+    assert "# TYPE kta_span_errors_total counter" in lines and "# TYPE kta_llm_tokens_total counter" in lines
+    first = [line for line in lines if line.startswith("kta_span_duration_seconds_bucket")][0]
+    assert 'span="llm.chat"' in first
+
+
+def test_write_prometheus_replaces_file(tmp_path):
+    path = tmp_path / "kta.prom"
+    path.write_text("stale\n")
+    tracer = Tracer()
+    record(tracer, "think", 0.0, 0.01)
+    tracer.write_prometheus(str(path))
+    assert path.read_text(encoding="utf-8") == tracer.prometheus_text()
+    assert [p.name for p in tmp_path.iterdir()] == ["kta.prom"]
+
+
+def test_metrics_endpoint():
+    async def fetch(port, target):
+        reader, writer = await asyncio.open_connection("127.0.0.1", port)
+        writer.write(f"GET {target} HTTP/1.1\r\nHost: localhost\r\n\r\n".encode())
+        await writer.drain()
+        response = await reader.read()
+        writer.close()
+        return response.decode()
+
+    async def scrape():
+        tracer = Tracer()
+        record(tracer, "act", 0.0, 0.5)
+        await tracer.serve(0)
+        port = tracer._server.sockets[0].getsockname()[1]
+        try:
+            return await fetch(port, "/metrics"), await fetch(port, "/"), tracer.prometheus_text()
+        finally:
+            await tracer.close()
+
+    metrics, missing, text = asyncio.run(scrape())
+    assert metrics.startswith("HTTP/1.1 200 OK") and metrics.endswith(text)
+    assert "text/plain; version=0.0.4" in metrics
+    assert missing.startswith("HTTP/1.1 404")
+
+
+def test_breakdown_merges_overlapping_spans():
+    tracer = Tracer()
+    session = record(tracer, "session", 0.0, 100.0)
+    record(tracer, "trial", 10.0, 60.0, parent=session)
+    # 与训练并行的投机请求不重复计算
+    record(tracer, "llm.chat", 50.0, 70.0, parent=session, speculative=True)
+    record(tracer, "llm.chat", 80.0, 85.0, parent=session)
+    record(tracer, "isolation", 10.0, 15.0, parent=session)
+    text = tracer.breakdown(session)
+    assert "会话耗时 100.0 秒" in text
+    assert "LLM 请求: 25.0 秒 (2 次)" in text and "训练: 50.0 秒 (1 次)" in text
+    assert "其中试验隔离: 5.0 秒 (1 次)" in text
+    # 被覆盖的区间为 [10, 70] 和 [80, 85]
+    assert text.endswith("代理自身: 35.0 秒")
+    assert Tracer().breakdown() == ""